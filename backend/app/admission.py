@@ -0,0 +1,321 @@
+"""
+Контроль допуска запросов к инференсу: ограничение числа одновременных
+инференсов, ограниченная очередь с классами приоритета и быстрый отказ
+с Retry-After вместо неограниченного роста задержки.
+
+Внутри класса приоритета запросы разных клиентов обслуживаются взвешенным
+round-robin по очередям клиентов, а частота запросов клиента ограничивается
+token bucket, поэтому один клиент не может занять модель целиком.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, List, Optional
+
+from starlette.requests import Request
+
+from app.config import settings
+from app.budget import decode_rate
+from app.metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED, ADMISSION_QUEUED, ADMISSION_IN_FLIGHT
+
+
+# Классы приоритета по убыванию важности
+PRIORITY_CLASSES = ("interactive", "bulk", "background")
+# Класс задач, не указанных в TASK_PRIORITIES; background - только для фоновой работы
+DEFAULT_PRIORITY = "bulk"
+
+
+class AdmissionRejected(Exception):
+    """Запрос отклонен контролем допуска."""
+
+    def __init__(self, status_code: int, error: str, message: str, retry_after: int):
+        self.status_code = status_code
+        self.error = error
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+def task_priority(task: str) -> str:
+    """Класс приоритета задачи по TASK_PRIORITIES (по умолчанию - DEFAULT_PRIORITY)."""
+    priority = settings.TASK_PRIORITIES.get(task, DEFAULT_PRIORITY)
+    return priority if priority in PRIORITY_CLASSES else DEFAULT_PRIORITY
+
+
+def client_identity(request: Request) -> str:
+    """Идентификатор клиента: API ключ из заголовка CLIENT_ID_HEADER или IP адрес."""
+    api_key = request.headers.get(settings.CLIENT_ID_HEADER)
+    if api_key:
+        return f"key:{api_key}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def client_weight(client: str) -> float:
+    """Вес клиента в round-robin по CLIENT_WEIGHTS (по умолчанию 1)."""
+    return max(0.01, settings.CLIENT_WEIGHTS.get(client, 1.0))
+
+
+def estimate_cost(width: int, height: int, max_new_tokens: int) -> float:
+    """
+    Оценивает стоимость инференса в секундах: prefill по числу пикселей
+    и decode по бюджету токенов и наблюдаемой скорости декодирования.
+    """
+    megapixels = width * height / 1_000_000
+    return megapixels * settings.ADMISSION_PREFILL_S_PER_MEGAPIXEL + max_new_tokens / decode_rate()
+
+
+class RateLimiter:
+    """
+    Token bucket на клиента: rate запросов в секунду с запасом burst.
+
+    Args:
+        rate: Пополнение в запросах в секунду (0 - без ограничения)
+        burst: Емкость корзины
+        clock: Источник монотонного времени
+    """
+
+    # Число корзин, после которого полные (неактивные) корзины удаляются
+    MAX_IDLE_BUCKETS = 10000
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self._buckets: Dict[str, List[float]] = {}
+
+    def acquire(self, client: str, priority: str) -> None:
+        """
+        Забирает один токен из корзины клиента.
+
+        Raises:
+            AdmissionRejected: 429, если корзина пуста
+        """
+        if self.rate <= 0:
+            return
+        now = self.clock()
+        tokens, updated = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[client] = [tokens, now]
+            ADMISSION_REJECTED.labels(priority, "rate_limited").inc()
+            raise AdmissionRejected(
+                429, "RATE_LIMITED",
+                "Превышен лимит частоты запросов клиента",
+                max(1, math.ceil((1 - tokens) / self.rate))
+            )
+        self._buckets[client] = [tokens - 1, now]
+        if len(self._buckets) > self.MAX_IDLE_BUCKETS:
+            self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        for client, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * self.rate >= self.burst:
+                del self._buckets[client]
+
+
+class _Ticket:
+    def __init__(self, priority: str, client: str, cost: float):
+        self.priority = priority
+        self.client = client
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.future: Optional[asyncio.Future] = None
+
+
+class AdmissionController:
+    """
+    Очередь перед инференсом. Работает в event loop, поэтому не требует блокировок.
+
+    Args:
+        max_in_flight: Максимум одновременных инференсов
+        queue_limits: Максимальная длина очереди для каждого класса приоритета
+        max_wait_s: Максимальное ожидаемое время в очереди (0 - без ограничения)
+        client_queue_limit: Максимальная длина очереди одного клиента в классе (0 - без ограничения)
+    """
+
+    def __init__(self, max_in_flight: int, queue_limits: Dict[str, int], max_wait_s: float = 0.0,
+                 client_queue_limit: int = 0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue_limits = queue_limits
+        self.max_wait_s = max_wait_s
+        self.client_queue_limit = client_queue_limit
+        self._in_flight: List[_Ticket] = []
+        # Класс приоритета -> клиент -> очередь; порядок клиентов - порядок появления
+        self._queues: Dict[str, Dict[str, Deque[_Ticket]]] = {priority: {} for priority in PRIORITY_CLASSES}
+        # Текущие веса smooth weighted round-robin по классам
+        self._current: Dict[str, Dict[str, float]] = {priority: {} for priority in PRIORITY_CLASSES}
+        self._queued: Dict[str, int] = {priority: 0 for priority in PRIORITY_CLASSES}
+
+    def queued(self, priority: Optional[str] = None, client: Optional[str] = None) -> int:
+        """Число ожидающих запросов (всего, для класса или для клиента в классе)."""
+        if client is not None:
+            return len(self._queues[priority].get(client, ()))
+        if priority is not None:
+            return self._queued[priority]
+        return sum(self._queued.values())
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def _slot_free(self) -> bool:
+        return len(self._in_flight) < self.max_in_flight and not self.queued()
+
+    def estimated_wait(self, priority: str, client: str = "", cost: float = 0.0) -> float:
+        """
+        Ожидаемое время до начала инференса для нового запроса клиента client
+        класса priority: остаток выполняющихся инференсов, очередь более
+        приоритетных классов и справедливая доля очередей других клиентов
+        того же класса, распределенные по max_in_flight слотам.
+        """
+        if self._slot_free():
+            return 0.0
+        now = time.monotonic()
+        remaining = sum(max(0.0, ticket.cost - (now - ticket.started_at)) for ticket in self._in_flight)
+        ahead = 0.0
+        for other in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority)]:
+            ahead += sum(ticket.cost for queue in self._queues[other].values() for ticket in queue)
+        clients = self._queues[priority]
+        own = sum(ticket.cost for ticket in clients.get(client, ())) + cost
+        weight = client_weight(client)
+        for other, queue in clients.items():
+            if other == client:
+                continue
+            # За время обслуживания own другой клиент успеет получить не больше своей доли
+            ahead += min(sum(ticket.cost for ticket in queue), own * client_weight(other) / weight)
+        return (remaining + ahead + own - cost) / self.max_in_flight
+
+    def _retry_after(self, priority: str, client: str) -> int:
+        return max(1, math.ceil(self.estimated_wait(priority, client)))
+
+    def check(self, priority: str, client: str = "") -> None:
+        """
+        Быстрая проверка до разбора изображения: отклоняет запрос, если заполнена
+        очередь класса или очередь клиента в этом классе.
+
+        Raises:
+            AdmissionRejected: 429 при заполненной очереди
+        """
+        if self._slot_free():
+            return
+        if self._queued[priority] >= self.queue_limits.get(priority, 0):
+            message = f"Очередь запросов ({priority}) заполнена, повторите позже"
+        elif self.client_queue_limit and self.queued(priority, client) >= self.client_queue_limit:
+            message = f"Слишком много запросов клиента в очереди ({priority}), повторите позже"
+        else:
+            return
+        ADMISSION_REJECTED.labels(priority, "queue_full").inc()
+        raise AdmissionRejected(429, "QUEUE_FULL", message, self._retry_after(priority, client))
+
+    @asynccontextmanager
+    async def admit(self, priority: str, cost: float, client: str = ""):
+        """
+        Ждет свободный слот инференса (по приоритету, внутри класса - взвешенный
+        round-robin по клиентам) и удерживает его на время блока.
+
+        Args:
+            priority: Класс приоритета
+            cost: Оценка стоимости в секундах (estimate_cost)
+            client: Идентификатор клиента
+
+        Raises:
+            AdmissionRejected: 429 при заполненной очереди, 503 если ожидание превысит ADMISSION_MAX_WAIT_S
+        """
+        self.check(priority, client)
+        wait = self.estimated_wait(priority, client, cost)
+        if self.max_wait_s > 0 and wait > self.max_wait_s:
+            ADMISSION_REJECTED.labels(priority, "overloaded").inc()
+            raise AdmissionRejected(
+                503, "OVERLOADED",
+                f"Сервер перегружен: ожидаемое время в очереди {wait:.0f} с",
+                max(1, math.ceil(wait - self.max_wait_s))
+            )
+
+        ticket = _Ticket(priority, client, cost)
+        if self._slot_free():
+            self._start(ticket)
+        else:
+            ticket.future = asyncio.get_running_loop().create_future()
+            self._queues[priority].setdefault(client, deque()).append(ticket)
+            self._set_queued(priority, 1)
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                if ticket.started_at is not None:
+                    self._release(ticket)
+                else:
+                    self._remove(ticket)
+                raise
+
+        ADMISSION_QUEUE_WAIT.labels(priority).observe(ticket.started_at - ticket.enqueued_at)
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def _set_queued(self, priority: str, delta: int) -> None:
+        self._queued[priority] += delta
+        ADMISSION_QUEUED.labels(priority).set(self._queued[priority])
+
+    def _start(self, ticket: _Ticket) -> None:
+        ticket.started_at = time.monotonic()
+        self._in_flight.append(ticket)
+        ADMISSION_IN_FLIGHT.set(len(self._in_flight))
+
+    def _remove(self, ticket: _Ticket) -> None:
+        clients = self._queues[ticket.priority]
+        queue = clients[ticket.client]
+        queue.remove(ticket)
+        if not queue:
+            del clients[ticket.client]
+            self._current[ticket.priority].pop(ticket.client, None)
+        self._set_queued(ticket.priority, -1)
+
+    def _next(self) -> Optional[_Ticket]:
+        """
+        Следующий запрос: первый непустой класс приоритета, внутри класса -
+        smooth weighted round-robin по клиентам с непустой очередью.
+        """
+        for priority in PRIORITY_CLASSES:
+            clients = self._queues[priority]
+            if not clients:
+                continue
+            current = self._current[priority]
+            total = 0.0
+            for client in clients:
+                weight = client_weight(client)
+                current[client] = current.get(client, 0.0) + weight
+                total += weight
+            chosen = max(clients, key=current.get)
+            current[chosen] -= total
+            ticket = clients[chosen][0]
+            self._remove(ticket)
+            return ticket
+        return None
+
+    def _release(self, ticket: _Ticket) -> None:
+        self._in_flight.remove(ticket)
+        while len(self._in_flight) < self.max_in_flight:
+            waiting = self._next()
+            if waiting is None:
+                break
+            self._start(waiting)
+            waiting.future.set_result(None)
+        ADMISSION_IN_FLIGHT.set(len(self._in_flight))
+
+
+def create_controller() -> AdmissionController:
+    """Контроллер по настройкам (ADMISSION_MAX_IN_FLIGHT=0 - по числу реплик модели)."""
+    return AdmissionController(
+        settings.ADMISSION_MAX_IN_FLIGHT or settings.MODEL_REPLICAS,
+        settings.ADMISSION_QUEUE_LIMITS,
+        settings.ADMISSION_MAX_WAIT_S,
+        settings.ADMISSION_CLIENT_QUEUE_LIMIT
+    )
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Token bucket по настройкам RATE_LIMIT_*."""
+    return RateLimiter(settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST)
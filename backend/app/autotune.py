@@ -0,0 +1,198 @@
+"""
+Автотюнер конфигурации инференса.
+Перебирает dtype, реализацию attention, число потоков и размер батча
+на синтетических изображениях и сохраняет лучший профиль рядом с кэшем модели.
+"""
+import json
+import os
+import time
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+
+
+AUTOTUNE_QUESTION = "What is in this image?"
+
+
+def profile_path() -> Path:
+    """Возвращает путь к файлу профиля для текущей модели и устройства."""
+    if settings.AUTOTUNE_PROFILE_PATH:
+        return Path(settings.AUTOTUNE_PROFILE_PATH)
+    model_slug = settings.MODEL_NAME.replace("/", "--")
+    return Path(settings.TRANSFORMERS_CACHE) / f"autotune_{model_slug}_{settings.DEVICE}.json"
+
+
+def fingerprint() -> Dict[str, Any]:
+    """Параметры окружения, при изменении которых профиль нужно пересчитать."""
+    try:
+        import torch
+        torch_version = torch.__version__
+    except ImportError:
+        torch_version = None
+    return {
+        "model_name": settings.MODEL_NAME,
+        "device": settings.DEVICE,
+        "cpu_count": os.cpu_count(),
+        "torch_version": torch_version,
+    }
+
+
+def load_profile(path: Optional[Path] = None) -> Optional[dict]:
+    """
+    Загружает сохраненный профиль, если он соответствует текущему окружению.
+
+    Returns:
+        Optional[dict]: Профиль или None
+    """
+    path = path or profile_path()
+    if not path.exists():
+        return None
+    try:
+        profile = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"Не удалось прочитать профиль автотюнера {path}: {e}")
+        return None
+    if profile.get("fingerprint") != fingerprint():
+        print("Профиль автотюнера устарел, требуется повторный подбор")
+        return None
+    return profile
+
+
+def save_profile(profile: dict, path: Optional[Path] = None) -> None:
+    """Сохраняет профиль в JSON."""
+    path = path or profile_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(profile, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def synthetic_images(count: int, size: int = 512) -> List[Image.Image]:
+    """Создает детерминированные синтетические изображения."""
+    rng = np.random.default_rng(0)
+    return [
+        Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+        for _ in range(count)
+    ]
+
+
+def default_thread_candidates() -> List[int]:
+    """Варианты числа потоков по умолчанию: все ядра и половина."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    return sorted({cpus, max(1, cpus // 2)}, reverse=True)
+
+
+def candidate_configs() -> List[dict]:
+    """Матрица конфигураций загрузки модели (без размера батча)."""
+    threads = settings.AUTOTUNE_THREADS or default_thread_candidates()
+    if settings.DEVICE == "cuda":
+        threads = [0]
+    return [
+        {"torch_dtype": dtype, "attn_implementation": attn, "num_threads": num_threads}
+        for dtype, attn, num_threads in product(
+            settings.AUTOTUNE_DTYPES, settings.AUTOTUNE_ATTN_IMPLEMENTATIONS, threads
+        )
+    ]
+
+
+def select_best(results: List[dict], slo_ms: float) -> Optional[dict]:
+    """
+    Выбирает конфигурацию с максимальной пропускной способностью в рамках SLO.
+    Если SLO не выполняется ни одной конфигурацией, выбирается самая быстрая по задержке.
+
+    Args:
+        results: Результаты замеров с ключами latency_ms и throughput
+        slo_ms: Ограничение задержки батча в миллисекундах
+
+    Returns:
+        Optional[dict]: Лучший результат или None, если замеров нет
+    """
+    if not results:
+        return None
+    feasible = [r for r in results if r["latency_ms"] <= slo_ms]
+    if feasible:
+        return max(feasible, key=lambda r: r["throughput"])
+    return min(results, key=lambda r: r["latency_ms"])
+
+
+def measure(manager, batch_size: int, images: List[Image.Image]) -> dict:
+    """Замеряет задержку батча и пропускную способность (изображений/с)."""
+    batch = images[:batch_size]
+    questions = [AUTOTUNE_QUESTION] * batch_size
+    manager.vqa_batch_inference(batch, questions, max_new_tokens=settings.AUTOTUNE_MAX_NEW_TOKENS)
+
+    latencies = []
+    for _ in range(settings.AUTOTUNE_ITERATIONS):
+        started = time.perf_counter()
+        manager.vqa_batch_inference(batch, questions, max_new_tokens=settings.AUTOTUNE_MAX_NEW_TOKENS)
+        latencies.append(time.perf_counter() - started)
+
+    latency = sum(latencies) / len(latencies)
+    return {"latency_ms": latency * 1000, "throughput": batch_size / latency}
+
+
+def run_autotune(manager) -> dict:
+    """
+    Перебирает матрицу конфигураций и возвращает лучший профиль.
+
+    Args:
+        manager: ModelManager, модель в котором будет перезагружаться
+
+    Returns:
+        dict: Профиль с выбранной конфигурацией и всеми замерами
+    """
+    images = synthetic_images(max(settings.AUTOTUNE_BATCH_SIZES))
+    results = []
+    loaded_key = None
+    for config in candidate_configs():
+        key = (config["torch_dtype"], config["attn_implementation"])
+        try:
+            if key != loaded_key:
+                manager.unload_model()
+                manager.load_model(torch_dtype=config["torch_dtype"],
+                                   attn_implementation=config["attn_implementation"])
+                loaded_key = key
+            manager.configure_threads(config["num_threads"])
+            for batch_size in settings.AUTOTUNE_BATCH_SIZES:
+                result = {**config, "batch_size": batch_size, **measure(manager, batch_size, images)}
+                print(f"Автотюнер: {result}")
+                results.append(result)
+        except Exception as e:
+            print(f"Автотюнер: конфигурация {config} пропущена: {e}")
+            loaded_key = None
+
+    best = select_best(results, settings.AUTOTUNE_LATENCY_SLO_MS)
+    if best is None:
+        raise RuntimeError("Автотюнер не смог выполнить ни одной конфигурации")
+
+    return {
+        **best,
+        "slo_ms": settings.AUTOTUNE_LATENCY_SLO_MS,
+        "fingerprint": fingerprint(),
+        "created_at": datetime.now().isoformat(),
+        "results": results,
+    }
+
+
+def ensure_profile(manager) -> dict:
+    """
+    Загружает сохраненный профиль или подбирает новый, затем загружает модель с ним.
+
+    Returns:
+        dict: Активный профиль
+    """
+    profile = load_profile()
+    if profile is None:
+        print("Запуск автотюнера конфигурации инференса...")
+        profile = run_autotune(manager)
+        save_profile(profile)
+        manager.unload_model()
+        print(f"Профиль автотюнера сохранен в {profile_path()}")
+
+    manager.set_profile(profile)
+    manager.load_model()
+    return profile
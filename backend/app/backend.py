@@ -0,0 +1,136 @@
+"""
+Интерфейс бэкенда инференса для ModelManager.
+Бэкенд загружает модели и выполняет генерацию; реестр моделей, метрики
+и постобработка ответов остаются в ModelManager.
+"""
+import importlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+
+class InferenceBackend:
+    """
+    Базовый класс бэкенда инференса.
+
+    Генерация разбита на стадии prepare -> generate -> decode, чтобы
+    ModelManager одинаково замерял их для любого бэкенда.
+    """
+
+    name = ""
+
+    def configure_threads(self, num_threads: int = 0, num_interop_threads: int = 0) -> None:
+        """Настраивает число потоков вычислений (0 - значение по умолчанию)."""
+
+    def load(self, model_name: str, torch_dtype: Optional[str] = None,
+             attn_implementation: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Загружает модель.
+
+        Args:
+            model_name: Имя модели на HuggingFace или путь
+            torch_dtype: Переопределение TORCH_DTYPE
+            attn_implementation: Переопределение ATTN_IMPLEMENTATION
+
+        Returns:
+            Dict[str, Any]: {"model": ..., "processor": ..., "size_bytes": int}
+        """
+        raise NotImplementedError
+
+    def release(self) -> None:
+        """Освобождает кэши устройства после выгрузки моделей."""
+
+    def draft_compatible(self, main: Dict[str, Any], draft: Dict[str, Any]) -> bool:
+        """Может ли draft-модель использоваться для спекулятивного декодирования main."""
+        return False
+
+    def prepare(self, entry: Dict[str, Any], images: List[Any], text_contents: List[str]) -> Any:
+        """Готовит входы модели для батча пар (изображение, текст)."""
+        raise NotImplementedError
+
+    def prepare_shared(self, entry: Dict[str, Any], image: Any, text_contents: List[str]) -> Any:
+        """
+        Готовит входы для нескольких запросов к одному изображению.
+        Бэкенд может закодировать изображение один раз для всех строк батча;
+        по умолчанию изображение повторяется в каждой строке.
+        """
+        return self.prepare(entry, [image] * len(text_contents), text_contents)
+
+    def prepare_images(self, entry: Dict[str, Any], images: List[Any], text_content: str,
+                       split_images: bool = True) -> Any:
+        """
+        Готовит входы одного промпта с несколькими изображениями (например, кадрами видео).
+        split_images=False отключает разбиение изображений на фрагменты, если бэкенд его выполняет.
+        """
+        raise NotImplementedError
+
+    def generate(self, entry: Dict[str, Any], inputs: Any, max_new_tokens: int,
+                 draft: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Выполняет генерацию.
+
+        Args:
+            entry: Запись реестра основной модели
+            inputs: Результат prepare
+            max_new_tokens: Лимит генерируемых токенов
+            draft: Запись реестра draft-модели (None - обычная генерация)
+
+        Returns:
+            Dict[str, Any]: {
+                "outputs": данные для decode,
+                "row_tokens": число новых токенов для каждого элемента батча,
+                "started", "first_token_at", "finished": моменты perf_counter,
+                "row_finished": момент perf_counter готовности каждого элемента батча,
+                "speculative": статистика assisted_generate или None
+            }
+        """
+        raise NotImplementedError
+
+    def prepare_chat(self, entry: Dict[str, Any], image: Any, history: List[Tuple[str, str]],
+                     text_content: str) -> Any:
+        """
+        Готовит входы хода диалога: история пар (вопрос, ответ) и новый вопрос.
+        Изображение прикладывается к первой реплике пользователя.
+        """
+        raise NotImplementedError
+
+    def prompt_tokens(self, inputs: Any) -> int:
+        """Длина промпта prepare_chat в токенах."""
+        raise NotImplementedError
+
+    def generate_chat(self, entry: Dict[str, Any], inputs: Any, max_new_tokens: int,
+                      cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Генерирует ответ хода диалога, переиспользуя KV-кэш предыдущего хода.
+
+        Args:
+            entry: Запись реестра модели
+            inputs: Результат prepare_chat
+            max_new_tokens: Лимит генерируемых токенов
+            cached: Запись KVCacheStore предыдущего хода или None
+
+        Returns:
+            Dict[str, Any]: Результат как у generate, а также
+                "cache": {"ids", "kv", "bytes"} для следующего хода,
+                "reused_tokens": число токенов промпта, взятых из кэша
+        """
+        raise NotImplementedError
+
+    def decode(self, entry: Dict[str, Any], result: Dict[str, Any]) -> List[str]:
+        """Декодирует новые токены в текст (без постобработки)."""
+        raise NotImplementedError
+
+
+BACKENDS = {
+    "transformers": "app.transformers_backend.TransformersBackend",
+    "fake": "app.fake_backend.FakeBackend",
+}
+
+
+def get_backend(name: Optional[str] = None) -> InferenceBackend:
+    """
+    Создает бэкенд по имени (по умолчанию INFERENCE_BACKEND).
+    Модуль бэкенда импортируется лениво, поэтому fake не требует torch.
+    """
+    module_name, class_name = BACKENDS[name or settings.INFERENCE_BACKEND].rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)()
@@ -0,0 +1,293 @@
+"""
+Пакетная обработка изображений из командной строки без HTTP API:
+описание (caption), ответы на вопросы (vqa) и OCR для каталога или манифеста.
+
+Изображения читаются и валидируются в отдельных процессах с опережением,
+инференс выполняется батчами, результаты дописываются в JSONL после каждого
+батча. Выходной файл служит чекпоинтом: повторный запуск с теми же
+аргументами пропускает уже обработанные изображения.
+
+Запуск из каталога backend:
+    python -m app.batch /data/images --task caption --output captions.jsonl
+    python -m app.batch manifest.jsonl --task vqa --output answers.jsonl --workers 8
+    python -m app.batch pages.txt --task ocr --output ocr.jsonl --batch-size 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from PIL import Image
+
+from app.budget import resolve_token_budget
+from app.validators import validate_image_bytes, validate_model, ValidationError
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+TASKS = ("caption", "vqa", "ocr")
+
+
+def iter_inputs(source: str) -> Iterator[Dict[str, Any]]:
+    """
+    Перечисляет входные изображения.
+
+    Args:
+        source: Каталог (рекурсивно), манифест .jsonl со строками {"path": ..., "question": ...}
+            или текстовый файл с путем на строку. Относительные пути в манифесте
+            считаются от каталога манифеста.
+
+    Returns:
+        Iterator[Dict]: {"path": ..., "question": ...}
+    """
+    root = Path(source)
+    if root.is_dir():
+        for path in sorted(root.rglob("*")):
+            if path.suffix.lower() in IMAGE_EXTENSIONS and path.is_file():
+                yield {"path": str(path)}
+        return
+
+    with open(root, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line) if root.suffix == ".jsonl" else {"path": line}
+            path = Path(item["path"])
+            item["path"] = str(path if path.is_absolute() else root.parent / path)
+            yield item
+
+
+def load_image(path: str) -> Tuple[Optional[Image.Image], Optional[str]]:
+    """
+    Читает и валидирует изображение (выполняется в процессе-загрузчике).
+
+    Returns:
+        Tuple: (RGB изображение, None) или (None, текст ошибки)
+    """
+    try:
+        _, image = validate_image_bytes(Path(path).read_bytes())
+        return image.convert("RGB"), None
+    except ValidationError as e:
+        return None, e.message
+    except OSError as e:
+        return None, f"Не удалось прочитать файл: {e}"
+
+
+def prefetch(items: List[Dict[str, Any]], workers: int,
+             window: int) -> Iterator[Tuple[Dict[str, Any], Optional[Image.Image], Optional[str]]]:
+    """
+    Загружает изображения в workers процессах, опережая потребителя не больше чем на window.
+    Порядок результатов совпадает с порядком items.
+    """
+    if workers <= 0:
+        for item in items:
+            yield (item, *load_image(item["path"]))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append((item, pool.submit(load_image, item["path"])))
+            if len(pending) >= window:
+                item, future = pending.popleft()
+                yield (item, *future.result())
+        while pending:
+            item, future = pending.popleft()
+            yield (item, *future.result())
+
+
+def load_checkpoint(output: Path, retry_errors: bool = False) -> Set[str]:
+    """
+    Возвращает пути, уже записанные в выходной JSONL.
+    Недописанная последняя строка (прерывание во время записи) удаляется из файла.
+
+    С retry_errors записи с ошибкой удаляются из файла (через временный файл
+    и os.replace), чтобы повторная обработка не давала второй записи для пути.
+
+    Args:
+        output: Выходной файл
+        retry_errors: Не считать обработанными изображения с ошибкой
+    """
+    if not output.exists():
+        return set()
+    data = output.read_bytes()
+    end = data.rfind(b"\n") + 1
+    if end < len(data):
+        with open(output, "r+b") as f:
+            f.truncate(end)
+
+    done = set()
+    kept = []
+    for line in data[:end].splitlines(keepends=True):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            kept.append(line)
+            continue
+        if retry_errors and "error" in record:
+            continue
+        kept.append(line)
+        done.add(record["path"])
+
+    if len(kept) < len(data[:end].splitlines()):
+        temp = output.with_name(output.name + ".tmp")
+        with open(temp, "wb") as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, output)
+    return done
+
+
+def format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+    """Печатает число обработанных изображений, скорость и оценку оставшегося времени."""
+
+    def __init__(self, total: int, interval: float = 5.0):
+        self.total = total
+        self.interval = interval
+        self.processed = 0
+        self.started = time.perf_counter()
+        self.reported = self.started
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def line(self) -> str:
+        rate = self.rate()
+        eta = format_eta((self.total - self.processed) / rate) if rate > 0 else "?"
+        return f"{self.processed}/{self.total} изображений, {rate:.2f} img/s, ETA {eta}"
+
+    def update(self, count: int) -> None:
+        self.processed += count
+        now = time.perf_counter()
+        if now - self.reported >= self.interval or self.processed == self.total:
+            self.reported = now
+            print(self.line(), flush=True)
+
+
+def infer_batch(manager: Any, task: str, batch: List[Tuple[Dict[str, Any], Image.Image]],
+                question: Optional[str], model: Optional[str],
+                max_new_tokens: Optional[int]) -> List[str]:
+    """Инференс одного батча; бюджет токенов - максимум оценок по элементам."""
+    images = [image for _, image in batch]
+    if task == "ocr":
+        budget = max(resolve_token_budget("ocr", max_new_tokens, image=image) for image in images)
+        return manager.ocr_batch_inference(images, budget, model)
+
+    questions = [None if task == "caption" else item.get("question", question) for item, _ in batch]
+    budget = max(
+        resolve_token_budget("caption" if q is None else "vqa", max_new_tokens, question=q)
+        for q in questions
+    )
+    return manager.vqa_batch_inference(images, questions, budget, model)
+
+
+def run_batch(source: str, output: str, task: str = "caption", question: Optional[str] = None,
+              model: Optional[str] = None, batch_size: Optional[int] = None, workers: int = 2,
+              max_new_tokens: Optional[int] = None, retry_errors: bool = False,
+              manager: Any = None, progress_interval: float = 5.0) -> Dict[str, int]:
+    """
+    Обрабатывает все изображения источника и дописывает результаты в output.
+
+    Returns:
+        Dict: {total, skipped, processed, errors}
+    """
+    if task == "vqa" and question is None:
+        question = "What is in this image?"
+    model = validate_model(model)
+
+    output_path = Path(output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    done = load_checkpoint(output_path, retry_errors)
+    items = list(iter_inputs(source))
+    todo = [item for item in items if item["path"] not in done]
+    print(f"Найдено изображений: {len(items)}, уже обработано: {len(items) - len(todo)}")
+
+    if manager is None:
+        from app.model_manager import ModelManager
+        manager = ModelManager()
+        manager.load_model()
+    batch_size = batch_size or manager.get_batch_size()
+
+    summary = {"total": len(items), "skipped": len(items) - len(todo), "processed": 0, "errors": 0}
+    progress = Progress(len(todo), progress_interval)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        def write(records: List[Dict[str, Any]]) -> None:
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            summary["processed"] += len(records)
+            summary["errors"] += sum(1 for record in records if "error" in record)
+            progress.update(len(records))
+
+        def flush(batch: List[Tuple[Dict[str, Any], Image.Image]]) -> None:
+            try:
+                texts = infer_batch(manager, task, batch, question, model, max_new_tokens)
+                records = [{"path": item["path"], "task": task, "text": text} for (item, _), text in zip(batch, texts)]
+            except Exception as e:
+                records = [{"path": item["path"], "task": task, "error": f"Ошибка инференса: {e}"} for item, _ in batch]
+            write(records)
+
+        batch: List[Tuple[Dict[str, Any], Image.Image]] = []
+        for item, image, error in prefetch(todo, workers, max(1, workers) * batch_size * 2):
+            if error is not None:
+                write([{"path": item["path"], "task": task, "error": error}])
+                continue
+            batch.append((item, image))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная обработка изображений")
+    parser.add_argument("source", help="Каталог с изображениями, манифест .jsonl или список путей .txt")
+    parser.add_argument("--output", required=True, help="Выходной JSONL (он же чекпоинт)")
+    parser.add_argument("--task", choices=TASKS, default="caption")
+    parser.add_argument("--question", default=None, help="Вопрос для vqa (если не задан в манифесте)")
+    parser.add_argument("--model", default=None, help="Псевдоним модели из реестра")
+    parser.add_argument("--batch-size", type=int, default=None, help="Размер батча (по умолчанию - профиль)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 4),
+                        help="Процессов для чтения изображений (0 - в основном процессе)")
+    parser.add_argument("--max-new-tokens", type=int, default=None, help="Лимит токенов (по умолчанию - оценка)")
+    parser.add_argument("--retry-errors", action="store_true", help="Повторить изображения с ошибкой")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        summary = run_batch(
+            args.source, args.output, args.task, args.question, args.model, args.batch_size,
+            args.workers, args.max_new_tokens, args.retry_errors
+        )
+    except KeyboardInterrupt:
+        print("\nПрервано. Повторный запуск с теми же аргументами продолжит с места остановки")
+        sys.exit(130)
+    except ValidationError as e:
+        print(f"Ошибка: {e.message}")
+        sys.exit(2)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Готово: обработано {summary['processed']}, ошибок {summary['errors']}, "
+        f"пропущено {summary['skipped']} за {format_eta(elapsed)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
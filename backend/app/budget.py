@@ -0,0 +1,171 @@
+"""
+Оценка бюджета генерируемых токенов для запроса.
+Эвристики по типу вопроса и плотности текста на изображении.
+"""
+import re
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.metrics import GENERATION_TOKENS_PER_SECOND
+from app.routing import resolve_model
+
+
+SHORT_ANSWER_TOKENS = 16
+FACT_ANSWER_TOKENS = 64
+MIN_OCR_TOKENS = 64
+
+# Вопросы с ответом да/нет или числом
+_YES_NO_RE = re.compile(
+    r"^(is|are|was|were|do|does|did|can|could|will|would|should|has|have|had)\b"
+    r"|\bли\b|^how many\b|^сколько\b",
+    re.IGNORECASE
+)
+# Вопросы с коротким фактическим ответом
+_FACT_RE = re.compile(
+    r"^(what|which|who|where|when)\b|^(что|какой|какая|какое|какие|кто|где|когда)\b",
+    re.IGNORECASE
+)
+# Вопросы, требующие развернутого ответа
+_LONG_RE = re.compile(
+    r"\b(describe|explain|why|list|details?|опиши|объясни|почему|перечисли|подробно)\b",
+    re.IGNORECASE
+)
+
+# Плотность границ, при которой страница считается полностью заполненной текстом
+FULL_PAGE_EDGE_DENSITY = 0.15
+
+
+def estimate_vqa_tokens(question: Optional[str]) -> int:
+    """
+    Оценивает длину ответа по вопросу.
+
+    Args:
+        question: Вопрос (None - описание изображения)
+
+    Returns:
+        int: Оценка бюджета токенов
+    """
+    if question is None or not question.strip():
+        return settings.CAPTION_MAX_NEW_TOKENS
+    question = question.strip()
+    if _LONG_RE.search(question):
+        return settings.VQA_MAX_NEW_TOKENS
+    if _YES_NO_RE.search(question):
+        return SHORT_ANSWER_TOKENS
+    if _FACT_RE.search(question):
+        return FACT_ANSWER_TOKENS
+    return settings.VQA_MAX_NEW_TOKENS
+
+
+def text_density(image: Image.Image, max_side: int = 256) -> float:
+    """
+    Оценивает плотность текста как долю пикселей с сильным градиентом яркости.
+
+    Args:
+        image: PIL изображение
+        max_side: Сторона уменьшенной копии для анализа
+
+    Returns:
+        float: Доля "краевых" пикселей от 0 до 1
+    """
+    thumbnail = image.convert("L")
+    thumbnail.thumbnail((max_side, max_side))
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    if pixels.shape[0] < 2 or pixels.shape[1] < 2:
+        return 0.0
+    dx = np.abs(np.diff(pixels, axis=1))[:-1, :]
+    dy = np.abs(np.diff(pixels, axis=0))[:, :-1]
+    return float(np.mean((dx + dy) > 64))
+
+
+def estimate_ocr_tokens(image: Image.Image) -> int:
+    """
+    Оценивает объем текста на изображении в токенах.
+
+    Args:
+        image: PIL изображение
+
+    Returns:
+        int: Оценка бюджета токенов
+    """
+    fill = min(1.0, text_density(image) / FULL_PAGE_EDGE_DENSITY)
+    return max(MIN_OCR_TOKENS, int(settings.OCR_MAX_NEW_TOKENS * fill))
+
+
+def decode_rate(model: Optional[str] = None, task: str = "vqa") -> float:
+    """
+    Наблюдаемая скорость декодирования одного запроса (токенов/с) моделью задачи
+    или DECODE_TOKENS_PER_SECOND, пока замеров нет.
+
+    Берется режим, в котором декодируется одиночный запрос: speculative при
+    настроенной DRAFT_MODEL (если замеров нет - greedy), иначе greedy.
+
+    Args:
+        model: Псевдоним модели из запроса (None - по маршрутизации задачи)
+        task: Задача (caption, vqa, ocr)
+    """
+    alias = resolve_model(task, model)
+    modes = ["greedy"]
+    if settings.DRAFT_MODEL and settings.DRAFT_MODEL != alias and task in settings.SPECULATIVE_TASKS:
+        modes.insert(0, "speculative")
+    rates = {
+        key[1]: child.sum / child.count
+        for key, child in GENERATION_TOKENS_PER_SECOND.children() if key[0] == alias and child.count
+    }
+    for mode in modes:
+        if mode in rates:
+            return rates[mode]
+    return settings.DECODE_TOKENS_PER_SECOND
+
+
+def default_token_budget(task: str) -> int:
+    """Бюджет по умолчанию для задачи."""
+    return {
+        "caption": settings.CAPTION_MAX_NEW_TOKENS,
+        "vqa": settings.VQA_MAX_NEW_TOKENS,
+        "ocr": settings.OCR_MAX_NEW_TOKENS,
+    }[task]
+
+
+def resolve_token_budget(task: str, requested: Optional[int] = None,
+                         latency_budget_ms: Optional[int] = None,
+                         question: Optional[str] = None,
+                         image: Optional[Image.Image] = None,
+                         model: Optional[str] = None) -> int:
+    """
+    Определяет max_new_tokens для запроса.
+
+    Значение клиента имеет приоритет, иначе используется эвристика
+    (или значение по умолчанию для задачи при ADAPTIVE_TOKEN_BUDGET=false).
+    Бюджет задержки переводится в токены по скорости декодирования.
+    Результат всегда ограничен MAX_NEW_TOKENS_CAP.
+
+    Args:
+        task: Задача (caption, vqa, ocr)
+        requested: max_new_tokens из запроса
+        latency_budget_ms: Бюджет задержки из запроса
+        question: Вопрос (для vqa/caption)
+        image: Изображение (для ocr)
+        model: Псевдоним модели из запроса (для скорости декодирования)
+
+    Returns:
+        int: Бюджет токенов
+    """
+    if requested is not None:
+        budget = requested
+    elif not settings.ADAPTIVE_TOKEN_BUDGET:
+        budget = default_token_budget(task)
+    elif task == "ocr" and image is not None:
+        budget = estimate_ocr_tokens(image)
+    elif task in ("vqa", "caption"):
+        budget = estimate_vqa_tokens(question)
+    else:
+        budget = default_token_budget(task)
+
+    if latency_budget_ms is not None:
+        budget = min(budget, max(1, int(latency_budget_ms / 1000 * decode_rate(model, task))))
+
+    return max(1, min(budget, settings.MAX_NEW_TOKENS_CAP))
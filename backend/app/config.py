@@ -15,11 +15,83 @@ class Settings(BaseSettings):
     MODEL_SIZE: Literal["instruct", "base"] = "instruct"
     DEVICE: Literal["cuda", "cpu"] = "cpu"
     TORCH_DTYPE: Literal["float16", "bfloat16", "float32"] = "float32"
+    ATTN_IMPLEMENTATION: Literal["auto", "eager", "sdpa", "flash_attention_2"] = "auto"
+    INFERENCE_BATCH_SIZE: int = 1
+    
+    INFERENCE_BACKEND: Literal["transformers", "fake"] = "transformers"
+    FAKE_PREFILL_MS: float = 150.0
+    FAKE_DECODE_MS_PER_TOKEN: float = 40.0
+    FAKE_OUTPUT_TOKENS: int = 48
+    FAKE_MODEL_SIZE_MB: int = 64
+    
+    MODEL_REGISTRY: dict[str, str] = {}
+    MODEL_ROUTES: dict[str, str] = {}
+    MODEL_IDLE_TIMEOUT: int = 900
+    MODEL_MEMORY_BUDGET_MB: int = 0
+    
+    VQA_MAX_NEW_TOKENS: int = 256
+    CAPTION_MAX_NEW_TOKENS: int = 384
+    OCR_MAX_NEW_TOKENS: int = 512
+    OCR_TILE_HEIGHT: int = 768
+    OCR_TILE_OVERLAP: int = 96
+    OCR_STREAM_MIN_CHARS: int = 64 * 1024
+    MAX_NEW_TOKENS_CAP: int = 1024
+    ADAPTIVE_TOKEN_BUDGET: bool = True
+    DECODE_TOKENS_PER_SECOND: float = 10.0
+    
+    DRAFT_MODEL: str = ""
+    SPECULATIVE_TASKS: list[str] = ["caption", "vqa", "ocr"]
+    SPECULATIVE_NUM_TOKENS: int = 5
+    SPECULATIVE_CONFIDENCE_THRESHOLD: float = 0.4
+    
+    AUTOTUNE: bool = False
+    AUTOTUNE_PROFILE_PATH: str = ""
+    AUTOTUNE_LATENCY_SLO_MS: int = 30000
+    AUTOTUNE_DTYPES: list[str] = ["float32", "bfloat16"]
+    AUTOTUNE_ATTN_IMPLEMENTATIONS: list[str] = ["eager", "sdpa"]
+    AUTOTUNE_THREADS: list[int] = []
+    AUTOTUNE_BATCH_SIZES: list[int] = [1, 2, 4]
+    AUTOTUNE_MAX_NEW_TOKENS: int = 32
+    AUTOTUNE_ITERATIONS: int = 2
     
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     WORKERS: int = 1
     
+    TORCH_NUM_THREADS: int = 0
+    TORCH_NUM_INTEROP_THREADS: int = 0
+    MODEL_REPLICAS: int = 1
+    REPLICA_THREADS: int = 0
+    REPLICA_BROADCAST_TIMEOUT: float = 60.0
+    
+    ADMISSION_MAX_IN_FLIGHT: int = 0
+    ADMISSION_QUEUE_LIMITS: dict[str, int] = {"interactive": 32, "bulk": 16, "background": 64}
+    ADMISSION_MAX_WAIT_S: float = 120.0
+    ADMISSION_PREFILL_S_PER_MEGAPIXEL: float = 2.0
+    TASK_PRIORITIES: dict[str, str] = {
+        "caption": "interactive", "vqa": "interactive", "ocr": "bulk", "precaption": "background"
+    }
+    ADMISSION_CLIENT_QUEUE_LIMIT: int = 8
+    CLIENT_ID_HEADER: str = "X-API-Key"
+    CLIENT_WEIGHTS: dict[str, float] = {}
+    RATE_LIMIT_PER_SECOND: float = 0.0
+    RATE_LIMIT_BURST: int = 20
+    
+    TRACING_ENABLED: bool = False
+    TRACE_SAMPLE_RATE: float = 0.1
+    TRACE_EXPORT_PATH: str = str(Path(__file__).parent.parent.parent / "traces" / "traces.jsonl")
+    
+    PROFILING_ENABLED: bool = False
+    ADMIN_TOKEN: str = ""
+    PROFILING_DIR: str = str(Path(__file__).parent.parent.parent / "profiles")
+    PROFILING_MAX_SECONDS: int = 300
+    PROFILING_MAX_REQUESTS: int = 20
+    
+    OCR_JOBS_DB: str = str(Path(__file__).parent.parent.parent / "jobs" / "ocr_jobs.sqlite3")
+    OCR_JOB_MAX_IMAGES: int = 200
+    OCR_JOB_MAX_PENDING_PAGES: int = 10000
+    OCR_JOB_TIMEOUT: int = 7 * 24 * 3600
+    
     HF_HOME: str = str(Path(__file__).parent.parent.parent / "models")
     TRANSFORMERS_CACHE: str = str(Path(__file__).parent.parent.parent / "models")
     HF_DATASETS_CACHE: str = str(Path(__file__).parent.parent.parent / "models")
@@ -27,6 +99,29 @@ class Settings(BaseSettings):
     MAX_IMAGE_SIZE: int = 10 * 1024 * 1024
     MAX_IMAGE_DIMENSION: int = 4096
     SESSION_TIMEOUT: int = 3600
+    EXPIRY_INTERVAL: float = 1.0
+    MAX_QUESTIONS_PER_REQUEST: int = 16
+    MAX_IMAGES_PER_REQUEST: int = 4
+    MAX_TOTAL_PIXELS: int = 4096 * 4096
+    
+    PRECAPTION_ON_UPLOAD: bool = False
+    CONVERSATION_ENABLED: bool = False
+    SESSION_MAX_TOKENS: int = 4096
+    SESSION_KV_CACHE_MB: int = 512
+    SESSION_KV_SPILL_DIR: str = ""
+    
+    NEAR_DUPLICATE_CACHE_ENABLED: bool = False
+    NEAR_DUPLICATE_CACHE_SIZE: int = 10000
+    NEAR_DUPLICATE_MAX_DISTANCE: int = 8
+    
+    VIDEO_MAX_SIZE: int = 100 * 1024 * 1024
+    VIDEO_MAX_FRAMES: int = 8
+    VIDEO_SAMPLING: str = "uniform"
+    VIDEO_SCENE_FPS: float = 2.0
+    VIDEO_SCENE_THRESHOLD: float = 0.12
+    VIDEO_DEDUP_DISTANCE: int = 16
+    VIDEO_FRAME_SIDE: int = 384
+    VIDEO_TMP_DIR: str = ""
     
     OCR_LANGUAGES: list[str] = ["en", "ru"]
     OCR_DEFAULT_LANGUAGE: str = "en"
@@ -0,0 +1,87 @@
+"""
+Истечение записей по дедлайнам на монотонных часах.
+
+Вместо периодического перебора всех сессий и результатов OCR дедлайны
+хранятся в min-куче: извлечение истекших - O(log n) на запись, а проверка
+без истекших - O(1). Продление (обращение к сессии) только обновляет
+дедлайн в словаре; запись кучи при извлечении перекладывается на новый
+дедлайн, поэтому на ключ приходится одна действующая запись кучи, а не по
+одной на каждое обращение. Действующей считается запись с дедлайном из
+_queued; остальные (после сокращения дедлайна) отбрасываются при извлечении.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class ExpiryQueue:
+    """
+    Дедлайны ключей.
+
+    Args:
+        clock: Источник монотонного времени в секундах
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._deadlines: Dict[Hashable, float] = {}
+        # Дедлайн действующей записи кучи ключа (остается и после cancel, пока запись в куче)
+        self._queued: Dict[Hashable, float] = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: Hashable, ttl: float) -> float:
+        """
+        Назначает ключу дедлайн через ttl секунд (заменяет прежний).
+
+        Returns:
+            float: Дедлайн по часам clock
+        """
+        deadline = self.clock() + ttl
+        with self._lock:
+            self._deadlines[key] = deadline
+            queued = self._queued.get(key)
+            # Продление не трогает кучу: запись с прежним дедлайном переложится при извлечении
+            if queued is None or deadline < queued:
+                self._queued[key] = deadline
+                heapq.heappush(self._heap, (deadline, next(self._counter), key))
+        return deadline
+
+    def cancel(self, key: Hashable) -> None:
+        """Снимает дедлайн ключа; его запись кучи отбросится при извлечении или переиспользуется schedule."""
+        with self._lock:
+            self._deadlines.pop(key, None)
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def pop_expired(self) -> List[Hashable]:
+        """Снимает и возвращает ключи, дедлайн которых наступил."""
+        now = self.clock()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                queued, _, key = heapq.heappop(self._heap)
+                if self._queued.get(key) != queued:
+                    # Запись заменена более ранней
+                    continue
+                del self._queued[key]
+                deadline = self._deadlines.get(key)
+                if deadline is None:
+                    continue
+                if deadline > now:
+                    self._queued[key] = deadline
+                    heapq.heappush(self._heap, (deadline, next(self._counter), key))
+                    continue
+                del self._deadlines[key]
+                expired.append(key)
+        return expired
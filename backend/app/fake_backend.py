@@ -0,0 +1,146 @@
+"""
+Детерминированный fake-бэкенд для нагрузочного тестирования без весов модели.
+Имитирует задержку prefill и decode, длину ответа и занимаемую память,
+не требует torch и загрузки модели.
+"""
+import hashlib
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.backend import InferenceBackend
+from app.config import settings
+from app.kv_cache import reusable_prefix
+
+
+# Сторона изображения после ресайза процессором SmolVLM2
+IMAGE_SIDE = 384
+
+# Токенов изображения в промпте диалога и байт KV-кэша на токен
+IMAGE_TOKENS = 64
+KV_BYTES_PER_TOKEN = 4096
+
+WORDS = (
+    "the", "a", "image", "shows", "text", "on", "of", "with", "and", "in",
+    "white", "red", "background", "document", "page", "line", "table", "photo",
+)
+
+
+def output_seed(image, text_content: str) -> int:
+    """Детерминированное зерно ответа по изображению и запросу."""
+    key = f"{text_content}|{image.size}|{image.mode}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+
+def output_tokens(seed: int, max_new_tokens: int) -> int:
+    """Длина ответа: от 0.5 до 1.5 FAKE_OUTPUT_TOKENS, не больше лимита."""
+    fraction = seed / 2 ** 64
+    tokens = int(settings.FAKE_OUTPUT_TOKENS * (0.5 + fraction))
+    return max(1, min(max_new_tokens, tokens))
+
+
+def output_text(seed: int, tokens: int) -> str:
+    """Текст из tokens слов, по 8 слов в строке."""
+    rng = random.Random(seed)
+    words = [rng.choice(WORDS) for _ in range(tokens)]
+    return "\n".join(" ".join(words[i:i + 8]) for i in range(0, len(words), 8))
+
+
+class FakeBackend(InferenceBackend):
+    """
+    Задержки задаются настройками FAKE_*: prefill пропорционален числу кодируемых
+    изображений в батче, decode - числу шагов (самому длинному ответу в батче).
+    """
+
+    name = "fake"
+
+    def load(self, model_name: str, torch_dtype: Optional[str] = None,
+             attn_implementation: Optional[str] = None) -> Dict[str, Any]:
+        size_bytes = settings.FAKE_MODEL_SIZE_MB * 1024 * 1024
+        weights = bytearray(size_bytes)
+        # Касаемся каждой страницы, чтобы память реально занималась процессом
+        weights[::4096] = b"\x01" * len(range(0, size_bytes, 4096))
+        print(f"Fake-модель {model_name} загружена ({settings.FAKE_MODEL_SIZE_MB}MB)")
+        return {"model": weights, "processor": None, "size_bytes": size_bytes}
+
+    def prepare(self, entry: Dict[str, Any], images: List[Any], text_contents: List[str]) -> List[tuple]:
+        # Ресайз имитирует работу процессора изображений
+        for image in images:
+            image.convert("RGB").resize((IMAGE_SIDE, IMAGE_SIDE))
+        return [(output_seed(image, text), text, True) for image, text in zip(images, text_contents)]
+
+    def prepare_shared(self, entry: Dict[str, Any], image: Any, text_contents: List[str]) -> List[tuple]:
+        # Изображение кодируется один раз: prefill оплачивает только первая строка
+        image.convert("RGB").resize((IMAGE_SIDE, IMAGE_SIDE))
+        return [(output_seed(image, text), text, i == 0) for i, text in enumerate(text_contents)]
+
+    def prepare_images(self, entry: Dict[str, Any], images: List[Any], text_content: str,
+                       split_images: bool = True) -> List[tuple]:
+        for image in images:
+            image.convert("RGB").resize((IMAGE_SIDE, IMAGE_SIDE))
+        return [(output_seed(images[0], f"{text_content}|{len(images)}"), text_content, len(images))]
+
+    def generate(self, entry: Dict[str, Any], inputs: List[tuple], max_new_tokens: int,
+                 draft: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        row_tokens = [output_tokens(seed, max_new_tokens) for seed, _, _ in inputs]
+        encoded = sum(encode for _, _, encode in inputs)
+
+        started = time.perf_counter()
+        time.sleep(settings.FAKE_PREFILL_MS * encoded / 1000)
+        first_token_at = time.perf_counter()
+        time.sleep(max(row_tokens) * settings.FAKE_DECODE_MS_PER_TOKEN / 1000)
+        finished = time.perf_counter()
+
+        return {
+            "outputs": [(seed, tokens) for (seed, _, _), tokens in zip(inputs, row_tokens)],
+            "row_tokens": row_tokens,
+            "started": started,
+            "first_token_at": first_token_at,
+            "finished": finished,
+            "row_finished": [
+                first_token_at + tokens * settings.FAKE_DECODE_MS_PER_TOKEN / 1000 for tokens in row_tokens
+            ],
+            "speculative": None,
+        }
+
+    def prepare_chat(self, entry: Dict[str, Any], image: Any, history: List[Tuple[str, str]],
+                     text_content: str) -> Dict[str, Any]:
+        image.convert("RGB").resize((IMAGE_SIDE, IMAGE_SIDE))
+        ids = ["<image>"] * IMAGE_TOKENS
+        for question, answer in history:
+            ids += ["<user>", *question.split(), "<assistant>", *answer.split(), "<end>"]
+        ids += ["<user>", *text_content.split(), "<assistant>"]
+        return {"ids": ids, "seed": output_seed(image, " ".join(ids))}
+
+    def prompt_tokens(self, inputs: Dict[str, Any]) -> int:
+        return len(inputs["ids"])
+
+    def generate_chat(self, entry: Dict[str, Any], inputs: Dict[str, Any], max_new_tokens: int,
+                      cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # Prefill пропорционален пересчитываемым токенам: весь промпт стоит как изображение и его текст
+        ids, seed = inputs["ids"], inputs["seed"]
+        reused = reusable_prefix(cached["ids"], ids, "<image>") if cached is not None else 0
+        tokens = output_tokens(seed, max_new_tokens)
+
+        started = time.perf_counter()
+        time.sleep(settings.FAKE_PREFILL_MS * (len(ids) - reused) / IMAGE_TOKENS / 1000)
+        first_token_at = time.perf_counter()
+        time.sleep(tokens * settings.FAKE_DECODE_MS_PER_TOKEN / 1000)
+        finished = time.perf_counter()
+
+        # Кэш покрывает промпт и все новые токены, кроме последнего
+        cache_ids = ids + output_text(seed, tokens).split()[:-1]
+        return {
+            "outputs": [(seed, tokens)],
+            "row_tokens": [tokens],
+            "started": started,
+            "first_token_at": first_token_at,
+            "finished": finished,
+            "row_finished": [finished],
+            "speculative": None,
+            "cache": {"ids": cache_ids, "kv": None, "bytes": len(cache_ids) * KV_BYTES_PER_TOKEN},
+            "reused_tokens": reused,
+        }
+
+    def decode(self, entry: Dict[str, Any], result: Dict[str, Any]) -> List[str]:
+        return [output_text(seed, tokens) for seed, tokens in result["outputs"]]
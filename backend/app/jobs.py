@@ -0,0 +1,346 @@
+"""
+Асинхронные задания OCR для многостраничных документов.
+
+Задания и изображения хранятся в локальной базе SQLite, поэтому очередь
+переживает перезапуск сервера. Фоновый обработчик забирает страницы
+батчами по INFERENCE_BATCH_SIZE и отправляет их в модель через контроль
+допуска с классом bulk.
+"""
+import asyncio
+import io
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.admission import AdmissionRejected, estimate_cost, task_priority
+from app.budget import resolve_token_budget
+from app.metrics import OCR_JOB_PAGES, OCR_JOB_PENDING_PAGES
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    client TEXT NOT NULL,
+    language TEXT NOT NULL,
+    model TEXT,
+    max_new_tokens INTEGER,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    image BLOB,
+    text TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS pages_status ON pages (status, job_id, idx);
+"""
+
+
+class JobStore:
+    """
+    Хранилище заданий OCR в SQLite.
+
+    Страница проходит состояния pending -> running -> done/error.
+    Изображение удаляется из базы сразу после обработки страницы.
+
+    Args:
+        path: Путь к файлу базы (":memory:" - в памяти)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def recover(self) -> int:
+        """Возвращает в очередь страницы, обработка которых прервалась перезапуском."""
+        with self._lock:
+            return self._conn.execute("UPDATE pages SET status = 'pending' WHERE status = 'running'").rowcount
+
+    def create_job(self, images: List[bytes], client: str, language: str,
+                   model: Optional[str] = None, max_new_tokens: Optional[int] = None) -> str:
+        """
+        Создает задание из байтов изображений.
+
+        Returns:
+            str: job_id
+        """
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO jobs (id, client, language, model, max_new_tokens, total, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, client, language, model, max_new_tokens, len(images), time.time())
+            )
+            self._conn.executemany(
+                "INSERT INTO pages (job_id, idx, status, image) VALUES (?, ?, 'pending', ?)",
+                [(job_id, idx, image) for idx, image in enumerate(images)]
+            )
+            self._conn.execute("COMMIT")
+        return job_id
+
+    def pending_pages(self) -> int:
+        """Число страниц, ожидающих обработки, во всех заданиях."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages WHERE status = 'pending'").fetchone()[0]
+
+    def claim(self, limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Забирает до limit ожидающих страниц самого старого задания.
+
+        Returns:
+            Optional[Dict]: {job: параметры задания, pages: [(idx, байты изображения)]} или None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT jobs.id, jobs.client, jobs.model, jobs.max_new_tokens FROM pages "
+                "JOIN jobs ON jobs.id = pages.job_id WHERE pages.status = 'pending' "
+                "ORDER BY jobs.created_at, pages.idx LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            job = dict(zip(("id", "client", "model", "max_new_tokens"), row))
+            pages = self._conn.execute(
+                "SELECT idx, image FROM pages WHERE job_id = ? AND status = 'pending' ORDER BY idx LIMIT ?",
+                (job["id"], limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE pages SET status = 'running' WHERE job_id = ? AND idx = ?",
+                [(job["id"], idx) for idx, _ in pages]
+            )
+        return {"job": job, "pages": pages}
+
+    def release(self, job_id: str, indexes: List[int]) -> None:
+        """Возвращает страницы в очередь (например, при отказе в допуске)."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE pages SET status = 'pending' WHERE job_id = ? AND idx = ?",
+                [(job_id, idx) for idx in indexes]
+            )
+
+    def complete(self, job_id: str, results: Dict[int, str], errors: Optional[Dict[int, str]] = None) -> None:
+        """Сохраняет тексты и ошибки страниц и отмечает завершение задания."""
+        errors = errors or {}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE pages SET status = 'done', text = ?, image = NULL WHERE job_id = ? AND idx = ?",
+                [(text, job_id, idx) for idx, text in results.items()]
+            )
+            self._conn.executemany(
+                "UPDATE pages SET status = 'error', error = ?, image = NULL WHERE job_id = ? AND idx = ?",
+                [(error, job_id, idx) for idx, error in errors.items()]
+            )
+            self._conn.execute(
+                "UPDATE jobs SET finished_at = ? WHERE id = ? AND NOT EXISTS "
+                "(SELECT 1 FROM pages WHERE job_id = ? AND status IN ('pending', 'running'))",
+                (time.time(), job_id, job_id)
+            )
+            self._conn.execute("COMMIT")
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Состояние задания.
+
+        Returns:
+            Optional[Dict]: {job_id, status, total, completed, failed, progress, created_at, finished_at}
+        """
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT total, created_at, finished_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM pages WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        total, created_at, finished_at = job
+        completed, failed = counts.get("done", 0), counts.get("error", 0)
+        if finished_at is not None:
+            status = "done"
+        elif counts.get("running") or completed or failed:
+            status = "running"
+        else:
+            status = "queued"
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "completed": completed,
+            "failed": failed,
+            "progress": round((completed + failed) / total, 4),
+            "created_at": created_at,
+            "finished_at": finished_at,
+        }
+
+    def results(self, job_id: str) -> Iterator[Dict[str, Any]]:
+        """Результаты страниц задания по порядку: {index, status, text, error}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, status, text, error FROM pages WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+        for idx, status, text, error in rows:
+            yield {"index": idx, "status": status, "text": text, "error": error}
+
+    def cleanup_expired(self, timeout_seconds: int) -> int:
+        """Удаляет завершенные задания старше timeout_seconds. Возвращает число удаленных."""
+        threshold = time.time() - timeout_seconds
+        with self._lock:
+            self._conn.execute("BEGIN")
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (threshold,)
+            ).fetchall()]
+            self._conn.executemany("DELETE FROM pages WHERE job_id = ?", [(job_id,) for job_id in expired])
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+            self._conn.execute("COMMIT")
+        return len(expired)
+
+
+_store: Optional[JobStore] = None
+
+
+def get_store() -> JobStore:
+    """
+    Хранилище заданий для OCR_JOBS_DB. При открытии базы страницы,
+    обработка которых прервалась перезапуском, возвращаются в очередь.
+    """
+    global _store
+    if _store is None or _store.path != settings.OCR_JOBS_DB:
+        _store = JobStore(settings.OCR_JOBS_DB)
+        recovered = _store.recover()
+        if recovered:
+            print(f"Возвращено в очередь страниц OCR: {recovered}")
+    return _store
+
+
+def results_jsonl(results: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Результаты задания в формате JSONL, по строке на страницу."""
+    for result in results:
+        yield (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def results_zip(results: Iterator[Dict[str, Any]]) -> bytes:
+    """ZIP архив с файлом page-NNNN.txt на каждую распознанную страницу и errors.txt."""
+    buffer = io.BytesIO()
+    errors = []
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            if result["status"] == "done":
+                archive.writestr(f"page-{result['index'] + 1:04d}.txt", result["text"])
+            elif result["status"] == "error":
+                errors.append(f"page-{result['index'] + 1:04d}: {result['error']}")
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors) + "\n")
+    return buffer.getvalue()
+
+
+def decode_pages(pages: List[Tuple[int, bytes]],
+                 requested_tokens: Optional[int]) -> Tuple[Dict[int, Image.Image], Dict[int, str], int]:
+    """
+    Открывает изображения страниц и выбирает бюджет токенов батча.
+
+    Returns:
+        Tuple: (изображения по индексу, ошибки по индексу, max_new_tokens)
+    """
+    images, errors = {}, {}
+    for idx, image_bytes in pages:
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+            images[idx] = image
+        except Exception as e:
+            errors[idx] = f"Не удалось открыть изображение: {e}"
+    max_new_tokens = max(
+        (resolve_token_budget("ocr", requested_tokens, image=image) for image in images.values()), default=0
+    )
+    return images, errors, max_new_tokens
+
+
+async def process_next(store: JobStore, manager: Any, admission: Any,
+                       run_inference: Callable, batch_size: int) -> bool:
+    """
+    Обрабатывает один батч страниц.
+
+    Запросы к SQLite, декодирование страниц и оценка бюджета выполняются
+    в пуле потоков: блокировка хранилища общая с запросами API, и ожидание
+    ее в цикле событий остановило бы все запросы.
+
+    Returns:
+        bool: False, если очередь пуста
+    """
+    claimed = await run_in_threadpool(store.claim, batch_size)
+    if claimed is None:
+        return False
+    job, pages = claimed["job"], claimed["pages"]
+
+    images, errors, max_new_tokens = await run_in_threadpool(decode_pages, pages, job["max_new_tokens"])
+    if not images:
+        await run_in_threadpool(store.complete, job["id"], {}, errors)
+        OCR_JOB_PAGES.labels("error").inc(len(errors))
+        return True
+
+    cost = sum(estimate_cost(*image.size, max_new_tokens) for image in images.values())
+    try:
+        async with admission.admit(task_priority("ocr"), cost, job["client"]):
+            texts = await run_inference(
+                manager.ocr_batch_inference, list(images.values()), max_new_tokens, job["model"]
+            )
+    except AdmissionRejected as e:
+        # Очередь занята интерактивными запросами - страницы вернутся в очередь
+        await run_in_threadpool(store.release, job["id"], list(images))
+        if errors:
+            await run_in_threadpool(store.complete, job["id"], {}, errors)
+            OCR_JOB_PAGES.labels("error").inc(len(errors))
+        await asyncio.sleep(e.retry_after)
+        return True
+    except Exception as e:
+        errors.update({idx: f"Ошибка при распознавании текста: {e}" for idx in images})
+        await run_in_threadpool(store.complete, job["id"], {}, errors)
+        OCR_JOB_PAGES.labels("error").inc(len(errors))
+        return True
+
+    await run_in_threadpool(store.complete, job["id"], dict(zip(images, texts)), errors)
+    OCR_JOB_PAGES.labels("done").inc(len(images))
+    if errors:
+        OCR_JOB_PAGES.labels("error").inc(len(errors))
+    return True
+
+
+async def run_worker(manager: Any, admission: Any, run_inference: Callable,
+                     batch_size: Callable[[], int], idle_interval: float = 1.0) -> None:
+    """Фоновый цикл обработки заданий; ждет загрузки модели и опрашивает очередь."""
+    while True:
+        try:
+            store = await run_in_threadpool(get_store)
+            OCR_JOB_PENDING_PAGES.set(await run_in_threadpool(store.pending_pages))
+            if not manager.is_loaded() or not await process_next(
+                store, manager, admission, run_inference, batch_size()
+            ):
+                await asyncio.sleep(idle_interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ошибка обработчика заданий OCR: {e}")
+            await asyncio.sleep(idle_interval)
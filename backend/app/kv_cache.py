@@ -0,0 +1,143 @@
+"""
+Хранилище KV-кэша диалогов по сессиям.
+
+Кэш последнего хода сессии позволяет на следующем ходе выполнять prefill
+только для новой реплики пользователя. Хранилище ограничено по памяти:
+при превышении SESSION_KV_CACHE_MB давно не использованные кэши выгружаются
+на диск (SESSION_KV_SPILL_DIR) или удаляются - тогда следующий ход
+пересчитывает диалог целиком.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.metrics import SESSION_KV_CACHE_BYTES, SESSION_KV_EVICTIONS
+
+
+def reusable_prefix(cached_ids: List[Any], ids: List[Any], image_token: Any) -> int:
+    """
+    Число токенов промпта, которые можно взять из кэша: общий префикс
+    с токенами кэша, покрывающий все токены изображения (признаки изображения
+    подставляются только при prefill), и хотя бы один токен для prefill.
+    """
+    limit = min(len(cached_ids), len(ids) - 1)
+    common = 0
+    while common < limit and cached_ids[common] == ids[common]:
+        common += 1
+    last_image = max((i for i, token in enumerate(ids) if token == image_token), default=-1)
+    return common if common > last_image else 0
+
+
+class KVCacheStore:
+    """
+    LRU кэшей по session_id.
+
+    Запись: {"model": псевдоним, "ids": токены, покрытые кэшем, "kv": кэш бэкенда, "bytes": размер}.
+    take() извлекает запись на время генерации: параллельный ход той же
+    сессии не получит кэш и пересчитает prefill.
+
+    Args:
+        budget_bytes: Максимальный суммарный размер кэшей в памяти
+        spill_dir: Каталог для выгрузки вытесненных кэшей ("" - удалять)
+    """
+
+    def __init__(self, budget_bytes: int, spill_dir: str = ""):
+        self.budget_bytes = budget_bytes
+        self.spill_dir = spill_dir
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._spilled: Dict[str, float] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._spilled)
+
+    def _spill_path(self, session_id: str) -> Path:
+        return Path(self.spill_dir) / f"{session_id}.kv"
+
+    def take(self, session_id: str, model: str) -> Optional[Dict[str, Any]]:
+        """Извлекает кэш сессии (из памяти или с диска); кэш другой модели удаляется."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry["bytes"]
+                SESSION_KV_CACHE_BYTES.set(self._bytes)
+            spilled = self._spilled.pop(session_id, None) is not None
+        if entry is None and spilled:
+            path = self._spill_path(session_id)
+            try:
+                with open(path, "rb") as f:
+                    entry = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                print(f"Не удалось прочитать KV-кэш сессии {session_id}: {e}")
+            finally:
+                path.unlink(missing_ok=True)
+        if entry is None or entry["model"] != model:
+            return None
+        entry["used_at"] = time.monotonic()
+        return entry
+
+    def put(self, session_id: str, entry: Dict[str, Any]) -> None:
+        """Сохраняет кэш сессии и вытесняет давно не использованные при превышении бюджета."""
+        if entry["bytes"] > self.budget_bytes:
+            return
+        entry["used_at"] = time.monotonic()
+        evicted = []
+        with self._lock:
+            self._entries[session_id] = entry
+            self._bytes += entry["bytes"]
+            while self._bytes > self.budget_bytes:
+                old_id, old = self._entries.popitem(last=False)
+                self._bytes -= old["bytes"]
+                evicted.append((old_id, old))
+            SESSION_KV_CACHE_BYTES.set(self._bytes)
+        for old_id, old in evicted:
+            self._evict(old_id, old)
+
+    def _evict(self, session_id: str, entry: Dict[str, Any]) -> None:
+        if self.spill_dir:
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                with open(self._spill_path(session_id), "wb") as f:
+                    pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                with self._lock:
+                    self._spilled[session_id] = entry["used_at"]
+                SESSION_KV_EVICTIONS.labels("disk").inc()
+                return
+            except OSError as e:
+                print(f"Не удалось выгрузить KV-кэш сессии {session_id}: {e}")
+        SESSION_KV_EVICTIONS.labels("drop").inc()
+
+    def expire(self, idle_seconds: float) -> int:
+        """Удаляет кэши, не использованные idle_seconds. Возвращает число удаленных."""
+        threshold = time.monotonic() - idle_seconds
+        with self._lock:
+            expired = [sid for sid, entry in self._entries.items() if entry["used_at"] < threshold]
+            for sid in expired:
+                self._bytes -= self._entries.pop(sid)["bytes"]
+            spilled = [sid for sid, used_at in self._spilled.items() if used_at < threshold]
+            for sid in spilled:
+                del self._spilled[sid]
+            SESSION_KV_CACHE_BYTES.set(self._bytes)
+        for sid in spilled:
+            self._spill_path(sid).unlink(missing_ok=True)
+        return len(expired) + len(spilled)
+
+
+_store: Optional[KVCacheStore] = None
+
+
+def get_kv_store() -> KVCacheStore:
+    """Хранилище KV-кэша диалогов процесса по настройкам SESSION_KV_*."""
+    global _store
+    if _store is None:
+        _store = KVCacheStore(settings.SESSION_KV_CACHE_MB * 1024 * 1024, settings.SESSION_KV_SPILL_DIR)
+    return _store
@@ -2,32 +2,67 @@
 FastAPI приложение для SmolVLM2 Web Demo.
 Предоставляет API endpoints для VQA и OCR.
 """
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import HTMLResponse, FileResponse, Response
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Header, Query, Request
+from fastapi.responses import HTMLResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+import gzip
+import math
 import os
+import secrets
+import time
 from datetime import datetime
+from typing import List, Optional
 import asyncio
 
 from app.config import settings
 from app.schemas import (
-    VQARequest, VQAResponse, OCRRequest, OCRResponse,
-    ErrorResponse, HealthResponse
+    VQARequest, VQAResponse, VQABatchRequest, VQABatchResponse, SessionRequest, SessionResponse,
+    VideoFrame, VideoResponse,
+    OCRRequest, OCRResponse, OCRJobRequest, OCRJobResponse,
+    ErrorResponse, HealthResponse, TorchProfileRequest, StackProfileRequest
+)
+from app.validators import (
+    validate_base64_image, validate_language, validate_model, validate_questions, validate_video_sampling,
+    validate_image_count, validate_total_pixels, ValidationError
 )
-from app.validators import validate_base64_image, validate_language, ValidationError
 from app.utils import (
-    generate_session_id, save_session_image, get_session_image,
-    save_ocr_result, get_ocr_result, cleanup_expired_sessions,
-    cleanup_expired_ocr_results
+    generate_session_id, save_session_image, get_session_image, get_session_history, save_session_turn,
+    save_ocr_result, get_ocr_result_gzip, ocr_results_bytes, gunzip_range, parse_byte_range,
+    expire_due, sessions, ocr_results
+)
+from app.model_manager import ModelManager, DEFAULT_VQA_PROMPT
+from app.replicas import ReplicaPool
+from app.autotune import ensure_profile
+from app.routing import model_registry, vqa_task
+from app.budget import resolve_token_budget
+from app.tiling import split_strips, merge_tile_texts
+from app.metrics import (
+    model_latency_summary, speculative_summary, render as render_metrics, CONTENT_TYPE_LATEST,
+    INFERENCE_QUEUE_DEPTH, SESSIONS_STORED, OCR_RESULTS_STORED, OCR_RESULTS_BYTES, time_stage
+)
+from app.middleware import MetricsMiddleware, TracingMiddleware
+from app.tracing import record_span
+from app.admission import (
+    AdmissionRejected, create_controller, create_rate_limiter, client_identity, estimate_cost, task_priority
+)
+from app.precaption import start_precaption, take_precaption
+from app.phash import near_duplicate_fingerprint, get_near_duplicate_index
+from app.video import spool_upload, sample_frames
+from app.jobs import get_store as get_job_store, run_worker as run_job_worker, results_jsonl, results_zip
+from app.profiling import (
+    start_torch_capture, start_stack_sampling, profiling_status, artifact_path
 )
-from app.model_manager import ModelManager
+from app.responses import ORJSONResponse, ORJSONRoute, stream_json
+from app.static_cache import StaticCache, accepted_encodings
 
 app = FastAPI(
     title="SmolVLM2 Web Demo API",
     description="API для демонстрации возможностей мультимодальной модели SmolVLM2",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
+app.router.route_class = ORJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,15 +70,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 static_dir = "/app/frontend"
 if not os.path.exists(static_dir):
     static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
-if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir, html=False), name="static")
+static_cache = StaticCache(static_dir)
 
-model_manager = ModelManager()
+if settings.MODEL_REPLICAS > 1:
+    model_manager = ReplicaPool(settings.MODEL_REPLICAS, settings.REPLICA_THREADS)
+else:
+    model_manager = ModelManager()
+
+admission = create_controller()
+rate_limiter = create_rate_limiter()
 
 
 @app.on_event("startup")
@@ -51,86 +94,459 @@ async def startup_event():
     """Инициализация при запуске приложения."""
     asyncio.create_task(load_model_async())
     asyncio.create_task(periodic_cleanup())
+    asyncio.create_task(expire_entries())
+    asyncio.create_task(run_job_worker(model_manager, admission, run_inference, job_batch_size))
 
 
 async def load_model_async():
     """Асинхронная загрузка модели."""
     try:
-        model_manager.load_model()
+        if settings.AUTOTUNE and isinstance(model_manager, ModelManager):
+            await run_in_threadpool(ensure_profile, model_manager)
+        else:
+            await run_in_threadpool(model_manager.load_model)
         print("Модель успешно загружена")
     except Exception as e:
         print(f"Ошибка при загрузке модели: {e}")
 
 
+async def expire_entries():
+    """Удаляет сессии и OCR результаты вскоре после их дедлайна (не позже EXPIRY_INTERVAL)."""
+    while True:
+        await asyncio.sleep(settings.EXPIRY_INTERVAL)
+        try:
+            expire_due()
+        except Exception as e:
+            print(f"Ошибка при удалении истекших записей: {e}")
+
+
 async def periodic_cleanup():
-    """Периодическая очистка истекших сессий и OCR результатов."""
+    """Периодическая очистка заданий OCR, простаивающих моделей и KV-кэшей."""
     while True:
         await asyncio.sleep(300)
         try:
-            cleanup_expired_sessions(settings.SESSION_TIMEOUT)
-            cleanup_expired_ocr_results(settings.SESSION_TIMEOUT)
+            await run_in_threadpool(get_job_store().cleanup_expired, settings.OCR_JOB_TIMEOUT)
+            if model_manager.is_loaded():
+                await run_in_threadpool(model_manager.unload_idle_models, settings.MODEL_IDLE_TIMEOUT)
+                if settings.CONVERSATION_ENABLED:
+                    await run_in_threadpool(model_manager.expire_session_caches, settings.SESSION_TIMEOUT)
         except Exception as e:
             print(f"Ошибка при очистке: {e}")
 
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """Отдает frontend HTML страницу."""
-    frontend_path = os.path.join(static_dir, "index.html")
-    if os.path.exists(frontend_path):
-        with open(frontend_path, "r", encoding="utf-8") as f:
-            return f.read()
-    return "<h1>Multimodal Demo</h1><p>Frontend не найден</p>"
+def session_fingerprint(session_id: str, image) -> Optional[dict]:
+    """Отпечаток изображения сессии для поиска почти дубликатов; вычисляется один раз на сессию."""
+    session = sessions.get(session_id)
+    if session is not None and "fingerprint" in session:
+        return session["fingerprint"]
+    fingerprint = near_duplicate_fingerprint(image)
+    if session is not None:
+        session["fingerprint"] = fingerprint
+    return fingerprint
+
+
+def request_images(request: VQARequest, image) -> List:
+    """
+    Изображения промпта запроса VQA: изображение сессии, затем images и изображения сессий image_ids.
+    Число изображений проверяется до декодирования, суммарное число пикселей - после.
+    """
+    extra, image_ids = request.images or [], request.image_ids or []
+    if not extra and not image_ids:
+        return [image]
+    validate_image_count(1 + len(extra) + len(image_ids))
+    images = [image] + [validate_base64_image(item)[1] for item in extra]
+    for image_id in image_ids:
+        stored = get_session_image(image_id)
+        if not stored:
+            raise ValidationError(
+                error="IMAGE_NOT_FOUND",
+                message=f"Изображение сессии {image_id} не найдено",
+                code="SESSION_NOT_FOUND"
+            )
+        images.append(stored[1])
+    validate_total_pixels(images)
+    return images
+
+
+def job_batch_size() -> int:
+    """Размер батча для заданий OCR (профиль автотюнера или INFERENCE_BATCH_SIZE)."""
+    if isinstance(model_manager, ModelManager):
+        return model_manager.get_batch_size()
+    return settings.INFERENCE_BATCH_SIZE
+
+
+async def run_inference(func, *args):
+    """Выполняет инференс в пуле потоков с учетом глубины очереди."""
+    INFERENCE_QUEUE_DEPTH.inc()
+    started = time.perf_counter()
+    try:
+        return await run_in_threadpool(func, *args)
+    finally:
+        record_span("inference", started, time.perf_counter())
+        INFERENCE_QUEUE_DEPTH.dec()
+
+
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail=ErrorResponse(
+            error=e.error,
+            message=e.message,
+            code="ADMISSION_REJECTED"
+        ).model_dump(),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+@app.api_route("/", methods=["GET", "HEAD"], response_class=HTMLResponse)
+async def root(request: Request):
+    """Отдает frontend HTML страницу из кэша в памяти."""
+    response = static_cache.response("index.html", request.headers)
+    if response is None:
+        return HTMLResponse("<h1>Multimodal Demo</h1><p>Frontend не найден</p>")
+    return response
+
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_file(path: str, request: Request, v: Optional[str] = None):
+    """Отдает файл frontend из кэша в памяти (сжатый, с ETag и Cache-Control)."""
+    response = static_cache.response(path, request.headers, v)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
 
 
 @app.get("/api/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint."""
+    profile = model_manager.get_profile()
+    if profile is not None:
+        profile = {k: v for k, v in profile.items() if k != "results"}
+    
+    loaded = await run_in_threadpool(model_manager.loaded_models) if model_manager.is_loaded() else {}
+    latency = model_latency_summary()
+    speculative = speculative_summary()
+    models = {
+        alias: {
+            "name": name,
+            "loaded": alias in loaded,
+            **loaded.get(alias, {}),
+            "latency": latency.get(alias, {}),
+            "speculative": speculative.get(alias)
+        }
+        for alias, name in model_registry().items()
+    }
+    
     return HealthResponse(
         status="healthy" if model_manager.is_loaded() else "loading",
         model_loaded=model_manager.is_loaded(),
-        device=settings.DEVICE
+        device=settings.DEVICE,
+        profile=profile,
+        models=models,
+        precaption_on_upload=settings.PRECAPTION_ON_UPLOAD
     )
 
 
+@app.get("/metrics")
+async def metrics():
+    """Метрики в текстовом формате Prometheus."""
+    SESSIONS_STORED.set(len(sessions))
+    OCR_RESULTS_STORED.set(len(ocr_results))
+    compressed, original = ocr_results_bytes()
+    OCR_RESULTS_BYTES.labels("gzip").set(compressed)
+    OCR_RESULTS_BYTES.labels("identity").set(original)
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/api/vqa", response_model=VQAResponse)
-async def vqa(request: VQARequest):
+async def vqa(request: VQARequest, http_request: Request):
     """
     Visual Question Answering endpoint.
     Принимает изображение и вопрос, возвращает ответ модели.
     """
     try:
+        task = vqa_task([request.question])
+        priority = task_priority(task)
+        client = client_identity(http_request)
+        rate_limiter.acquire(client, priority)
+        admission.check(priority, client)
+        
         image_bytes, image = validate_base64_image(request.image)
+        model = validate_model(request.model)
         
         session_id = request.session_id
-        if session_id:
-            existing = get_session_image(session_id)
-            if existing:
-                image_bytes, image = existing
-            else:
-                save_session_image(session_id, image_bytes, image)
+        existing = get_session_image(session_id) if session_id else None
+        if existing:
+            image_bytes, image = existing
         else:
-            session_id = generate_session_id()
+            session_id = session_id or generate_session_id()
             save_session_image(session_id, image_bytes, image)
+            if task != "caption":
+                # Описание понадобится следующим запросом - готовим его в фоне
+                start_precaption(session_id, client, model_manager, admission, run_inference)
         
-        try:
-            answer = model_manager.vqa_inference(image, request.question)
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=ErrorResponse(
-                    error="INFERENCE_ERROR",
-                    message=f"Ошибка при обработке модели: {str(e)}",
-                    code="MODEL_ERROR"
-                ).dict()
-            )
+        images = request_images(request, image)
+        # Несколько изображений - отдельный промпт: без истории диалога, описания сессии и кэша
+        multi_image = len(images) > 1
+        conversation = settings.CONVERSATION_ENABLED and not multi_image
+        
+        max_new_tokens = resolve_token_budget(
+            task,
+            request.max_new_tokens,
+            request.latency_budget_ms,
+            question=request.question,
+            model=model
+        )
+        
+        answer = None
+        history = get_session_history(session_id) if conversation else []
+        # Ответ в диалоге зависит от истории, поэтому почти дубликаты ищутся только без нее
+        fingerprint = None if settings.CONVERSATION_ENABLED or multi_image else session_fingerprint(session_id, image)
+        cache_key = ("vqa", (request.question or "").strip(), model, max_new_tokens)
+        if fingerprint is not None:
+            answer = get_near_duplicate_index().get(fingerprint, cache_key, "vqa")
+        if answer is None and existing and task == "caption" and not history and not multi_image:
+            answer = await take_precaption(session_id, max_new_tokens, model)
+            if answer is not None and conversation:
+                save_session_turn(session_id, DEFAULT_VQA_PROMPT, answer)
+        if answer is None:
+            # Prefill растет с суммарным числом пикселей всех изображений промпта
+            pixels = sum(item.width * item.height for item in images)
+            async with admission.admit(priority, estimate_cost(pixels, 1, max_new_tokens), client):
+                try:
+                    if conversation:
+                        turn = await run_inference(
+                            model_manager.chat_inference, image, session_id, history, request.question,
+                            max_new_tokens, model
+                        )
+                        save_session_turn(session_id, turn["question"], turn["raw"])
+                        answer = turn["answer"]
+                    else:
+                        answer = await run_inference(
+                            model_manager.vqa_inference, images if multi_image else image, request.question,
+                            model, max_new_tokens
+                        )
+                except Exception as e:
+                    raise HTTPException(
+                        status_code=500,
+                        detail=ErrorResponse(
+                            error="INFERENCE_ERROR",
+                            message=f"Ошибка при обработке модели: {str(e)}",
+                            code="MODEL_ERROR"
+                        ).model_dump()
+                    )
+        if fingerprint is not None:
+            get_near_duplicate_index().put(fingerprint, cache_key, answer)
         
         return VQAResponse(
             answer=answer,
             session_id=session_id,
+            timestamp=datetime.now().isoformat(),
+            max_new_tokens=max_new_tokens
+        )
+    
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except HTTPException:
+        raise
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                error=e.error,
+                message=e.message,
+                code=e.code
+            ).model_dump()
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=ErrorResponse(
+                error="INTERNAL_ERROR",
+                message=f"Внутренняя ошибка сервера: {str(e)}",
+                code="SERVER_ERROR"
+            ).model_dump()
+        )
+
+
+@app.post("/api/sessions", response_model=SessionResponse)
+async def create_session(request: SessionRequest, http_request: Request):
+    """
+    Создает сессию с изображением до первого вопроса.
+    При PRECAPTION_ON_UPLOAD описание изображения готовится в фоне.
+    """
+    try:
+        client = client_identity(http_request)
+        rate_limiter.acquire(client, task_priority("precaption"))
+        image_bytes, image = validate_base64_image(request.image)
+        
+        session_id = generate_session_id()
+        save_session_image(session_id, image_bytes, image)
+        started = start_precaption(session_id, client, model_manager, admission, run_inference)
+        
+        return SessionResponse(session_id=session_id, precaption=started is not None)
+    
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                error=e.error,
+                message=e.message,
+                code=e.code
+            ).model_dump()
+        )
+
+
+@app.post("/api/vqa/batch", response_model=VQABatchResponse)
+async def vqa_batch(request: VQABatchRequest, http_request: Request):
+    """
+    Несколько вопросов к одному изображению.
+    Изображение кодируется один раз, ответы генерируются одним батчем.
+    """
+    try:
+        questions = validate_questions(request.questions)
+        task = vqa_task(questions)
+        priority = task_priority(task)
+        client = client_identity(http_request)
+        rate_limiter.acquire(client, priority)
+        admission.check(priority, client)
+        
+        model = validate_model(request.model)
+        
+        # Изображение из существующей сессии не декодируется и не валидируется повторно
+        session_id = request.session_id
+        existing = get_session_image(session_id) if session_id else None
+        if existing:
+            image_bytes, image = existing
+        else:
+            image_bytes, image = validate_base64_image(request.image or "")
+            session_id = session_id or generate_session_id()
+            save_session_image(session_id, image_bytes, image)
+        
+        # Батч декодируется до самого длинного ответа
+        max_new_tokens = max(
+            resolve_token_budget(
+                vqa_task([question]), request.max_new_tokens, request.latency_budget_ms,
+                question=question, model=model
+            )
+            for question in questions
+        )
+        
+        async with admission.admit(priority, estimate_cost(*image.size, max_new_tokens), client):
+            try:
+                results = await run_inference(
+                    model_manager.vqa_multi_inference, image, questions, max_new_tokens, model
+                )
+            except Exception as e:
+                raise HTTPException(
+                    status_code=500,
+                    detail=ErrorResponse(
+                        error="INFERENCE_ERROR",
+                        message=f"Ошибка при обработке модели: {str(e)}",
+                        code="MODEL_ERROR"
+                    ).model_dump()
+                )
+        
+        return VQABatchResponse(
+            answers=[dict(result, question=question) for question, result in zip(questions, results)],
+            session_id=session_id,
+            timestamp=datetime.now().isoformat(),
+            max_new_tokens=max_new_tokens
+        )
+    
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except HTTPException:
+        raise
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                error=e.error,
+                message=e.message,
+                code=e.code
+            ).model_dump()
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=ErrorResponse(
+                error="INTERNAL_ERROR",
+                message=f"Внутренняя ошибка сервера: {str(e)}",
+                code="SERVER_ERROR"
+            ).model_dump()
+        )
+
+
+@app.post("/api/video", response_model=VideoResponse)
+async def video(
+    http_request: Request,
+    question: Optional[str] = Query(None, description="Вопрос к видео (по умолчанию - описание)"),
+    strategy: Optional[str] = Query(None, description="Выборка кадров: uniform или scene"),
+    max_frames: Optional[int] = Query(None, description="Максимум кадров, передаваемых модели"),
+    model: Optional[str] = Query(None, description="Псевдоним модели из реестра"),
+    max_new_tokens: Optional[int] = Query(None, ge=1, description="Лимит генерируемых токенов"),
+    latency_budget_ms: Optional[int] = Query(None, ge=1, description="Бюджет задержки генерации в миллисекундах")
+):
+    """
+    Описание видео или ответ на вопрос по нему.
+    Клип передается телом запроса (Content-Type: video/*) и пишется на диск по частям,
+    модели передаются выбранные ключевые кадры.
+    """
+    try:
+        question = question.strip() if question and question.strip() else None
+        task = vqa_task([question])
+        priority = task_priority(task)
+        client = client_identity(http_request)
+        rate_limiter.acquire(client, priority)
+        admission.check(priority, client)
+        
+        strategy, max_frames = validate_video_sampling(strategy, max_frames)
+        model = validate_model(model)
+        
+        with time_stage("video_upload"):
+            path = await spool_upload(http_request.stream(), settings.VIDEO_MAX_SIZE)
+        try:
+            sampled = await run_in_threadpool(sample_frames, path, strategy, max_frames)
+        finally:
+            os.unlink(path)
+        frames = sampled["frames"]
+        
+        max_new_tokens = resolve_token_budget(
+            task, max_new_tokens, latency_budget_ms, question=question, model=model
+        )
+        width, height = frames[0]["image"].size
+        async with admission.admit(priority, estimate_cost(width, height * len(frames), max_new_tokens), client):
+            try:
+                answer = await run_inference(
+                    model_manager.video_inference, [frame["image"] for frame in frames], question,
+                    max_new_tokens, model
+                )
+            except Exception as e:
+                raise HTTPException(
+                    status_code=500,
+                    detail=ErrorResponse(
+                        error="INFERENCE_ERROR",
+                        message=f"Ошибка при обработке модели: {str(e)}",
+                        code="MODEL_ERROR"
+                    ).model_dump()
+                )
+        
+        return VideoResponse(
+            answer=answer,
+            frames=[VideoFrame(index=frame["index"], timestamp=frame["timestamp"]) for frame in frames],
+            candidates=sampled["candidates"],
+            duration=sampled["duration"],
+            max_new_tokens=max_new_tokens,
             timestamp=datetime.now().isoformat()
         )
     
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except HTTPException:
+        raise
     except ValidationError as e:
         raise HTTPException(
             status_code=400,
@@ -138,7 +554,7 @@ async def vqa(request: VQARequest):
                 error=e.error,
                 message=e.message,
                 code=e.code
-            ).dict()
+            ).model_dump()
         )
     except Exception as e:
         raise HTTPException(
@@ -147,41 +563,86 @@ async def vqa(request: VQARequest):
                 error="INTERNAL_ERROR",
                 message=f"Внутренняя ошибка сервера: {str(e)}",
                 code="SERVER_ERROR"
-            ).dict()
+            ).model_dump()
         )
 
 
 @app.post("/api/ocr", response_model=OCRResponse)
-async def ocr(request: OCRRequest):
+async def ocr(request: OCRRequest, http_request: Request):
     """
     OCR endpoint.
     Извлекает текст из изображения.
     """
     try:
+        priority = task_priority("ocr")
+        client = client_identity(http_request)
+        rate_limiter.acquire(client, priority)
+        admission.check(priority, client)
+        
         image_bytes, image = validate_base64_image(request.image)
         language = validate_language(request.language)
+        model = validate_model(request.model)
         
-        try:
-            text = model_manager.ocr_inference(image)
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=ErrorResponse(
-                    error="OCR_ERROR",
-                    message=f"Ошибка при распознавании текста: {str(e)}",
-                    code="OCR_ERROR"
-                ).dict()
+        tiles = [image]
+        if request.tiled:
+            tiles = split_strips(image, settings.OCR_TILE_HEIGHT, settings.OCR_TILE_OVERLAP)
+        # Бюджет задается на полосу: батч декодируется до самой длинной из них
+        max_new_tokens = max(
+            resolve_token_budget(
+                "ocr", request.max_new_tokens, request.latency_budget_ms, image=tile, model=model
             )
+            for tile in tiles
+        )
+        cost = estimate_cost(image.width, sum(tile.height for tile in tiles), max_new_tokens)
+        
+        fingerprint = near_duplicate_fingerprint(image)
+        cache_key = ("ocr", model, max_new_tokens, request.tiled)
+        text = get_near_duplicate_index().get(fingerprint, cache_key, "ocr") if fingerprint is not None else None
+        if text is None:
+            async with admission.admit(priority, cost, client):
+                try:
+                    if len(tiles) > 1:
+                        texts = await run_inference(model_manager.ocr_batch_inference, tiles, max_new_tokens, model)
+                        text = merge_tile_texts(texts)
+                    else:
+                        text = await run_inference(model_manager.ocr_inference, image, model, max_new_tokens)
+                except Exception as e:
+                    raise HTTPException(
+                        status_code=500,
+                        detail=ErrorResponse(
+                            error="OCR_ERROR",
+                            message=f"Ошибка при распознавании текста: {str(e)}",
+                            code="OCR_ERROR"
+                        ).model_dump()
+                    )
+            if fingerprint is not None:
+                get_near_duplicate_index().put(fingerprint, cache_key, text)
         
         task_id = save_ocr_result(text)
         download_url = f"/api/download/ocr/{task_id}"
         
+        if len(text) >= settings.OCR_STREAM_MIN_CHARS:
+            payload = {
+                "text": text,
+                "download_url": download_url,
+                "task_id": task_id,
+                "max_new_tokens": max_new_tokens,
+                "tiles": len(tiles),
+            }
+            return StreamingResponse(stream_json(payload, "text"), media_type="application/json")
+        
         return OCRResponse(
             text=text,
             download_url=download_url,
-            task_id=task_id
+            task_id=task_id,
+            max_new_tokens=max_new_tokens,
+            tiles=len(tiles)
         )
     
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except HTTPException:
+        raise
     except ValidationError as e:
         raise HTTPException(
             status_code=400,
@@ -189,7 +650,7 @@ async def ocr(request: OCRRequest):
                 error=e.error,
                 message=e.message,
                 code=e.code
-            ).dict()
+            ).model_dump()
         )
     except Exception as e:
         raise HTTPException(
@@ -198,39 +659,253 @@ async def ocr(request: OCRRequest):
                 error="INTERNAL_ERROR",
                 message=f"Внутренняя ошибка сервера: {str(e)}",
                 code="SERVER_ERROR"
-            ).dict()
+            ).model_dump()
         )
 
 
 @app.get("/api/download/ocr/{task_id}")
-async def download_ocr(task_id: str):
+async def download_ocr(task_id: str, request: Request):
     """
     Скачивание результата OCR в виде .txt файла.
+    Клиенту, принимающему gzip, отдается хранимый сжатый текст без повторного сжатия;
+    запрос с Range получает часть текста (206).
     """
-    text = get_ocr_result(task_id)
+    stored = get_ocr_result_gzip(task_id)
     
-    if text is None:
+    if stored is None:
         raise HTTPException(
             status_code=404,
             detail=ErrorResponse(
                 error="NOT_FOUND",
                 message="Результат OCR не найден или истек",
                 code="TASK_NOT_FOUND"
-            ).dict()
+            ).model_dump()
         )
     
-    from io import BytesIO
-    file_content = BytesIO(text.encode("utf-8"))
+    body, size = stored
+    media_type = "text/plain; charset=utf-8"
+    headers = {
+        "Content-Disposition": f'attachment; filename="ocr_result_{task_id}.txt"',
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
     
-    return Response(
-        content=file_content.getvalue(),
-        media_type="text/plain; charset=utf-8",
-        headers={
-            "Content-Disposition": f'attachment; filename="ocr_result_{task_id}.txt"'
-        }
+    range_header = request.headers.get("range")
+    if range_header:
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(
+                content=gunzip_range(body, start, end), status_code=206, media_type=media_type, headers=headers
+            )
+    
+    if "gzip" in accepted_encodings(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type=media_type, headers=headers)
+    return Response(content=gzip.decompress(body), media_type=media_type, headers=headers)
+
+
+def job_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=404,
+        detail=ErrorResponse(
+            error="NOT_FOUND",
+            message="Задание OCR не найдено или истекло",
+            code="JOB_NOT_FOUND"
+        ).model_dump()
+    )
+
+
+def job_response(status: dict) -> OCRJobResponse:
+    return OCRJobResponse(
+        **status,
+        status_url=f"/api/ocr/jobs/{status['job_id']}",
+        result_url=f"/api/ocr/jobs/{status['job_id']}/result"
+    )
+
+
+def decode_job_images(images: list) -> list:
+    """Валидирует изображения задания и возвращает их байты."""
+    return [validate_base64_image(image)[0] for image in images]
+
+
+@app.post("/api/ocr/jobs", response_model=OCRJobResponse, status_code=202)
+async def create_ocr_job(request: OCRJobRequest, http_request: Request):
+    """
+    Создает асинхронное задание OCR для нескольких изображений (страниц документа).
+    Страницы распознаются в фоне батчами, состояние доступно по status_url.
+    """
+    try:
+        client = client_identity(http_request)
+        rate_limiter.acquire(client, task_priority("ocr"))
+        
+        if len(request.images) > settings.OCR_JOB_MAX_IMAGES:
+            raise ValidationError(
+                "TOO_MANY_IMAGES",
+                f"Слишком много изображений в задании. Максимум: {settings.OCR_JOB_MAX_IMAGES}",
+                "JOB_TOO_LARGE"
+            )
+        store = get_job_store()
+        pending = await run_in_threadpool(store.pending_pages)
+        if pending + len(request.images) > settings.OCR_JOB_MAX_PENDING_PAGES:
+            overflow = pending + len(request.images) - settings.OCR_JOB_MAX_PENDING_PAGES
+            raise AdmissionRejected(
+                429, "QUEUE_FULL",
+                "Очередь заданий OCR заполнена, повторите позже",
+                max(1, math.ceil(overflow * estimate_cost(1000, 1000, settings.OCR_MAX_NEW_TOKENS)))
+            )
+        
+        language = validate_language(request.language)
+        model = validate_model(request.model)
+        images = await run_in_threadpool(decode_job_images, request.images)
+        
+        job_id = await run_in_threadpool(
+            store.create_job, images, client, language, model, request.max_new_tokens
+        )
+        return job_response(await run_in_threadpool(store.status, job_id))
+    
+    except AdmissionRejected as e:
+        raise admission_error(e)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                error=e.error,
+                message=e.message,
+                code=e.code
+            ).model_dump()
+        )
+
+
+@app.get("/api/ocr/jobs/{job_id}", response_model=OCRJobResponse)
+async def get_ocr_job(job_id: str):
+    """Состояние и прогресс задания OCR."""
+    status = await run_in_threadpool(get_job_store().status, job_id)
+    if status is None:
+        raise job_not_found()
+    return job_response(status)
+
+
+@app.get("/api/ocr/jobs/{job_id}/result")
+async def download_ocr_job(job_id: str, format: str = "jsonl"):
+    """
+    Результат завершенного задания OCR: JSONL (строка на страницу)
+    или ZIP архив с текстовым файлом на страницу.
+    """
+    if format not in ("jsonl", "zip"):
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                error="INVALID_FORMAT",
+                message="Неподдерживаемый формат результата. Поддерживаются: jsonl, zip",
+                code="INVALID_FORMAT"
+            ).model_dump()
+        )
+    store = get_job_store()
+    status = await run_in_threadpool(store.status, job_id)
+    if status is None:
+        raise job_not_found()
+    if status["status"] != "done":
+        raise HTTPException(
+            status_code=409,
+            detail=ErrorResponse(
+                error="JOB_NOT_FINISHED",
+                message=f"Задание еще выполняется: обработано {status['completed'] + status['failed']} из {status['total']}",
+                code="JOB_IN_PROGRESS"
+            ).model_dump()
+        )
+    
+    results = await run_in_threadpool(lambda: list(store.results(job_id)))
+    if format == "zip":
+        return Response(
+            content=await run_in_threadpool(results_zip, results),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="ocr_job_{job_id}.zip"'}
+        )
+    return StreamingResponse(
+        results_jsonl(results),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="ocr_job_{job_id}.jsonl"'}
     )
 
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Доступ к профилированию: при PROFILING_ENABLED=false endpoints не существуют,
+    иначе требуется заголовок X-Admin-Token, совпадающий с ADMIN_TOKEN.
+    """
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not settings.ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(
+        x_admin_token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(
+            status_code=403,
+            detail=ErrorResponse(
+                error="FORBIDDEN",
+                message="Неверный токен администратора",
+                code="INVALID_ADMIN_TOKEN"
+            ).model_dump()
+        )
+
+
+def profiling_conflict(message: str) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=ErrorResponse(
+            error="PROFILING_CONFLICT",
+            message=message,
+            code="PROFILING_BUSY"
+        ).model_dump()
+    )
+
+
+@app.get("/api/admin/profiling", dependencies=[Depends(require_admin)])
+async def get_profiling():
+    """Состояние профилирования и список артефактов."""
+    return profiling_status()
+
+
+@app.post("/api/admin/profiling/torch", dependencies=[Depends(require_admin)])
+async def profile_torch(request: TorchProfileRequest):
+    """Профилирует следующие N инференсов через torch.profiler."""
+    if isinstance(model_manager, ReplicaPool):
+        raise profiling_conflict("torch.profiler недоступен при MODEL_REPLICAS > 1: инференс идет в процессах реплик")
+    try:
+        return start_torch_capture(request.requests, request.seconds)
+    except RuntimeError as e:
+        raise profiling_conflict(str(e))
+
+
+@app.post("/api/admin/profiling/stack", dependencies=[Depends(require_admin)])
+async def profile_stack(request: StackProfileRequest):
+    """Семплирует стеки Python потоков сервера в течение окна."""
+    try:
+        return start_stack_sampling(request.seconds, request.interval_ms)
+    except RuntimeError as e:
+        raise profiling_conflict(str(e))
+
+
+@app.get("/api/admin/profiling/artifacts/{name}", dependencies=[Depends(require_admin)])
+async def download_profiling_artifact(name: str):
+    """Скачивание артефакта профилирования."""
+    path = artifact_path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorResponse(
+                error="NOT_FOUND",
+                message="Артефакт профилирования не найден",
+                code="ARTIFACT_NOT_FOUND"
+            ).model_dump()
+        )
+    return FileResponse(path, filename=name)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,410 @@
+"""
+Легковесные метрики процесса: счетчики, gauge и гистограммы с метками.
+Все операции - O(1) или O(log buckets) под локальной блокировкой.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional
+
+from app.tracing import record_span
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    """Базовый класс метрики с метками."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Возвращает дочернюю метрику для набора значений меток."""
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], object]]:
+        """Снимок всех дочерних метрик."""
+        with self._lock:
+            return list(self._children.items())
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Монотонно возрастающий счетчик."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+
+class Gauge(_Metric):
+    """Значение, которое может расти и убывать."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Замеряет длительность блока в секундах."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+REGISTRY: List[_Metric] = []
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render() -> str:
+    """
+    Рендерит все метрики в текстовом формате Prometheus 0.0.4.
+
+    Returns:
+        str: Текст для ответа /metrics
+    """
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for values, child in metric.children():
+            if metric.kind == "histogram":
+                with child._lock:
+                    counts = list(child.counts)
+                    total, count = child.sum, child.count
+                cumulative = 0
+                for bound, bucket_count in zip(metric.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, values, le)} {cumulative}")
+                labels = _format_labels(metric.labelnames, values)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{metric.name}_count{labels} {count}")
+            else:
+                labels = _format_labels(metric.labelnames, values)
+                lines.append(f"{metric.name}{labels} {_format_value(child.value)}")
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP запросы по endpoint и статусу",
+    ("method", "path", "status")
+)
+
+HTTP_REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Длительность обработки HTTP запроса",
+    ("method", "path")
+)
+
+STAGE_LATENCY = Histogram(
+    "request_stage_seconds",
+    "Длительность стадий обработки запроса",
+    ("stage",)
+)
+
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "inference_queue_depth",
+    "Запросы, ожидающие или выполняющие инференс"
+)
+
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds",
+    "Время ожидания в очереди перед инференсом",
+    ("priority",)
+)
+
+ADMISSION_QUEUED = Gauge(
+    "admission_queued",
+    "Запросы в очереди контроля допуска",
+    ("priority",)
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Запросы, допущенные к инференсу"
+)
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Запросы, отклоненные контролем допуска",
+    ("priority", "reason")
+)
+
+OCR_JOB_PAGES = Counter(
+    "ocr_job_pages_total",
+    "Обработанные страницы заданий OCR",
+    ("status",)
+)
+
+OCR_JOB_PENDING_PAGES = Gauge(
+    "ocr_job_pending_pages",
+    "Страницы заданий OCR, ожидающие обработки"
+)
+
+SESSIONS_STORED = Gauge(
+    "sessions_stored",
+    "Количество сессий в памяти"
+)
+
+OCR_RESULTS_STORED = Gauge(
+    "ocr_results_stored",
+    "Количество результатов OCR в памяти"
+)
+
+OCR_RESULTS_BYTES = Gauge(
+    "ocr_results_bytes",
+    "Размер результатов OCR в памяти: gzip - хранимый, identity - исходного текста",
+    ("encoding",)
+)
+
+INFERENCE_LATENCY = Histogram(
+    "inference_latency_seconds",
+    "Длительность инференса модели",
+    ("model", "task")
+)
+
+GENERATED_TOKENS = Counter(
+    "generated_tokens_total",
+    "Сгенерированные токены",
+    ("model", "task")
+)
+
+GENERATION_TOKENS_PER_SECOND = Histogram(
+    "generation_tokens_per_second",
+    "Скорость генерации одного элемента батча (новых токенов в секунду)",
+    ("model", "mode"),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+GENERATION_BUDGET_TOKENS = Histogram(
+    "generation_budget_tokens",
+    "Бюджет max_new_tokens на элемент батча",
+    ("task",),
+    buckets=TOKEN_BUCKETS
+)
+
+GENERATION_TOKENS = Histogram(
+    "generation_tokens",
+    "Фактически сгенерированные токены на элемент батча",
+    ("task",),
+    buckets=TOKEN_BUCKETS
+)
+
+SPECULATIVE_PROPOSED_TOKENS = Counter(
+    "speculative_proposed_tokens_total",
+    "Токены, предложенные draft-моделью",
+    ("model",)
+)
+
+SPECULATIVE_ACCEPTED_TOKENS = Counter(
+    "speculative_accepted_tokens_total",
+    "Токены draft-модели, принятые основной моделью",
+    ("model",)
+)
+
+SESSION_PREFILL_TOKENS = Counter(
+    "session_prefill_tokens_total",
+    "Токены промпта диалога: reused - взяты из KV-кэша сессии, computed - прошли prefill",
+    ("kind",)
+)
+
+SESSION_KV_CACHE_BYTES = Gauge(
+    "session_kv_cache_bytes",
+    "Размер KV-кэшей диалогов в памяти"
+)
+
+SESSION_KV_EVICTIONS = Counter(
+    "session_kv_evictions_total",
+    "Вытеснения KV-кэшей диалогов: disk - выгружен на диск, drop - удален",
+    ("target",)
+)
+
+PRECAPTION_JOBS = Counter(
+    "precaption_jobs_total",
+    "Фоновые описания изображений по исходу: done, skipped, cancelled, failed",
+    ("status",)
+)
+
+PRECAPTION_REQUESTS = Counter(
+    "precaption_requests_total",
+    "Запросы описания в сессии с фоновым описанием: hit - готовый ответ, attached - ожидание выполняющегося, miss - обычный инференс",
+    ("result",)
+)
+
+NEAR_DUPLICATE_LOOKUPS = Counter(
+    "near_duplicate_lookups_total",
+    "Поиск результата для почти дубликата изображения по типу: hit - результат переиспользован, miss - инференс",
+    ("kind", "result")
+)
+
+
+def record_stage(stage: str, started: float, finished: float) -> None:
+    """Учитывает стадию в гистограмме и в трассе текущего запроса (границы в perf_counter)."""
+    STAGE_LATENCY.labels(stage).observe(finished - started)
+    record_span(stage, started, finished)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Контекстный менеджер, замеряющий стадию обработки запроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, started, time.perf_counter())
+
+
+def model_latency_summary() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Сводка задержек инференса по моделям и задачам.
+
+    Returns:
+        Dict: {model: {task: {"requests": n, "avg_latency_s": t}}}
+    """
+    summary: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for (model, task), child in INFERENCE_LATENCY.children():
+        avg = child.sum / child.count if child.count else 0.0
+        summary.setdefault(model, {})[task] = {"requests": child.count, "avg_latency_s": round(avg, 4)}
+    return summary
+
+
+def speculative_summary() -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Сводка спекулятивного декодирования по моделям.
+
+    Returns:
+        Dict: {model: {"acceptance_rate": r, "tokens_per_second_gain": g}}
+    """
+    accepted = {key[0]: child.value for key, child in SPECULATIVE_ACCEPTED_TOKENS.children()}
+    rates: Dict[Tuple[str, str], float] = {
+        key: child.sum / child.count
+        for key, child in GENERATION_TOKENS_PER_SECOND.children() if child.count
+    }
+    summary: Dict[str, Dict[str, Optional[float]]] = {}
+    for (model,), child in SPECULATIVE_PROPOSED_TOKENS.children():
+        speculative = rates.get((model, "speculative"))
+        greedy = rates.get((model, "greedy"))
+        summary[model] = {
+            "acceptance_rate": round(accepted.get(model, 0.0) / child.value, 4) if child.value else None,
+            "tokens_per_second_gain": round(speculative / greedy, 3) if speculative and greedy else None,
+        }
+    return summary
@@ -0,0 +1,95 @@
+"""
+ASGI middleware для учета HTTP запросов в метриках и трассировке.
+"""
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+
+from app.metrics import HTTP_REQUESTS, HTTP_REQUEST_LATENCY
+from app.tracing import start_trace, end_trace, should_sample, get_exporter
+
+
+def route_path(scope) -> str:
+    """
+    Возвращает шаблон пути маршрута (например, /api/download/ocr/{task_id}),
+    чтобы метки метрик не зависели от параметров пути.
+    """
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    app = scope.get("app")
+    if app is not None:
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Считает запросы и длительность по endpoint."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = route_path(scope)
+            HTTP_REQUEST_LATENCY.labels(scope["method"], path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(scope["method"], path, str(status["code"])).inc()
+
+
+class TracingMiddleware:
+    """
+    Собирает стадии запроса в трассу, добавляет заголовок Server-Timing
+    и экспортирует выбранные трассы в JSONL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = start_trace(should_sample())
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_trace(token)
+            if trace.sampled:
+                path = route_path(scope)
+                records = trace.to_records(f"{scope['method']} {path}", time.perf_counter(), {
+                    "http.method": scope["method"],
+                    "http.route": path,
+                    "http.status_code": status["code"],
+                })
+                try:
+                    # Запись на диск идет в фоновом потоке экспортера
+                    get_exporter().export(records)
+                except OSError as e:
+                    print(f"Ошибка при записи трассы: {e}")
@@ -2,19 +2,91 @@
 Менеджер для загрузки и работы с моделью SmolVLM2.
 Реализует singleton паттерн для избежания множественных загрузок.
 """
-import torch
-from transformers import AutoProcessor, AutoModelForImageTextToText
-from typing import Optional, Any
+from typing import Optional, Any, List, Dict, Callable, Tuple
+from contextlib import contextmanager, ExitStack
 import os
+import threading
+import time
 from app.config import settings
+from app.autotune import load_profile
+from app.backend import InferenceBackend, get_backend
+from app.kv_cache import get_kv_store
+from app.routing import DEFAULT_MODEL, model_registry, resolve_model, vqa_task
+from app.metrics import (
+    INFERENCE_LATENCY, GENERATION_TOKENS_PER_SECOND, GENERATION_BUDGET_TOKENS, GENERATION_TOKENS,
+    GENERATED_TOKENS, record_stage, time_stage,
+    SPECULATIVE_PROPOSED_TOKENS, SPECULATIVE_ACCEPTED_TOKENS, SESSION_PREFILL_TOKENS
+)
+from app.profiling import torch_profile
+
+
+DEFAULT_VQA_PROMPT = "Describe this image in detail."
+DEFAULT_IMAGES_PROMPT = "Describe these images in detail."
+IMAGES_PROMPT = "The images are numbered 1 to {count} in the order given."
+DEFAULT_VIDEO_PROMPT = "Describe this video in detail."
+VIDEO_FRAMES_PROMPT = "The images are {frames} frames of a video in chronological order."
+OCR_PROMPT = "Extract all text from this image. Return only the text, no additional description."
+
+
+def _strip_artifacts(text: str) -> str:
+    """Удаляет служебные токены и зацикленный хвост из ответа."""
+    text = text.replace("Assistant:", "").replace("assistant:", "").strip()
+    text = text.replace("<text>", "").replace("</text>", "").strip()
+    text = text.replace("<|im_start|>", "").replace("<|im_end|>", "").strip()
+    text = text.replace("<end_of_utterance>", "").strip()
+    
+    words = text.split()
+    if len(words) > 3:
+        last_words = words[-3:]
+        if len(set(last_words)) == 1 and len(words) > 10:
+            for i in range(len(words) - 3, 0, -1):
+                if words[i:i+3] == last_words:
+                    text = " ".join(words[:i])
+                    break
+    return text
+
+
+def postprocess_answer(text: str) -> str:
+    """
+    Очищает сгенерированный ответ VQA.
+    
+    Args:
+        text: Декодированный текст генерации
+        
+    Returns:
+        str: Ответ в одну строку без служебных токенов
+    """
+    return " ".join(_strip_artifacts(text).split())
+
+
+def postprocess_ocr(text: str) -> str:
+    """
+    Очищает сгенерированный текст OCR, сохраняя переносы строк.
+    
+    Args:
+        text: Декодированный текст генерации
+        
+    Returns:
+        str: Текст без пустых строк и служебных токенов
+    """
+    text = _strip_artifacts(text)
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    return '\n'.join(lines)
 
 
 class ModelManager:
-    """Singleton менеджер модели SmolVLM2."""
+    """
+    Singleton менеджер моделей SmolVLM2.
+    Держит реестр моделей с ленивой загрузкой и выгрузкой простаивающих.
+    """
     
     _instance: Optional['ModelManager'] = None
-    _model: Optional[AutoModelForImageTextToText] = None
-    _processor: Optional[AutoProcessor] = None
+    _backend: Optional[InferenceBackend] = None
+    _entries: Dict[str, dict] = {}
+    _profile: Optional[dict] = None
+    _draft_compatibility: Dict[tuple, bool] = {}
+    _load_lock = threading.Lock()
+    _usage_lock = threading.Lock()
     _loaded: bool = False
     
     def __new__(cls):
@@ -26,224 +98,429 @@ class ModelManager:
         if not self._loaded:
             self._loaded = True
     
-    def load_model(self) -> None:
-        """Загружает модель и процессор из кэша или HuggingFace Hub."""
-        if self._model is not None and self._processor is not None:
+    def load_model(self, model: str = DEFAULT_MODEL, torch_dtype: Optional[str] = None,
+                   attn_implementation: Optional[str] = None) -> None:
+        """
+        Загружает модель и процессор из кэша или HuggingFace Hub.
+        
+        Args:
+            model: Псевдоним модели из реестра
+            torch_dtype: Переопределение TORCH_DTYPE (используется автотюнером)
+            attn_implementation: Переопределение ATTN_IMPLEMENTATION
+        """
+        if model in self._entries:
             return
         
-        print(f"Загрузка модели {settings.MODEL_NAME}...")
+        with self._load_lock:
+            if model in self._entries:
+                return
+            self._entries[model] = self._load_entry(model_registry()[model], torch_dtype, attn_implementation)
+        self._enforce_memory_budget(keep=model)
+    
+    def _load_entry(self, model_name: str, torch_dtype: Optional[str],
+                    attn_implementation: Optional[str]) -> dict:
+        """Загружает модель и процессор и возвращает запись реестра."""
+        print(f"Загрузка модели {model_name}...")
+        
+        if settings.AUTOTUNE and self._profile is None:
+            self._profile = load_profile()
+        if self._profile is not None:
+            torch_dtype = torch_dtype or self._profile.get("torch_dtype")
+            attn_implementation = attn_implementation or self._profile.get("attn_implementation")
+        
+        num_threads = settings.TORCH_NUM_THREADS
+        if num_threads == 0 and self._profile is not None:
+            num_threads = self._profile.get("num_threads", 0)
+        self.configure_threads(num_threads, settings.TORCH_NUM_INTEROP_THREADS)
+        
+        loaded = self.backend.load(model_name, torch_dtype, attn_implementation)
+        return {
+            "name": model_name,
+            **loaded,
+            "last_used": time.monotonic(),
+            "in_use": 0,
+        }
+    
+    @property
+    def backend(self) -> InferenceBackend:
+        """Бэкенд инференса (INFERENCE_BACKEND), создается при первом обращении."""
+        if ModelManager._backend is None:
+            ModelManager._backend = get_backend()
+        return ModelManager._backend
+    
+    def configure_threads(self, num_threads: int = 0, num_interop_threads: int = 0) -> None:
+        """Настраивает число потоков вычислений бэкенда."""
+        self.backend.configure_threads(num_threads, num_interop_threads)
+    
+    def unload_model(self, model: Optional[str] = None) -> None:
+        """
+        Выгружает модель из памяти.
         
-        if settings.DEVICE == "cuda" and torch.cuda.is_available():
-            if settings.TORCH_DTYPE == "float16":
-                torch_dtype = torch.float16
-            elif settings.TORCH_DTYPE == "bfloat16":
-                torch_dtype = torch.bfloat16
+        Args:
+            model: Псевдоним модели (None - выгрузить все)
+        """
+        with self._load_lock:
+            if model is None:
+                self._entries.clear()
             else:
-                torch_dtype = torch.float32
-            device = "cuda"
-        else:
-            torch_dtype = torch.float32
-            device = "cpu"
-            if settings.DEVICE == "cuda":
-                print("Предупреждение: CUDA запрошена, но недоступна. Используется CPU.")
-        
-        print("Загрузка процессора...")
-        self._processor = AutoProcessor.from_pretrained(
-            settings.MODEL_NAME,
-            cache_dir=settings.TRANSFORMERS_CACHE,
-            trust_remote_code=True
-        )
+                self._entries.pop(model, None)
+        self.backend.release()
+    
+    def unload_idle_models(self, idle_seconds: int) -> List[str]:
+        """
+        Выгружает модели, не использовавшиеся дольше idle_seconds.
+        Модель по умолчанию не выгружается.
         
-        print("Загрузка модели...")
+        Returns:
+            List[str]: Псевдонимы выгруженных моделей
+        """
+        now = time.monotonic()
+        idle = [
+            alias for alias, entry in list(self._entries.items())
+            if alias != DEFAULT_MODEL and entry["in_use"] == 0
+            and now - entry["last_used"] > idle_seconds
+        ]
+        for alias in idle:
+            print(f"Выгрузка простаивающей модели {alias}")
+            self.unload_model(alias)
+        return idle
+    
+    def _enforce_memory_budget(self, keep: str) -> None:
+        """
+        Выгружает давно не использовавшиеся модели, пока суммарный размер превышает бюджет.
+        Модель по умолчанию не выгружается.
+        """
+        if settings.MODEL_MEMORY_BUDGET_MB <= 0:
+            return
+        budget = settings.MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+        candidates = sorted(
+            (entry["last_used"], alias) for alias, entry in list(self._entries.items())
+            if alias not in (keep, DEFAULT_MODEL) and entry["in_use"] == 0
+        )
+        for _, alias in candidates:
+            if sum(entry["size_bytes"] for entry in list(self._entries.values())) <= budget:
+                break
+            print(f"Выгрузка модели {alias}: превышен бюджет памяти {settings.MODEL_MEMORY_BUDGET_MB}MB")
+            self.unload_model(alias)
+    
+    @contextmanager
+    def _use(self, model: str):
+        """Загружает модель при необходимости и помечает ее занятой на время блока."""
+        entry = None
+        while entry is None:
+            self.load_model(model)
+            with self._usage_lock:
+                entry = self._entries.get(model)
+                if entry is not None:
+                    entry["in_use"] += 1
         try:
-            import flash_attn
-            attn_implementation = "flash_attention_2" if device == "cuda" else "eager"
-        except ImportError:
-            attn_implementation = "eager"
-            if device == "cuda":
-                print("FlashAttention2 не установлен, используется eager attention")
-        
-        if device == "cuda":
-            self._model = AutoModelForImageTextToText.from_pretrained(
-                settings.MODEL_NAME,
-                cache_dir=settings.TRANSFORMERS_CACHE,
-                torch_dtype=torch_dtype,
-                _attn_implementation=attn_implementation,
-                trust_remote_code=True,
-                device_map="auto"
-            )
-        else:
-            self._model = AutoModelForImageTextToText.from_pretrained(
-                settings.MODEL_NAME,
-                cache_dir=settings.TRANSFORMERS_CACHE,
-                torch_dtype=torch_dtype,
-                _attn_implementation=attn_implementation,
-                trust_remote_code=True
-            )
-            self._model = self._model.to(device)
-        
-        self._model.eval()
-        print(f"Модель загружена на {device} с dtype {torch_dtype}")
+            yield entry
+        finally:
+            with self._usage_lock:
+                entry["in_use"] -= 1
+                entry["last_used"] = time.monotonic()
     
-    def get_model(self) -> AutoModelForImageTextToText:
+    def get_model(self, model: str = DEFAULT_MODEL) -> Any:
         """Возвращает загруженную модель."""
-        if self._model is None:
-            self.load_model()
-        return self._model
+        self.load_model(model)
+        return self._entries[model]["model"]
     
-    def get_processor(self) -> AutoProcessor:
+    def get_processor(self, model: str = DEFAULT_MODEL) -> Any:
         """Возвращает загруженный процессор."""
-        if self._processor is None:
-            self.load_model()
-        return self._processor
+        self.load_model(model)
+        return self._entries[model]["processor"]
     
-    def is_loaded(self) -> bool:
+    def is_loaded(self, model: str = DEFAULT_MODEL) -> bool:
         """Проверяет, загружена ли модель."""
-        return self._model is not None and self._processor is not None
-
-    def vqa_inference(self, image, question: Optional[str] = None) -> str:
-        if not self.is_loaded():
-            self.load_model()
-
-        model = self.get_model()
-        processor = self.get_processor()
-
-        if question is None or not question.strip():
-            text_content = "Describe this image in detail."
-        else:
-            text_content = question
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image"},
-                    {"type": "text", "text": text_content}
-                ]
+        return model in self._entries
+    
+    def loaded_models(self) -> Dict[str, dict]:
+        """Возвращает сведения о загруженных моделях."""
+        now = time.monotonic()
+        return {
+            alias: {
+                "name": entry["name"],
+                "size_mb": round(entry["size_bytes"] / (1024 * 1024), 1),
+                "idle_s": round(now - entry["last_used"], 1),
             }
-        ]
-
-        prompt = processor.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
-        inputs = processor(text=prompt, images=[image], return_tensors="pt")
-
-        device = next(model.parameters()).device
-        dtype = next(model.parameters()).dtype
-        inputs = {k: v.to(device).to(dtype) if v.dtype.is_floating_point else v.to(device) 
-                  for k, v in inputs.items()}
-
-        with torch.no_grad():
-            generated_ids = model.generate(
-                **inputs,
-                max_new_tokens=512,
-                do_sample=False,
-                temperature=0.7,
-                repetition_penalty=1.2,
-                pad_token_id=processor.tokenizer.pad_token_id,
-                eos_token_id=processor.tokenizer.eos_token_id
+            for alias, entry in list(self._entries.items())
+        }
+    
+    def set_profile(self, profile: Optional[dict]) -> None:
+        """Устанавливает профиль автотюнера, применяемый при загрузке модели."""
+        self._profile = profile
+    
+    def get_profile(self) -> Optional[dict]:
+        """Возвращает активный профиль автотюнера."""
+        return self._profile
+    
+    def get_batch_size(self) -> int:
+        """Возвращает размер батча для пакетного инференса."""
+        if self._profile is not None:
+            return self._profile.get("batch_size", settings.INFERENCE_BATCH_SIZE)
+        return settings.INFERENCE_BATCH_SIZE
+    
+    def _draft_alias(self, model: str, task: str, batch_size: int) -> Optional[str]:
+        """Возвращает псевдоним draft-модели, если спекулятивное декодирование применимо."""
+        draft = settings.DRAFT_MODEL
+        if not draft or draft == model or batch_size != 1 or task not in settings.SPECULATIVE_TASKS:
+            return None
+        if draft not in model_registry():
+            return None
+        
+        key = (model, draft)
+        if key not in self._draft_compatibility:
+            self.load_model(model)
+            self.load_model(draft)
+            compatible = self.backend.draft_compatible(self._entries[model], self._entries[draft])
+            if not compatible:
+                print(f"Draft-модель {draft} несовместима с {model}, спекулятивное декодирование отключено")
+            self._draft_compatibility[key] = compatible
+        return draft if self._draft_compatibility[key] else None
+    
+    def _generate(self, images: List[Any], text_contents: List[str], max_new_tokens: int = 512,
+                  model: str = DEFAULT_MODEL, task: str = "vqa",
+                  postprocess: Callable[[str], str] = postprocess_answer) -> List[str]:
+        """
+        Выполняет генерацию для батча пар (изображение, текст).
+        
+        Returns:
+            List[str]: Очищенный текст новых токенов для каждого элемента батча
+        """
+        rows = self._generate_rows(images, text_contents, max_new_tokens, model, task, postprocess)
+        return [row["text"] for row in rows]
+    
+    def _generate_rows(self, images: List[Any], text_contents: List[str], max_new_tokens: int = 512,
+                       model: str = DEFAULT_MODEL, task: str = "vqa",
+                       postprocess: Callable[[str], str] = postprocess_answer,
+                       shared_image: bool = False,
+                       chat: Optional[Dict[str, Any]] = None,
+                       multi_image: bool = False, split_images: bool = True) -> List[Dict[str, Any]]:
+        """
+        Выполняет генерацию для батча пар (изображение, текст).
+        При настроенной DRAFT_MODEL одиночные запросы декодируются спекулятивно.
+        
+        Args:
+            shared_image: Все тексты относятся к images[0]; изображение кодируется один раз
+            chat: {"session_id", "history"} - ход диалога для единственной пары
+                с переиспользованием KV-кэша предыдущего хода сессии
+            multi_image: Все изображения относятся к единственному тексту (один промпт)
+            split_images: Разбивать изображения промпта multi_image на фрагменты
+        
+        Returns:
+            List[Dict]: {text, raw, tokens, latency_ms} для каждого элемента батча;
+                raw - текст до постобработки,
+                latency_ms - от начала подготовки входов до готовности элемента
+        """
+        with ExitStack() as stack:
+            entry = stack.enter_context(self._use(model))
+            stack.enter_context(torch_profile(model, task))
+            stack.enter_context(INFERENCE_LATENCY.labels(model, task).time())
+            draft_alias = None if chat else self._draft_alias(model, task, len(text_contents))
+            draft = stack.enter_context(self._use(draft_alias)) if draft_alias else None
+            
+            prepare_started = time.perf_counter()
+            with time_stage("preprocess"):
+                if chat:
+                    inputs = self._prepare_chat(entry, images[0], chat["history"], text_contents[0])
+                elif multi_image:
+                    inputs = self.backend.prepare_images(entry, images, text_contents[0], split_images)
+                elif shared_image:
+                    inputs = self.backend.prepare_shared(entry, images[0], text_contents)
+                else:
+                    inputs = self.backend.prepare(entry, images, text_contents)
+            
+            if chat:
+                kv_store = get_kv_store()
+                cached = kv_store.take(chat["session_id"], model)
+                result = self.backend.generate_chat(entry, inputs, max_new_tokens, cached)
+                reused = result["reused_tokens"]
+                SESSION_PREFILL_TOKENS.labels("reused").inc(reused)
+                SESSION_PREFILL_TOKENS.labels("computed").inc(self.backend.prompt_tokens(inputs) - reused)
+                kv_store.put(chat["session_id"], dict(result["cache"], model=model))
+            else:
+                result = self.backend.generate(entry, inputs, max_new_tokens, draft)
+            started, finished = result["started"], result["finished"]
+            elapsed = finished - started
+            prefill_end = result["first_token_at"] or finished
+            record_stage("prefill", started, prefill_end)
+            record_stage("decode", prefill_end, finished)
+            
+            stats = result["speculative"]
+            if stats is not None:
+                SPECULATIVE_PROPOSED_TOKENS.labels(model).inc(stats["proposed_tokens"])
+                SPECULATIVE_ACCEPTED_TOKENS.labels(model).inc(stats["accepted_tokens"])
+            
+            row_tokens = result["row_tokens"]
+            new_tokens = sum(row_tokens)
+            GENERATED_TOKENS.labels(model, task).inc(new_tokens)
+            for tokens in row_tokens:
+                GENERATION_BUDGET_TOKENS.labels(task).observe(max_new_tokens)
+                GENERATION_TOKENS.labels(task).observe(tokens)
+            # Скорость на элемент батча: суммарная скорость батча завышает скорость одного запроса
+            row_finished = result.get("row_finished") or [finished] * len(row_tokens)
+            tokens_per_second = GENERATION_TOKENS_PER_SECOND.labels(
+                model, "speculative" if draft is not None else "greedy"
             )
+            for tokens, done in zip(row_tokens, row_finished):
+                if done > started:
+                    tokens_per_second.observe(tokens / (done - started))
+            
+            with time_stage("postprocess"):
+                texts = self.backend.decode(entry, result)
+                return [
+                    {
+                        "text": postprocess(text),
+                        "raw": text,
+                        "tokens": tokens,
+                        "latency_ms": round((done - prepare_started) * 1000, 1),
+                    }
+                    for text, tokens, done in zip(texts, row_tokens, row_finished)
+                ]
 
-        generated_texts = processor.batch_decode(
-            generated_ids,
-            skip_special_tokens=True
-        )
-
-        full_response = generated_texts[0]
-        prompt_text = processor.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
-        
-        if prompt_text in full_response:
-            answer = full_response.split(prompt_text, 1)[-1].strip()
-        elif text_content in full_response:
-            answer = full_response.split(text_content, 1)[-1].strip()
-        else:
-            answer = full_response
-        
-        answer = answer.replace("Assistant:", "").replace("assistant:", "").strip()
-        answer = answer.replace("<text>", "").replace("</text>", "").strip()
-        answer = answer.replace("<|im_start|>", "").replace("<|im_end|>", "").strip()
-        answer = answer.replace("<end_of_utterance>", "").strip()
-        
-        words = answer.split()
-        if len(words) > 3:
-            last_words = words[-3:]
-            if len(set(last_words)) == 1 and len(words) > 10:
-                for i in range(len(words) - 3, 0, -1):
-                    if words[i:i+3] == last_words:
-                        answer = " ".join(words[:i])
-                        break
-        
-        answer = " ".join(answer.split())
-        
-        return answer
+    def _prepare_chat(self, entry: Dict[str, Any], image: Any, history: List[Tuple[str, str]],
+                      text_content: str) -> Any:
+        """Входы хода диалога; старые ходы отбрасываются, пока промпт длиннее SESSION_MAX_TOKENS."""
+        for start in range(len(history) + 1):
+            inputs = self.backend.prepare_chat(entry, image, history[start:], text_content)
+            if self.backend.prompt_tokens(inputs) <= settings.SESSION_MAX_TOKENS:
+                break
+        return inputs
 
+    def vqa_inference(self, image, question: Optional[str] = None, model: Optional[str] = None,
+                      max_new_tokens: int = 512) -> str:
+        """
+        Отвечает на вопрос к изображению или к списку изображений.
+        Несколько изображений передаются одним промптом и предобрабатываются
+        одним вызовом процессора; изображения разбиваются на фрагменты, как одиночные.
+        """
+        if not isinstance(image, list):
+            return self.vqa_batch_inference([image], [question], max_new_tokens, model)[0]
+        if len(image) == 1:
+            return self.vqa_batch_inference(image, [question], max_new_tokens, model)[0]
+        question_text = DEFAULT_IMAGES_PROMPT if question is None or not question.strip() else question
+        text_content = f"{IMAGES_PROMPT.format(count=len(image))} {question_text}"
+        task = vqa_task([question])
+        model = resolve_model(task, model)
+        rows = self._generate_rows(image, [text_content], max_new_tokens, model, task, postprocess_answer,
+                                   multi_image=True)
+        return rows[0]["text"]
     
-    def ocr_inference(self, image) -> str:
-        if not self.is_loaded():
-            self.load_model()
-
-        model = self.get_model()
-        processor = self.get_processor()
-
-        text_content = "Extract all text from this image. Return only the text, no additional description."
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image"},
-                    {"type": "text", "text": text_content}
-                ]
-            }
+    def vqa_batch_inference(self, images: List[Any], questions: List[Optional[str]],
+                            max_new_tokens: int = 512, model: Optional[str] = None) -> List[str]:
+        """
+        Отвечает на вопросы к изображениям одним батчем.
+        
+        Args:
+            images: PIL изображения
+            questions: Вопросы (None или пустая строка - описание изображения)
+            max_new_tokens: Лимит генерируемых токенов
+            model: Псевдоним модели (None - по правилам маршрутизации)
+            
+        Returns:
+            List[str]: Ответы в порядке входных данных
+        """
+        text_contents = [
+            DEFAULT_VQA_PROMPT if question is None or not question.strip() else question
+            for question in questions
         ]
-
-        prompt = processor.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
-        inputs = processor(text=prompt, images=[image], return_tensors="pt")
-
-        device = next(model.parameters()).device
-        dtype = next(model.parameters()).dtype
-        inputs = {k: v.to(device).to(dtype) if v.dtype.is_floating_point else v.to(device) 
-                  for k, v in inputs.items()}
-
-        with torch.no_grad():
-            generated_ids = model.generate(
-                **inputs,
-                max_new_tokens=512,
-                do_sample=False,
-                temperature=0.7,
-                repetition_penalty=1.2,
-                pad_token_id=processor.tokenizer.pad_token_id,
-                eos_token_id=processor.tokenizer.eos_token_id
-            )
-
-        generated_texts = processor.batch_decode(
-            generated_ids,
-            skip_special_tokens=True
-        )
-
-        full_response = generated_texts[0]
-        prompt_text = processor.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
-        
-        if prompt_text in full_response:
-            text = full_response.split(prompt_text, 1)[-1].strip()
-        elif text_content in full_response:
-            text = full_response.split(text_content, 1)[-1].strip()
-        else:
-            text = full_response
-        
-        text = text.replace("Assistant:", "").replace("assistant:", "").strip()
-        text = text.replace("<text>", "").replace("</text>", "").strip()
-        text = text.replace("<|im_start|>", "").replace("<|im_end|>", "").strip()
-        text = text.replace("<end_of_utterance>", "").strip()
-        
-        words = text.split()
-        if len(words) > 3:
-            last_words = words[-3:]
-            if len(set(last_words)) == 1 and len(words) > 10:
-                for i in range(len(words) - 3, 0, -1):
-                    if words[i:i+3] == last_words:
-                        text = " ".join(words[:i])
-                        break
-        
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        text = '\n'.join(lines)
-        
-        return text
+        task = vqa_task(questions)
+        model = resolve_model(task, model)
+        return self._generate(images, text_contents, max_new_tokens, model, task, postprocess_answer)
+    
+    def vqa_multi_inference(self, image, questions: List[Optional[str]], max_new_tokens: int = 512,
+                            model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Отвечает на несколько вопросов к одному изображению одним батчем.
+        Изображение кодируется один раз, ответы декодируются совместно.
+        
+        Args:
+            image: PIL изображение
+            questions: Вопросы (None или пустая строка - описание изображения)
+            max_new_tokens: Лимит генерируемых токенов
+            model: Псевдоним модели (None - по правилам маршрутизации)
+            
+        Returns:
+            List[Dict]: {answer, tokens, latency_ms} в порядке вопросов
+        """
+        text_contents = [
+            DEFAULT_VQA_PROMPT if question is None or not question.strip() else question
+            for question in questions
+        ]
+        task = vqa_task(questions)
+        model = resolve_model(task, model)
+        rows = self._generate_rows([image], text_contents, max_new_tokens, model, task, postprocess_answer,
+                                   shared_image=True)
+        return [{"answer": row["text"], "tokens": row["tokens"], "latency_ms": row["latency_ms"]} for row in rows]
+    
+    def chat_inference(self, image, session_id: str, history: List[Tuple[str, str]],
+                       question: Optional[str] = None, max_new_tokens: int = 512,
+                       model: Optional[str] = None) -> Dict[str, str]:
+        """
+        Отвечает на вопрос с учетом истории диалога сессии.
+        Prefill выполняется только для токенов, не покрытых KV-кэшем предыдущего хода.
+        
+        Args:
+            image: PIL изображение сессии
+            session_id: ID сессии (ключ KV-кэша)
+            history: Предыдущие ходы (вопрос, сырой ответ модели)
+            question: Вопрос (None или пустая строка - описание изображения)
+            max_new_tokens: Лимит генерируемых токенов
+            model: Псевдоним модели (None - по правилам маршрутизации)
+            
+        Returns:
+            Dict[str, str]: {answer, question, raw}; question и raw - ход для истории сессии
+        """
+        text_content = DEFAULT_VQA_PROMPT if question is None or not question.strip() else question
+        task = vqa_task([question])
+        model = resolve_model(task, model)
+        row = self._generate_rows([image], [text_content], max_new_tokens, model, task, postprocess_answer,
+                                  chat={"session_id": session_id, "history": history})[0]
+        return {"answer": row["text"], "question": text_content, "raw": row["raw"]}
+    
+    def video_inference(self, frames: List[Any], question: Optional[str] = None, max_new_tokens: int = 512,
+                        model: Optional[str] = None) -> str:
+        """
+        Описывает видео или отвечает на вопрос по его кадрам.
+        Кадры передаются одним промптом без разбиения на фрагменты, как в видеорежиме SmolVLM2.
+        
+        Args:
+            frames: PIL изображения кадров в хронологическом порядке
+            question: Вопрос (None или пустая строка - описание видео)
+            max_new_tokens: Лимит генерируемых токенов
+            model: Псевдоним модели (None - по правилам маршрутизации)
+            
+        Returns:
+            str: Ответ модели
+        """
+        question_text = DEFAULT_VIDEO_PROMPT if question is None or not question.strip() else question
+        text_content = f"{VIDEO_FRAMES_PROMPT.format(frames=len(frames))} {question_text}"
+        task = vqa_task([question])
+        model = resolve_model(task, model)
+        rows = self._generate_rows(frames, [text_content], max_new_tokens, model, task, postprocess_answer,
+                                   multi_image=True, split_images=False)
+        return rows[0]["text"]
+    
+    def expire_session_caches(self, idle_seconds: float) -> int:
+        """Удаляет KV-кэши диалогов, не использованные idle_seconds."""
+        return get_kv_store().expire(idle_seconds)
+    
+    def ocr_inference(self, image, model: Optional[str] = None, max_new_tokens: int = 512) -> str:
+        return self.ocr_batch_inference([image], max_new_tokens, model)[0]
+    
+    def ocr_batch_inference(self, images: List[Any], max_new_tokens: int = 512,
+                            model: Optional[str] = None) -> List[str]:
+        """
+        Извлекает текст из нескольких изображений одним батчем.
+        
+        Args:
+            images: PIL изображения
+            max_new_tokens: Лимит генерируемых токенов
+            model: Псевдоним модели (None - по правилам маршрутизации)
+            
+        Returns:
+            List[str]: Распознанный текст в порядке входных данных
+        """
+        model = resolve_model("ocr", model)
+        return self._generate(images, [OCR_PROMPT] * len(images), max_new_tokens, model, "ocr",
+                              postprocess_ocr)
@@ -0,0 +1,182 @@
+"""
+Поиск почти дубликатов изображений по перцептивному хэшу.
+
+Браузеры пережимают и масштабируют фото при загрузке, поэтому повторная
+загрузка того же снимка отличается побайтно. dHash - знаки разностей соседних
+пикселей уменьшенной серой копии - устойчив к пережатию и масштабированию:
+такие копии отличаются в нескольких битах. Индекс хранит отпечатки недавних
+изображений и результаты инференса по ним; результат изображения на
+расстоянии Хэмминга не больше NEAR_DUPLICATE_MAX_DISTANCE переиспользуется.
+
+dHash не видит цвет и пропорции, поэтому отпечаток дополнен средним цветом
+и отношением сторон: перекрашенное или обрезанное изображение дубликатом не считается.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.metrics import NEAR_DUPLICATE_LOOKUPS, time_stage
+
+
+# Сторона хэша: HASH_SIZE x HASH_SIZE бит, HASH_WORDS слов uint64
+HASH_SIZE = 16
+HASH_WORDS = HASH_SIZE * HASH_SIZE // 64
+# Допустимое отличие среднего цвета (0-255 по каналу) и отношения сторон
+COLOR_TOLERANCE = 8
+ASPECT_TOLERANCE = 0.02
+# Результатов на одно изображение (разные вопросы, бюджеты, модели)
+MAX_RESULTS_PER_IMAGE = 32
+
+if hasattr(np, "bitwise_count"):
+    popcount = np.bitwise_count
+else:
+    _BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(words: np.ndarray) -> np.ndarray:
+        """Число единичных бит в каждом слове uint64 (numpy < 2.0)."""
+        return _BYTE_BITS[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1)
+
+
+def image_fingerprint(image: Image.Image) -> Dict[str, Any]:
+    """
+    Отпечаток изображения для поиска почти дубликатов.
+
+    Args:
+        image: PIL изображение
+
+    Returns:
+        Dict[str, Any]: {"hash": HASH_WORDS слов uint64, "color": средний RGB, "aspect": ширина / высота}
+    """
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    # Цвет усредняется уже на уменьшенной копии; reducing_gap сначала сжимает изображение
+    # целочисленным reduce(), это в 1.5 раза быстрее полного BOX на больших снимках
+    small = image.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX, reducing_gap=2.0)
+    small = np.asarray(small, dtype=np.float32)
+    if small.ndim == 2:
+        gray = small
+        color = np.repeat(small.mean(), 3)
+    else:
+        gray = small @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        color = small.mean(axis=(0, 1))
+    bits = gray[:, 1:] > gray[:, :-1]
+    return {
+        "hash": np.packbits(bits).view(">u8").astype(np.uint64),
+        "color": color.round().astype(np.int16),
+        "aspect": image.width / image.height,
+    }
+
+
+def is_near_duplicate(a: Dict[str, Any], b: Dict[str, Any], max_distance: int) -> bool:
+    """Почти дубликаты ли изображения с отпечатками a и b."""
+    return (
+        int(popcount(a["hash"] ^ b["hash"]).sum()) <= max_distance
+        and int(np.abs(a["color"] - b["color"]).max()) <= COLOR_TOLERANCE
+        and abs(a["aspect"] - b["aspect"]) <= ASPECT_TOLERANCE * a["aspect"]
+    )
+
+
+def near_duplicate_fingerprint(image: Image.Image) -> Optional[Dict[str, Any]]:
+    """Отпечаток для поиска почти дубликатов или None, если NEAR_DUPLICATE_CACHE_ENABLED выключен."""
+    if not settings.NEAR_DUPLICATE_CACHE_ENABLED:
+        return None
+    with time_stage("image_hash"):
+        return image_fingerprint(image)
+
+
+class NearDuplicateIndex:
+    """
+    Кольцевой индекс отпечатков последних capacity изображений с результатами.
+    Поиск - векторизованный перебор: XOR и подсчет бит по первому слову всех
+    отпечатков (нижняя граница расстояния), полное расстояние - только для прошедших.
+
+    Args:
+        capacity: Число хранимых изображений (старые вытесняются по кругу)
+        max_distance: Максимальное расстояние Хэмминга для почти дубликата
+    """
+
+    def __init__(self, capacity: int, max_distance: int):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        # Слова хэшей хранятся по столбцам: первое слово всех отпечатков лежит подряд
+        self._hashes = np.zeros((HASH_WORDS, capacity), dtype=np.uint64)
+        self._colors = np.zeros((capacity, 3), dtype=np.int16)
+        self._aspects = np.zeros(capacity, dtype=np.float32)
+        self._results: List[Optional["OrderedDict[Hashable, Any]"]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _nearest(self, fingerprint: Dict[str, Any]) -> np.ndarray:
+        """Слоты почти дубликатов в порядке возрастания расстояния."""
+        target = fingerprint["hash"]
+        slots = np.flatnonzero(popcount(self._hashes[0, :self._size] ^ target[0]) <= self.max_distance)
+        if not slots.size:
+            return slots
+        distances = popcount(self._hashes[:, slots] ^ target[:, None]).sum(axis=0)
+        similar = (
+            (distances <= self.max_distance)
+            & (np.abs(self._colors[slots] - fingerprint["color"]).max(axis=1) <= COLOR_TOLERANCE)
+            & (np.abs(self._aspects[slots] - fingerprint["aspect"]) <= ASPECT_TOLERANCE * fingerprint["aspect"])
+        )
+        slots, distances = slots[similar], distances[similar]
+        return slots[np.argsort(distances, kind="stable")]
+
+    def get(self, fingerprint: Dict[str, Any], key: Hashable, kind: str) -> Optional[Any]:
+        """
+        Результат для почти дубликата изображения.
+
+        Args:
+            fingerprint: Отпечаток image_fingerprint
+            key: Параметры запроса, от которых зависит результат
+            kind: Тип результата для метрик (vqa, ocr)
+
+        Returns:
+            Optional[Any]: Сохраненный результат или None
+        """
+        with self._lock:
+            for slot in self._nearest(fingerprint):
+                results = self._results[slot]
+                if key in results:
+                    results.move_to_end(key)
+                    NEAR_DUPLICATE_LOOKUPS.labels(kind, "hit").inc()
+                    return results[key]
+        NEAR_DUPLICATE_LOOKUPS.labels(kind, "miss").inc()
+        return None
+
+    def put(self, fingerprint: Dict[str, Any], key: Hashable, value: Any) -> None:
+        """Сохраняет результат у ближайшего почти дубликата или в новом слоте."""
+        with self._lock:
+            slots = self._nearest(fingerprint)
+            if slots.size:
+                results = self._results[slots[0]]
+            else:
+                slot = self._next
+                self._next = (self._next + 1) % self.capacity
+                self._size = min(self._size + 1, self.capacity)
+                self._hashes[:, slot] = fingerprint["hash"]
+                self._colors[slot] = fingerprint["color"]
+                self._aspects[slot] = fingerprint["aspect"]
+                results = self._results[slot] = OrderedDict()
+            results[key] = value
+            results.move_to_end(key)
+            if len(results) > MAX_RESULTS_PER_IMAGE:
+                results.popitem(last=False)
+
+
+_index: Optional[NearDuplicateIndex] = None
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """Индекс почти дубликатов процесса по настройкам NEAR_DUPLICATE_*."""
+    global _index
+    if _index is None:
+        _index = NearDuplicateIndex(settings.NEAR_DUPLICATE_CACHE_SIZE, settings.NEAR_DUPLICATE_MAX_DISTANCE)
+    return _index
@@ -0,0 +1,106 @@
+"""
+Фоновое описание изображения при создании сессии.
+
+Самый частый первый запрос после загрузки - описание изображения промптом
+по умолчанию. При PRECAPTION_ON_UPLOAD новая сессия ставит такое описание
+в очередь с классом приоритета background: оно выполняется только когда нет
+ожидающих интерактивных и bulk запросов. Результат сохраняется в сессии,
+и запрос описания возвращает его сразу или дожидается выполняющегося инференса.
+"""
+import asyncio
+from typing import Any, Callable, Optional
+
+from app.config import settings
+from app.admission import AdmissionRejected, estimate_cost, task_priority
+from app.budget import resolve_token_budget
+from app.metrics import PRECAPTION_JOBS, PRECAPTION_REQUESTS
+from app.utils import sessions
+
+
+def start_precaption(session_id: str, client: str, manager: Any, admission: Any,
+                     run_inference: Callable) -> Optional[asyncio.Task]:
+    """
+    Ставит фоновое описание изображения сессии в очередь.
+
+    Args:
+        session_id: ID сессии с сохраненным изображением
+        client: Идентификатор клиента для справедливого планирования
+        manager: ModelManager или ReplicaPool
+        admission: Контроллер допуска
+        run_inference: Корутина выполнения инференса в пуле потоков
+
+    Returns:
+        Optional[asyncio.Task]: Задача или None, если режим выключен
+    """
+    session = sessions.get(session_id)
+    if not settings.PRECAPTION_ON_UPLOAD or session is None or "caption" in session:
+        return None
+    job = {"status": "queued", "answer": None, "max_new_tokens": resolve_token_budget("caption")}
+    job["task"] = asyncio.create_task(
+        _run(session_id, session["image"], job, client, manager, admission, run_inference)
+    )
+    session["caption"] = job
+    return job["task"]
+
+
+async def _run(session_id: str, image: Any, job: dict, client: str, manager: Any, admission: Any,
+               run_inference: Callable) -> None:
+    cost = estimate_cost(*image.size, job["max_new_tokens"])
+    try:
+        async with admission.admit(task_priority("precaption"), cost, client):
+            if session_id not in sessions:
+                # Сессия истекла, пока описание ждало в очереди
+                job["status"] = "cancelled"
+            else:
+                job["status"] = "running"
+                job["answer"] = await run_inference(
+                    manager.vqa_inference, image, None, None, job["max_new_tokens"]
+                )
+                job["status"] = "done"
+    except AdmissionRejected:
+        job["status"] = "skipped"
+    except asyncio.CancelledError:
+        job["status"] = "cancelled"
+        PRECAPTION_JOBS.labels("cancelled").inc()
+        raise
+    except Exception as e:
+        job["status"] = "failed"
+        print(f"Ошибка фонового описания изображения: {e}")
+    PRECAPTION_JOBS.labels(job["status"]).inc()
+
+
+async def take_precaption(session_id: str, max_new_tokens: int, model: Optional[str]) -> Optional[str]:
+    """
+    Ответ фонового описания для запроса описания в сессии.
+
+    Готовое описание возвращается сразу, выполняющееся - дожидается.
+    Описание, еще ожидающее в очереди background, отменяется: запрос
+    выполнится обычным путем с интерактивным приоритетом.
+
+    Args:
+        session_id: ID сессии
+        max_new_tokens: Бюджет токенов запроса
+        model: Псевдоним модели из запроса
+
+    Returns:
+        Optional[str]: Описание или None, если нужен обычный инференс
+    """
+    session = sessions.get(session_id)
+    job = session.get("caption") if session else None
+    if job is None:
+        return None
+    # Описание с другим бюджетом или моделью не совпало бы с ответом на запрос
+    if model is None and max_new_tokens == job["max_new_tokens"]:
+        if job["status"] == "done":
+            PRECAPTION_REQUESTS.labels("hit").inc()
+            return job["answer"]
+        if job["status"] == "running":
+            # shield: отключение клиента не должно прерывать описание для следующих запросов
+            await asyncio.shield(job["task"])
+            if job["status"] == "done":
+                PRECAPTION_REQUESTS.labels("attached").inc()
+                return job["answer"]
+        elif job["status"] == "queued":
+            job["task"].cancel()
+    PRECAPTION_REQUESTS.labels("miss").inc()
+    return None
@@ -0,0 +1,250 @@
+"""
+Профилирование по запросу: трассы torch.profiler для инференса
+и семплирование стеков Python потоков сервера.
+Пока захват не запущен, хук инференса сводится к одной проверке на None.
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+
+
+def profiling_dir() -> str:
+    """Директория артефактов профилирования (создается при необходимости)."""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    return settings.PROFILING_DIR
+
+
+def _clamp_seconds(seconds: Optional[float]) -> float:
+    if seconds is None:
+        return float(settings.PROFILING_MAX_SECONDS)
+    return min(float(seconds), float(settings.PROFILING_MAX_SECONDS))
+
+
+class TorchCapture:
+    """Захват torch.profiler для следующих N инференсов или до истечения окна."""
+
+    def __init__(self, requests: int, seconds: float):
+        self.id = uuid.uuid4().hex[:8]
+        self.requests = requests
+        self.deadline = time.monotonic() + seconds
+        self.captured = 0
+        self.artifacts: List[str] = []
+        self._lock = threading.Lock()
+
+    def active(self) -> bool:
+        return self.captured < self.requests and time.monotonic() < self.deadline
+
+    def take(self) -> Optional[int]:
+        """Резервирует номер захвата или возвращает None, если захват завершен."""
+        with self._lock:
+            if not self.active():
+                return None
+            self.captured += 1
+            return self.captured
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "active": self.active(),
+            "captured": self.captured,
+            "requests": self.requests,
+            "remaining_s": round(max(0.0, self.deadline - time.monotonic()), 1),
+            "artifacts": list(self.artifacts),
+        }
+
+
+# Активный захват (проверяется на каждом инференсе) и последний захват (для статуса)
+_torch_capture: Optional[TorchCapture] = None
+_last_torch_capture: Optional[TorchCapture] = None
+_start_lock = threading.Lock()
+# torch.profiler не допускает пересекающихся сессий: профилируется один инференс за раз
+_profiler_busy = threading.Lock()
+
+
+def start_torch_capture(requests: int, seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Запускает захват torch.profiler.
+
+    Args:
+        requests: Сколько следующих инференсов профилировать (ограничено PROFILING_MAX_REQUESTS)
+        seconds: Окно захвата (ограничено PROFILING_MAX_SECONDS)
+
+    Returns:
+        Dict[str, Any]: Статус захвата
+
+    Raises:
+        RuntimeError: Если захват уже идет
+    """
+    global _torch_capture, _last_torch_capture
+    with _start_lock:
+        if _last_torch_capture is not None and _last_torch_capture.active():
+            raise RuntimeError("Захват torch.profiler уже запущен")
+        capture = TorchCapture(min(requests, settings.PROFILING_MAX_REQUESTS), _clamp_seconds(seconds))
+        _torch_capture = _last_torch_capture = capture
+        return capture.status()
+
+
+def torch_profile(model: str, task: str):
+    """
+    Контекстный менеджер вокруг инференса: профилирует его, если идет захват.
+    Инференсы, идущие параллельно с профилируемым, выполняются без профиля
+    и не расходуют запросы захвата.
+
+    Args:
+        model: Псевдоним модели (для имени артефакта)
+        task: Задача (для имени артефакта)
+    """
+    global _torch_capture
+    capture = _torch_capture
+    if capture is None or not _profiler_busy.acquire(blocking=False):
+        return nullcontext()
+    index = capture.take()
+    if index is None:
+        _torch_capture = None
+        _profiler_busy.release()
+        return nullcontext()
+    return _profile_inference(capture, index, f"{model}-{task}")
+
+
+@contextmanager
+def _profile_inference(capture: TorchCapture, index: int, label: str):
+    """Профилирует инференс и сохраняет артефакты; освобождает _profiler_busy."""
+    try:
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+
+        with profile(activities=activities, record_shapes=True) as prof:
+            yield
+    finally:
+        _profiler_busy.release()
+
+    name = f"torch-{capture.id}-{index}-{label}"
+    directory = profiling_dir()
+    trace_path = os.path.join(directory, f"{name}.json")
+    table_path = os.path.join(directory, f"{name}.txt")
+    try:
+        prof.export_chrome_trace(trace_path)
+        with open(table_path, "w", encoding="utf-8") as f:
+            f.write(prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=50))
+        capture.artifacts.extend([os.path.basename(trace_path), os.path.basename(table_path)])
+    except OSError as e:
+        print(f"Ошибка при сохранении профиля torch: {e}")
+
+
+class StackSampler(threading.Thread):
+    """
+    Семплирует стеки всех потоков процесса через sys._current_frames
+    и сохраняет их в формате folded stacks (для flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, seconds: float, interval_ms: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.id = uuid.uuid4().hex[:8]
+        self.seconds = seconds
+        self.interval = max(interval_ms, 1.0) / 1000
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.artifact: Optional[str] = None
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        deadline = time.monotonic() + self.seconds
+        own_id = threading.get_ident()
+        while not self._stop_event.is_set() and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+            self._stop_event.wait(self.interval)
+        self._write()
+
+    def _write(self) -> None:
+        path = os.path.join(profiling_dir(), f"stack-{self.id}.folded")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.artifact = os.path.basename(path)
+        except OSError as e:
+            print(f"Ошибка при сохранении профиля стеков: {e}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "active": self.is_alive(),
+            "samples": self.samples,
+            "artifacts": [self.artifact] if self.artifact else [],
+        }
+
+
+_stack_sampler: Optional[StackSampler] = None
+
+
+def start_stack_sampling(seconds: Optional[float] = None, interval_ms: float = 10.0) -> Dict[str, Any]:
+    """
+    Запускает семплирование стеков в фоновом потоке.
+
+    Args:
+        seconds: Длительность (ограничена PROFILING_MAX_SECONDS)
+        interval_ms: Интервал между снимками в миллисекундах
+
+    Returns:
+        Dict[str, Any]: Статус семплирования
+
+    Raises:
+        RuntimeError: Если семплирование уже идет
+    """
+    global _stack_sampler
+    with _start_lock:
+        if _stack_sampler is not None and _stack_sampler.is_alive():
+            raise RuntimeError("Семплирование стеков уже запущено")
+        _stack_sampler = StackSampler(_clamp_seconds(seconds), interval_ms)
+        _stack_sampler.start()
+        return _stack_sampler.status()
+
+
+def profiling_status() -> Dict[str, Any]:
+    """Состояние захватов и список артефактов."""
+    directory = settings.PROFILING_DIR
+    artifacts = []
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                artifacts.append({"name": name, "size_bytes": os.path.getsize(path)})
+    return {
+        "torch": _last_torch_capture.status() if _last_torch_capture is not None else None,
+        "stack": _stack_sampler.status() if _stack_sampler is not None else None,
+        "artifacts": artifacts,
+    }
+
+
+def artifact_path(name: str) -> Optional[str]:
+    """Путь к артефакту по имени или None (имена вне директории не принимаются)."""
+    directory = settings.PROFILING_DIR
+    if os.path.basename(name) != name or name.startswith("."):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
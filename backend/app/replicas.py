@@ -0,0 +1,361 @@
+"""
+Пул реплик модели в отдельных процессах.
+Каждая реплика закреплена за своим непересекающимся набором CPU,
+запросы направляются в наименее загруженную реплику. Завершившаяся
+реплика исключается из маршрутизации, ее незавершенные запросы получают ошибку.
+"""
+import os
+import queue
+import threading
+import time
+import zlib
+import multiprocessing as mp
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.autotune import load_profile
+from app.routing import resolve_model, vqa_task
+from app.metrics import INFERENCE_LATENCY
+
+
+# Как часто поток разбора ответов проверяет, живы ли процессы реплик (секунды)
+LIVENESS_INTERVAL = 1.0
+
+
+def available_cpus() -> List[int]:
+    """Возвращает список CPU, доступных текущему процессу."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cpus(cpus: List[int], replicas: int) -> List[List[int]]:
+    """
+    Делит CPU на непересекающиеся наборы для реплик.
+
+    Args:
+        cpus: Доступные CPU
+        replicas: Количество реплик
+
+    Returns:
+        List[List[int]]: Набор CPU для каждой реплики
+
+    Raises:
+        ValueError: Если CPU меньше, чем реплик
+    """
+    if replicas < 1:
+        raise ValueError("Количество реплик должно быть положительным")
+    if len(cpus) < replicas:
+        raise ValueError(f"Недостаточно CPU ({len(cpus)}) для {replicas} реплик")
+
+    base, extra = divmod(len(cpus), replicas)
+    sets = []
+    start = 0
+    for i in range(replicas):
+        size = base + (1 if i < extra else 0)
+        sets.append(list(cpus[start:start + size]))
+        start += size
+    return sets
+
+
+def _replica_worker(index: int, cpus: List[int], num_threads: int, tasks, results) -> None:
+    """Цикл процесса-реплики: загрузка модели и выполнение задач."""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    # OMP_NUM_THREADS должен быть выставлен до импорта torch
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    settings.TORCH_NUM_THREADS = num_threads
+
+    from app.model_manager import ModelManager
+
+    manager = ModelManager()
+    try:
+        manager.load_model()
+    except Exception as e:
+        results.put(("error", index, None, f"{type(e).__name__}: {e}"))
+        return
+    results.put(("ready", index, None, None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, method, args, kwargs = task
+        try:
+            value = getattr(manager, method)(*args, **kwargs)
+            results.put(("ok", index, task_id, value))
+        except Exception as e:
+            results.put(("fail", index, task_id, f"{type(e).__name__}: {e}"))
+
+
+class ReplicaPool:
+    """
+    Пул из K реплик ModelManager в процессах-воркерах.
+    Предоставляет тот же интерфейс инференса, что и ModelManager.
+    """
+
+    def __init__(self, replicas: int, threads_per_replica: int = 0, cpus: Optional[List[int]] = None):
+        self.cpu_sets = partition_cpus(cpus if cpus is not None else available_cpus(), replicas)
+        self.threads = [threads_per_replica or len(cpu_set) for cpu_set in self.cpu_sets]
+        self.in_flight = [0] * replicas
+        self._ready = [False] * replicas
+        self._alive = [True] * replicas
+        self._errors: List[str] = []
+        self._lock = threading.Lock()
+        self._started = threading.Event()
+        self._all_ready = threading.Condition(self._lock)
+        self._futures: Dict[int, Tuple[int, Future]] = {}
+        self._task_ids = count()
+        self._processes: List[Any] = []
+        self._task_queues: List[Any] = []
+        self._results = None
+        self._collector: Optional[threading.Thread] = None
+
+    @property
+    def replicas(self) -> int:
+        return len(self.cpu_sets)
+
+    def start(self) -> None:
+        """Запускает процессы-реплики."""
+        with self._lock:
+            if self._started.is_set():
+                return
+            self._started.set()
+
+        ctx = mp.get_context("spawn")
+        self._results = ctx.Queue()
+        for index, (cpu_set, threads) in enumerate(zip(self.cpu_sets, self.threads)):
+            tasks = ctx.Queue()
+            process = ctx.Process(
+                target=_replica_worker,
+                args=(index, cpu_set, threads, tasks, self._results),
+                daemon=True,
+                name=f"model-replica-{index}"
+            )
+            process.start()
+            self._task_queues.append(tasks)
+            self._processes.append(process)
+            print(f"Реплика {index} запущена на CPU {cpu_set} ({threads} потоков)")
+
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+
+    def load_model(self) -> None:
+        """
+        Запускает реплики и блокируется, пока каждая не загрузит модель или не завершится.
+
+        Raises:
+            RuntimeError: Если модель не загрузилась ни в одной реплике
+        """
+        self.start()
+        with self._all_ready:
+            self._all_ready.wait_for(self._loading_finished)
+            if self._errors:
+                message = "; ".join(self._errors)
+                if not any(self._ready):
+                    raise RuntimeError(message)
+                print(f"Часть реплик недоступна: {message}")
+
+    def _loading_finished(self) -> bool:
+        return all(ready or not alive for ready, alive in zip(self._ready, self._alive))
+
+    def is_loaded(self) -> bool:
+        """Проверяет, что загрузка реплик завершена и хотя бы одна из них готова."""
+        return any(self._ready) and self._loading_finished()
+
+    def get_profile(self) -> Optional[dict]:
+        """Возвращает профиль автотюнера, который загружают реплики."""
+        if not settings.AUTOTUNE:
+            return None
+        return load_profile()
+
+    def stop(self) -> None:
+        """Останавливает процессы-реплики."""
+        with self._lock:
+            # Остановленные реплики не считаются упавшими
+            self._alive = [False] * self.replicas
+            self._ready = [False] * self.replicas
+        for tasks in self._task_queues:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+
+    def _pick_replica(self) -> int:
+        """Выбирает готовую реплику с наименьшим числом задач в работе."""
+        candidates = [i for i in range(self.replicas) if self._ready[i]]
+        if not candidates:
+            raise RuntimeError("Нет готовых реплик модели")
+        return min(candidates, key=lambda i: self.in_flight[i])
+
+    def submit(self, method: str, *args, **kwargs) -> Future:
+        """
+        Отправляет вызов метода ModelManager в наименее загруженную реплику.
+
+        Returns:
+            Future: Результат вызова
+        """
+        with self._lock:
+            index = self._pick_replica()
+        return self._submit_to(index, method, *args, **kwargs)
+
+    def submit_affine(self, key: str, method: str, *args, **kwargs) -> Future:
+        """
+        Отправляет вызов в реплику, закрепленную за ключом (например, сессией
+        с KV-кэшем в памяти реплики). Если она не готова - в наименее загруженную.
+        """
+        index = zlib.crc32(key.encode("utf-8")) % self.replicas
+        with self._lock:
+            if not self._ready[index]:
+                index = self._pick_replica()
+        return self._submit_to(index, method, *args, **kwargs)
+
+    def _submit_to(self, index: int, method: str, *args, **kwargs) -> Future:
+        """Отправляет вызов метода в конкретную реплику."""
+        future: Future = Future()
+        with self._lock:
+            if not self._alive[index]:
+                raise RuntimeError(f"Реплика {index} недоступна")
+            task_id = next(self._task_ids)
+            self.in_flight[index] += 1
+            self._futures[task_id] = (index, future)
+        self._task_queues[index].put((task_id, method, args, kwargs))
+        return future
+
+    def broadcast(self, method: str, *args, **kwargs) -> List[Any]:
+        """
+        Вызывает метод во всех готовых репликах и возвращает результаты ответивших
+        за REPLICA_BROADCAST_TIMEOUT; ошибки и таймауты отдельных реплик пропускаются.
+        """
+        futures = [
+            (index, self._submit_to(index, method, *args, **kwargs))
+            for index in range(self.replicas) if self._ready[index]
+        ]
+        deadline = time.monotonic() + settings.REPLICA_BROADCAST_TIMEOUT
+        results = []
+        for index, future in futures:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                print(f"Реплика {index} не ответила на {method}")
+            except Exception as e:
+                print(f"Ошибка реплики {index} в {method}: {e}")
+        return results
+
+    def _collect_results(self) -> None:
+        """Фоновый поток, разбирающий ответы реплик и следящий за их процессами."""
+        while True:
+            try:
+                self._handle_result(*self._results.get(timeout=LIVENESS_INTERVAL))
+            except queue.Empty:
+                pass
+            self._check_processes()
+
+    def _handle_result(self, kind: str, index: int, task_id: Optional[int], payload: Any) -> None:
+        with self._lock:
+            if kind == "ready":
+                self._ready[index] = True
+                self._all_ready.notify_all()
+                return
+            if kind == "error":
+                self._errors.append(f"Реплика {index}: {payload}")
+                self._alive[index] = False
+                self._all_ready.notify_all()
+                return
+            entry = self._futures.pop(task_id, None)
+            if entry is None:
+                # Запрос уже завершен ошибкой при обнаружении падения реплики
+                return
+            self.in_flight[index] -= 1
+        future = entry[1]
+        if kind == "ok":
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(payload))
+
+    def _check_processes(self) -> None:
+        """Исключает завершившиеся реплики и завершает ошибкой их незавершенные запросы."""
+        for index, process in enumerate(self._processes):
+            if not self._alive[index] or process.is_alive():
+                continue
+            # Ответы, отправленные репликой до завершения, разбираются первыми
+            while True:
+                try:
+                    self._handle_result(*self._results.get_nowait())
+                except queue.Empty:
+                    break
+            self._mark_dead(index, f"процесс завершился с кодом {process.exitcode}")
+
+    def _mark_dead(self, index: int, reason: str) -> None:
+        with self._lock:
+            if not self._alive[index]:
+                return
+            self._alive[index] = False
+            self._ready[index] = False
+            self._errors.append(f"Реплика {index}: {reason}")
+            self.in_flight[index] = 0
+            orphaned = [task_id for task_id, (owner, _) in self._futures.items() if owner == index]
+            futures = [self._futures.pop(task_id)[1] for task_id in orphaned]
+            self._all_ready.notify_all()
+        print(f"Реплика {index} недоступна: {reason}")
+        for future in futures:
+            future.set_exception(RuntimeError(f"Реплика {index} недоступна: {reason}"))
+
+    def unload_idle_models(self, idle_seconds: int) -> List[str]:
+        unloaded = set()
+        for aliases in self.broadcast("unload_idle_models", idle_seconds):
+            unloaded.update(aliases)
+        return sorted(unloaded)
+
+    def expire_session_caches(self, idle_seconds: float) -> int:
+        return sum(self.broadcast("expire_session_caches", idle_seconds))
+
+    def loaded_models(self) -> Dict[str, dict]:
+        models: Dict[str, dict] = {}
+        for replica_models in self.broadcast("loaded_models"):
+            for alias, info in replica_models.items():
+                models.setdefault(alias, info)
+        return models
+
+    def vqa_inference(self, image, question: Optional[str] = None, model: Optional[str] = None,
+                      max_new_tokens: int = 512) -> str:
+        if isinstance(image, list) and len(image) > 1:
+            task = vqa_task([question])
+            with INFERENCE_LATENCY.labels(resolve_model(task, model), task).time():
+                return self.submit("vqa_inference", image, question, model, max_new_tokens).result()
+        if isinstance(image, list):
+            image = image[0]
+        return self.vqa_batch_inference([image], [question], max_new_tokens, model)[0]
+
+    def ocr_inference(self, image, model: Optional[str] = None, max_new_tokens: int = 512) -> str:
+        return self.ocr_batch_inference([image], max_new_tokens, model)[0]
+
+    # Метрики инференса собираются в родительском процессе: реплики - отдельные процессы
+    def vqa_batch_inference(self, images, questions, max_new_tokens: int = 512, model: Optional[str] = None):
+        task = vqa_task(questions)
+        with INFERENCE_LATENCY.labels(resolve_model(task, model), task).time():
+            return self.submit("vqa_batch_inference", images, questions, max_new_tokens, model).result()
+
+    def vqa_multi_inference(self, image, questions, max_new_tokens: int = 512, model: Optional[str] = None):
+        task = vqa_task(questions)
+        with INFERENCE_LATENCY.labels(resolve_model(task, model), task).time():
+            return self.submit("vqa_multi_inference", image, questions, max_new_tokens, model).result()
+
+    def chat_inference(self, image, session_id: str, history, question: Optional[str] = None,
+                       max_new_tokens: int = 512, model: Optional[str] = None):
+        task = vqa_task([question])
+        with INFERENCE_LATENCY.labels(resolve_model(task, model), task).time():
+            return self.submit_affine(session_id, "chat_inference", image, session_id, history, question,
+                                      max_new_tokens, model).result()
+
+    def video_inference(self, frames, question: Optional[str] = None, max_new_tokens: int = 512,
+                        model: Optional[str] = None):
+        task = vqa_task([question])
+        with INFERENCE_LATENCY.labels(resolve_model(task, model), task).time():
+            return self.submit("video_inference", frames, question, max_new_tokens, model).result()
+
+    def ocr_batch_inference(self, images, max_new_tokens: int = 512, model: Optional[str] = None):
+        with INFERENCE_LATENCY.labels(resolve_model("ocr", model), "ocr").time():
+            return self.submit("ocr_batch_inference", images, max_new_tokens, model).result()
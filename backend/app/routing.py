@@ -0,0 +1,45 @@
+"""
+Реестр моделей и маршрутизация задач между ними.
+"""
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+
+DEFAULT_MODEL = "default"
+TASKS = ("caption", "vqa", "ocr")
+
+
+def model_registry() -> Dict[str, str]:
+    """
+    Возвращает реестр моделей: псевдоним -> имя модели на HuggingFace.
+    Псевдоним "default" всегда указывает на MODEL_NAME.
+    """
+    return {**settings.MODEL_REGISTRY, DEFAULT_MODEL: settings.MODEL_NAME}
+
+
+def resolve_model(task: str, override: Optional[str] = None) -> str:
+    """
+    Определяет псевдоним модели для задачи.
+
+    Args:
+        task: Задача (caption, vqa, ocr)
+        override: Псевдоним из запроса, имеет приоритет над правилами
+
+    Returns:
+        str: Псевдоним модели из реестра
+    """
+    registry = model_registry()
+    if override:
+        if override not in registry:
+            raise KeyError(override)
+        return override
+    alias = settings.MODEL_ROUTES.get(task, DEFAULT_MODEL)
+    return alias if alias in registry else DEFAULT_MODEL
+
+
+def vqa_task(questions: List[Optional[str]]) -> str:
+    """Задача для набора вопросов: caption, если все вопросы пустые, иначе vqa."""
+    if all(question is None or not question.strip() for question in questions):
+        return "caption"
+    return "vqa"
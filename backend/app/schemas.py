@@ -2,20 +2,79 @@
 Pydantic схемы для валидации входных и выходных данных API.
 """
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, Any, Dict, List
 
 
 class VQARequest(BaseModel):
     """Схема запроса для Visual Question Answering."""
     image: str = Field(..., description="Base64-encoded изображение")
+    images: Optional[List[str]] = Field(None, description="Дополнительные base64-encoded изображения того же промпта")
+    image_ids: Optional[List[str]] = Field(None, description="ID сессий, изображения которых добавляются в промпт")
     question: Optional[str] = Field(None, description="Вопрос об изображении (опционально)")
     session_id: Optional[str] = Field(None, description="ID сессии для сохранения изображения")
+    model: Optional[str] = Field(None, description="Псевдоним модели из реестра (по умолчанию - по правилам маршрутизации)")
+    max_new_tokens: Optional[int] = Field(None, ge=1, description="Лимит генерируемых токенов (по умолчанию - оценка сервера)")
+    latency_budget_ms: Optional[int] = Field(None, ge=1, description="Бюджет задержки генерации в миллисекундах")
 
 
 class VQAResponse(BaseModel):
     """Схема ответа для Visual Question Answering."""
     answer: str = Field(..., description="Ответ модели")
     session_id: str = Field(..., description="ID сессии")
+    max_new_tokens: Optional[int] = Field(None, description="Примененный лимит генерируемых токенов")
+    timestamp: str = Field(..., description="Временная метка ответа")
+
+
+class SessionRequest(BaseModel):
+    """Схема запроса создания сессии."""
+    image: str = Field(..., description="Base64-encoded изображение")
+
+
+class SessionResponse(BaseModel):
+    """Схема ответа создания сессии."""
+    session_id: str = Field(..., description="ID сессии")
+    precaption: bool = Field(False, description="Описание изображения готовится в фоне")
+
+
+class VQABatchRequest(BaseModel):
+    """Схема запроса нескольких вопросов к одному изображению."""
+    image: Optional[str] = Field(None, description="Base64-encoded изображение (можно не передавать при существующей сессии)")
+    questions: List[Optional[str]] = Field(..., min_length=1, description="Вопросы к изображению (пустой вопрос - описание)")
+    session_id: Optional[str] = Field(None, description="ID сессии с сохраненным изображением")
+    model: Optional[str] = Field(None, description="Псевдоним модели из реестра (по умолчанию - по правилам маршрутизации)")
+    max_new_tokens: Optional[int] = Field(None, ge=1, description="Лимит генерируемых токенов на ответ (по умолчанию - оценка сервера)")
+    latency_budget_ms: Optional[int] = Field(None, ge=1, description="Бюджет задержки генерации в миллисекундах")
+
+
+class VQABatchAnswer(BaseModel):
+    """Ответ на один вопрос из пакета."""
+    question: Optional[str] = Field(None, description="Вопрос")
+    answer: str = Field(..., description="Ответ модели")
+    tokens: int = Field(..., description="Число сгенерированных токенов")
+    latency_ms: float = Field(..., description="Время от начала обработки до готовности ответа")
+
+
+class VQABatchResponse(BaseModel):
+    """Схема ответа на несколько вопросов к одному изображению."""
+    answers: List[VQABatchAnswer] = Field(..., description="Ответы в порядке вопросов")
+    session_id: str = Field(..., description="ID сессии")
+    max_new_tokens: Optional[int] = Field(None, description="Примененный лимит генерируемых токенов")
+    timestamp: str = Field(..., description="Временная метка ответа")
+
+
+class VideoFrame(BaseModel):
+    """Кадр видео, переданный модели."""
+    index: int = Field(..., description="Номер кадра в клипе")
+    timestamp: float = Field(..., description="Время кадра в секундах")
+
+
+class VideoResponse(BaseModel):
+    """Схема ответа по видео."""
+    answer: str = Field(..., description="Ответ модели")
+    frames: List[VideoFrame] = Field(..., description="Кадры, переданные модели, в хронологическом порядке")
+    candidates: int = Field(..., description="Кадров выбрано до удаления почти дубликатов")
+    duration: Optional[float] = Field(None, description="Длительность клипа в секундах")
+    max_new_tokens: Optional[int] = Field(None, description="Примененный лимит генерируемых токенов")
     timestamp: str = Field(..., description="Временная метка ответа")
 
 
@@ -23,6 +82,10 @@ class OCRRequest(BaseModel):
     """Схема запроса для OCR."""
     image: str = Field(..., description="Base64-encoded изображение")
     language: Optional[str] = Field("en", description="Язык распознавания (en, ru)")
+    model: Optional[str] = Field(None, description="Псевдоним модели из реестра (по умолчанию - по правилам маршрутизации)")
+    max_new_tokens: Optional[int] = Field(None, ge=1, description="Лимит генерируемых токенов (по умолчанию - оценка сервера)")
+    latency_budget_ms: Optional[int] = Field(None, ge=1, description="Бюджет задержки генерации в миллисекундах")
+    tiled: bool = Field(False, description="Распознавать высокую страницу перекрывающимися полосами одним батчем")
 
 
 class OCRResponse(BaseModel):
@@ -30,6 +93,30 @@ class OCRResponse(BaseModel):
     text: str = Field(..., description="Извлеченный текст")
     download_url: str = Field(..., description="URL для скачивания результата")
     task_id: str = Field(..., description="ID задачи для скачивания")
+    max_new_tokens: Optional[int] = Field(None, description="Примененный лимит генерируемых токенов")
+    tiles: int = Field(1, description="Число полос, на которые была разбита страница")
+
+
+class OCRJobRequest(BaseModel):
+    """Схема запроса создания задания OCR."""
+    images: List[str] = Field(..., min_length=1, description="Base64-encoded изображения страниц в порядке документа")
+    language: Optional[str] = Field("en", description="Язык распознавания (en, ru)")
+    model: Optional[str] = Field(None, description="Псевдоним модели из реестра (по умолчанию - по правилам маршрутизации)")
+    max_new_tokens: Optional[int] = Field(None, ge=1, description="Лимит генерируемых токенов на страницу (по умолчанию - оценка сервера)")
+
+
+class OCRJobResponse(BaseModel):
+    """Схема состояния задания OCR."""
+    job_id: str = Field(..., description="ID задания")
+    status: str = Field(..., description="Состояние: queued, running, done")
+    total: int = Field(..., description="Всего страниц")
+    completed: int = Field(..., description="Распознано страниц")
+    failed: int = Field(..., description="Страниц с ошибкой")
+    progress: float = Field(..., description="Доля обработанных страниц")
+    created_at: float = Field(..., description="Время создания (unix)")
+    finished_at: Optional[float] = Field(None, description="Время завершения (unix)")
+    status_url: str = Field(..., description="URL состояния задания")
+    result_url: str = Field(..., description="URL результата (?format=jsonl или zip)")
 
 
 class ErrorResponse(BaseModel):
@@ -44,4 +131,19 @@ class HealthResponse(BaseModel):
     status: str = Field(..., description="Статус сервиса")
     model_loaded: bool = Field(..., description="Загружена ли модель")
     device: str = Field(..., description="Устройство (CPU/CUDA)")
+    profile: Optional[Dict[str, Any]] = Field(None, description="Профиль инференса, выбранный автотюнером")
+    models: Dict[str, Any] = Field(default_factory=dict, description="Модели реестра: состояние и задержки")
+    precaption_on_upload: bool = Field(False, description="Готовит ли сервер описание при создании сессии")
+
+
+
+class TorchProfileRequest(BaseModel):
+    """Схема запроса захвата torch.profiler."""
+    requests: int = Field(1, ge=1, description="Сколько следующих инференсов профилировать")
+    seconds: Optional[float] = Field(None, gt=0, description="Окно захвата в секундах (по умолчанию - максимум)")
+
 
+class StackProfileRequest(BaseModel):
+    """Схема запроса семплирования стеков."""
+    seconds: float = Field(30, gt=0, description="Длительность семплирования в секундах")
+    interval_ms: float = Field(10, ge=1, description="Интервал между снимками стеков в миллисекундах")
@@ -0,0 +1,73 @@
+"""
+Спекулятивное декодирование с маленькой draft-моделью.
+Draft-модель предлагает токены, основная модель проверяет их одним проходом.
+При жадном декодировании результат совпадает с обычной генерацией.
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Tuple
+
+import torch
+
+
+def is_draft_compatible(main_processor, draft_processor) -> bool:
+    """
+    Проверяет, что draft-модель понимает те же входы, что и основная:
+    одинаковый словарь токенизатора и одинаковое число токенов на изображение.
+    """
+    if main_processor.tokenizer.get_vocab() != draft_processor.tokenizer.get_vocab():
+        return False
+    return getattr(main_processor, "image_seq_len", None) == getattr(draft_processor, "image_seq_len", None)
+
+
+def configure_draft(draft_model, num_tokens: int, confidence_threshold: float) -> None:
+    """Настраивает генерацию кандидатов draft-модели (фиксированное число токенов за шаг)."""
+    config = draft_model.generation_config
+    config.num_assistant_tokens = num_tokens
+    config.num_assistant_tokens_schedule = "constant"
+    if hasattr(config, "assistant_confidence_threshold"):
+        config.assistant_confidence_threshold = confidence_threshold
+
+
+@contextmanager
+def _count_forward_calls(module, counter: Dict[str, int], key: str):
+    """Считает вызовы forward модуля на время блока."""
+    def hook(*_):
+        counter[key] += 1
+    handle = module.register_forward_hook(hook)
+    try:
+        yield
+    finally:
+        handle.remove()
+
+
+def assisted_generate(model, draft_model, inputs: Dict[str, Any],
+                      **generate_kwargs) -> Tuple[torch.Tensor, Dict[str, float]]:
+    """
+    Генерирует с помощью draft-модели и считает долю принятых токенов.
+
+    Каждая итерация: draft делает k проходов (k кандидатов), основная модель -
+    один проверочный проход, принимая совпавшие кандидаты и добавляя свой токен.
+    Отсюда принятые = новые токены - итерации.
+
+    Args:
+        model: Основная модель
+        draft_model: Draft-модель с тем же токенизатором
+        inputs: Входы процессора
+        **generate_kwargs: Параметры generate (жадное декодирование)
+
+    Returns:
+        Tuple[torch.Tensor, Dict[str, float]]: Сгенерированные id и статистика
+    """
+    counter = {"verify": 0, "draft": 0}
+    with _count_forward_calls(model, counter, "verify"), _count_forward_calls(draft_model, counter, "draft"):
+        generated_ids = model.generate(**inputs, assistant_model=draft_model, **generate_kwargs)
+
+    new_tokens = generated_ids.shape[1] - inputs["input_ids"].shape[1]
+    accepted = max(0, new_tokens - counter["verify"])
+    proposed = counter["draft"]
+    return generated_ids, {
+        "new_tokens": new_tokens,
+        "proposed_tokens": proposed,
+        "accepted_tokens": min(accepted, proposed),
+        "acceptance_rate": min(1.0, accepted / proposed) if proposed else 0.0,
+    }
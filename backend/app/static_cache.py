@@ -0,0 +1,148 @@
+"""
+Кэш статического frontend в памяти.
+
+Файлы читаются и сжимаются один раз при запуске: запрос страницы не
+обращается к диску и не тратит CPU процесса инференса на сжатие. Для
+каждого файла хранятся варианты gzip и brotli (если установлен пакет
+brotli), если они меньше исходного, и строгий ETag по содержимому -
+свой для каждого варианта, так как их тела различаются.
+
+Ссылки index.html на /static/ переписываются в версионированные
+(/static/app.js?v=<хэш>): такие ответы кэшируются браузером навсегда,
+а после изменения файла меняется и URL. Сам index.html и запросы без
+версии отдаются с no-cache и перепроверяются по If-None-Match (304).
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, List, Optional
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Cache-Control версионированных ресурсов (год) и всех остальных ответов
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+STATIC_LINK = re.compile(r'(src|href)="/static/([^"?#]+)"')
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Кодировки из Accept-Encoding, кроме запрещенных через q=0."""
+    encodings = []
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        quality = params.strip().partition("q=")[2]
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        encodings.append(name.strip())
+    return encodings
+
+
+class StaticAsset:
+    """
+    Файл frontend с заранее сжатыми вариантами.
+
+    Args:
+        content: Содержимое файла
+        media_type: MIME-тип
+    """
+
+    def __init__(self, content: bytes, media_type: str):
+        self.media_type = media_type
+        self.version = hashlib.sha256(content).hexdigest()[:16]
+        self.variants: Dict[str, bytes] = {"identity": content}
+        compressed = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(content, quality=11)
+        for encoding, body in compressed.items():
+            if len(body) < len(content):
+                self.variants[encoding] = body
+        self.etags: Dict[str, str] = {
+            encoding: f'"{self.version}"' if encoding == "identity" else f'"{self.version}-{encoding}"'
+            for encoding in self.variants
+        }
+
+    def select(self, accept_encoding: str) -> str:
+        """Наименьший вариант из принимаемых клиентом (identity - всегда)."""
+        accepted = accepted_encodings(accept_encoding)
+        candidates = [encoding for encoding in self.variants if encoding == "identity" or encoding in accepted]
+        return min(candidates, key=lambda encoding: len(self.variants[encoding]))
+
+
+class StaticCache:
+    """
+    Файлы каталога frontend в памяти.
+
+    Args:
+        directory: Каталог frontend (отсутствующий каталог - пустой кэш)
+    """
+
+    def __init__(self, directory: str):
+        self.assets: Dict[str, StaticAsset] = {}
+        if not os.path.isdir(directory):
+            return
+        files = {}
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                with open(path, "rb") as f:
+                    files[os.path.relpath(path, directory).replace(os.sep, "/")] = f.read()
+        for name, content in files.items():
+            if name != "index.html":
+                self.assets[name] = StaticAsset(content, self._media_type(name))
+        if "index.html" in files:
+            html = STATIC_LINK.sub(self._versioned_link, files["index.html"].decode("utf-8"))
+            self.assets["index.html"] = StaticAsset(html.encode("utf-8"), "text/html; charset=utf-8")
+
+    @staticmethod
+    def _media_type(name: str) -> str:
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+            media_type += "; charset=utf-8"
+        return media_type
+
+    def _versioned_link(self, match: "re.Match") -> str:
+        attribute, name = match.groups()
+        asset = self.assets.get(name)
+        if asset is None:
+            return match.group(0)
+        return f'{attribute}="/static/{name}?v={asset.version}"'
+
+    def response(self, name: str, headers, version: Optional[str] = None) -> Optional[Response]:
+        """
+        Ответ для файла name.
+
+        Args:
+            name: Путь файла относительно каталога frontend
+            headers: Заголовки запроса
+            version: Параметр v из URL (совпадает с версией - кэшировать навсегда)
+
+        Returns:
+            Optional[Response]: 200 или 304; None, если файла нет
+        """
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        encoding = asset.select(headers.get("accept-encoding", ""))
+        cache_control = IMMUTABLE_CACHE_CONTROL if version == asset.version else REVALIDATE_CACHE_CONTROL
+        response_headers = {"ETag": asset.etags[encoding], "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if_none_match = headers.get("if-none-match", "")
+        # If-None-Match сравнивается слабо (W/"..." совпадает с тем же строгим ETag) и с ETag
+        # любого варианта: содержимое то же, в ответе 304 - ETag варианта для этого клиента
+        if if_none_match.strip() == "*" or not set(asset.etags.values()).isdisjoint(
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        ):
+            return Response(status_code=304, headers=response_headers)
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return Response(content=asset.variants[encoding], media_type=asset.media_type, headers=response_headers)
@@ -0,0 +1,120 @@
+"""
+Тайловый OCR: разбиение высоких страниц на перекрывающиеся горизонтальные
+полосы и склейка распознанного текста с удалением строк из перекрытия.
+"""
+from difflib import SequenceMatcher
+from typing import List
+
+from PIL import Image
+
+
+# Сколько строк на границе полос сравнивается при поиске перекрытия
+OVERLAP_MAX_LINES = 8
+# Минимальная похожесть строк, распознанных в двух полосах, чтобы считать их одной строкой
+LINE_SIMILARITY = 0.85
+# Строки короче сравниваются только точно
+MIN_FUZZY_LENGTH = 12
+# Минимальная длина обрезка строки на краю полосы
+MIN_FRAGMENT_LENGTH = 4
+
+
+def split_strips(image: Image.Image, tile_height: int, overlap: int) -> List[Image.Image]:
+    """
+    Разбивает изображение на горизонтальные полосы во всю ширину.
+
+    Соседние полосы перекрываются на overlap пикселей, чтобы строка,
+    разрезанная границей одной полосы, целиком попала в соседнюю.
+    Изображение не выше tile_height + overlap возвращается одной полосой.
+
+    Args:
+        image: PIL изображение
+        tile_height: Высота полосы в пикселях
+        overlap: Перекрытие соседних полос в пикселях
+
+    Returns:
+        List[Image.Image]: Полосы сверху вниз
+    """
+    width, height = image.size
+    overlap = max(0, min(overlap, tile_height // 2))
+    if height <= tile_height + overlap:
+        return [image]
+
+    step = tile_height - overlap
+    count = -(-(height - overlap) // step)
+    # Полосы одинаковой высоты, равномерно распределенные по странице
+    strip_height = -(-(height + (count - 1) * overlap) // count)
+    tops = [round(i * (height - strip_height) / (count - 1)) for i in range(count)]
+    return [image.crop((0, top, width, top + strip_height)) for top in tops]
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.lower().split())
+
+
+def _similar(a: str, b: str) -> bool:
+    """Одна и та же строка, распознанная в двух полосах (короткие строки - только точно)."""
+    if a == b:
+        return True
+    return min(len(a), len(b)) >= MIN_FUZZY_LENGTH and SequenceMatcher(None, a, b).ratio() >= LINE_SIMILARITY
+
+
+def _is_fragment(fragment: str, lines: List[str]) -> bool:
+    """Строка - обрезок одной из lines (распознана по части высоты на границе полосы)."""
+    return len(fragment) >= MIN_FRAGMENT_LENGTH and any(
+        fragment != line and fragment in line for line in lines
+    )
+
+
+def merge_overlap(previous: List[str], current: List[str]) -> List[str]:
+    """
+    Склеивает строки двух соседних полос, удаляя строки перекрытия.
+
+    Перебираются варианты границы: с обрезком строки в конце верхней полосы
+    и в начале нижней или без них; выбирается вариант с наибольшим числом
+    совпавших строк перекрытия.
+
+    Args:
+        previous: Непустые строки верхней полосы
+        current: Непустые строки нижней полосы
+
+    Returns:
+        List[str]: Строки обеих полос без дубликатов на границе
+    """
+    tail = [_normalize(line) for line in previous[-OVERLAP_MAX_LINES:]]
+    head = [_normalize(line) for line in current[:OVERLAP_MAX_LINES]]
+
+    best = (0, 0, 0)
+    for drop in (0, 1):
+        if drop and not (len(tail) > 1 and _is_fragment(tail[-1], head)):
+            continue
+        for skip in (0, 1):
+            if skip and not (len(head) > 1 and _is_fragment(head[0], tail)):
+                continue
+            upper, lower = tail[:len(tail) - drop], head[skip:]
+            matched = next(
+                (k for k in range(min(len(upper), len(lower)), 0, -1)
+                 if all(_similar(a, b) for a, b in zip(upper[-k:], lower[:k]))),
+                0
+            )
+            if matched + drop + skip > sum(best):
+                best = (matched, drop, skip)
+
+    matched, drop, skip = best
+    return previous[:len(previous) - drop] + current[skip + matched:]
+
+
+def merge_tile_texts(texts: List[str]) -> str:
+    """
+    Объединяет тексты полос сверху вниз в текст страницы.
+
+    Args:
+        texts: Распознанный текст каждой полосы
+
+    Returns:
+        str: Текст страницы
+    """
+    lines: List[str] = []
+    for text in texts:
+        current = [line for line in text.split("\n") if line.strip()]
+        lines = merge_overlap(lines, current) if lines else current
+    return "\n".join(lines)
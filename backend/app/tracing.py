@@ -0,0 +1,198 @@
+"""
+Трассировка запросов: длительности стадий для заголовка Server-Timing
+и выборочная запись спанов в локальный JSONL файл.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+
+class Trace:
+    """
+    Спаны одного запроса.
+    Время хранится в perf_counter и переводится в wall-clock только при экспорте.
+    """
+
+    def __init__(self, sampled: bool = False):
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.started_wall = time.time()
+        self.spans: List[Tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float) -> None:
+        """Добавляет завершенный спан (границы в perf_counter)."""
+        with self._lock:
+            self.spans.append((name, start, end))
+
+    def stage_durations(self) -> Dict[str, float]:
+        """Суммарная длительность стадий в миллисекундах в порядке первого появления."""
+        durations: Dict[str, float] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for name, start, end in spans:
+            durations[name] = durations.get(name, 0.0) + (end - start) * 1000
+        return durations
+
+    def server_timing(self, finished: Optional[float] = None) -> str:
+        """
+        Значение заголовка Server-Timing.
+
+        Args:
+            finished: Момент окончания (perf_counter), по умолчанию - текущий
+
+        Returns:
+            str: Например "base64_decode;dur=1.2, preprocess;dur=35.0, total;dur=812.4"
+        """
+        finished = time.perf_counter() if finished is None else finished
+        parts = [f"{name};dur={duration:.1f}" for name, duration in self.stage_durations().items()]
+        parts.append(f"total;dur={(finished - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_records(self, name: str, finished: float,
+                   attributes: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Преобразует трассу в записи спанов: корневой спан запроса и дочерние стадии.
+
+        Args:
+            name: Имя корневого спана
+            finished: Момент окончания запроса (perf_counter)
+            attributes: Атрибуты корневого спана
+
+        Returns:
+            List[Dict[str, Any]]: Записи для экспорта
+        """
+        trace_id = os.urandom(16).hex()
+        root_id = os.urandom(8).hex()
+
+        def record(span_name, span_id, parent_id, start, end, attrs=None):
+            return {
+                "trace_id": trace_id,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "name": span_name,
+                "start_time": round(self.started_wall + (start - self.started), 6),
+                "duration_ms": round((end - start) * 1000, 3),
+                "attributes": attrs or {},
+            }
+
+        with self._lock:
+            spans = list(self.spans)
+        span_ids = [os.urandom(8).hex() for _ in spans]
+        records = [record(name, root_id, None, self.started, finished, attributes)]
+        for index, (span_name, start, end) in enumerate(spans):
+            # Родитель - самый короткий спан, целиком содержащий текущий (например, inference)
+            parent_id, parent_length = root_id, None
+            for other, (_, other_start, other_end) in enumerate(spans):
+                if other != index and other_start <= start and end <= other_end:
+                    length = other_end - other_start
+                    if length > end - start and (parent_length is None or length < parent_length):
+                        parent_id, parent_length = span_ids[other], length
+            records.append(record(span_name, span_ids[index], parent_id, start, end))
+        return records
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def start_trace(sampled: bool = False) -> Tuple[Trace, Token]:
+    """Создает трассу и делает ее текущей для контекста запроса."""
+    trace = Trace(sampled)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: Token) -> None:
+    """Снимает текущую трассу."""
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    """Текущая трасса или None вне запроса."""
+    return _current_trace.get()
+
+
+def record_span(name: str, start: float, end: float) -> None:
+    """Записывает спан в текущую трассу, если она есть."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start, end)
+
+
+def should_sample() -> bool:
+    """Решает, экспортировать ли трассу запроса (TRACING_ENABLED и TRACE_SAMPLE_RATE)."""
+    return settings.TRACING_ENABLED and random.random() < settings.TRACE_SAMPLE_RATE
+
+
+class JsonlExporter:
+    """
+    Дописывает спаны в JSONL файл, по одной записи на строку.
+
+    export() только ставит трассу в ограниченную очередь; сериализацию и запись
+    на диск выполняет один фоновый поток, поэтому запрос не ждет диска и не
+    конкурирует за файл с другими запросами. При переполненной очереди трасса
+    отбрасывается.
+
+    Args:
+        path: Путь к файлу трасс
+        max_pending: Сколько трасс может ждать записи
+    """
+
+    def __init__(self, path: str, max_pending: int = 1024):
+        self.path = path
+        self.dropped = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._queue: "queue.Queue[List[Dict[str, Any]]]" = queue.Queue(maxsize=max_pending)
+        self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+        self._writer.start()
+
+    def export(self, records: List[Dict[str, Any]]) -> None:
+        """Ставит записи трассы в очередь на запись (не блокирует)."""
+        try:
+            self._queue.put_nowait(records)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """Ждет записи всех поставленных в очередь трасс."""
+        self._queue.join()
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            # Накопившиеся трассы пишутся одним открытием файла
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                lines = "".join(
+                    json.dumps(record, ensure_ascii=False) + "\n" for records in batch for record in records
+                )
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                print(f"Ошибка при записи трассы: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+_exporter: Optional[JsonlExporter] = None
+
+
+def get_exporter() -> JsonlExporter:
+    """Экспортер для TRACE_EXPORT_PATH."""
+    global _exporter
+    if _exporter is None or _exporter.path != settings.TRACE_EXPORT_PATH:
+        _exporter = JsonlExporter(settings.TRACE_EXPORT_PATH)
+    return _exporter
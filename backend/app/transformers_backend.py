@@ -0,0 +1,325 @@
+"""
+Бэкенд инференса на transformers и torch.
+"""
+import inspect
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from transformers import AutoProcessor, AutoModelForImageTextToText, LogitsProcessor, LogitsProcessorList
+from transformers.modeling_outputs import BaseModelOutputWithPooling
+
+from app.backend import InferenceBackend
+from app.config import settings
+from app.kv_cache import reusable_prefix
+from app.speculative import is_draft_compatible, configure_draft, assisted_generate
+
+
+TORCH_DTYPES = {
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+    "float32": torch.float32,
+}
+
+
+def configure_torch_threads(num_threads: int = 0, num_interop_threads: int = 0) -> None:
+    """
+    Настраивает число потоков torch для intra-op и inter-op параллелизма.
+
+    Args:
+        num_threads: Число intra-op потоков (0 - значение torch по умолчанию)
+        num_interop_threads: Число inter-op потоков (0 - значение torch по умолчанию)
+    """
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError:
+            # inter-op пул можно настроить только до первой параллельной операции
+            print("Предупреждение: inter-op потоки torch уже инициализированы")
+
+
+def accepts_encoder_outputs(model) -> bool:
+    """Принимает ли модель готовые признаки изображений (mm_encoder_outputs) вместо pixel_values."""
+    base = getattr(model, "model", None)
+    return hasattr(model, "get_image_features") and base is not None and (
+        "mm_encoder_outputs" in inspect.signature(base.forward).parameters
+    )
+
+
+class FirstTokenTimer(LogitsProcessor):
+    """
+    Фиксирует моменты вызовов logits processor: первый - окончание prefill,
+    k-й - выбор k-го нового токена.
+    Не изменяет scores, поэтому не влияет на результат генерации.
+    """
+
+    def __init__(self):
+        self.step_times: List[float] = []
+
+    @property
+    def first_token_at(self) -> Optional[float]:
+        return self.step_times[0] if self.step_times else None
+
+    def __call__(self, input_ids, scores):
+        self.step_times.append(time.perf_counter())
+        return scores
+
+
+class TransformersBackend(InferenceBackend):
+    """Модели AutoModelForImageTextToText на CPU или CUDA."""
+
+    name = "transformers"
+
+    def configure_threads(self, num_threads: int = 0, num_interop_threads: int = 0) -> None:
+        configure_torch_threads(num_threads, num_interop_threads)
+
+    def load(self, model_name: str, torch_dtype: Optional[str] = None,
+             attn_implementation: Optional[str] = None) -> Dict[str, Any]:
+        if settings.DEVICE == "cuda" and torch.cuda.is_available():
+            torch_dtype = TORCH_DTYPES[torch_dtype or settings.TORCH_DTYPE]
+            device = "cuda"
+        else:
+            # На CPU по умолчанию float32, другой dtype только при явном переопределении
+            torch_dtype = TORCH_DTYPES[torch_dtype or "float32"]
+            device = "cpu"
+            if settings.DEVICE == "cuda":
+                print("Предупреждение: CUDA запрошена, но недоступна. Используется CPU.")
+
+        print("Загрузка процессора...")
+        processor = AutoProcessor.from_pretrained(
+            model_name,
+            cache_dir=settings.TRANSFORMERS_CACHE,
+            trust_remote_code=True
+        )
+        processor.tokenizer.padding_side = "left"
+
+        print("Загрузка модели...")
+        attn_implementation = attn_implementation or settings.ATTN_IMPLEMENTATION
+        if attn_implementation == "auto":
+            try:
+                import flash_attn
+                attn_implementation = "flash_attention_2" if device == "cuda" else "eager"
+            except ImportError:
+                attn_implementation = "eager"
+                if device == "cuda":
+                    print("FlashAttention2 не установлен, используется eager attention")
+
+        if device == "cuda":
+            model = AutoModelForImageTextToText.from_pretrained(
+                model_name,
+                cache_dir=settings.TRANSFORMERS_CACHE,
+                torch_dtype=torch_dtype,
+                _attn_implementation=attn_implementation,
+                trust_remote_code=True,
+                device_map="auto"
+            )
+        else:
+            model = AutoModelForImageTextToText.from_pretrained(
+                model_name,
+                cache_dir=settings.TRANSFORMERS_CACHE,
+                torch_dtype=torch_dtype,
+                _attn_implementation=attn_implementation,
+                trust_remote_code=True
+            )
+            model = model.to(device)
+
+        model.eval()
+        print(f"Модель загружена на {device} с dtype {torch_dtype}, attention {attn_implementation}")
+
+        return {
+            "model": model,
+            "processor": processor,
+            "size_bytes": sum(p.numel() * p.element_size() for p in model.parameters()),
+        }
+
+    def release(self) -> None:
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def draft_compatible(self, main: Dict[str, Any], draft: Dict[str, Any]) -> bool:
+        return is_draft_compatible(main["processor"], draft["processor"])
+
+    def _build_prompt(self, processor, text_content: str, history: Optional[List[Tuple[str, str]]] = None,
+                      images: int = 1) -> str:
+        """Строит chat-промпт с изображениями в первой реплике пользователя и историей диалога."""
+        messages = []
+        for question, answer in (history or []) + [(text_content, None)]:
+            content = [{"type": "text", "text": question}]
+            if not messages:
+                content[:0] = [{"type": "image"}] * images
+            messages.append({"role": "user", "content": content})
+            if answer is not None:
+                messages.append({"role": "assistant", "content": [{"type": "text", "text": answer}]})
+        return processor.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
+
+    def prepare(self, entry: Dict[str, Any], images: List[Any], text_contents: List[str]) -> Dict[str, Any]:
+        processor = entry["processor"]
+        prompts = [self._build_prompt(processor, text_content) for text_content in text_contents]
+        inputs = processor(
+            text=prompts,
+            images=[[image] for image in images],
+            padding=len(prompts) > 1,
+            return_tensors="pt"
+        )
+        return self._to_device(entry, inputs)
+
+    def _to_device(self, entry: Dict[str, Any], inputs) -> Dict[str, Any]:
+        device = next(entry["model"].parameters()).device
+        dtype = next(entry["model"].parameters()).dtype
+        return {k: v.to(device).to(dtype) if v.dtype.is_floating_point else v.to(device)
+                for k, v in inputs.items()}
+
+    def prepare_images(self, entry: Dict[str, Any], images: List[Any], text_content: str,
+                       split_images: bool = True) -> Dict[str, Any]:
+        processor = entry["processor"]
+        inputs = processor(
+            text=[self._build_prompt(processor, text_content, images=len(images))],
+            images=[images],
+            return_tensors="pt",
+            **({} if split_images else {"do_image_splitting": False})
+        )
+        return self._to_device(entry, inputs)
+
+    def prepare_shared(self, entry: Dict[str, Any], image: Any, text_contents: List[str]) -> Dict[str, Any]:
+        """
+        Процессор и vision encoder выполняются один раз для первого промпта;
+        в остальные промпты подставляется тот же развернутый блок токенов
+        изображения, признаки изображения повторяются для каждой строки.
+        """
+        model, processor = entry["model"], entry["processor"]
+        if len(text_contents) == 1 or not accepts_encoder_outputs(model):
+            return super().prepare_shared(entry, image, text_contents)
+
+        first = self.prepare(entry, [image], text_contents[:1])
+        tokenizer = processor.tokenizer
+        image_token_id = model.config.image_token_id
+        rows = [tokenizer(self._build_prompt(processor, text))["input_ids"] for text in text_contents]
+
+        # Развернутый блок изображения: то, чем процессор заменил токен <image> в первом промпте
+        expanded = first["input_ids"][0].tolist()
+        position = rows[0].index(image_token_id)
+        image_block = expanded[position:len(expanded) - (len(rows[0]) - position - 1)]
+        rows = [row[:row.index(image_token_id)] + image_block + row[row.index(image_token_id) + 1:] for row in rows]
+
+        # Левый паддинг, как у процессора
+        length = max(len(row) for row in rows)
+        device = first["input_ids"].device
+        input_ids = torch.tensor(
+            [[tokenizer.pad_token_id] * (length - len(row)) + row for row in rows], device=device
+        )
+        attention_mask = torch.tensor(
+            [[0] * (length - len(row)) + [1] * len(row) for row in rows], device=device
+        )
+
+        with torch.no_grad():
+            features = model.get_image_features(first["pixel_values"], first.get("pixel_attention_mask"))
+        features = BaseModelOutputWithPooling(pooler_output=features.pooler_output.repeat(len(rows), 1, 1))
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "mm_encoder_outputs": {"image": features},
+        }
+
+    def _generate_kwargs(self, processor, timer: FirstTokenTimer, max_new_tokens: int) -> Dict[str, Any]:
+        return dict(
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            repetition_penalty=1.2,
+            pad_token_id=processor.tokenizer.pad_token_id,
+            eos_token_id=processor.tokenizer.eos_token_id,
+            logits_processor=LogitsProcessorList([timer])
+        )
+
+    def _result(self, processor, timer: FirstTokenTimer, new_ids, started: float, finished: float,
+                stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        row_tokens = (new_ids != processor.tokenizer.pad_token_id).sum(dim=1).tolist()
+        if stats is None and timer.step_times:
+            # Строка готова после выбора ее последнего токена
+            steps = timer.step_times
+            row_finished = [steps[min(max(tokens - 1, 0), len(steps) - 1)] for tokens in row_tokens]
+        else:
+            row_finished = [finished] * len(row_tokens)
+        return {
+            "outputs": new_ids,
+            "row_tokens": row_tokens,
+            "started": started,
+            "first_token_at": timer.first_token_at,
+            "finished": finished,
+            "row_finished": row_finished,
+            "speculative": stats,
+        }
+
+    def generate(self, entry: Dict[str, Any], inputs: Dict[str, Any], max_new_tokens: int,
+                 draft: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        processor = entry["processor"]
+        timer = FirstTokenTimer()
+        generate_kwargs = self._generate_kwargs(processor, timer, max_new_tokens)
+
+        stats = None
+        started = time.perf_counter()
+        with torch.no_grad():
+            if draft is not None:
+                configure_draft(draft["model"], settings.SPECULATIVE_NUM_TOKENS,
+                                settings.SPECULATIVE_CONFIDENCE_THRESHOLD)
+                generated_ids, stats = assisted_generate(entry["model"], draft["model"], inputs,
+                                                         **generate_kwargs)
+            else:
+                generated_ids = entry["model"].generate(**inputs, **generate_kwargs)
+        finished = time.perf_counter()
+
+        new_ids = generated_ids[:, inputs["input_ids"].shape[1]:]
+        return self._result(processor, timer, new_ids, started, finished, stats)
+
+    def prepare_chat(self, entry: Dict[str, Any], image: Any, history: List[Tuple[str, str]],
+                     text_content: str) -> Dict[str, Any]:
+        processor = entry["processor"]
+        inputs = processor(
+            text=[self._build_prompt(processor, text_content, history)],
+            images=[[image]],
+            return_tensors="pt"
+        )
+        return self._to_device(entry, inputs)
+
+    def prompt_tokens(self, inputs: Dict[str, Any]) -> int:
+        return inputs["input_ids"].shape[1]
+
+    def generate_chat(self, entry: Dict[str, Any], inputs: Dict[str, Any], max_new_tokens: int,
+                      cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Кэш предыдущего хода обрезается до общего префикса с новым промптом,
+        generate выполняет prefill только для оставшихся токенов.
+        """
+        model, processor = entry["model"], entry["processor"]
+        ids = inputs["input_ids"][0].tolist()
+        reused = 0
+        generate_kwargs = {}
+        if cached is not None:
+            reused = reusable_prefix(cached["ids"], ids, model.config.image_token_id)
+            if reused:
+                cache = cached["kv"]
+                if cache.get_seq_length() > reused:
+                    cache.crop(reused - cache.get_seq_length())
+                generate_kwargs["past_key_values"] = cache
+
+        timer = FirstTokenTimer()
+        generate_kwargs.update(self._generate_kwargs(processor, timer, max_new_tokens))
+        started = time.perf_counter()
+        with torch.no_grad():
+            output = model.generate(**inputs, return_dict_in_generate=True, **generate_kwargs)
+        finished = time.perf_counter()
+
+        cache = output.past_key_values
+        result = self._result(processor, timer, output.sequences[:, len(ids):], started, finished)
+        result["cache"] = {
+            "ids": output.sequences[0, :cache.get_seq_length()].tolist(),
+            "kv": cache,
+            "bytes": sum(t.numel() * t.element_size() for layer in cache.layers
+                         for t in (layer.keys, layer.values) if t is not None),
+        }
+        result["reused_tokens"] = reused
+        return result
+
+    def decode(self, entry: Dict[str, Any], result: Dict[str, Any]) -> List[str]:
+        return entry["processor"].batch_decode(result["outputs"], skip_special_tokens=True)
@@ -4,13 +4,23 @@
 import uuid
 import time
 import base64
+import gzip
+import zlib
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
 import io
 
+from app.config import settings
+from app.expiry import ExpiryQueue
+
 
 sessions: Dict[str, Dict] = {}
+ocr_results: Dict[str, Dict] = {}
+
+# Дедлайны сессий (SESSION_TIMEOUT с последнего обращения) и результатов OCR
+# (SESSION_TIMEOUT с создания); ключи - ("session", id) и ("ocr", task_id)
+expiry = ExpiryQueue()
 
 
 def generate_session_id() -> str:
@@ -30,9 +40,10 @@ def save_session_image(session_id: str, image_bytes: bytes, image: Image.Image)
     sessions[session_id] = {
         "image_bytes": image_bytes,
         "image": image,
-        "created_at": datetime.now(),
-        "last_accessed": datetime.now()
+        "history": [],
+        "created_at": datetime.now()
     }
+    expiry.schedule(("session", session_id), settings.SESSION_TIMEOUT)
 
 
 def get_session_image(session_id: str) -> Optional[tuple[bytes, Image.Image]]:
@@ -49,24 +60,35 @@ def get_session_image(session_id: str) -> Optional[tuple[bytes, Image.Image]]:
         return None
     
     session = sessions[session_id]
-    session["last_accessed"] = datetime.now()
+    expiry.schedule(("session", session_id), settings.SESSION_TIMEOUT)
     return session["image_bytes"], session["image"]
 
 
-def cleanup_expired_sessions(timeout_seconds: int) -> None:
+def get_session_history(session_id: str) -> List[Tuple[str, str]]:
+    """
+    Получает историю диалога сессии.
+    
+    Args:
+        session_id: ID сессии
+        
+    Returns:
+        List[Tuple[str, str]]: Копия списка ходов (вопрос, ответ модели)
+    """
+    session = sessions.get(session_id)
+    return list(session["history"]) if session else []
+
+
+def save_session_turn(session_id: str, question: str, answer: str) -> None:
     """
-    Удаляет истекшие сессии.
+    Добавляет ход диалога в историю сессии.
     
     Args:
-        timeout_seconds: Таймаут сессии в секундах
+        session_id: ID сессии
+        question: Вопрос в том виде, в каком он передан модели
+        answer: Ответ модели до постобработки
     """
-    now = datetime.now()
-    expired = [
-        sid for sid, session in sessions.items()
-        if (now - session["last_accessed"]).total_seconds() > timeout_seconds
-    ]
-    for sid in expired:
-        del sessions[sid]
+    if session_id in sessions:
+        sessions[session_id]["history"].append((question, answer))
 
 
 def image_to_base64(image: Image.Image, format: str = "JPEG") -> str:
@@ -86,12 +108,14 @@ def image_to_base64(image: Image.Image, format: str = "JPEG") -> str:
     return base64.b64encode(image_bytes).decode("utf-8")
 
 
-ocr_results: Dict[str, Dict] = {}
+# Результат OCR хранится в gzip: его же отдает скачивание с Content-Encoding: gzip,
+# поэтому текст сжимается один раз при сохранении
+OCR_GZIP_LEVEL = 6
 
 
 def save_ocr_result(text: str) -> str:
     """
-    Сохраняет результат OCR и возвращает task_id.
+    Сохраняет результат OCR в сжатом виде и возвращает task_id.
     
     Args:
         text: Распознанный текст
@@ -100,10 +124,13 @@ def save_ocr_result(text: str) -> str:
         str: task_id для скачивания
     """
     task_id = str(uuid.uuid4())
+    data = text.encode("utf-8")
     ocr_results[task_id] = {
-        "text": text,
+        "gzip": gzip.compress(data, compresslevel=OCR_GZIP_LEVEL, mtime=0),
+        "size": len(data),
         "created_at": datetime.now()
     }
+    expiry.schedule(("ocr", task_id), settings.SESSION_TIMEOUT)
     return task_id
 
 
@@ -117,23 +144,86 @@ def get_ocr_result(task_id: str) -> Optional[str]:
     Returns:
         Optional[str]: Текст или None
     """
-    if task_id not in ocr_results:
+    result = ocr_results.get(task_id)
+    if result is None:
+        return None
+    return gzip.decompress(result["gzip"]).decode("utf-8")
+
+
+def get_ocr_result_gzip(task_id: str) -> Optional[Tuple[bytes, int]]:
+    """
+    Получает результат OCR без распаковки.
+    
+    Args:
+        task_id: ID задачи
+        
+    Returns:
+        Optional[Tuple[bytes, int]]: Текст в UTF-8, сжатый gzip, и его размер без сжатия, или None
+    """
+    result = ocr_results.get(task_id)
+    if result is None:
         return None
-    return ocr_results[task_id]["text"]
+    return result["gzip"], result["size"]
 
 
-def cleanup_expired_ocr_results(timeout_seconds: int = 3600) -> None:
+def ocr_results_bytes() -> Tuple[int, int]:
+    """Размер хранимых результатов OCR: (сжатый, исходного текста в UTF-8)."""
+    compressed = original = 0
+    for result in list(ocr_results.values()):
+        compressed += len(result["gzip"])
+        original += result["size"]
+    return compressed, original
+
+
+def gunzip_range(body: bytes, start: int, end: int) -> bytes:
+    """Байты start..end (включительно) распакованных данных; распаковывается только префикс до end."""
+    return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS).decompress(body, end + 1)[start:]
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
     """
-    Удаляет истекшие результаты OCR.
+    Разбирает заголовок Range с одним диапазоном байт.
     
     Args:
-        timeout_seconds: Таймаут в секундах
+        header: Значение заголовка (bytes=0-99, bytes=100-, bytes=-100)
+        size: Размер ресурса в байтах
+        
+    Returns:
+        Optional[Tuple[int, int]]: Начало и конец (включительно) или None,
+            если заголовок некорректен или содержит несколько диапазонов (отдается весь ресурс)
+        
+    Raises:
+        ValueError: Если диапазон не пересекается с ресурсом (416)
     """
-    now = datetime.now()
-    expired = [
-        tid for tid, result in ocr_results.items()
-        if (now - result["created_at"]).total_seconds() > timeout_seconds
-    ]
-    for tid in expired:
-        del ocr_results[tid]
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last) or not (first + last).isdigit():
+        return None
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Пустой диапазон")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise ValueError("Диапазон за концом ресурса")
+    if end < start:
+        return None
+    return start, end
 
+
+def expire_due() -> int:
+    """
+    Удаляет сессии и результаты OCR, дедлайн которых наступил.
+    Просматриваются только истекшие записи, а не все хранилище.
+    
+    Returns:
+        int: Число удаленных записей
+    """
+    expired = expiry.pop_expired()
+    for kind, key in expired:
+        (sessions if kind == "session" else ocr_results).pop(key, None)
+    return len(expired)
@@ -1,11 +1,18 @@
 """
 Валидация входных данных: изображений, форматов, размеров.
 """
-import base64
+import binascii
 import io
 from PIL import Image
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 from app.config import settings
+from app.routing import model_registry
+from app.metrics import time_stage
+
+
+VIDEO_SAMPLING_STRATEGIES = ("uniform", "scene")
+# Длина префикса data:image/...;base64, в котором ищется запятая
+DATA_URL_PREFIX_MAX = 64
 
 
 class ValidationError(Exception):
@@ -17,30 +24,32 @@ class ValidationError(Exception):
         super().__init__(message)
 
 
-def validate_base64_image(base64_string: str) -> Tuple[bytes, Image.Image]:
+def decode_base64_image(base64_string: str) -> bytes:
     """
-    Валидирует base64 строку и декодирует изображение.
+    Декодирует base64 строку изображения (с префиксом data:image или без).
     
     Args:
         base64_string: Base64-encoded строка изображения
         
     Returns:
-        Tuple[bytes, Image.Image]: Декодированные байты и PIL Image
+        bytes: Декодированные байты
         
     Raises:
-        ValidationError: Если валидация не прошла
+        ValidationError: Если строка пустая, слишком большая или некорректная
     """
-    if not base64_string or not base64_string.strip():
+    if not base64_string or base64_string.isspace():
         raise ValidationError(
             error="INVALID_IMAGE",
             message="Изображение не предоставлено",
             code="EMPTY_IMAGE"
         )
     
-    if "," in base64_string:
-        base64_string = base64_string.split(",")[1]
+    # Строка без префикса декодируется без копирования; с префиксом data:image
+    # копируется один раз при переводе в байты, префикс пропускается по смещению
+    start = base64_string.find(",", 0, DATA_URL_PREFIX_MAX) + 1
+    length = len(base64_string) - start
     
-    if len(base64_string) > settings.MAX_IMAGE_SIZE:
+    if length > settings.MAX_IMAGE_SIZE:
         raise ValidationError(
             error="IMAGE_TOO_LARGE",
             message=f"Размер изображения превышает {settings.MAX_IMAGE_SIZE / (1024*1024):.1f}MB",
@@ -48,14 +57,36 @@ def validate_base64_image(base64_string: str) -> Tuple[bytes, Image.Image]:
         )
     
     try:
-        image_bytes = base64.b64decode(base64_string, validate=True)
-    except Exception as e:
+        data = base64_string if start == 0 else memoryview(base64_string.encode("ascii"))[start:]
+        image_bytes = binascii.a2b_base64(data)
+    except (binascii.Error, ValueError):
+        image_bytes = None
+    # a2b_base64 пропускает символы вне алфавита: строка корректна, только если
+    # длина результата соответствует ее длине и паддингу (без отдельного прохода regex)
+    padding = 2 if base64_string.endswith("==") else 1 if base64_string.endswith("=") else 0
+    if image_bytes is None or length % 4 or len(image_bytes) != length // 4 * 3 - padding:
         raise ValidationError(
             error="INVALID_BASE64",
             message="Некорректная base64 строка",
             code="DECODE_ERROR"
         )
     
+    return image_bytes
+
+
+def validate_image_bytes(image_bytes: bytes) -> Tuple[bytes, Image.Image]:
+    """
+    Проверяет размер, формат и разрешение изображения и открывает его.
+    
+    Args:
+        image_bytes: Байты изображения
+        
+    Returns:
+        Tuple[bytes, Image.Image]: Байты и PIL Image
+        
+    Raises:
+        ValidationError: Если валидация не прошла
+    """
     if len(image_bytes) > settings.MAX_IMAGE_SIZE:
         raise ValidationError(
             error="IMAGE_TOO_LARGE",
@@ -106,6 +137,25 @@ def validate_base64_image(base64_string: str) -> Tuple[bytes, Image.Image]:
     return image_bytes, image
 
 
+def validate_base64_image(base64_string: str) -> Tuple[bytes, Image.Image]:
+    """
+    Валидирует base64 строку и декодирует изображение.
+    
+    Args:
+        base64_string: Base64-encoded строка изображения
+        
+    Returns:
+        Tuple[bytes, Image.Image]: Декодированные байты и PIL Image
+        
+    Raises:
+        ValidationError: Если валидация не прошла
+    """
+    with time_stage("base64_decode"):
+        image_bytes = decode_base64_image(base64_string)
+    with time_stage("image_validate"):
+        return validate_image_bytes(image_bytes)
+
+
 def validate_language(language: Optional[str]) -> str:
     """
     Валидирует язык для OCR.
@@ -146,3 +196,125 @@ def validate_session_id(session_id: Optional[str]) -> Optional[str]:
         return None
     return session_id.strip()
 
+
+
+def validate_model(model: Optional[str]) -> Optional[str]:
+    """
+    Валидирует псевдоним модели из запроса.
+    
+    Args:
+        model: Псевдоним модели из реестра
+        
+    Returns:
+        Optional[str]: Валидный псевдоним или None (маршрутизация по задаче)
+        
+    Raises:
+        ValidationError: Если модель не зарегистрирована
+    """
+    if model is None or not model.strip():
+        return None
+    
+    registry = model_registry()
+    if model not in registry:
+        raise ValidationError(
+            error="INVALID_MODEL",
+            message=f"Неизвестная модель. Доступны: {', '.join(sorted(registry))}",
+            code="MODEL_NOT_FOUND"
+        )
+    
+    return model
+
+
+def validate_video_sampling(strategy: Optional[str], max_frames: Optional[int]) -> Tuple[str, int]:
+    """
+    Валидирует параметры выборки кадров видео.
+    
+    Args:
+        strategy: Стратегия выборки (None - VIDEO_SAMPLING)
+        max_frames: Максимум кадров (None - VIDEO_MAX_FRAMES)
+        
+    Returns:
+        Tuple[str, int]: Стратегия и максимум кадров
+        
+    Raises:
+        ValidationError: Если стратегия неизвестна или кадров больше VIDEO_MAX_FRAMES
+    """
+    strategy = strategy or settings.VIDEO_SAMPLING
+    if strategy not in VIDEO_SAMPLING_STRATEGIES:
+        raise ValidationError(
+            error="INVALID_SAMPLING",
+            message=f"Неизвестная стратегия выборки кадров. Доступны: {', '.join(VIDEO_SAMPLING_STRATEGIES)}",
+            code="SAMPLING_ERROR"
+        )
+    
+    if max_frames is None:
+        max_frames = settings.VIDEO_MAX_FRAMES
+    if not 1 <= max_frames <= settings.VIDEO_MAX_FRAMES:
+        raise ValidationError(
+            error="TOO_MANY_FRAMES",
+            message=f"Число кадров должно быть от 1 до {settings.VIDEO_MAX_FRAMES}",
+            code="LIMIT_EXCEEDED"
+        )
+    
+    return strategy, max_frames
+
+
+def validate_questions(questions: List[Optional[str]]) -> List[Optional[str]]:
+    """
+    Валидирует список вопросов к одному изображению.
+    
+    Args:
+        questions: Вопросы (None или пустая строка - описание изображения)
+        
+    Returns:
+        List[Optional[str]]: Вопросы без лишних пробелов
+        
+    Raises:
+        ValidationError: Если вопросов больше MAX_QUESTIONS_PER_REQUEST
+    """
+    if len(questions) > settings.MAX_QUESTIONS_PER_REQUEST:
+        raise ValidationError(
+            error="TOO_MANY_QUESTIONS",
+            message=f"Слишком много вопросов в запросе (максимум {settings.MAX_QUESTIONS_PER_REQUEST})",
+            code="LIMIT_EXCEEDED"
+        )
+    
+    return [question.strip() if question else None for question in questions]
+
+
+def validate_image_count(count: int) -> int:
+    """
+    Проверяет число изображений в одном промпте.
+    
+    Raises:
+        ValidationError: Если изображений больше MAX_IMAGES_PER_REQUEST
+    """
+    if count > settings.MAX_IMAGES_PER_REQUEST:
+        raise ValidationError(
+            error="TOO_MANY_IMAGES",
+            message=f"Слишком много изображений в запросе (максимум {settings.MAX_IMAGES_PER_REQUEST})",
+            code="LIMIT_EXCEEDED"
+        )
+    
+    return count
+
+
+def validate_total_pixels(images: List[Image.Image]) -> int:
+    """
+    Проверяет суммарное число пикселей изображений одного промпта.
+    
+    Returns:
+        int: Суммарное число пикселей
+        
+    Raises:
+        ValidationError: Если пикселей больше MAX_TOTAL_PIXELS
+    """
+    pixels = sum(image.width * image.height for image in images)
+    if pixels > settings.MAX_TOTAL_PIXELS:
+        raise ValidationError(
+            error="IMAGES_TOO_LARGE",
+            message=f"Суммарное разрешение изображений превышает {settings.MAX_TOTAL_PIXELS / 1_000_000:.1f} Мпикс",
+            code="LIMIT_EXCEEDED"
+        )
+    
+    return pixels
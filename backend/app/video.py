@@ -0,0 +1,219 @@
+"""
+Выборка ключевых кадров видео для /api/video.
+
+Тело запроса пишется во временный файл по частям и не держится в памяти
+целиком: декодеру OpenCV нужен путь к файлу. Кадры читаются последовательно,
+в память попадает не больше VIDEO_MAX_FRAMES кадров уменьшенного размера.
+Стратегии выборки:
+- uniform: кадры в серединах равных отрезков клипа; далекие кадры
+  достигаются перемоткой, близкие - пропуском через grab() без преобразования;
+- scene: кадры с частотой VIDEO_SCENE_FPS сравниваются с предыдущим,
+  остаются кадры смены сцены с наибольшим изменением.
+Затем отбрасываются кадры, почти совпадающие с уже выбранными (перцептивный хэш).
+"""
+import os
+import tempfile
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.metrics import time_stage
+from app.phash import image_fingerprint, is_near_duplicate
+from app.validators import ValidationError
+
+
+# Разрыв в кадрах, начиная с которого перемотка быстрее последовательного grab()
+SEEK_MIN_GAP = 120
+# Сторона серой миниатюры для оценки смены сцены
+SCENE_THUMBNAIL = 32
+# Части тела запроса копятся до этого размера и пишутся на диск одним вызовом в пуле потоков
+SPOOL_WRITE_BYTES = 1024 * 1024
+
+
+async def spool_upload(chunks: AsyncIterator[bytes], max_bytes: int) -> str:
+    """
+    Записывает тело запроса во временный файл по частям.
+    Запись идет в пуле потоков блоками по SPOOL_WRITE_BYTES и не блокирует цикл событий.
+
+    Args:
+        chunks: Части тела запроса
+        max_bytes: Максимальный размер видео
+
+    Returns:
+        str: Путь к временному файлу (удаляет вызывающий)
+
+    Raises:
+        ValidationError: Если видео пустое или больше max_bytes
+    """
+    fd, path = tempfile.mkstemp(suffix=".video", dir=settings.VIDEO_TMP_DIR or None)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb", buffering=0) as f:
+            pending: List[bytes] = []
+            pending_size = 0
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValidationError(
+                        error="VIDEO_TOO_LARGE",
+                        message=f"Размер видео превышает {max_bytes / (1024 * 1024):.1f}MB",
+                        code="SIZE_EXCEEDED"
+                    )
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= SPOOL_WRITE_BYTES:
+                    await run_in_threadpool(_write_all, f, b"".join(pending))
+                    pending, pending_size = [], 0
+            if pending:
+                await run_in_threadpool(_write_all, f, b"".join(pending))
+        if size == 0:
+            raise ValidationError(error="INVALID_VIDEO", message="Видео не предоставлено", code="EMPTY_VIDEO")
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def _write_all(f, data: bytes) -> None:
+    """Пишет data в небуферизованный файл целиком (write может записать часть)."""
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view):]
+
+
+def uniform_indices(frame_count: int, max_frames: int) -> List[int]:
+    """Номера не больше max_frames кадров в серединах равных отрезков клипа."""
+    count = min(frame_count, max_frames)
+    return sorted({int((i + 0.5) * frame_count / count) for i in range(count)}) if count > 0 else []
+
+
+def scene_changes(frames: Iterable[Tuple[int, np.ndarray]], max_frames: int,
+                  threshold: float) -> List[Tuple[int, np.ndarray]]:
+    """
+    Кадры смены сцены из потока (номер, кадр RGB).
+
+    Разность кадра - среднее абсолютное отличие серой миниатюры от предыдущего
+    кадра потока (0-1). Первый кадр берется всегда, остальные - при разности
+    не меньше threshold. Хранится не больше max_frames кадров: при переполнении
+    вытесняется кадр с наименьшей разностью, поэтому память не растет с длиной клипа.
+    """
+    selected: List[Tuple[int, np.ndarray, float]] = []
+    previous = None
+    for index, frame in frames:
+        height, width = frame.shape[:2]
+        thumbnail = frame[::max(1, height // SCENE_THUMBNAIL), ::max(1, width // SCENE_THUMBNAIL)]
+        thumbnail = thumbnail.mean(axis=-1, dtype=np.float32) / 255
+        score = 1.0 if previous is None else float(np.abs(thumbnail - previous).mean())
+        previous = thumbnail
+        if score < threshold:
+            continue
+        selected.append((index, frame, score))
+        if len(selected) > max_frames:
+            del selected[min(range(1, len(selected)), key=lambda i: selected[i][2])]
+    return [(index, frame) for index, frame, _ in selected]
+
+
+def drop_near_duplicates(frames: List[Dict[str, Any]], max_distance: int) -> List[Dict[str, Any]]:
+    """Оставляет кадры, не являющиеся почти дубликатами ранее оставленных."""
+    kept, fingerprints = [], []
+    for frame in frames:
+        fingerprint = image_fingerprint(frame["image"])
+        if any(is_near_duplicate(fingerprint, other, max_distance) for other in fingerprints):
+            continue
+        kept.append(frame)
+        fingerprints.append(fingerprint)
+    return kept
+
+
+def _to_rgb(cv2, bgr: np.ndarray) -> np.ndarray:
+    """Уменьшает кадр до VIDEO_FRAME_SIDE по большей стороне и переводит в RGB."""
+    height, width = bgr.shape[:2]
+    scale = settings.VIDEO_FRAME_SIDE / max(height, width)
+    if scale < 1:
+        bgr = cv2.resize(bgr, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+def _read_uniform(cv2, capture, frame_count: int, max_frames: int) -> Iterator[Tuple[int, np.ndarray]]:
+    position = 0
+    for target in uniform_indices(frame_count, max_frames):
+        if target - position > SEEK_MIN_GAP:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+        while position < target:
+            if not capture.grab():
+                return
+            position += 1
+        ok, bgr = capture.read()
+        position += 1
+        if not ok:
+            return
+        yield target, _to_rgb(cv2, bgr)
+
+
+def _read_every(cv2, capture, step: int) -> Iterator[Tuple[int, np.ndarray]]:
+    index = 0
+    while capture.grab():
+        if index % step == 0:
+            ok, bgr = capture.retrieve()
+            if not ok:
+                return
+            yield index, _to_rgb(cv2, bgr)
+        index += 1
+
+
+def sample_frames(path: str, strategy: str, max_frames: int) -> Dict[str, Any]:
+    """
+    Выбирает ключевые кадры видеофайла.
+
+    Args:
+        path: Путь к видеофайлу
+        strategy: Стратегия выборки (uniform, scene)
+        max_frames: Максимум кадров
+
+    Returns:
+        Dict[str, Any]: {
+            "frames": [{"index", "timestamp", "image"}] в хронологическом порядке,
+            "candidates": кадров выбрано до удаления почти дубликатов,
+            "frame_count", "fps", "duration": параметры клипа
+        }
+
+    Raises:
+        ValidationError: Если файл не удалось декодировать
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValidationError(error="INVALID_VIDEO", message="Не удалось открыть видео", code="VIDEO_ERROR")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        with time_stage("video_decode"):
+            # Без числа кадров (потоковые контейнеры) равномерная выборка невозможна
+            if strategy == "uniform" and frame_count > 0:
+                sampled = list(_read_uniform(cv2, capture, frame_count, max_frames))
+            else:
+                step = max(1, round(fps / settings.VIDEO_SCENE_FPS))
+                sampled = scene_changes(_read_every(cv2, capture, step), max_frames, settings.VIDEO_SCENE_THRESHOLD)
+    finally:
+        capture.release()
+
+    if not sampled:
+        raise ValidationError(error="INVALID_VIDEO", message="Не удалось декодировать кадры видео", code="VIDEO_ERROR")
+    frames = [
+        {"index": index, "timestamp": round(index / fps, 2), "image": Image.fromarray(rgb)}
+        for index, rgb in sampled
+    ]
+    with time_stage("frame_dedup"):
+        kept = drop_near_duplicates(frames, settings.VIDEO_DEDUP_DISTANCE)
+    return {
+        "frames": kept,
+        "candidates": len(frames),
+        "frame_count": frame_count,
+        "fps": fps,
+        "duration": round(frame_count / fps, 2) if frame_count > 0 else None,
+    }
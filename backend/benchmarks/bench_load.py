@@ -0,0 +1,255 @@
+"""
+Нагрузочный тест API с открытой моделью поступления запросов.
+
+Запросы приходят по пуассоновскому процессу с заданной частотой независимо
+от того, завершились ли предыдущие. Задержка считается от запланированного
+момента отправки, поэтому перегрузка не маскируется (coordinated omission).
+
+Запуск из каталога backend:
+    # в процессе, с fake-бэкендом
+    python -m benchmarks.bench_load --rate 20 --requests 400 --baseline
+    # против запущенного сервера
+    python -m benchmarks.bench_load --url http://localhost:8000 --rate 0.5 --requests 50
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.regression import check, update_baseline
+
+REQUEST_KINDS = ("vqa", "caption", "ocr", "download")
+QUESTIONS = (
+    "What is in this image?",
+    "Is there a person in the picture?",
+    "How many objects are on the table?",
+    "Describe the colors and the layout in detail.",
+)
+
+# Параметры, с которыми снят baseline нагрузочного теста
+BASELINE_ARGS = {
+    "rate": 20.0, "requests": 400, "mix": "vqa=0.5,caption=0.1,ocr=0.25,download=0.15",
+    "image_sizes": "256,512,1024", "session_reuse": 0.3, "seed": 0,
+}
+BASELINE_FAKE_SETTINGS = {
+    "FAKE_PREFILL_MS": "20", "FAKE_DECODE_MS_PER_TOKEN": "2", "FAKE_OUTPUT_TOKENS": "48",
+    "FAKE_MODEL_SIZE_MB": "16", "ADMISSION_MAX_IN_FLIGHT": "16",
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Разбирает строку вида 'vqa=0.6,ocr=0.4' в нормированные доли."""
+    weights = {}
+    for item in mix.split(","):
+        kind, weight = item.split("=")
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise ValueError(f"Неизвестный тип запроса: {kind}")
+        weights[kind] = float(weight)
+    total = sum(weights.values())
+    return {kind: weight / total for kind, weight in weights.items()}
+
+
+def arrival_times(rate: float, count: int, seed: int = 0) -> List[float]:
+    """Моменты поступления запросов (секунды от старта) для пуассоновского процесса."""
+    rng = random.Random(seed)
+    times, now = [], 0.0
+    for _ in range(count):
+        now += rng.expovariate(rate)
+        times.append(now)
+    return times
+
+
+def synthetic_image_base64(size: int, seed: int = 0) -> str:
+    """JPEG с градиентом и шумом, похожий по размеру на фотографию."""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, size, dtype=np.float32)
+    pixels = np.stack([
+        np.add.outer(gradient, gradient) / 2,
+        np.tile(gradient, (size, 1)),
+        np.full((size, size), 128, dtype=np.float32),
+    ], axis=-1)
+    pixels += rng.normal(0, 20, pixels.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=85)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(np.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(results: List[Tuple[str, int, float]], elapsed: float) -> Dict[str, Dict[str, float]]:
+    """
+    Сводка по типам запросов и в целом.
+
+    Args:
+        results: (тип, HTTP статус или 0 при сетевой ошибке, задержка в секундах)
+        elapsed: Длительность теста в секундах
+
+    Returns:
+        Dict: {тип: {requests, errors, error_rate, p50_ms, p95_ms, p99_ms, throughput_rps}}
+    """
+    groups: Dict[str, List[Tuple[int, float]]] = {}
+    for kind, status, latency in results:
+        groups.setdefault(kind, []).append((status, latency))
+        groups.setdefault("all", []).append((status, latency))
+
+    summary = {}
+    for kind, items in groups.items():
+        latencies = [latency * 1000 for _, latency in items]
+        errors = sum(1 for status, _ in items if not 200 <= status < 300)
+        summary[kind] = {
+            "requests": len(items),
+            "errors": errors,
+            "error_rate": round(errors / len(items), 4),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "throughput_rps": round((len(items) - errors) / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+    return summary
+
+
+class LoadGenerator:
+    """Генератор запросов к API со смесью типов запросов и повторным использованием сессий."""
+
+    def __init__(self, client: httpx.AsyncClient, mix: Dict[str, float], image_sizes: List[int],
+                 session_reuse: float = 0.0, seed: int = 0):
+        self.client = client
+        self.mix = mix
+        self.images = [synthetic_image_base64(size, seed + i) for i, size in enumerate(image_sizes)]
+        self.session_reuse = session_reuse
+        self.rng = random.Random(seed)
+        self.sessions: List[str] = []
+        self.task_ids: List[str] = []
+
+    def next_kind(self) -> str:
+        kinds = list(self.mix)
+        return self.rng.choices(kinds, weights=[self.mix[kind] for kind in kinds])[0]
+
+    def build_request(self, kind: str) -> Tuple[str, str, str, Optional[dict]]:
+        """Возвращает (тип, метод, путь, тело) для запроса заданного типа."""
+        if kind == "download" and not self.task_ids:
+            kind = "ocr"
+        if kind == "download":
+            return kind, "GET", f"/api/download/ocr/{self.rng.choice(self.task_ids)}", None
+        image = self.rng.choice(self.images)
+        if kind == "ocr":
+            return kind, "POST", "/api/ocr", {"image": image, "language": "en"}
+        body = {"image": image, "question": None if kind == "caption" else self.rng.choice(QUESTIONS)}
+        if self.sessions and self.rng.random() < self.session_reuse:
+            body["session_id"] = self.rng.choice(self.sessions)
+        return kind, "POST", "/api/vqa", body
+
+    async def send(self, kind: str, method: str, path: str, body: Optional[dict],
+                   scheduled: float) -> Tuple[str, int, float]:
+        try:
+            response = await self.client.request(method, path, json=body)
+            status = response.status_code
+            if status == 200 and kind == "ocr":
+                self.task_ids.append(response.json()["task_id"])
+            elif status == 200 and kind in ("vqa", "caption"):
+                self.sessions.append(response.json()["session_id"])
+        except httpx.HTTPError:
+            status = 0
+        return kind, status, time.perf_counter() - scheduled
+
+    async def run(self, rate: float, count: int, seed: int = 0) -> Dict[str, Dict[str, float]]:
+        """
+        Отправляет count запросов с частотой rate в секунду (открытая модель).
+
+        Returns:
+            Dict: Сводка summarize
+        """
+        started = time.perf_counter()
+        tasks = []
+        for offset in arrival_times(rate, count, seed):
+            scheduled = started + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send(*self.build_request(self.next_kind()), scheduled)))
+        results = await asyncio.gather(*tasks)
+        return summarize(results, time.perf_counter() - started)
+
+
+def make_client(url: Optional[str], timeout: float) -> httpx.AsyncClient:
+    """HTTP клиент к серверу по url или к приложению в текущем процессе."""
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout)
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=timeout)
+
+
+async def run_load(url: Optional[str], rate: float, requests: int, mix: str, image_sizes: str,
+                   session_reuse: float, seed: int = 0, timeout: float = 300.0) -> Dict[str, Dict[str, float]]:
+    """Запускает нагрузочный тест и возвращает сводку."""
+    async with make_client(url, timeout) as client:
+        generator = LoadGenerator(client, parse_mix(mix), [int(size) for size in image_sizes.split(",")],
+                                  session_reuse, seed)
+        return await generator.run(rate, requests, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API")
+    parser.add_argument("--url", default=None, help="Адрес сервера (по умолчанию - приложение в процессе)")
+    parser.add_argument("--rate", type=float, default=BASELINE_ARGS["rate"], help="Запросов в секунду")
+    parser.add_argument("--requests", type=int, default=BASELINE_ARGS["requests"], help="Всего запросов")
+    parser.add_argument("--mix", default=BASELINE_ARGS["mix"], help="Доли типов запросов")
+    parser.add_argument("--image-sizes", default=BASELINE_ARGS["image_sizes"], help="Стороны изображений")
+    parser.add_argument("--session-reuse", type=float, default=BASELINE_ARGS["session_reuse"],
+                        help="Доля VQA запросов с существующей сессией")
+    parser.add_argument("--seed", type=int, default=BASELINE_ARGS["seed"])
+    parser.add_argument("--timeout", type=float, default=300.0, help="Таймаут запроса в секундах")
+    parser.add_argument("--json", action="store_true", help="Вывести сводку в JSON")
+    parser.add_argument("--baseline", action="store_true", help="Сравнить с benchmarks/baseline.json")
+    parser.add_argument("--update-baseline", action="store_true", help="Записать результаты в baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Допустимое ухудшение (0.5 = 50%%)")
+    args = parser.parse_args()
+
+    if args.url is None:
+        # В процессе по умолчанию используется fake-бэкенд с параметрами baseline
+        os.environ.setdefault("INFERENCE_BACKEND", "fake")
+        for key, value in BASELINE_FAKE_SETTINGS.items():
+            os.environ.setdefault(key, value)
+
+    summary = asyncio.run(run_load(args.url, args.rate, args.requests, args.mix, args.image_sizes,
+                                   args.session_reuse, args.seed, args.timeout))
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{'kind':<10} {'req':>6} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+        for kind, row in summary.items():
+            print(
+                f"{kind:<10} {row['requests']:>6} {row['error_rate'] * 100:>6.1f} {row['p50_ms']:>9.1f} "
+                f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['throughput_rps']:>8.2f}"
+            )
+
+    if args.update_baseline:
+        update_baseline("load", summary)
+        print("Baseline обновлен")
+    elif args.baseline and not check("load", summary, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Микро-бенчмарки горячих функций: валидация изображения, постобработка ответа,
+хранилище сессий, перцептивный хэш и поиск почти дубликатов, сериализация
+больших ответов OCR.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_micro --baseline
+    python -m benchmarks.bench_micro --update-baseline
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import utils
+from app.expiry import ExpiryQueue
+from app.model_manager import postprocess_answer, postprocess_ocr
+from app.phash import NearDuplicateIndex, image_fingerprint
+from app.responses import ORJSONResponse, stream_json
+from app.schemas import OCRResponse
+from app.validators import validate_base64_image
+from benchmarks.regression import check, update_baseline
+
+SESSIONS = 10000
+NEAR_DUPLICATE_ENTRIES = 1_000_000
+
+ANSWER = (
+    "Assistant: The image shows a wooden table with a laptop, a cup of coffee and several "
+    "printed documents. " * 8 + "<end_of_utterance>"
+)
+OCR_TEXT = "\n".join(f"  Line {i}: invoice total 1{i}.00 USD  \n" for i in range(60))
+# Текст многостраничного документа: ~1MB с кириллицей и экранируемыми символами
+LARGE_OCR_TEXT = "\n".join(f"Строка {i}: \"Итого\" 1{i}.00 руб.\tinvoice total" for i in range(20000))
+
+
+def noise_image_base64(size: int, seed: int = 0, format: str = "JPEG") -> str:
+    """JPEG с шумом - худший случай для декодера."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=format, quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def measure(func: Callable[[], object], repeat: int = 7, min_time: float = 0.2) -> float:
+    """
+    Время одного вызова в микросекундах (лучшее из repeat серий).
+    Размер серии подбирается так, чтобы она длилась не меньше min_time.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - started >= min_time:
+            break
+        number *= 2
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best * 1e6
+
+
+def bench_session_store() -> Dict[str, float]:
+    """Сохранение, чтение и удаление истекших сессий при SESSIONS активных сессиях."""
+    saved, saved_expiry = dict(utils.sessions), utils.expiry
+    utils.sessions.clear()
+    utils.expiry = ExpiryQueue()
+    image_bytes = b"\x00" * 1024
+    image = Image.new("RGB", (8, 8))
+    try:
+        for i in range(SESSIONS):
+            utils.save_session_image(f"session-{i}", image_bytes, image)
+        counter = iter(range(10 ** 9))
+        return {
+            "session_save": measure(lambda: utils.save_session_image(f"session-{next(counter) % SESSIONS}",
+                                                                     image_bytes, image)),
+            "session_get": measure(lambda: utils.get_session_image("session-5000")),
+            "session_cleanup": measure(utils.expire_due, repeat=3),
+        }
+    finally:
+        utils.sessions.clear()
+        utils.sessions.update(saved)
+        utils.expiry = saved_expiry
+
+
+def bench_near_duplicate(image_base64: str) -> Dict[str, float]:
+    """Отпечаток изображения 1024x1024 и поиск в индексе на NEAR_DUPLICATE_ENTRIES изображений."""
+    image = validate_base64_image(image_base64)[1]
+    fingerprint = image_fingerprint(image)
+    index = NearDuplicateIndex(NEAR_DUPLICATE_ENTRIES, max_distance=8)
+    # Индекс заполняется напрямую: put() с поиском по растущему индексу занял бы минуты
+    rng = np.random.default_rng(0)
+    index._hashes[:] = rng.integers(0, 2 ** 63, index._hashes.shape, dtype=np.uint64)
+    index._colors[:] = fingerprint["color"]
+    index._aspects[:] = fingerprint["aspect"]
+    index._size = NEAR_DUPLICATE_ENTRIES
+    # Искомое изображение в середине: поиск находит ровно один результат
+    middle = NEAR_DUPLICATE_ENTRIES // 2
+    index._hashes[:, middle] = fingerprint["hash"]
+    index._results[middle] = OrderedDict(key="answer")
+    return {
+        "image_fingerprint_1024": measure(lambda: image_fingerprint(image)),
+        "near_duplicate_lookup_1m": measure(lambda: index.get(fingerprint, "key", "vqa"), repeat=3),
+    }
+
+
+def bench_ocr_serialization() -> Dict[str, float]:
+    """Ответ OCR с LARGE_OCR_TEXT: стандартный путь FastAPI (jsonable_encoder + json), orjson и поток."""
+    response = OCRResponse(text=LARGE_OCR_TEXT, download_url="/api/download/ocr/task", task_id="task",
+                           max_new_tokens=512, tiles=40)
+    payload = response.model_dump()
+    return {
+        "ocr_response_json": measure(
+            lambda: json.dumps(jsonable_encoder(response), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        ),
+        "ocr_response_orjson": measure(lambda: ORJSONResponse(response.model_dump())),
+        "ocr_response_stream": measure(lambda: b"".join(stream_json(payload, "text"))),
+    }
+
+
+def run_micro(runs: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Запускает все микро-бенчмарки runs раз и берет медиану,
+    чтобы один шумный прогон не давал ложной регрессии.
+    """
+    image_512 = noise_image_base64(512)
+    image_1024 = noise_image_base64(1024)
+    samples: Dict[str, list] = {}
+    for _ in range(runs):
+        results = {
+            "validate_base64_image_512": measure(lambda: validate_base64_image(image_512)),
+            "validate_base64_image_1024": measure(lambda: validate_base64_image(image_1024)),
+            "postprocess_answer": measure(lambda: postprocess_answer(ANSWER)),
+            "postprocess_ocr": measure(lambda: postprocess_ocr(OCR_TEXT)),
+            **bench_session_store(),
+            **bench_near_duplicate(image_1024),
+            **bench_ocr_serialization(),
+        }
+        for name, value in results.items():
+            samples.setdefault(name, []).append(value)
+    return {name: {"us_per_op": round(statistics.median(values), 3)} for name, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микро-бенчмарки")
+    parser.add_argument("--baseline", action="store_true", help="Сравнить с benchmarks/baseline.json")
+    parser.add_argument("--update-baseline", action="store_true", help="Записать результаты в baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Допустимое ухудшение (0.5 = 50%%)")
+    parser.add_argument("--runs", type=int, default=3, help="Число прогонов, берется медиана")
+    args = parser.parse_args()
+
+    results = run_micro(args.runs)
+    print(f"{'benchmark':<30} {'us/op':>12}")
+    for name, result in results.items():
+        print(f"{name:<30} {result['us_per_op']:>12.3f}")
+
+    if args.update_baseline:
+        update_baseline("micro", results)
+        print("Baseline обновлен")
+    elif args.baseline and not check("micro", results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк суммарной пропускной способности: реплики × потоки.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_replicas --grid 1x32,2x16,4x8 --requests 32
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.replicas import ReplicaPool, available_cpus
+
+
+def synthetic_image(size: int = 512) -> Image.Image:
+    """Создает синтетическое изображение с градиентом."""
+    img = Image.new('RGB', (size, size))
+    img.putdata([((x * 255) // size, (y * 255) // size, 128) for y in range(size) for x in range(size)])
+    return img
+
+
+def parse_grid(grid: str) -> list[tuple[int, int]]:
+    """Разбирает строку вида '1x32,2x16' в список (реплики, потоки)."""
+    configs = []
+    for item in grid.split(","):
+        replicas, threads = item.lower().split("x")
+        configs.append((int(replicas), int(threads)))
+    return configs
+
+
+def run_config(replicas: int, threads: int, requests: int, image: Image.Image) -> dict:
+    """Запускает одну конфигурацию и возвращает метрики."""
+    cpus = available_cpus()[:replicas * threads]
+    pool = ReplicaPool(replicas, threads, cpus=cpus)
+    started = time.perf_counter()
+    pool.load_model()
+    load_time = time.perf_counter() - started
+
+    latencies = []
+
+    def one_request(_):
+        t0 = time.perf_counter()
+        pool.vqa_inference(image, "What is in this image?")
+        latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=replicas * 2) as executor:
+        list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - started
+    pool.stop()
+
+    latencies.sort()
+    return {
+        "replicas": replicas,
+        "threads": threads,
+        "load_s": load_time,
+        "throughput_rps": requests / elapsed,
+        "p50_s": latencies[len(latencies) // 2],
+        "p95_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк реплик модели")
+    parser.add_argument("--grid", default="1x4,2x2,4x1", help="Конфигурации RxT через запятую")
+    parser.add_argument("--requests", type=int, default=16, help="Количество запросов на конфигурацию")
+    parser.add_argument("--image-size", type=int, default=512, help="Сторона синтетического изображения")
+    args = parser.parse_args()
+
+    image = synthetic_image(args.image_size)
+    print(f"{'replicas':>8} {'threads':>8} {'load, s':>8} {'req/s':>8} {'p50, s':>8} {'p95, s':>8}")
+    for replicas, threads in parse_grid(args.grid):
+        result = run_config(replicas, threads, args.requests, image)
+        print(
+            f"{result['replicas']:>8} {result['threads']:>8} {result['load_s']:>8.1f} "
+            f"{result['throughput_rps']:>8.3f} {result['p50_s']:>8.2f} {result['p95_s']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
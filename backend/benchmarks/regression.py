@@ -0,0 +1,94 @@
+"""
+Сравнение результатов бенчмарков с закоммиченным baseline.
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# Метрики, для которых больше - лучше
+HIGHER_IS_BETTER = ("throughput_rps", "ops_per_s")
+# Допустимый абсолютный рост доли ошибок
+ERROR_RATE_SLACK = 0.01
+# Рост задержки меньше этого значения считается шумом
+LATENCY_SLACK_MS = 5.0
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Разворачивает вложенные результаты в {"load.vqa.p95_ms": 123.0}."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Находит регрессии относительно baseline.
+
+    Args:
+        results: Текущие результаты
+        baseline: Сохраненные результаты
+        tolerance: Допустимое относительное ухудшение (0.3 = 30%)
+
+    Returns:
+        List[str]: Описания регрессий (пустой список - регрессий нет)
+    """
+    current = flatten(results)
+    regressions = []
+    for name, expected in flatten(baseline).items():
+        if name not in current:
+            continue
+        actual = current[name]
+        metric = name.rsplit(".", 1)[-1]
+        if metric == "error_rate":
+            failed = actual > expected + ERROR_RATE_SLACK
+        elif metric in HIGHER_IS_BETTER:
+            failed = actual < expected * (1 - tolerance)
+        elif metric.endswith("_ms"):
+            failed = actual > expected * (1 + tolerance) and actual - expected > LATENCY_SLACK_MS
+        elif metric == "us_per_op":
+            failed = actual > expected * (1 + tolerance)
+        else:
+            continue
+        if failed:
+            regressions.append(f"{name}: {actual:.3f} (baseline {expected:.3f})")
+    return regressions
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> Dict[str, Any]:
+    """Загружает baseline или возвращает пустой словарь."""
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def update_baseline(section: str, results: Dict[str, Any], path: Path = BASELINE_PATH) -> None:
+    """Перезаписывает раздел baseline текущими результатами."""
+    baseline = load_baseline(path)
+    baseline[section] = results
+    path.write_text(json.dumps(baseline, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+
+def check(section: str, results: Dict[str, Any], tolerance: float, path: Path = BASELINE_PATH) -> bool:
+    """
+    Сравнивает раздел результатов с baseline и печатает регрессии.
+
+    Returns:
+        bool: True, если регрессий нет
+    """
+    baseline = load_baseline(path).get(section)
+    if baseline is None:
+        print(f"Baseline для раздела {section} не найден, сравнение пропущено")
+        return True
+    regressions = compare(results, baseline, tolerance)
+    for regression in regressions:
+        print(f"РЕГРЕССИЯ {section}.{regression}")
+    if not regressions:
+        print(f"Регрессий относительно baseline нет (допуск {tolerance:.0%})")
+    return not regressions
@@ -0,0 +1,377 @@
+"""
+Тесты для контроля допуска запросов к инференсу.
+"""
+import pytest
+import asyncio
+import base64
+import io
+import sys
+import os
+import time
+
+import httpx
+from PIL import Image
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import fake_backend
+from app.admission import AdmissionController, AdmissionRejected, RateLimiter, estimate_cost, task_priority
+from app.fake_backend import FakeBackend
+from app.metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED
+from app.model_manager import ModelManager
+
+
+async def hold(controller, priority, cost, started, release, order=None, name=None, client=""):
+    """Занимает слот инференса до события release."""
+    async with controller.admit(priority, cost, client):
+        if order is not None:
+            order.append(name)
+        started.set()
+        await release.wait()
+
+
+class TestAdmissionController:
+    """Тесты очереди допуска."""
+
+    def test_max_in_flight(self):
+        """Одновременно выполняется не больше max_in_flight запросов."""
+        async def run():
+            controller = AdmissionController(2, {"interactive": 10, "bulk": 10})
+            release = asyncio.Event()
+            tasks = [
+                asyncio.create_task(hold(controller, "interactive", 1.0, asyncio.Event(), release))
+                for _ in range(4)
+            ]
+            await asyncio.sleep(0.01)
+            assert controller.in_flight() == 2
+            assert controller.queued() == 2
+            release.set()
+            await asyncio.gather(*tasks)
+            assert controller.in_flight() == 0
+            assert controller.queued() == 0
+
+        asyncio.run(run())
+
+    def test_priority_order(self):
+        """Интерактивные запросы обслуживаются раньше bulk, внутри класса - FIFO."""
+        async def run():
+            controller = AdmissionController(1, {"interactive": 10, "bulk": 10})
+            order = []
+            releases = {}
+            tasks = []
+            for name, priority in [("first", "bulk"), ("bulk-1", "bulk"), ("vqa-1", "interactive"),
+                                   ("bulk-2", "bulk"), ("vqa-2", "interactive")]:
+                releases[name] = asyncio.Event()
+                tasks.append(asyncio.create_task(
+                    hold(controller, priority, 1.0, asyncio.Event(), releases[name], order, name)
+                ))
+                await asyncio.sleep(0)
+            for name in releases:
+                releases[name].set()
+            await asyncio.gather(*tasks)
+            assert order == ["first", "vqa-1", "vqa-2", "bulk-1", "bulk-2"]
+
+        asyncio.run(run())
+
+    def test_queue_full_rejected(self):
+        """При заполненной очереди класса запрос сразу получает 429 с Retry-After."""
+        async def run():
+            controller = AdmissionController(1, {"interactive": 1, "bulk": 0})
+            release = asyncio.Event()
+            tasks = [
+                asyncio.create_task(hold(controller, "interactive", 4.0, asyncio.Event(), release))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.01)
+            rejected_before = ADMISSION_REJECTED.labels("interactive", "queue_full").value
+
+            with pytest.raises(AdmissionRejected) as exc_info:
+                async with controller.admit("interactive", 1.0):
+                    pass
+            assert exc_info.value.status_code == 429
+            assert exc_info.value.error == "QUEUE_FULL"
+            assert exc_info.value.retry_after == 8
+            assert ADMISSION_REJECTED.labels("interactive", "queue_full").value == rejected_before + 1
+
+            with pytest.raises(AdmissionRejected):
+                controller.check("bulk")
+
+            release.set()
+            await asyncio.gather(*tasks)
+            controller.check("bulk")
+
+        asyncio.run(run())
+
+    def test_overloaded_rejected(self):
+        """Если ожидаемое время в очереди больше max_wait_s, запрос получает 503."""
+        async def run():
+            controller = AdmissionController(1, {"interactive": 10, "bulk": 10}, max_wait_s=5.0)
+            release = asyncio.Event()
+            task = asyncio.create_task(hold(controller, "bulk", 20.0, asyncio.Event(), release))
+            await asyncio.sleep(0.01)
+
+            with pytest.raises(AdmissionRejected) as exc_info:
+                async with controller.admit("interactive", 1.0):
+                    pass
+            assert exc_info.value.status_code == 503
+            assert exc_info.value.retry_after == 15
+
+            release.set()
+            await task
+
+        asyncio.run(run())
+
+    def test_estimated_wait_ignores_lower_priority(self):
+        """Bulk запросы в очереди не увеличивают ожидание интерактивных."""
+        async def run():
+            controller = AdmissionController(1, {"interactive": 10, "bulk": 10})
+            release = asyncio.Event()
+            tasks = [asyncio.create_task(hold(controller, "interactive", 2.0, asyncio.Event(), release))]
+            await asyncio.sleep(0)
+            tasks += [
+                asyncio.create_task(hold(controller, "bulk", 10.0, asyncio.Event(), release))
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            assert controller.estimated_wait("interactive") == pytest.approx(2.0, abs=0.1)
+            assert controller.estimated_wait("bulk") == pytest.approx(32.0, abs=0.1)
+            release.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """Отмененный запрос освобождает место в очереди и не занимает слот."""
+        async def run():
+            controller = AdmissionController(1, {"interactive": 10, "bulk": 10})
+            release = asyncio.Event()
+            running = asyncio.create_task(hold(controller, "interactive", 1.0, asyncio.Event(), release))
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(hold(controller, "interactive", 1.0, asyncio.Event(), release))
+            await asyncio.sleep(0.01)
+            assert controller.queued("interactive") == 1
+
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert controller.queued("interactive") == 0
+
+            release.set()
+            await running
+            assert controller.in_flight() == 0
+
+        asyncio.run(run())
+
+    def test_queue_wait_metric(self):
+        """Время ожидания в очереди попадает в гистограмму по классу приоритета."""
+        async def run():
+            controller = AdmissionController(1, {"interactive": 10, "bulk": 10})
+            before = ADMISSION_QUEUE_WAIT.labels("bulk").count
+            release = asyncio.Event()
+            running = asyncio.create_task(hold(controller, "interactive", 1.0, asyncio.Event(), release))
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(hold(controller, "bulk", 1.0, asyncio.Event(), asyncio.Event()))
+            await asyncio.sleep(0.05)
+            release.set()
+            await running
+            await asyncio.sleep(0)
+            waiting.cancel()
+            assert ADMISSION_QUEUE_WAIT.labels("bulk").count == before + 1
+            assert ADMISSION_QUEUE_WAIT.labels("bulk").sum >= 0.05
+
+        asyncio.run(run())
+
+
+class TestFairScheduling:
+    """Тесты взвешенного round-robin по клиентам."""
+
+    def run_order(self, controller, requests):
+        """Ставит запросы (клиент, класс) в очередь за занятым слотом и возвращает порядок обслуживания."""
+        async def run():
+            order = []
+            release = asyncio.Event()
+            tasks = [asyncio.create_task(hold(controller, "interactive", 1.0, asyncio.Event(), release))]
+            await asyncio.sleep(0)
+            for i, (client, priority) in enumerate(requests):
+                tasks.append(asyncio.create_task(hold(
+                    controller, priority, 1.0, asyncio.Event(), release, order, client, client
+                )))
+                await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(*tasks)
+            return order
+
+        return asyncio.run(run())
+
+    def test_round_robin_between_clients(self):
+        """Клиент с длинной очередью не задерживает клиента, пришедшего позже."""
+        controller = AdmissionController(1, {"interactive": 100, "bulk": 100})
+        order = self.run_order(controller, [("flood", "interactive")] * 4 + [("user", "interactive")] * 2)
+        assert order == ["flood", "user", "flood", "user", "flood", "flood"]
+
+    def test_weights(self, monkeypatch):
+        """Клиент с весом 2 получает вдвое больше слотов."""
+        import app.admission
+        monkeypatch.setattr(app.admission.settings, "CLIENT_WEIGHTS", {"heavy": 2.0})
+        controller = AdmissionController(1, {"interactive": 100, "bulk": 100})
+        order = self.run_order(controller, [("heavy", "interactive")] * 6 + [("light", "interactive")] * 6)
+        assert order[:6].count("heavy") == 4
+        assert order[:6].count("light") == 2
+
+    def test_priority_before_fairness(self):
+        """Класс приоритета важнее очередности клиентов."""
+        controller = AdmissionController(1, {"interactive": 100, "bulk": 100})
+        order = self.run_order(controller, [("a", "bulk"), ("b", "bulk"), ("c", "interactive")])
+        assert order == ["c", "a", "b"]
+
+    def test_client_queue_limit(self):
+        """Заполненная очередь одного клиента не мешает другим."""
+        async def run():
+            controller = AdmissionController(1, {"interactive": 100, "bulk": 100}, client_queue_limit=2)
+            release = asyncio.Event()
+            tasks = [
+                asyncio.create_task(hold(controller, "interactive", 1.0, asyncio.Event(), release, client="flood"))
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            with pytest.raises(AdmissionRejected) as exc_info:
+                controller.check("interactive", "flood")
+            assert exc_info.value.status_code == 429
+            controller.check("interactive", "user")
+            release.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+    def test_estimated_wait_is_fair(self):
+        """Ожидание нового клиента не растет с длиной очереди другого клиента."""
+        async def run():
+            controller = AdmissionController(1, {"interactive": 100, "bulk": 100})
+            release = asyncio.Event()
+            tasks = [
+                asyncio.create_task(hold(controller, "interactive", 1.0, asyncio.Event(), release, client="flood"))
+                for _ in range(20)
+            ]
+            await asyncio.sleep(0.01)
+            controller.max_wait_s = 5.0
+            assert controller.estimated_wait("interactive", "flood", 1.0) == pytest.approx(20.0, abs=0.1)
+            assert controller.estimated_wait("interactive", "user", 1.0) == pytest.approx(2.0, abs=0.1)
+            with pytest.raises(AdmissionRejected):
+                async with controller.admit("interactive", 1.0, "flood"):
+                    pass
+            tasks.append(asyncio.create_task(
+                hold(controller, "interactive", 1.0, asyncio.Event(), release, client="user")
+            ))
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+
+
+class TestRateLimiter:
+    """Тесты token bucket."""
+
+    def test_burst_and_refill(self):
+        now = [0.0]
+        limiter = RateLimiter(rate=0.5, burst=2, clock=lambda: now[0])
+        limiter.acquire("a", "bulk")
+        limiter.acquire("a", "bulk")
+        with pytest.raises(AdmissionRejected) as exc_info:
+            limiter.acquire("a", "bulk")
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.error == "RATE_LIMITED"
+        assert exc_info.value.retry_after == 2
+
+        limiter.acquire("b", "bulk")
+        now[0] = 2.0
+        limiter.acquire("a", "bulk")
+
+    def test_disabled(self):
+        limiter = RateLimiter(rate=0, burst=1)
+        for _ in range(100):
+            limiter.acquire("a", "bulk")
+
+    def test_idle_buckets_pruned(self, monkeypatch):
+        now = [0.0]
+        limiter = RateLimiter(rate=1.0, burst=1, clock=lambda: now[0])
+        monkeypatch.setattr(RateLimiter, "MAX_IDLE_BUCKETS", 3)
+        for i in range(4):
+            limiter.acquire(f"client-{i}", "bulk")
+        now[0] = 10.0
+        limiter.acquire("new", "bulk")
+        assert len(limiter._buckets) == 1
+
+
+class TestFairnessUnderFlood:
+    """Задержка обычного клиента при потоке запросов другого клиента (fake-бэкенд)."""
+
+    # Граница p95 для обычного клиента: несколько времен обслуживания,
+    # тогда как очередь флудера обслуживается больше секунды
+    P95_BOUND_S = 0.3
+
+    @pytest.fixture(autouse=True)
+    def fake_app(self, monkeypatch):
+        import app.main
+        monkeypatch.setattr(fake_backend.settings, "FAKE_PREFILL_MS", 5.0)
+        monkeypatch.setattr(fake_backend.settings, "FAKE_DECODE_MS_PER_TOKEN", 0.2)
+        monkeypatch.setattr(fake_backend.settings, "FAKE_MODEL_SIZE_MB", 1)
+        monkeypatch.setattr(ModelManager, "_backend", FakeBackend())
+        monkeypatch.setattr(ModelManager, "_entries", {})
+        monkeypatch.setattr(app.main, "model_manager", ModelManager())
+        monkeypatch.setattr(app.main, "admission", AdmissionController(1, {"interactive": 200, "bulk": 200}))
+        monkeypatch.setattr(app.main, "rate_limiter", RateLimiter(0, 1))
+        return app.main.app
+
+    def test_flood_does_not_starve_other_client(self, fake_app):
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), color="blue").save(buffer, format="PNG")
+        body = {"image": base64.b64encode(buffer.getvalue()).decode("utf-8"), "question": "What is this?"}
+
+        async def request(client, api_key):
+            started = time.perf_counter()
+            response = await client.post("/api/vqa", json=body, headers={"X-API-Key": api_key})
+            assert response.status_code == 200
+            return time.perf_counter() - started
+
+        async def user(client):
+            latencies = []
+            for _ in range(10):
+                latencies.append(await request(client, "user"))
+                await asyncio.sleep(0.02)
+            return latencies
+
+        async def run():
+            transport = httpx.ASGITransport(app=fake_app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await request(client, "warmup")
+                flood = [asyncio.create_task(request(client, "flood")) for _ in range(80)]
+                await asyncio.sleep(0.05)
+                user_latencies = await user(client)
+                flood_latencies = await asyncio.gather(*flood)
+                return user_latencies, flood_latencies
+
+        user_latencies, flood_latencies = asyncio.run(run())
+        user_p95 = sorted(user_latencies)[int(0.95 * len(user_latencies)) - 1]
+        assert max(flood_latencies) > 3 * self.P95_BOUND_S
+        assert user_p95 < self.P95_BOUND_S
+
+
+class TestCostEstimation:
+    """Тесты оценки стоимости и приоритета."""
+
+    def test_cost_grows_with_image_and_tokens(self, monkeypatch):
+        import app.admission
+        monkeypatch.setattr(app.admission, "decode_rate", lambda: 10.0)
+        monkeypatch.setattr(app.admission.settings, "ADMISSION_PREFILL_S_PER_MEGAPIXEL", 2.0)
+        assert estimate_cost(1000, 1000, 0) == pytest.approx(2.0)
+        assert estimate_cost(1000, 1000, 50) == pytest.approx(7.0)
+        assert estimate_cost(2000, 1000, 50) > estimate_cost(1000, 1000, 50)
+
+    def test_task_priority(self):
+        assert task_priority("vqa") == "interactive"
+        assert task_priority("caption") == "interactive"
+        assert task_priority("ocr") == "bulk"
+        assert task_priority("precaption") == "background"
+        assert task_priority("unknown") == "bulk"
@@ -38,6 +38,8 @@ def mock_model_manager(monkeypatch):
     """Мокирует ModelManager для всех тестов."""
     mock_manager = MagicMock()
     mock_manager.is_loaded.return_value = True
+    mock_manager.get_profile.return_value = None
+    mock_manager.loaded_models.return_value = {"default": {"name": "test-model", "size_mb": 1.0, "idle_s": 0.0}}
     mock_manager.vqa_inference.return_value = "This is a test image."
     mock_manager.ocr_inference.return_value = "Sample OCR text"
     
@@ -60,6 +62,14 @@ class TestHealthEndpoint:
         assert "model_loaded" in data
         assert "device" in data
         assert data["model_loaded"] is True
+        assert data["models"]["default"]["loaded"] is True
+        assert data["precaption_on_upload"] is False
+
+    def test_precaption_flag(self, client, mock_model_manager, monkeypatch):
+        """Frontend создает сессию при загрузке только при включенном фоновом описании."""
+        import app.main
+        monkeypatch.setattr(app.main.settings, "PRECAPTION_ON_UPLOAD", True)
+        assert client.get("/api/health").json()["precaption_on_upload"] is True
 
 
 class TestVQAEndpoint:
@@ -124,6 +134,68 @@ class TestVQAEndpoint:
         assert response2.status_code == 200
         assert response2.json()["session_id"] == session_id
     
+    def test_vqa_model_override(self, client, sample_image_base64, mock_model_manager):
+        """Тест передачи псевдонима модели в инференс."""
+        response = client.post(
+            "/api/vqa",
+            json={
+                "image": sample_image_base64,
+                "question": "What?",
+                "model": "default"
+            }
+        )
+        assert response.status_code == 200
+        args = mock_model_manager.vqa_inference.call_args[0]
+        assert args[2] == "default"
+    
+    def test_vqa_token_budget(self, client, sample_image_base64, mock_model_manager):
+        """Тест передачи бюджета токенов клиента в инференс."""
+        response = client.post(
+            "/api/vqa",
+            json={
+                "image": sample_image_base64,
+                "question": "Describe the image",
+                "max_new_tokens": 42
+            }
+        )
+        assert response.status_code == 200
+        assert response.json()["max_new_tokens"] == 42
+        assert mock_model_manager.vqa_inference.call_args[0][3] == 42
+    
+    def test_vqa_estimated_token_budget(self, client, sample_image_base64, mock_model_manager):
+        """Тест оценки бюджета для вопроса да/нет."""
+        response = client.post(
+            "/api/vqa",
+            json={
+                "image": sample_image_base64,
+                "question": "Is it red?"
+            }
+        )
+        assert response.status_code == 200
+        assert response.json()["max_new_tokens"] < 64
+    
+    def test_vqa_invalid_token_budget(self, client, sample_image_base64):
+        """Тест невалидного бюджета токенов."""
+        response = client.post(
+            "/api/vqa",
+            json={
+                "image": sample_image_base64,
+                "max_new_tokens": 0
+            }
+        )
+        assert response.status_code == 422
+    
+    def test_vqa_unknown_model(self, client, sample_image_base64):
+        """Тест VQA с незарегистрированной моделью."""
+        response = client.post(
+            "/api/vqa",
+            json={
+                "image": sample_image_base64,
+                "model": "unknown-model"
+            }
+        )
+        assert response.status_code == 400
+    
     def test_vqa_invalid_image(self, client):
         """Тест VQA с невалидным изображением."""
         response = client.post(
@@ -159,6 +231,269 @@ class TestVQAEndpoint:
         assert response.status_code == 422  # Validation error
 
 
+class TestSessionsEndpoint:
+    """Тесты для /api/sessions и фонового описания."""
+    
+    def setup_method(self):
+        sessions.clear()
+    
+    def test_create_session(self, client, sample_image_base64, mock_model_manager):
+        response = client.post("/api/sessions", json={"image": sample_image_base64})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["session_id"] in sessions
+        assert data["precaption"] is False
+        mock_model_manager.vqa_inference.assert_not_called()
+    
+    def test_invalid_image(self, client):
+        response = client.post("/api/sessions", json={"image": "invalid"})
+        assert response.status_code == 400
+    
+    def test_caption_served_from_session(self, client, sample_image_base64, mock_model_manager):
+        """Готовое фоновое описание возвращается без инференса."""
+        from app.budget import resolve_token_budget
+        session_id = client.post("/api/sessions", json={"image": sample_image_base64}).json()["session_id"]
+        sessions[session_id]["caption"] = {
+            "status": "done", "answer": "Precomputed caption.",
+            "max_new_tokens": resolve_token_budget("caption"), "task": None
+        }
+        
+        response = client.post("/api/vqa", json={"image": sample_image_base64, "session_id": session_id})
+        assert response.status_code == 200
+        assert response.json()["answer"] == "Precomputed caption."
+        mock_model_manager.vqa_inference.assert_not_called()
+        
+        response = client.post(
+            "/api/vqa", json={"image": sample_image_base64, "session_id": session_id, "question": "Color?"}
+        )
+        assert response.json()["answer"] == "This is a test image."
+
+
+class TestMultiImageVQA:
+    """Тесты для /api/vqa с несколькими изображениями."""
+    
+    def setup_method(self):
+        """Очистка перед каждым тестом."""
+        sessions.clear()
+    
+    def test_images_in_one_prompt(self, client, sample_image_base64, mock_model_manager):
+        """Изображения передаются одним списком: image, images, затем image_ids."""
+        stored = client.post("/api/sessions", json={"image": sample_image_base64}).json()["session_id"]
+        response = client.post(
+            "/api/vqa",
+            json={
+                "image": sample_image_base64, "images": [sample_image_base64],
+                "image_ids": [stored], "question": "What changed?"
+            }
+        )
+        assert response.status_code == 200
+        images, question = mock_model_manager.vqa_inference.call_args[0][:2]
+        assert isinstance(images, list) and len(images) == 3
+        assert images[2] is sessions[stored]["image"]
+        assert question == "What changed?"
+    
+    def test_single_image_unchanged(self, client, sample_image_base64, mock_model_manager):
+        response = client.post("/api/vqa", json={"image": sample_image_base64, "images": []})
+        assert response.status_code == 200
+        assert not isinstance(mock_model_manager.vqa_inference.call_args[0][0], list)
+    
+    def test_too_many_images(self, client, sample_image_base64, mock_model_manager, monkeypatch):
+        import app.main
+        monkeypatch.setattr(app.main.settings, "MAX_IMAGES_PER_REQUEST", 2)
+        response = client.post(
+            "/api/vqa", json={"image": sample_image_base64, "images": [sample_image_base64] * 2}
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "TOO_MANY_IMAGES"
+        mock_model_manager.vqa_inference.assert_not_called()
+    
+    def test_total_pixels_limit(self, client, sample_image_base64, mock_model_manager, monkeypatch):
+        import app.main
+        monkeypatch.setattr(app.main.settings, "MAX_TOTAL_PIXELS", 15000)
+        response = client.post(
+            "/api/vqa", json={"image": sample_image_base64, "images": [sample_image_base64]}
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "IMAGES_TOO_LARGE"
+    
+    def test_unknown_image_id(self, client, sample_image_base64, mock_model_manager):
+        response = client.post("/api/vqa", json={"image": sample_image_base64, "image_ids": ["missing"]})
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "IMAGE_NOT_FOUND"
+
+
+class TestConversation:
+    """Тесты диалога в сессии при CONVERSATION_ENABLED."""
+    
+    def setup_method(self):
+        sessions.clear()
+    
+    def test_history_passed_to_next_turn(self, client, sample_image_base64, mock_model_manager, monkeypatch):
+        import app.main
+        monkeypatch.setattr(app.main.settings, "CONVERSATION_ENABLED", True)
+        mock_model_manager.chat_inference.side_effect = lambda image, sid, history, question, *args: {
+            "answer": f"Answer {len(history)}.", "question": question, "raw": f"answer {len(history)}"
+        }
+        
+        response = client.post("/api/vqa", json={"image": sample_image_base64, "question": "What is this?"})
+        assert response.json()["answer"] == "Answer 0."
+        session_id = response.json()["session_id"]
+        
+        response = client.post(
+            "/api/vqa", json={"image": sample_image_base64, "session_id": session_id, "question": "Why?"}
+        )
+        assert response.json()["answer"] == "Answer 1."
+        assert sessions[session_id]["history"] == [("What is this?", "answer 0"), ("Why?", "answer 1")]
+        mock_model_manager.vqa_inference.assert_not_called()
+
+
+class TestNearDuplicateCache:
+    """Тесты переиспользования результатов для почти дубликатов изображений."""
+    
+    @pytest.fixture(autouse=True)
+    def enabled(self, monkeypatch):
+        import app.main
+        from app import phash
+        monkeypatch.setattr(app.main.settings, "NEAR_DUPLICATE_CACHE_ENABLED", True)
+        monkeypatch.setattr(phash, "_index", phash.NearDuplicateIndex(16, 8))
+    
+    def recompressed(self, size):
+        """Пережатая и уменьшенная копия того же изображения."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 100), color='red').resize((size, size)).save(buffer, format='JPEG', quality=70)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    
+    def test_vqa_reused(self, client, sample_image_base64, mock_model_manager):
+        client.post("/api/vqa", json={"image": sample_image_base64, "question": "What is this?"})
+        response = client.post("/api/vqa", json={"image": self.recompressed(80), "question": "What is this?"})
+        assert response.status_code == 200
+        assert response.json()["answer"] == "This is a test image."
+        assert mock_model_manager.vqa_inference.call_count == 1
+        
+        client.post("/api/vqa", json={"image": self.recompressed(80), "question": "Another?"})
+        assert mock_model_manager.vqa_inference.call_count == 2
+    
+    def test_ocr_reused(self, client, sample_image_base64, mock_model_manager):
+        client.post("/api/ocr", json={"image": sample_image_base64})
+        response = client.post("/api/ocr", json={"image": self.recompressed(90)})
+        assert response.status_code == 200
+        assert response.json()["text"] == "Sample OCR text"
+        assert mock_model_manager.ocr_inference.call_count == 1
+
+
+class TestVideoEndpoint:
+    """Тесты для /api/video."""
+    
+    @pytest.fixture
+    def sampled(self, monkeypatch):
+        import app.main
+        calls = []
+        
+        def fake_sample_frames(path, strategy, max_frames):
+            with open(path, "rb") as f:
+                calls.append((f.read(), strategy, max_frames))
+            return {
+                "frames": [
+                    {"index": i * 25, "timestamp": float(i), "image": Image.new("RGB", (64, 36), "red")}
+                    for i in range(2)
+                ],
+                "candidates": 3, "frame_count": 75, "fps": 25.0, "duration": 3.0,
+            }
+        
+        monkeypatch.setattr(app.main, "sample_frames", fake_sample_frames)
+        return calls
+    
+    def test_video_question(self, client, mock_model_manager, sampled):
+        mock_model_manager.video_inference.return_value = "A red screen."
+        response = client.post(
+            "/api/video", params={"question": "What happens?", "strategy": "scene", "max_frames": 4},
+            content=b"clip-bytes", headers={"Content-Type": "video/mp4"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["answer"] == "A red screen."
+        assert data["frames"] == [{"index": 0, "timestamp": 0.0}, {"index": 25, "timestamp": 1.0}]
+        assert data["candidates"] == 3
+        assert sampled == [(b"clip-bytes", "scene", 4)]
+        frames, question = mock_model_manager.video_inference.call_args[0][:2]
+        assert len(frames) == 2 and question == "What happens?"
+    
+    def test_invalid_strategy(self, client, sampled):
+        response = client.post("/api/video", params={"strategy": "random"}, content=b"clip")
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "INVALID_SAMPLING"
+    
+    def test_too_many_frames(self, client, sampled):
+        response = client.post("/api/video", params={"max_frames": 1000}, content=b"clip")
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "TOO_MANY_FRAMES"
+    
+    def test_too_large(self, client, sampled, monkeypatch):
+        import app.main
+        monkeypatch.setattr(app.main.settings, "VIDEO_MAX_SIZE", 4)
+        response = client.post("/api/video", content=b"clip-bytes")
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "VIDEO_TOO_LARGE"
+        assert sampled == []
+
+
+class TestVQABatchEndpoint:
+    """Тесты для /api/vqa/batch."""
+    
+    ANSWERS = [
+        {"answer": "A red square.", "tokens": 4, "latency_ms": 120.0},
+        {"answer": "Red.", "tokens": 2, "latency_ms": 80.0},
+    ]
+    
+    def setup_method(self):
+        sessions.clear()
+    
+    def test_answers_in_order(self, client, sample_image_base64, mock_model_manager):
+        mock_model_manager.vqa_multi_inference.return_value = self.ANSWERS
+        response = client.post(
+            "/api/vqa/batch",
+            json={"image": sample_image_base64, "questions": ["What is this?", "Color?"], "max_new_tokens": 16}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [a["question"] for a in data["answers"]] == ["What is this?", "Color?"]
+        assert [a["answer"] for a in data["answers"]] == ["A red square.", "Red."]
+        assert data["answers"][1]["latency_ms"] == 80.0
+        assert data["max_new_tokens"] == 16
+        assert data["session_id"] in sessions
+        
+        image, questions, max_new_tokens, model = mock_model_manager.vqa_multi_inference.call_args[0]
+        assert image.size == (100, 100)
+        assert questions == ["What is this?", "Color?"]
+        mock_model_manager.vqa_inference.assert_not_called()
+    
+    def test_session_image_reused(self, client, sample_image_base64, mock_model_manager):
+        """Изображение берется из сессии, повторно передавать его не нужно."""
+        mock_model_manager.vqa_multi_inference.return_value = self.ANSWERS
+        session_id = client.post(
+            "/api/vqa", json={"image": sample_image_base64, "question": "First"}
+        ).json()["session_id"]
+        
+        response = client.post("/api/vqa/batch", json={"session_id": session_id, "questions": ["a", "b"]})
+        assert response.status_code == 200
+        assert response.json()["session_id"] == session_id
+    
+    def test_unknown_session_without_image(self, client):
+        response = client.post("/api/vqa/batch", json={"session_id": "missing", "questions": ["a"]})
+        assert response.status_code == 400
+        assert response.json()["detail"]["code"] == "EMPTY_IMAGE"
+    
+    def test_too_many_questions(self, client, sample_image_base64, monkeypatch):
+        monkeypatch.setattr("app.validators.settings.MAX_QUESTIONS_PER_REQUEST", 2)
+        response = client.post("/api/vqa/batch", json={"image": sample_image_base64, "questions": ["a", "b", "c"]})
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "TOO_MANY_QUESTIONS"
+    
+    def test_empty_questions(self, client, sample_image_base64):
+        response = client.post("/api/vqa/batch", json={"image": sample_image_base64, "questions": []})
+        assert response.status_code == 422
+
+
 class TestOCREndpoint:
     """Тесты для /api/ocr."""
     
@@ -195,6 +530,25 @@ class TestOCREndpoint:
         data = response.json()
         assert "text" in data
     
+    def test_ocr_large_text_streamed(self, client, sample_image_base64, mock_model_manager, monkeypatch):
+        """Длинный текст отдается потоком, тело - тот же JSON, что и без потока."""
+        import app.main
+        monkeypatch.setattr(app.main.settings, "OCR_STREAM_MIN_CHARS", 1000)
+        text = "Строка \"текста\"\n" * 500
+        mock_model_manager.ocr_inference.return_value = text
+        response = client.post("/api/ocr", json={"image": sample_image_base64})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        data = response.json()
+        assert data["text"] == text
+        assert data["download_url"] == f"/api/download/ocr/{data['task_id']}"
+        assert data["tiles"] == 1
+    
+    def test_malformed_json(self, client):
+        """Некорректный JSON разбирается orjson и дает 422, как раньше."""
+        response = client.post("/api/ocr", content=b'{"image": ', headers={"Content-Type": "application/json"})
+        assert response.status_code == 422
+    
     def test_ocr_invalid_image(self, client):
         """Тест OCR с невалидным изображением."""
         response = client.post(
@@ -243,6 +597,32 @@ class TestDownloadOCREndpoint:
         assert task_id in response.headers["content-disposition"]
         assert response.text == "Sample OCR text"
     
+    def test_download_gzip_and_range(self, client):
+        """Сжатый текст отдается как есть; Range и клиент без gzip получают распакованные байты."""
+        import app.main
+        text = "Строка распознанного текста\n" * 200
+        task_id = app.main.save_ocr_result(text)
+        data = text.encode("utf-8")
+        url = f"/api/download/ocr/{task_id}"
+        
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text == text
+        assert int(response.headers["content-length"]) < len(data)
+        
+        response = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert response.content == data
+        
+        response = client.get(url, headers={"Range": "bytes=10-109"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 10-109/{len(data)}"
+        assert response.content == data[10:110]
+        
+        response = client.get(url, headers={"Range": f"bytes={len(data)}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(data)}"
+    
     def test_download_nonexistent_task(self, client):
         """Тест скачивания несуществующего результата."""
         response = client.get("/api/download/ocr/nonexistent-task-id")
@@ -257,4 +637,276 @@ class TestRootEndpoint:
         response = client.get("/")
         assert response.status_code == 200
         assert "text/html" in response.headers["content-type"]
+    
+    def test_root_not_modified(self, client):
+        """Повторный запрос с ETag получает 304."""
+        response = client.get("/")
+        etag = response.headers.get("etag")
+        if etag is None:
+            pytest.skip("Frontend не найден")
+        assert client.get("/", headers={"If-None-Match": etag}).status_code == 304
+    
+    def test_static_file_gzip(self, client):
+        """Файлы frontend отдаются из кэша сжатыми, если клиент принимает gzip."""
+        import app.main
+        if "app.js" not in app.main.static_cache.assets:
+            pytest.skip("Frontend не найден")
+        response = client.get("/static/app.js", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert "etag" in response.headers
+    
+    def test_static_file_missing(self, client):
+        assert client.get("/static/missing.js").status_code == 404
+
+
+
+class TestMetricsEndpoint:
+    """Тесты для /metrics."""
+    
+    def test_metrics_exposition(self, client, sample_image_base64):
+        """Метрики отдаются в формате Prometheus и учитывают запросы."""
+        client.post("/api/vqa", json={"image": sample_image_base64, "question": "What?"})
+        client.get("/api/download/ocr/nonexistent-task-id")
+        
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        assert 'http_requests_total{method="POST",path="/api/vqa",status="200"}' in text
+        assert 'path="/api/download/ocr/{task_id}",status="404"' in text
+        assert 'request_stage_seconds_count{stage="base64_decode"}' in text
+        assert 'request_stage_seconds_count{stage="image_validate"}' in text
+        assert "sessions_stored" in text
+        assert "inference_queue_depth 0" in text
+
+
+class TestServerTiming:
+    """Тесты для заголовка Server-Timing и экспорта трасс."""
+    
+    def test_server_timing_header(self, client, sample_image_base64):
+        """Ответ содержит длительности стадий и общее время."""
+        response = client.post("/api/vqa", json={"image": sample_image_base64, "question": "What?"})
+        assert response.status_code == 200
+        timing = response.headers["server-timing"]
+        names = [part.split(";")[0].strip() for part in timing.split(",")]
+        assert names[:2] == ["base64_decode", "image_validate"]
+        assert "inference" in names
+        assert names[-1] == "total"
+    
+    def test_server_timing_on_errors(self, client):
+        """Заголовок есть и у ошибок."""
+        response = client.get("/api/download/ocr/nonexistent-task-id")
+        assert response.status_code == 404
+        assert response.headers["server-timing"].startswith("total;dur=")
+    
+    def test_trace_export(self, client, sample_image_base64, tmp_path, monkeypatch):
+        """Выбранные трассы пишутся в JSONL."""
+        import app.tracing
+        path = tmp_path / "traces.jsonl"
+        monkeypatch.setattr(app.tracing.settings, "TRACING_ENABLED", True)
+        monkeypatch.setattr(app.tracing.settings, "TRACE_SAMPLE_RATE", 1.0)
+        monkeypatch.setattr(app.tracing.settings, "TRACE_EXPORT_PATH", str(path))
+        
+        client.post("/api/vqa", json={"image": sample_image_base64, "question": "What?"})
+        app.tracing.get_exporter().flush()
+        
+        import json
+        records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        root = records[0]
+        assert root["name"] == "POST /api/vqa"
+        assert root["attributes"]["http.status_code"] == 200
+        assert {"base64_decode", "image_validate", "inference"} <= {record["name"] for record in records}
+
+
+class TestProfilingEndpoints:
+    """Тесты для /api/admin/profiling."""
+    
+    @pytest.fixture
+    def profiling_enabled(self, tmp_path, monkeypatch):
+        import app.main
+        monkeypatch.setattr(app.main.settings, "PROFILING_ENABLED", True)
+        monkeypatch.setattr(app.main.settings, "ADMIN_TOKEN", "secret")
+        monkeypatch.setattr(app.main.settings, "PROFILING_DIR", str(tmp_path))
+        return tmp_path
+    
+    def test_disabled(self, client, monkeypatch):
+        """По умолчанию endpoints не существуют."""
+        import app.main
+        monkeypatch.setattr(app.main.settings, "PROFILING_ENABLED", False)
+        response = client.get("/api/admin/profiling", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 404
+    
+    def test_requires_token(self, client, profiling_enabled):
+        assert client.get("/api/admin/profiling").status_code == 403
+        response = client.get("/api/admin/profiling", headers={"X-Admin-Token": "wrong"})
+        assert response.status_code == 403
+    
+    def test_empty_token_rejected(self, client, profiling_enabled, monkeypatch):
+        """Пустой ADMIN_TOKEN не открывает доступ."""
+        import app.main
+        monkeypatch.setattr(app.main.settings, "ADMIN_TOKEN", "")
+        response = client.get("/api/admin/profiling", headers={"X-Admin-Token": ""})
+        assert response.status_code == 403
+    
+    def test_status_and_download(self, client, profiling_enabled):
+        (profiling_enabled / "stack-test.folded").write_text("main;run 3\n")
+        headers = {"X-Admin-Token": "secret"}
+        
+        response = client.get("/api/admin/profiling", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["artifacts"] == [{"name": "stack-test.folded", "size_bytes": 11}]
+        
+        response = client.get("/api/admin/profiling/artifacts/stack-test.folded", headers=headers)
+        assert response.status_code == 200
+        assert response.text == "main;run 3\n"
+        
+        response = client.get("/api/admin/profiling/artifacts/missing.folded", headers=headers)
+        assert response.status_code == 404
+
+
+class TestAdmission:
+    """Тесты отказа в допуске к инференсу."""
+    
+    @pytest.fixture
+    def busy_admission(self, monkeypatch):
+        import app.main
+        from app.admission import AdmissionRejected
+        busy = MagicMock()
+        busy.check.side_effect = AdmissionRejected(429, "QUEUE_FULL", "Очередь запросов (bulk) заполнена", 7)
+        monkeypatch.setattr(app.main, "admission", busy)
+        return busy
+    
+    def test_queue_full_returns_429(self, client, sample_image_base64, mock_model_manager, busy_admission):
+        response = client.post("/api/ocr", json={"image": sample_image_base64})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "7"
+        assert response.json()["detail"]["error"] == "QUEUE_FULL"
+        assert busy_admission.check.call_args[0][0] == "bulk"
+        mock_model_manager.ocr_inference.assert_not_called()
+    
+    def test_overloaded_returns_503(self, client, sample_image_base64, mock_model_manager, busy_admission):
+        from app.admission import AdmissionRejected
+        busy_admission.check.side_effect = AdmissionRejected(503, "OVERLOADED", "Сервер перегружен", 12)
+        response = client.post("/api/vqa", json={"image": sample_image_base64, "question": "What?"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "12"
+        assert busy_admission.check.call_args[0][0] == "interactive"
+        mock_model_manager.vqa_inference.assert_not_called()
+    
+    def test_queue_wait_in_metrics(self, client, sample_image_base64):
+        client.post("/api/vqa", json={"image": sample_image_base64, "question": "What?"})
+        body = client.get("/metrics").text
+        assert 'admission_queue_wait_seconds_count{priority="interactive"}' in body
+
+
+class TestTiledOCR:
+    """Тесты для /api/ocr с разбиением на полосы."""
+    
+    @pytest.fixture
+    def tall_image_base64(self):
+        img = Image.new('RGB', (400, 2000), color='white')
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    
+    def test_tiled_ocr(self, client, tall_image_base64, mock_model_manager):
+        mock_model_manager.ocr_batch_inference.return_value = [
+            "Title\nfirst paragraph", "first paragraph\nsecond paragraph", "second paragraph\nfooter"
+        ]
+        response = client.post("/api/ocr", json={"image": tall_image_base64, "tiled": True})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["tiles"] == 3
+        assert data["text"] == "Title\nfirst paragraph\nsecond paragraph\nfooter"
+        tiles = mock_model_manager.ocr_batch_inference.call_args[0][0]
+        assert len(tiles) == 3
+        mock_model_manager.ocr_inference.assert_not_called()
+    
+    def test_small_image_not_tiled(self, client, sample_image_base64, mock_model_manager):
+        response = client.post("/api/ocr", json={"image": sample_image_base64, "tiled": True})
+        assert response.status_code == 200
+        assert response.json()["tiles"] == 1
+        mock_model_manager.ocr_inference.assert_called_once()
+
 
+class TestOCRJobs:
+    """Тесты для /api/ocr/jobs."""
+    
+    @pytest.fixture(autouse=True)
+    def job_db(self, tmp_path, monkeypatch):
+        import app.main
+        monkeypatch.setattr(app.main.settings, "OCR_JOBS_DB", str(tmp_path / "jobs.sqlite3"))
+    
+    def process_all(self, mock_model_manager):
+        import asyncio
+        import app.main
+        from app.jobs import get_store, process_next
+        mock_model_manager.ocr_batch_inference.side_effect = lambda images, *args: [
+            f"page text {i}" for i in range(len(images))
+        ]
+        
+        async def run():
+            while await process_next(get_store(), mock_model_manager, app.main.admission,
+                                     app.main.run_inference, 4):
+                pass
+        
+        asyncio.run(run())
+    
+    def test_job_lifecycle(self, client, sample_image_base64, mock_model_manager):
+        import json
+        import zipfile
+        
+        response = client.post("/api/ocr/jobs", json={"images": [sample_image_base64] * 3})
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued"
+        assert job["total"] == 3
+        
+        response = client.get(f"{job['result_url']}?format=zip")
+        assert response.status_code == 409
+        
+        self.process_all(mock_model_manager)
+        
+        response = client.get(job["status_url"])
+        assert response.status_code == 200
+        assert response.json()["status"] == "done"
+        assert response.json()["progress"] == 1.0
+        
+        response = client.get(job["result_url"])
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["text"] for line in lines] == ["page text 0", "page text 1", "page text 2"]
+        
+        response = client.get(f"{job['result_url']}?format=zip")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            assert archive.namelist() == ["page-0001.txt", "page-0002.txt", "page-0003.txt"]
+    
+    def test_invalid_image_rejected(self, client, sample_image_base64):
+        response = client.post("/api/ocr/jobs", json={"images": [sample_image_base64, "invalid"]})
+        assert response.status_code == 400
+    
+    def test_too_many_images(self, client, sample_image_base64, monkeypatch):
+        import app.main
+        monkeypatch.setattr(app.main.settings, "OCR_JOB_MAX_IMAGES", 2)
+        response = client.post("/api/ocr/jobs", json={"images": [sample_image_base64] * 3})
+        assert response.status_code == 400
+        assert response.json()["detail"]["code"] == "JOB_TOO_LARGE"
+    
+    def test_queue_full(self, client, sample_image_base64, monkeypatch):
+        import app.main
+        monkeypatch.setattr(app.main.settings, "OCR_JOB_MAX_PENDING_PAGES", 3)
+        assert client.post("/api/ocr/jobs", json={"images": [sample_image_base64] * 2}).status_code == 202
+        response = client.post("/api/ocr/jobs", json={"images": [sample_image_base64] * 2})
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+    
+    def test_unknown_job(self, client):
+        assert client.get("/api/ocr/jobs/missing").status_code == 404
+        assert client.get("/api/ocr/jobs/missing/result").status_code == 404
+    
+    def test_invalid_format(self, client, sample_image_base64):
+        job = client.post("/api/ocr/jobs", json={"images": [sample_image_base64]}).json()
+        assert client.get(f"{job['result_url']}?format=pdf").status_code == 400
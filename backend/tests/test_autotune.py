@@ -0,0 +1,144 @@
+"""
+Тесты для автотюнера конфигурации инференса.
+"""
+import pytest
+import json
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app.autotune as autotune
+from app.autotune import (
+    select_best, load_profile, save_profile, fingerprint,
+    candidate_configs, ensure_profile, synthetic_images
+)
+
+
+class FakeManager:
+    """Менеджер модели, имитирующий инференс без весов."""
+
+    def __init__(self):
+        self.loads = []
+        self.profile = None
+
+    def unload_model(self):
+        pass
+
+    def load_model(self, torch_dtype=None, attn_implementation=None):
+        self.loads.append((torch_dtype, attn_implementation))
+
+    def set_profile(self, profile):
+        self.profile = profile
+
+    def configure_threads(self, num_threads=0, num_interop_threads=0):
+        pass
+
+    def vqa_batch_inference(self, images, questions, max_new_tokens=512):
+        return ["answer"] * len(images)
+
+
+@pytest.fixture
+def profile_file(tmp_path, monkeypatch):
+    """Направляет профиль автотюнера во временный файл."""
+    path = tmp_path / "profile.json"
+    monkeypatch.setattr(autotune.settings, "AUTOTUNE_PROFILE_PATH", str(path))
+    return path
+
+
+class TestSelectBest:
+    """Тесты выбора лучшей конфигурации."""
+
+    def test_best_throughput_within_slo(self):
+        """Выбирается максимальная пропускная способность среди укладывающихся в SLO."""
+        results = [
+            {"batch_size": 1, "latency_ms": 100, "throughput": 10},
+            {"batch_size": 4, "latency_ms": 300, "throughput": 13},
+            {"batch_size": 8, "latency_ms": 900, "throughput": 9},
+            {"batch_size": 16, "latency_ms": 2000, "throughput": 30},
+        ]
+        assert select_best(results, 1000)["batch_size"] == 4
+
+    def test_fallback_to_lowest_latency(self):
+        """Если SLO не выполним, выбирается минимальная задержка."""
+        results = [
+            {"batch_size": 1, "latency_ms": 1500, "throughput": 1},
+            {"batch_size": 2, "latency_ms": 2500, "throughput": 1.5},
+        ]
+        assert select_best(results, 1000)["batch_size"] == 1
+
+    def test_empty_results(self):
+        """Пустые результаты."""
+        assert select_best([], 1000) is None
+
+
+class TestProfilePersistence:
+    """Тесты сохранения и загрузки профиля."""
+
+    def test_roundtrip(self, profile_file):
+        """Профиль с актуальным fingerprint загружается."""
+        profile = {"batch_size": 2, "fingerprint": fingerprint()}
+        save_profile(profile)
+        assert load_profile() == profile
+
+    def test_missing_profile(self, profile_file):
+        """Отсутствующий профиль."""
+        assert load_profile() is None
+
+    def test_stale_fingerprint(self, profile_file):
+        """Профиль с другим окружением игнорируется."""
+        profile_file.write_text(json.dumps({"batch_size": 2, "fingerprint": {"model_name": "other"}}))
+        assert load_profile() is None
+
+    def test_corrupted_profile(self, profile_file):
+        """Поврежденный файл профиля игнорируется."""
+        profile_file.write_text("{not json")
+        assert load_profile() is None
+
+
+class TestAutotune:
+    """Тесты запуска автотюнера."""
+
+    def test_candidate_configs(self, monkeypatch):
+        """Матрица конфигураций - декартово произведение настроек."""
+        monkeypatch.setattr(autotune.settings, "AUTOTUNE_DTYPES", ["float32", "bfloat16"])
+        monkeypatch.setattr(autotune.settings, "AUTOTUNE_ATTN_IMPLEMENTATIONS", ["eager"])
+        monkeypatch.setattr(autotune.settings, "AUTOTUNE_THREADS", [4, 2])
+        monkeypatch.setattr(autotune.settings, "DEVICE", "cpu")
+        assert len(candidate_configs()) == 4
+
+    def test_synthetic_images(self):
+        """Синтетические изображения нужного размера."""
+        images = synthetic_images(2, size=32)
+        assert len(images) == 2
+        assert images[0].size == (32, 32)
+
+    def test_ensure_profile_runs_and_persists(self, profile_file, monkeypatch):
+        """Без сохраненного профиля запускается подбор, результат сохраняется."""
+        monkeypatch.setattr(autotune.settings, "AUTOTUNE_DTYPES", ["float32"])
+        monkeypatch.setattr(autotune.settings, "AUTOTUNE_ATTN_IMPLEMENTATIONS", ["eager", "sdpa"])
+        monkeypatch.setattr(autotune.settings, "AUTOTUNE_THREADS", [1])
+        monkeypatch.setattr(autotune.settings, "AUTOTUNE_BATCH_SIZES", [1, 2])
+        monkeypatch.setattr(autotune.settings, "AUTOTUNE_ITERATIONS", 1)
+        manager = FakeManager()
+
+        profile = ensure_profile(manager)
+
+        assert profile_file.exists()
+        assert manager.profile == profile
+        assert profile["batch_size"] in (1, 2)
+        assert len(profile["results"]) == 4
+        assert ("float32", "eager") in manager.loads
+        assert ("float32", "sdpa") in manager.loads
+
+    def test_ensure_profile_reuses_saved(self, profile_file):
+        """Сохраненный профиль переиспользуется без повторного подбора."""
+        saved = {"batch_size": 4, "torch_dtype": "float32", "fingerprint": fingerprint()}
+        save_profile(saved)
+        manager = FakeManager()
+
+        profile = ensure_profile(manager)
+
+        assert profile == saved
+        assert manager.loads == [(None, None)]
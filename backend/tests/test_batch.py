@@ -0,0 +1,187 @@
+"""
+Тесты пакетной обработки из командной строки.
+"""
+import pytest
+import json
+import sys
+import os
+from PIL import Image
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import fake_backend
+from app.batch import iter_inputs, load_checkpoint, prefetch, run_batch, format_eta
+from app.fake_backend import FakeBackend
+from app.model_manager import ModelManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """ModelManager с быстрым fake-бэкендом."""
+    monkeypatch.setattr(fake_backend.settings, "FAKE_PREFILL_MS", 1.0)
+    monkeypatch.setattr(fake_backend.settings, "FAKE_DECODE_MS_PER_TOKEN", 0.1)
+    monkeypatch.setattr(fake_backend.settings, "FAKE_MODEL_SIZE_MB", 1)
+    monkeypatch.setattr(ModelManager, "_backend", FakeBackend())
+    monkeypatch.setattr(ModelManager, "_entries", {})
+    monkeypatch.setattr(ModelManager, "_profile", None)
+    manager = ModelManager()
+    manager.load_model()
+    return manager
+
+
+@pytest.fixture
+def images(tmp_path):
+    """Каталог с пятью изображениями (одно во вложенной папке) и посторонним файлом."""
+    root = tmp_path / "images"
+    (root / "sub").mkdir(parents=True)
+    for i in range(4):
+        Image.new("RGB", (32 + i, 32), "red").save(root / f"img{i}.png")
+    Image.new("RGB", (40, 40), "blue").save(root / "sub" / "nested.jpg")
+    (root / "notes.txt").write_text("не изображение")
+    return root
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+class TestInputs:
+    """Тесты перечисления входных изображений."""
+
+    def test_directory(self, images):
+        paths = [item["path"] for item in iter_inputs(str(images))]
+        assert len(paths) == 5
+        assert paths == sorted(paths)
+        assert str(images / "sub" / "nested.jpg") in paths
+
+    def test_text_manifest(self, tmp_path):
+        manifest = tmp_path / "list.txt"
+        manifest.write_text("# комментарий\na.png\n\n/abs/b.png\n")
+        assert [item["path"] for item in iter_inputs(str(manifest))] == [str(tmp_path / "a.png"), "/abs/b.png"]
+
+    def test_jsonl_manifest(self, tmp_path):
+        manifest = tmp_path / "list.jsonl"
+        manifest.write_text(json.dumps({"path": "a.png", "question": "Что это?"}) + "\n")
+        assert list(iter_inputs(str(manifest))) == [{"path": str(tmp_path / "a.png"), "question": "Что это?"}]
+
+
+class TestPrefetch:
+    """Тесты загрузки изображений."""
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_order_and_errors(self, images, tmp_path, workers):
+        broken = tmp_path / "broken.png"
+        broken.write_bytes(b"not an image")
+        items = [{"path": str(path)} for path in sorted(images.glob("*.png"))]
+        items.insert(1, {"path": str(broken)})
+        items.append({"path": str(tmp_path / "missing.png")})
+
+        results = list(prefetch(items, workers, window=2))
+        assert [item for item, _, _ in results] == items
+        assert results[0][1].mode == "RGB" and results[0][2] is None
+        assert results[1][1] is None and results[1][2]
+        assert "Не удалось прочитать файл" in results[-1][2]
+
+
+class TestCheckpoint:
+    """Тесты чекпоинта по выходному файлу."""
+
+    def test_missing(self, tmp_path):
+        assert load_checkpoint(tmp_path / "out.jsonl") == set()
+
+    def test_truncates_partial_line(self, tmp_path):
+        output = tmp_path / "out.jsonl"
+        output.write_text(
+            json.dumps({"path": "a", "text": "x"}) + "\n"
+            + json.dumps({"path": "b", "error": "e"}) + "\n"
+            + '{"path": "c", "te'
+        )
+        assert load_checkpoint(output) == {"a", "b"}
+        assert output.read_text().endswith("\n")
+        assert load_checkpoint(output, retry_errors=True) == {"a"}
+        assert [record["path"] for record in read_records(output)] == ["a"]
+
+    def test_format_eta(self):
+        assert format_eta(3725.9) == "1:02:05"
+
+
+class TestRunBatch:
+    """Тесты пакетной обработки на fake-бэкенде."""
+
+    def test_caption(self, images, tmp_path, manager):
+        output = tmp_path / "out" / "captions.jsonl"
+        summary = run_batch(str(images), str(output), "caption", batch_size=2, workers=0, manager=manager)
+        assert summary == {"total": 5, "skipped": 0, "processed": 5, "errors": 0}
+        records = read_records(output)
+        assert len(records) == 5
+        assert all(record["task"] == "caption" and record["text"] for record in records)
+
+    def test_resume(self, images, tmp_path, manager):
+        """Повторный запуск обрабатывает только новые изображения."""
+        output = tmp_path / "captions.jsonl"
+        run_batch(str(images), str(output), batch_size=2, workers=0, manager=manager)
+        Image.new("RGB", (48, 48), "green").save(images / "new.png")
+        with open(output, "a") as f:
+            f.write('{"path": "half-writ')
+
+        summary = run_batch(str(images), str(output), batch_size=2, workers=0, manager=manager)
+        assert summary == {"total": 6, "skipped": 5, "processed": 1, "errors": 0}
+        records = read_records(output)
+        assert len(records) == 6
+        assert records[-1]["path"] == str(images / "new.png")
+
+    def test_retry_errors_one_record_per_path(self, images, tmp_path, manager, monkeypatch):
+        """Повтор ошибок заменяет записи с ошибкой, а не дописывает вторую запись."""
+        output = tmp_path / "captions.jsonl"
+        failing = manager.vqa_batch_inference
+
+        def fail(*args):
+            raise RuntimeError("oom")
+
+        monkeypatch.setattr(manager, "vqa_batch_inference", fail)
+        summary = run_batch(str(images), str(output), batch_size=2, workers=0, manager=manager)
+        assert summary["errors"] == 5
+        monkeypatch.setattr(manager, "vqa_batch_inference", failing)
+
+        summary = run_batch(str(images), str(output), batch_size=2, workers=0, manager=manager, retry_errors=True)
+        assert summary == {"total": 5, "skipped": 0, "processed": 5, "errors": 0}
+        records = read_records(output)
+        paths = [record["path"] for record in records]
+        assert len(paths) == len(set(paths)) == 5
+        assert all("text" in record for record in records)
+
+        summary = run_batch(str(images), str(output), batch_size=2, workers=0, manager=manager, retry_errors=True)
+        assert summary["skipped"] == 5
+        assert len(read_records(output)) == 5
+
+    def test_vqa_questions_from_manifest(self, images, tmp_path, manager, monkeypatch):
+        manifest = tmp_path / "list.jsonl"
+        manifest.write_text(
+            json.dumps({"path": str(images / "img0.png"), "question": "What color?"}) + "\n"
+            + json.dumps({"path": str(images / "img1.png")}) + "\n"
+        )
+        calls = []
+        original = manager.vqa_batch_inference
+
+        def spy(images, questions, *args):
+            calls.append(questions)
+            return original(images, questions, *args)
+
+        monkeypatch.setattr(manager, "vqa_batch_inference", spy)
+        run_batch(str(manifest), str(tmp_path / "out.jsonl"), "vqa", question="Default?",
+                  batch_size=4, workers=0, manager=manager)
+        assert calls == [["What color?", "Default?"]]
+
+    def test_ocr_with_invalid_image_and_model_error(self, images, tmp_path, manager, monkeypatch):
+        (images / "broken.png").write_bytes(b"not an image")
+        output = tmp_path / "ocr.jsonl"
+
+        def fail(images, *args):
+            raise RuntimeError("model failed")
+
+        monkeypatch.setattr(manager, "ocr_batch_inference", fail)
+        summary = run_batch(str(images), str(output), "ocr", batch_size=8, workers=1, manager=manager)
+        assert summary["errors"] == 6
+        errors = [record["error"] for record in read_records(output)]
+        assert sum("model failed" in error for error in errors) == 5
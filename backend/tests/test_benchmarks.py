@@ -0,0 +1,111 @@
+"""
+Тесты для нагрузочного теста и сравнения с baseline.
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+
+from app import fake_backend
+from app.admission import AdmissionController
+from app.fake_backend import FakeBackend
+from app.model_manager import ModelManager
+from benchmarks.bench_load import (
+    LoadGenerator, arrival_times, parse_mix, percentile, summarize
+)
+from benchmarks.regression import compare, flatten
+
+
+class TestLoadHelpers:
+    """Тесты вспомогательных функций нагрузочного теста."""
+
+    def test_parse_mix(self):
+        assert parse_mix("vqa=3,ocr=1") == {"vqa": 0.75, "ocr": 0.25}
+        with pytest.raises(ValueError):
+            parse_mix("video=1")
+
+    def test_arrival_times(self):
+        """Пуассоновские моменты детерминированы по seed и в среднем дают заданную частоту."""
+        times = arrival_times(10, 2000, seed=1)
+        assert times == arrival_times(10, 2000, seed=1)
+        assert times == sorted(times)
+        assert 180 < times[-1] < 220
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([], 95) == 0.0
+
+    def test_summarize(self):
+        results = [("vqa", 200, 0.1), ("vqa", 500, 0.3), ("ocr", 200, 0.2), ("ocr", 0, 1.0)]
+        summary = summarize(results, elapsed=2.0)
+        assert summary["vqa"]["error_rate"] == 0.5
+        assert summary["all"]["requests"] == 4
+        assert summary["all"]["throughput_rps"] == 1.0
+        assert summary["ocr"]["p99_ms"] == 1000.0
+
+
+class TestRegression:
+    """Тесты сравнения с baseline."""
+
+    def test_flatten(self):
+        assert flatten({"a": {"b": 1, "c": "x"}}) == {"a.b": 1.0}
+
+    def test_detects_regressions(self):
+        baseline = {
+            "vqa": {"p95_ms": 100.0, "throughput_rps": 10.0, "error_rate": 0.0},
+            "postprocess": {"us_per_op": 20.0},
+        }
+        current = {
+            "vqa": {"p95_ms": 140.0, "throughput_rps": 6.0, "error_rate": 0.05},
+            "postprocess": {"us_per_op": 21.0},
+        }
+        regressions = compare(current, baseline, tolerance=0.3)
+        assert len(regressions) == 3
+        assert any(item.startswith("vqa.p95_ms") for item in regressions)
+        assert any(item.startswith("vqa.throughput_rps") for item in regressions)
+        assert any(item.startswith("vqa.error_rate") for item in regressions)
+
+    def test_small_latency_noise_ignored(self):
+        """Рост задержки на единицы миллисекунд не считается регрессией."""
+        assert compare({"download": {"p99_ms": 6.0}}, {"download": {"p99_ms": 2.0}}, 0.3) == []
+
+    def test_missing_metrics_ignored(self):
+        assert compare({}, {"vqa": {"p95_ms": 100.0}}, 0.3) == []
+
+
+class TestLoadGenerator:
+    """Прогон генератора нагрузки против приложения с fake-бэкендом."""
+
+    @pytest.fixture(autouse=True)
+    def fake_manager(self, monkeypatch):
+        import app.main
+        monkeypatch.setattr(fake_backend.settings, "FAKE_PREFILL_MS", 1.0)
+        monkeypatch.setattr(fake_backend.settings, "FAKE_DECODE_MS_PER_TOKEN", 0.1)
+        monkeypatch.setattr(fake_backend.settings, "FAKE_MODEL_SIZE_MB", 1)
+        monkeypatch.setattr(ModelManager, "_backend", FakeBackend())
+        monkeypatch.setattr(ModelManager, "_entries", {})
+        monkeypatch.setattr(app.main, "model_manager", ModelManager())
+        monkeypatch.setattr(app.main, "admission", AdmissionController(16, {"interactive": 64, "bulk": 64}))
+
+    def test_in_process_run(self):
+        from app.main import app
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                generator = LoadGenerator(client, parse_mix("vqa=2,caption=1,ocr=1,download=1"),
+                                          [64, 128], session_reuse=0.5, seed=3)
+                return await generator.run(rate=200, count=40, seed=3)
+
+        summary = asyncio.run(run())
+        assert summary["all"]["requests"] == 40
+        assert summary["all"]["errors"] == 0
+        assert {"vqa", "ocr"} <= set(summary)
+        assert summary["all"]["p50_ms"] <= summary["all"]["p99_ms"]
@@ -0,0 +1,140 @@
+"""
+Тесты для оценки бюджета генерируемых токенов.
+"""
+import pytest
+import sys
+import os
+from PIL import Image, ImageDraw
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app.budget
+from app.budget import (
+    estimate_vqa_tokens, estimate_ocr_tokens, text_density, decode_rate,
+    resolve_token_budget, SHORT_ANSWER_TOKENS, FACT_ANSWER_TOKENS, MIN_OCR_TOKENS
+)
+
+
+@pytest.fixture
+def text_page():
+    """Изображение, плотно заполненное "строками текста"."""
+    img = Image.new('L', (400, 400), color=255)
+    draw = ImageDraw.Draw(img)
+    for y in range(10, 390, 12):
+        for x in range(10, 390, 8):
+            draw.rectangle([x, y, x + 4, y + 6], fill=0)
+    return img.convert('RGB')
+
+
+@pytest.fixture
+def blank_image():
+    """Однотонное изображение без текста."""
+    return Image.new('RGB', (400, 400), color='white')
+
+
+class TestEstimateVQATokens:
+    """Тесты эвристики для вопросов."""
+
+    def test_caption(self):
+        """Описание изображения получает бюджет caption."""
+        assert estimate_vqa_tokens(None) == app.budget.settings.CAPTION_MAX_NEW_TOKENS
+        assert estimate_vqa_tokens("  ") == app.budget.settings.CAPTION_MAX_NEW_TOKENS
+
+    @pytest.mark.parametrize("question", [
+        "Is there a cat?", "Are the lights on?", "How many people are there?",
+        "Есть ли на фото собака?", "Сколько машин?"
+    ])
+    def test_yes_no_and_count(self, question):
+        """Да/нет и подсчет - короткий бюджет."""
+        assert estimate_vqa_tokens(question) == SHORT_ANSWER_TOKENS
+
+    @pytest.mark.parametrize("question", ["What color is the car?", "Где находится дом?"])
+    def test_fact(self, question):
+        """Фактические вопросы - средний бюджет."""
+        assert estimate_vqa_tokens(question) == FACT_ANSWER_TOKENS
+
+    @pytest.mark.parametrize("question", ["Describe the scene", "Why is the man running?", "Опиши подробно"])
+    def test_long(self, question):
+        """Развернутые вопросы - полный бюджет VQA."""
+        assert estimate_vqa_tokens(question) == app.budget.settings.VQA_MAX_NEW_TOKENS
+
+
+class TestEstimateOCRTokens:
+    """Тесты эвристики для OCR."""
+
+    def test_density_ordering(self, text_page, blank_image):
+        """Страница с текстом плотнее пустой."""
+        assert text_density(text_page) > text_density(blank_image)
+        assert text_density(blank_image) == 0.0
+
+    def test_blank_gets_minimum(self, blank_image):
+        """Пустое изображение получает минимальный бюджет."""
+        assert estimate_ocr_tokens(blank_image) == MIN_OCR_TOKENS
+
+    def test_dense_page_gets_more(self, text_page, blank_image):
+        """Плотный текст получает больший бюджет."""
+        assert estimate_ocr_tokens(text_page) > estimate_ocr_tokens(blank_image)
+        assert estimate_ocr_tokens(text_page) <= app.budget.settings.OCR_MAX_NEW_TOKENS
+
+
+class TestResolveTokenBudget:
+    """Тесты итогового бюджета запроса."""
+
+    def test_client_value_wins(self):
+        """Значение клиента имеет приоритет над эвристикой."""
+        assert resolve_token_budget("vqa", requested=100, question="Is it red?") == 100
+
+    def test_cap(self, monkeypatch):
+        """Значение клиента ограничено сверху."""
+        monkeypatch.setattr(app.budget.settings, "MAX_NEW_TOKENS_CAP", 300)
+        assert resolve_token_budget("ocr", requested=5000) == 300
+
+    def test_heuristic(self):
+        """Без значения клиента используется эвристика."""
+        assert resolve_token_budget("vqa", question="Is it red?") == SHORT_ANSWER_TOKENS
+
+    def test_adaptive_disabled(self, monkeypatch):
+        """При выключенной эвристике используется значение по умолчанию для задачи."""
+        monkeypatch.setattr(app.budget.settings, "ADAPTIVE_TOKEN_BUDGET", False)
+        assert resolve_token_budget("vqa", question="Is it red?") == app.budget.settings.VQA_MAX_NEW_TOKENS
+
+    def test_latency_budget(self, monkeypatch):
+        """Бюджет задержки переводится в токены по скорости декодирования."""
+        monkeypatch.setattr(app.budget, "decode_rate", lambda model, task: 20.0)
+        assert resolve_token_budget("vqa", requested=500, latency_budget_ms=2000) == 40
+        assert resolve_token_budget("vqa", requested=10, latency_budget_ms=2000) == 10
+
+
+class TestDecodeRate:
+    """Тесты скорости декодирования для бюджета задержки."""
+
+    @pytest.fixture(autouse=True)
+    def rates(self, monkeypatch):
+        monkeypatch.setattr(app.budget.GENERATION_TOKENS_PER_SECOND, "_children", {})
+        monkeypatch.setattr(app.budget.settings, "DECODE_TOKENS_PER_SECOND", 10.0)
+        monkeypatch.setattr(app.budget.settings, "DRAFT_MODEL", "")
+        monkeypatch.setattr(app.budget.settings, "MODEL_REGISTRY", {"fast": "test/fast", "draft": "test/draft"})
+        monkeypatch.setattr(app.budget.settings, "MODEL_ROUTES", {})
+        return app.budget.GENERATION_TOKENS_PER_SECOND
+
+    def test_fallback_without_observations(self):
+        assert decode_rate() == 10.0
+
+    def test_rate_of_requested_model(self, rates):
+        """Учитывается только скорость модели запроса."""
+        rates.labels("default", "greedy").observe(20.0)
+        rates.labels("fast", "greedy").observe(80.0)
+        assert decode_rate() == 20.0
+        assert decode_rate("fast", "vqa") == 80.0
+        assert decode_rate("draft", "vqa") == 10.0
+
+    def test_speculative_mode(self, rates, monkeypatch):
+        """С draft-моделью берется скорость спекулятивного режима, пока она есть."""
+        rates.labels("default", "greedy").observe(20.0)
+        monkeypatch.setattr(app.budget.settings, "DRAFT_MODEL", "draft")
+        assert decode_rate() == 20.0
+        rates.labels("default", "speculative").observe(30.0)
+        assert decode_rate() == 30.0
+        monkeypatch.setattr(app.budget.settings, "SPECULATIVE_TASKS", ["ocr"])
+        assert decode_rate("default", "vqa") == 20.0
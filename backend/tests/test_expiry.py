@@ -0,0 +1,102 @@
+"""
+Тесты для очереди дедлайнов.
+"""
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.expiry import ExpiryQueue
+
+
+class FakeClock:
+    """Управляемые монотонные часы."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestExpiryQueue:
+    """Тесты для ExpiryQueue."""
+    
+    def test_expires_in_deadline_order(self):
+        clock = FakeClock()
+        queue = ExpiryQueue(clock)
+        queue.schedule("b", 20)
+        queue.schedule("a", 10)
+        queue.schedule("c", 30)
+        clock.now = 9.9
+        assert queue.pop_expired() == []
+        clock.now = 20
+        assert queue.pop_expired() == ["a", "b"]
+        assert len(queue) == 1 and "c" in queue
+    
+    def test_extension_keeps_one_heap_entry(self):
+        """Продление не добавляет записи в кучу: устаревшая перекладывается при извлечении."""
+        clock = FakeClock()
+        queue = ExpiryQueue(clock)
+        queue.schedule("session", 10)
+        for step in range(1, 100):
+            clock.now = step * 0.05
+            queue.schedule("session", 10)
+        assert len(queue._heap) == 1
+        
+        clock.now = 10
+        assert queue.pop_expired() == []
+        assert len(queue._heap) == 1
+        clock.now = queue.deadline("session")
+        assert queue.pop_expired() == ["session"]
+        assert len(queue._heap) == 0
+    
+    def test_shortened_deadline(self):
+        clock = FakeClock()
+        queue = ExpiryQueue(clock)
+        queue.schedule("key", 100)
+        queue.schedule("key", 5)
+        clock.now = 5
+        assert queue.pop_expired() == ["key"]
+        queue.schedule("key", 10)
+        clock.now = 100
+        # Запись с прежним дедлайном 100 отброшена, не переложена второй копией
+        assert queue.pop_expired() == ["key"]
+        assert len(queue._heap) == 0
+    
+    def test_cancel(self):
+        clock = FakeClock()
+        queue = ExpiryQueue(clock)
+        queue.schedule("key", 1)
+        queue.cancel("key")
+        clock.now = 2
+        assert queue.pop_expired() == []
+        assert len(queue) == 0
+        assert len(queue._heap) == 0
+    
+    def test_cancel_then_schedule_keeps_one_heap_entry(self):
+        """Ключ, снятый и назначенный заново, не получает второй записи кучи."""
+        clock = FakeClock()
+        queue = ExpiryQueue(clock)
+        for step in range(50):
+            clock.now = step * 0.1
+            queue.schedule("key", 10)
+            queue.cancel("key")
+            queue.schedule("key", 10)
+            assert len(queue._heap) == 1
+        clock.now = queue.deadline("key")
+        assert queue.pop_expired() == ["key"]
+        assert len(queue._heap) == 0
+    
+    def test_rescheduled_after_expiry(self):
+        """Ключ, сохраненный заново после истечения, получает новый дедлайн."""
+        clock = FakeClock()
+        queue = ExpiryQueue(clock)
+        queue.schedule("key", 1)
+        clock.now = 1
+        assert queue.pop_expired() == ["key"]
+        queue.schedule("key", 1)
+        assert queue.pop_expired() == []
+        clock.now = 2
+        assert queue.pop_expired() == ["key"]
@@ -0,0 +1,185 @@
+"""
+Тесты для интерфейса бэкендов и fake-бэкенда.
+"""
+import pytest
+import sys
+import os
+from PIL import Image
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import fake_backend, kv_cache
+from app.backend import get_backend
+from app.fake_backend import FakeBackend, output_tokens
+from app.kv_cache import KVCacheStore
+from app.metrics import GENERATION_TOKENS_PER_SECOND, SESSION_PREFILL_TOKENS
+from app.model_manager import ModelManager
+
+
+@pytest.fixture
+def fast_fake(monkeypatch):
+    """Fake-бэкенд с короткими задержками."""
+    monkeypatch.setattr(fake_backend.settings, "FAKE_PREFILL_MS", 10.0)
+    monkeypatch.setattr(fake_backend.settings, "FAKE_DECODE_MS_PER_TOKEN", 1.0)
+    monkeypatch.setattr(fake_backend.settings, "FAKE_OUTPUT_TOKENS", 20)
+    monkeypatch.setattr(fake_backend.settings, "FAKE_MODEL_SIZE_MB", 1)
+    return FakeBackend()
+
+
+@pytest.fixture
+def manager(fast_fake, monkeypatch):
+    """ModelManager с fake-бэкендом и пустым реестром загруженных моделей."""
+    monkeypatch.setattr(ModelManager, "_backend", fast_fake)
+    monkeypatch.setattr(ModelManager, "_entries", {})
+    monkeypatch.setattr(ModelManager, "_profile", None)
+    return ModelManager()
+
+
+class TestGetBackend:
+    """Тесты выбора бэкенда."""
+
+    def test_fake(self):
+        assert isinstance(get_backend("fake"), FakeBackend)
+
+    def test_unknown(self):
+        with pytest.raises(KeyError):
+            get_backend("onnx")
+
+
+class TestFakeBackend:
+    """Тесты fake-бэкенда."""
+
+    def test_output_tokens_bounds(self, fast_fake):
+        """Длина ответа в пределах 0.5-1.5 от среднего и не больше лимита."""
+        assert output_tokens(0, 100) == 10
+        assert output_tokens(3 * 2 ** 62, 100) == 25
+        assert output_tokens(3 * 2 ** 62, 5) == 5
+
+    def test_load_reports_memory(self, fast_fake):
+        entry = fast_fake.load("fake-model")
+        assert entry["size_bytes"] == 1024 * 1024
+        assert len(entry["model"]) == entry["size_bytes"]
+
+    def test_latency_emulation(self, fast_fake):
+        """prefill пропорционален батчу, decode - самому длинному ответу."""
+        entry = fast_fake.load("fake-model")
+        images = [Image.new("RGB", (64, 64), "white")] * 2
+        inputs = fast_fake.prepare(entry, images, ["What?", "Describe this image in detail."])
+        result = fast_fake.generate(entry, inputs, max_new_tokens=512)
+
+        assert result["first_token_at"] - result["started"] >= 0.020
+        assert result["finished"] - result["first_token_at"] >= max(result["row_tokens"]) * 0.001
+        texts = fast_fake.decode(entry, result)
+        assert [len(text.split()) for text in texts] == result["row_tokens"]
+
+
+    def test_shared_image_encoded_once(self, fast_fake):
+        """Вопросы к одному изображению оплачивают prefill один раз."""
+        entry = fast_fake.load("fake-model")
+        image = Image.new("RGB", (64, 64), "white")
+        questions = ["What?", "Where?", "Describe this image in detail."]
+        shared = fast_fake.prepare_shared(entry, image, questions)
+        assert [seed for seed, _, _ in shared] == [seed for seed, _, _ in fast_fake.prepare(entry, [image] * 3, questions)]
+
+        result = fast_fake.generate(entry, shared, max_new_tokens=512)
+        assert result["first_token_at"] - result["started"] < 0.020
+        assert max(result["row_finished"]) <= result["finished"]
+
+    def test_frames_encoded_in_one_prompt(self, fast_fake):
+        """Кадры видео - один промпт, prefill растет с числом кадров."""
+        entry = fast_fake.load("fake-model")
+        frames = [Image.new("RGB", (64, 48), color) for color in ("red", "green", "blue")]
+        inputs = fast_fake.prepare_images(entry, frames, "What happens?", split_images=False)
+        assert len(inputs) == 1
+
+        result = fast_fake.generate(entry, inputs, max_new_tokens=512)
+        assert result["first_token_at"] - result["started"] >= 0.030
+
+
+class TestModelManagerWithFakeBackend:
+    """Тесты ModelManager поверх fake-бэкенда."""
+
+    def test_deterministic(self, manager):
+        image = Image.new("RGB", (64, 64), "red")
+        first = manager.vqa_inference(image, "What is this?")
+        second = manager.vqa_inference(image, "What is this?")
+        assert first == second
+        assert first != manager.vqa_inference(image, "What color is it?")
+
+    def test_respects_budget(self, manager):
+        image = Image.new("RGB", (64, 64), "red")
+        assert len(manager.vqa_inference(image, "What?", max_new_tokens=3).split()) <= 3
+
+    def test_ocr_batch(self, manager):
+        images = [Image.new("RGB", (64, 64), "white"), Image.new("RGB", (32, 32), "white")]
+        texts = manager.ocr_batch_inference(images)
+        assert len(texts) == 2
+        assert all(texts)
+        assert manager.loaded_models()["default"]["size_mb"] == 1.0
+
+    def test_decode_rate_per_row(self, manager, monkeypatch):
+        """Скорость записывается на элемент батча и не превышает скорость одного запроса."""
+        monkeypatch.setattr(GENERATION_TOKENS_PER_SECOND, "_children", {})
+        manager.ocr_batch_inference([Image.new("RGB", (64, 64), "white")] * 4, 20)
+        child = GENERATION_TOKENS_PER_SECOND.labels("default", "greedy")
+        assert child.count == 4
+        # 1 мс на токен: один запрос декодирует не быстрее 1000 токенов/с
+        assert child.sum / child.count < 1000
+
+    def test_multi_question(self, manager):
+        """Ответы на несколько вопросов совпадают с батчем и упорядочены по готовности."""
+        image = Image.new("RGB", (64, 64), "red")
+        questions = ["What is this?", None, "What color is it?"]
+        results = manager.vqa_multi_inference(image, questions)
+        assert [r["answer"] for r in results] == manager.vqa_batch_inference([image] * 3, questions)
+        assert [r["tokens"] for r in results] == [len(r["answer"].split()) for r in results]
+        slowest = max(results, key=lambda r: r["tokens"])
+        assert all(r["latency_ms"] <= slowest["latency_ms"] for r in results)
+
+    def test_chat_reuses_previous_turn(self, manager, monkeypatch):
+        """Второй ход пересчитывает только новую реплику, ответы совпадают с полным пересчетом."""
+        monkeypatch.setattr(kv_cache, "_store", KVCacheStore(1024 * 1024))
+        image = Image.new("RGB", (64, 64), "red")
+        first = manager.chat_inference(image, "s1", [], "What is this?")
+        history = [(first["question"], first["raw"])]
+        reused_before = SESSION_PREFILL_TOKENS.labels("reused").value
+        computed_before = SESSION_PREFILL_TOKENS.labels("computed").value
+        
+        second = manager.chat_inference(image, "s1", history, "What color is it?")
+        reused = SESSION_PREFILL_TOKENS.labels("reused").value - reused_before
+        computed = SESSION_PREFILL_TOKENS.labels("computed").value - computed_before
+        assert reused > fake_backend.IMAGE_TOKENS
+        assert computed < 10
+        
+        # Без кэша тот же ход дает тот же ответ
+        monkeypatch.setattr(kv_cache, "_store", KVCacheStore(1024 * 1024))
+        assert manager.chat_inference(image, "s2", history, "What color is it?") == second
+
+    def test_chat_truncates_history(self, manager, monkeypatch):
+        """Старые ходы отбрасываются, чтобы промпт уложился в SESSION_MAX_TOKENS."""
+        monkeypatch.setattr(kv_cache, "_store", KVCacheStore(1024 * 1024))
+        monkeypatch.setattr(fake_backend.settings, "SESSION_MAX_TOKENS", fake_backend.IMAGE_TOKENS + 12)
+        prepared = []
+        original = manager.backend.prepare_chat
+        monkeypatch.setattr(
+            manager.backend, "prepare_chat",
+            lambda *args: prepared.append(args[2]) or original(*args)
+        )
+        image = Image.new("RGB", (64, 64), "red")
+        history = [("First question?", "one two three four five six"), ("Second?", "seven eight")]
+        manager.chat_inference(image, "s1", history, "Third?")
+        assert prepared[-1] == history[1:]
+
+    def test_multi_image_vqa(self, manager):
+        """Список изображений - один промпт и один ответ, порядок изображений важен."""
+        images = [Image.new("RGB", (64, 48), "red"), Image.new("RGB", (48, 64), "blue")]
+        answer = manager.vqa_inference(images, "What changed?")
+        assert isinstance(answer, str) and answer
+        assert answer == manager.vqa_inference(images, "What changed?")
+        assert manager.vqa_inference(images[:1], "What changed?") == manager.vqa_inference(images[0], "What changed?")
+
+    def test_video_inference(self, manager):
+        frames = [Image.new("RGB", (64, 48), color) for color in ("red", "green", "blue")]
+        answer = manager.video_inference(frames, "What happens?")
+        assert answer and answer == manager.video_inference(frames, "What happens?")
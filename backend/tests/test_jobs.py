@@ -0,0 +1,198 @@
+"""
+Тесты для асинхронных заданий OCR.
+"""
+import pytest
+import asyncio
+import io
+import json
+import threading
+import time
+import zipfile
+import sys
+import os
+from unittest.mock import MagicMock
+
+from PIL import Image
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.admission import AdmissionController, AdmissionRejected
+from app.jobs import JobStore, process_next, results_jsonl, results_zip
+
+
+def png_bytes(color: str = "red", size: int = 32) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), color=color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def run_inference(func, *args):
+    return func(*args)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def manager():
+    manager = MagicMock()
+    manager.ocr_batch_inference.side_effect = lambda images, max_new_tokens, model: [
+        f"text {image.size[0]}" for image in images
+    ]
+    return manager
+
+
+@pytest.fixture
+def admission():
+    return AdmissionController(1, {"interactive": 10, "bulk": 10})
+
+
+class TestJobStore:
+    """Тесты хранилища заданий."""
+
+    def test_lifecycle(self, store):
+        job_id = store.create_job([png_bytes(), png_bytes(), png_bytes()], "ip:1", "en")
+        assert store.status(job_id)["status"] == "queued"
+        assert store.pending_pages() == 3
+
+        claimed = store.claim(2)
+        assert claimed["job"]["id"] == job_id
+        assert [idx for idx, _ in claimed["pages"]] == [0, 1]
+        assert store.status(job_id)["status"] == "running"
+
+        store.complete(job_id, {0: "a"}, {1: "broken"})
+        status = store.status(job_id)
+        assert (status["completed"], status["failed"], status["finished_at"]) == (1, 1, None)
+
+        store.complete(job_id, {2: "c"})
+        status = store.status(job_id)
+        assert status["status"] == "done"
+        assert status["progress"] == 1.0
+        assert [r["status"] for r in store.results(job_id)] == ["done", "error", "done"]
+
+    def test_missing_job(self, store):
+        assert store.status("missing") is None
+        assert store.claim(4) is None
+
+    def test_oldest_job_first(self, store):
+        first = store.create_job([png_bytes()], "ip:1", "en")
+        store.create_job([png_bytes()], "ip:2", "en")
+        assert store.claim(4)["job"]["id"] == first
+
+    def test_persistent_and_recover(self, tmp_path):
+        """Очередь переживает перезапуск, прерванные страницы возвращаются в очередь."""
+        path = str(tmp_path / "jobs.sqlite3")
+        store = JobStore(path)
+        job_id = store.create_job([png_bytes(), png_bytes()], "ip:1", "en")
+        store.claim(1)
+        store.close()
+
+        reopened = JobStore(path)
+        assert reopened.pending_pages() == 1
+        assert reopened.recover() == 1
+        assert reopened.pending_pages() == 2
+        assert reopened.status(job_id)["total"] == 2
+        reopened.close()
+
+    def test_image_dropped_after_processing(self, store):
+        job_id = store.create_job([png_bytes()], "ip:1", "en")
+        store.claim(1)
+        store.complete(job_id, {0: "text"})
+        image = store._conn.execute("SELECT image FROM pages WHERE job_id = ?", (job_id,)).fetchone()[0]
+        assert image is None
+
+    def test_cleanup_expired(self, store):
+        done = store.create_job([png_bytes()], "ip:1", "en")
+        running = store.create_job([png_bytes()], "ip:1", "en")
+        store.claim(1)
+        store.complete(done, {0: "text"})
+        time.sleep(0.01)
+        assert store.cleanup_expired(0) == 1
+        assert store.status(done) is None
+        assert store.status(running) is not None
+
+
+class TestProcessNext:
+    """Тесты фоновой обработки страниц."""
+
+    def test_processes_in_batches(self, store, manager, admission):
+        job_id = store.create_job([png_bytes(size=16 + i) for i in range(5)], "ip:1", "en", max_new_tokens=32)
+
+        async def run():
+            while await process_next(store, manager, admission, run_inference, 2):
+                pass
+
+        asyncio.run(run())
+        batch_sizes = [len(c.args[0]) for c in manager.ocr_batch_inference.call_args_list]
+        assert batch_sizes == [2, 2, 1]
+        assert manager.ocr_batch_inference.call_args.args[1] == 32
+        assert [r["text"] for r in store.results(job_id)] == [f"text {16 + i}" for i in range(5)]
+        assert store.status(job_id)["status"] == "done"
+
+    def test_invalid_image_and_model_error(self, store, manager, admission):
+        job_id = store.create_job([b"not an image", png_bytes()], "ip:1", "en")
+        manager.ocr_batch_inference.side_effect = RuntimeError("model failed")
+
+        asyncio.run(process_next(store, manager, admission, run_inference, 4))
+        results = list(store.results(job_id))
+        assert "Не удалось открыть изображение" in results[0]["error"]
+        assert "model failed" in results[1]["error"]
+        assert store.status(job_id)["status"] == "done"
+
+    def test_admission_rejected_requeues(self, store, manager, monkeypatch):
+        job_id = store.create_job([png_bytes()], "ip:1", "en")
+        busy = MagicMock()
+        busy.admit.side_effect = AdmissionRejected(503, "OVERLOADED", "busy", 1)
+        delays = []
+
+        async def sleep(delay):
+            delays.append(delay)
+
+        monkeypatch.setattr(asyncio, "sleep", sleep)
+        assert asyncio.run(process_next(store, manager, busy, run_inference, 4))
+        assert delays == [1]
+        manager.ocr_batch_inference.assert_not_called()
+        assert store.pending_pages() == 1
+        assert store.status(job_id)["status"] == "queued"
+
+    def test_store_not_used_on_event_loop(self, store, manager, admission, monkeypatch):
+        store.create_job([png_bytes()], "ip:1", "en")
+        threads = []
+        for name in ("claim", "complete"):
+            method = getattr(store, name)
+            monkeypatch.setattr(store, name, lambda *args, method=method: (
+                threads.append(threading.get_ident()), method(*args)
+            )[1])
+
+        async def run():
+            await process_next(store, manager, admission, run_inference, 4)
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(run())
+        assert len(threads) == 2
+        assert loop_thread not in threads
+
+
+class TestResultFormats:
+    """Тесты форматов выгрузки результатов."""
+
+    RESULTS = [
+        {"index": 0, "status": "done", "text": "первая страница", "error": None},
+        {"index": 1, "status": "error", "text": None, "error": "битое изображение"},
+        {"index": 2, "status": "done", "text": "третья", "error": None},
+    ]
+
+    def test_jsonl(self):
+        lines = b"".join(results_jsonl(iter(self.RESULTS))).decode("utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == self.RESULTS
+
+    def test_zip(self):
+        with zipfile.ZipFile(io.BytesIO(results_zip(iter(self.RESULTS)))) as archive:
+            assert archive.namelist() == ["page-0001.txt", "page-0003.txt", "errors.txt"]
+            assert archive.read("page-0001.txt").decode("utf-8") == "первая страница"
+            assert "page-0002: битое изображение" in archive.read("errors.txt").decode("utf-8")
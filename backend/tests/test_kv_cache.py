@@ -0,0 +1,89 @@
+"""
+Тесты хранилища KV-кэша диалогов.
+"""
+import pytest
+import sys
+import os
+import time
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.kv_cache import KVCacheStore, reusable_prefix
+from app.metrics import SESSION_KV_EVICTIONS
+
+
+def make_entry(size: int, model: str = "default") -> dict:
+    return {"model": model, "ids": [1, 2, 3], "kv": b"x" * size, "bytes": size}
+
+
+class TestReusablePrefix:
+    """Тесты длины переиспользуемого префикса."""
+
+    def test_common_prefix(self):
+        assert reusable_prefix(["i", "i", "a", "b"], ["i", "i", "a", "c", "d"], "i") == 3
+
+    def test_leaves_token_for_prefill(self):
+        """Хотя бы один токен промпта проходит prefill."""
+        assert reusable_prefix(["i", "a", "b", "c"], ["i", "a", "b"], "i") == 2
+
+    def test_must_cover_image(self):
+        """Кэш, расходящийся до конца изображения, не используется."""
+        assert reusable_prefix(["i", "x", "i"], ["i", "y", "i", "a"], "i") == 0
+
+
+class TestKVCacheStore:
+    """Тесты KVCacheStore."""
+
+    def test_take_removes_entry(self):
+        store = KVCacheStore(1000)
+        store.put("s1", make_entry(100))
+        assert store.memory_bytes() == 100
+        assert store.take("s1", "default")["bytes"] == 100
+        assert store.take("s1", "default") is None
+        assert store.memory_bytes() == 0
+
+    def test_model_mismatch(self):
+        store = KVCacheStore(1000)
+        store.put("s1", make_entry(100, model="large"))
+        assert store.take("s1", "default") is None
+        assert len(store) == 0
+
+    def test_oversized_entry_skipped(self):
+        store = KVCacheStore(100)
+        store.put("s1", make_entry(200))
+        assert len(store) == 0
+
+    def test_lru_eviction_drops(self):
+        dropped_before = SESSION_KV_EVICTIONS.labels("drop").value
+        store = KVCacheStore(250)
+        store.put("s1", make_entry(100))
+        store.put("s2", make_entry(100))
+        store.take("s1", "default")
+        store.put("s1", make_entry(100))
+        store.put("s3", make_entry(100))
+        # s2 использовался давнее всех
+        assert store.take("s2", "default") is None
+        assert store.take("s1", "default") is not None
+        assert store.memory_bytes() == 100
+        assert SESSION_KV_EVICTIONS.labels("drop").value == dropped_before + 1
+
+    def test_eviction_spills_to_disk(self, tmp_path):
+        store = KVCacheStore(150, str(tmp_path))
+        store.put("s1", make_entry(100))
+        store.put("s2", make_entry(100))
+        assert (tmp_path / "s1.kv").exists()
+        assert len(store) == 2
+        entry = store.take("s1", "default")
+        assert entry["kv"] == b"x" * 100
+        assert not (tmp_path / "s1.kv").exists()
+
+    def test_expire(self, tmp_path):
+        store = KVCacheStore(150, str(tmp_path))
+        store.put("s1", make_entry(100))
+        store.put("s2", make_entry(100))
+        time.sleep(0.05)
+        assert store.expire(0.01) == 2
+        assert len(store) == 0
+        assert store.memory_bytes() == 0
+        assert not (tmp_path / "s1.kv").exists()
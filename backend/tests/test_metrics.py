@@ -0,0 +1,101 @@
+"""
+Тесты для метрик и их экспорта в формате Prometheus.
+"""
+import pytest
+import re
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.metrics import Counter, Gauge, Histogram, REGISTRY, render
+
+
+# Строка сэмпла: имя{метки} значение
+SAMPLE_RE = re.compile(
+    r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+    r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})?'
+    r' (-?[0-9.e+-]+|\+Inf|-Inf|NaN)$'
+)
+
+
+@pytest.fixture
+def metrics():
+    """Временные метрики, удаляемые из реестра после теста."""
+    created = []
+
+    def make(cls, *args, **kwargs):
+        metric = cls(*args, **kwargs)
+        created.append(metric)
+        return metric
+
+    yield make
+    for metric in created:
+        REGISTRY.remove(metric)
+
+
+class TestMetrics:
+    """Тесты примитивов метрик."""
+
+    def test_counter(self, metrics):
+        counter = metrics(Counter, "test_counter_total", "Тестовый счетчик", ("kind",))
+        counter.labels("a").inc()
+        counter.labels("a").inc(2)
+        assert counter.labels("a").value == 3
+
+    def test_gauge(self, metrics):
+        gauge = metrics(Gauge, "test_gauge", "Тестовый gauge")
+        gauge.inc(5)
+        gauge.dec(2)
+        assert gauge.labels().value == 3
+        gauge.set(10)
+        assert gauge.labels().value == 10
+
+    def test_histogram_buckets(self, metrics):
+        histogram = metrics(Histogram, "test_histogram", "Тестовая гистограмма", buckets=(1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        child = histogram.labels()
+        assert child.counts == [2, 1, 1]
+        assert child.count == 4
+        assert child.sum == 14.5
+
+    def test_wrong_label_count(self, metrics):
+        counter = metrics(Counter, "test_labels_total", "Тест", ("a", "b"))
+        with pytest.raises(ValueError):
+            counter.labels("x")
+
+
+class TestExposition:
+    """Тесты текстового формата Prometheus."""
+
+    def test_format(self, metrics):
+        """Каждая строка - комментарий HELP/TYPE или корректный сэмпл."""
+        counter = metrics(Counter, "test_requests_total", "Запросы", ("path",))
+        counter.labels('/a"b\\c').inc()
+        histogram = metrics(Histogram, "test_latency_seconds", "Задержка", ("stage",), buckets=(0.1, 1))
+        histogram.labels("decode").observe(0.5)
+
+        text = render()
+        assert text.endswith("\n")
+        for line in text.strip().split("\n"):
+            if line.startswith("#"):
+                assert re.match(r"^# (HELP|TYPE) [a-zA-Z_:][a-zA-Z0-9_:]* .+$", line), line
+            else:
+                assert SAMPLE_RE.match(line), line
+
+        assert "# TYPE test_latency_seconds histogram" in text
+        assert 'test_requests_total{path="/a\\"b\\\\c"} 1' in text
+
+    def test_histogram_cumulative(self, metrics):
+        """Корзины гистограммы кумулятивны, +Inf равна count."""
+        histogram = metrics(Histogram, "test_cumulative_seconds", "Тест", buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+
+        text = render()
+        assert 'test_cumulative_seconds_bucket{le="0.1"} 1' in text
+        assert 'test_cumulative_seconds_bucket{le="1"} 2' in text
+        assert 'test_cumulative_seconds_bucket{le="+Inf"} 3' in text
+        assert "test_cumulative_seconds_count 3" in text
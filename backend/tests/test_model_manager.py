@@ -0,0 +1,115 @@
+"""
+Тесты для постобработки ответов модели.
+"""
+import pytest
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import app.model_manager
+from app.model_manager import ModelManager, postprocess_answer, postprocess_ocr
+
+
+class TestPostprocessAnswer:
+    """Тесты для очистки ответа VQA."""
+
+    def test_strips_special_tokens(self):
+        """Служебные токены удаляются."""
+        assert postprocess_answer(" Assistant: A red square.<end_of_utterance>") == "A red square."
+
+    def test_collapses_whitespace(self):
+        """Пробелы и переносы схлопываются."""
+        assert postprocess_answer("A red\n\n square") == "A red square"
+
+    def test_cuts_repetition_tail(self):
+        """Зацикленный хвост обрезается."""
+        text = "one two three four five six seven eight nine ten yes yes yes"
+        assert postprocess_answer(text) == "one two three four five six seven eight nine ten"
+
+
+class TestPostprocessOCR:
+    """Тесты для очистки результата OCR."""
+
+    def test_keeps_lines(self):
+        """Переносы строк сохраняются, пустые строки удаляются."""
+        assert postprocess_ocr("<text>Line 1\n\n  Line 2 </text>") == "Line 1\nLine 2"
+
+
+@pytest.fixture
+def manager():
+    """ModelManager с записями реестра без реальных весов."""
+    manager = ModelManager()
+    saved = dict(manager._entries)
+    manager._entries.clear()
+    yield manager
+    manager._entries.clear()
+    manager._entries.update(saved)
+
+
+def fake_entry(size_mb: int, idle_s: float, in_use: int = 0) -> dict:
+    """Создает запись реестра, имитирующую загруженную модель."""
+    return {
+        "name": "test/model",
+        "model": None,
+        "processor": None,
+        "size_bytes": size_mb * 1024 * 1024,
+        "last_used": time.monotonic() - idle_s,
+        "in_use": in_use,
+    }
+
+
+class TestModelRegistryMemory:
+    """Тесты выгрузки моделей из реестра."""
+
+    def test_unload_idle_models(self, manager):
+        """Простаивающие модели выгружаются, default и занятые - нет."""
+        manager._entries["default"] = fake_entry(100, idle_s=1000)
+        manager._entries["small"] = fake_entry(10, idle_s=1000)
+        manager._entries["busy"] = fake_entry(10, idle_s=1000, in_use=1)
+        manager._entries["fresh"] = fake_entry(10, idle_s=1)
+
+        unloaded = manager.unload_idle_models(600)
+
+        assert unloaded == ["small"]
+        assert set(manager._entries) == {"default", "busy", "fresh"}
+
+    def test_memory_budget_evicts_lru(self, manager, monkeypatch):
+        """При превышении бюджета выгружаются наиболее давно использованные модели."""
+        monkeypatch.setattr(app.model_manager.settings, "MODEL_MEMORY_BUDGET_MB", 250)
+        manager._entries["old"] = fake_entry(100, idle_s=300)
+        manager._entries["recent"] = fake_entry(100, idle_s=10)
+        manager._entries["new"] = fake_entry(100, idle_s=0)
+
+        manager._enforce_memory_budget(keep="new")
+
+        assert set(manager._entries) == {"recent", "new"}
+
+    def test_memory_budget_keeps_default(self, manager, monkeypatch):
+        """Модель по умолчанию не выгружается, даже если использовалась давнее всех."""
+        monkeypatch.setattr(app.model_manager.settings, "MODEL_MEMORY_BUDGET_MB", 150)
+        manager._entries["default"] = fake_entry(100, idle_s=1000)
+        manager._entries["old"] = fake_entry(100, idle_s=300)
+        manager._entries["new"] = fake_entry(100, idle_s=0)
+
+        manager._enforce_memory_budget(keep="new")
+
+        assert set(manager._entries) == {"default", "new"}
+        assert manager.is_loaded()
+
+    def test_memory_budget_disabled(self, manager):
+        """Без бюджета модели не выгружаются."""
+        manager._entries["a"] = fake_entry(100, idle_s=300)
+        manager._entries["b"] = fake_entry(100, idle_s=0)
+        manager._enforce_memory_budget(keep="b")
+        assert set(manager._entries) == {"a", "b"}
+
+    def test_loaded_models(self, manager):
+        """Сведения о загруженных моделях."""
+        manager._entries["default"] = fake_entry(100, idle_s=5)
+        info = manager.loaded_models()
+        assert info["default"]["size_mb"] == 100.0
+        assert manager.is_loaded()
+        assert not manager.is_loaded("small")
@@ -0,0 +1,104 @@
+"""
+Тесты перцептивного хэша и индекса почти дубликатов.
+"""
+import pytest
+import io
+import sys
+import os
+
+import numpy as np
+from PIL import Image
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import phash
+from app.phash import NearDuplicateIndex, image_fingerprint, popcount
+
+
+def gradient_image(size: int = 400, flip: bool = False) -> Image.Image:
+    """Плавное изображение, похожее на фото: шум не переживает пережатие."""
+    x = np.linspace(0, 1, size)
+    base = np.outer(np.sin(x * 7), np.cos(x * 5)) * 120 + 128
+    pixels = np.stack([base, base[::-1], base.T], axis=-1).astype(np.uint8)
+    if flip:
+        pixels = np.ascontiguousarray(pixels[:, ::-1])
+    return Image.fromarray(pixels)
+
+
+def recompress(image: Image.Image, size: int, quality: int = 60) -> Image.Image:
+    buffer = io.BytesIO()
+    image.resize((size, size)).save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def distance(a: dict, b: dict) -> int:
+    return int(popcount(a["hash"] ^ b["hash"]).sum())
+
+
+class TestFingerprint:
+    """Тесты отпечатка изображения."""
+
+    def test_recompressed_copy_is_close(self):
+        original = image_fingerprint(gradient_image())
+        assert distance(original, image_fingerprint(recompress(gradient_image(), 300))) <= 8
+
+    def test_different_image_is_far(self):
+        assert distance(image_fingerprint(gradient_image()), image_fingerprint(gradient_image(flip=True))) > 32
+
+    def test_modes(self):
+        """Серые и палитровые изображения дают отпечаток той же формы."""
+        for mode in ("L", "P", "RGBA"):
+            fingerprint = image_fingerprint(gradient_image().convert(mode))
+            assert fingerprint["hash"].shape == (phash.HASH_WORDS,)
+            assert fingerprint["color"].shape == (3,)
+
+    def test_popcount_fallback(self):
+        words = np.array([[0, 1, 2 ** 64 - 1, 0x00FF00FF00FF00FF]], dtype=np.uint64)
+        table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+        fallback = table[words.view(np.uint8)].reshape(*words.shape, 8).sum(axis=-1)
+        assert popcount(words).tolist() == fallback.tolist() == [[0, 1, 64, 32]]
+
+
+class TestNearDuplicateIndex:
+    """Тесты индекса почти дубликатов."""
+
+    def test_near_duplicate_hit(self):
+        index = NearDuplicateIndex(16, max_distance=8)
+        index.put(image_fingerprint(gradient_image()), "key", "answer")
+        assert index.get(image_fingerprint(recompress(gradient_image(), 300)), "key", "vqa") == "answer"
+        assert index.get(image_fingerprint(recompress(gradient_image(), 300)), "other", "vqa") is None
+        assert index.get(image_fingerprint(gradient_image(flip=True)), "key", "vqa") is None
+
+    def test_color_and_aspect_checked(self):
+        """Перекрашенное или растянутое изображение с тем же dHash дубликатом не считается."""
+        index = NearDuplicateIndex(16, max_distance=8)
+        index.put(image_fingerprint(Image.new("RGB", (64, 64), "red")), "key", "red")
+        assert index.get(image_fingerprint(Image.new("RGB", (64, 64), "blue")), "key", "vqa") is None
+        assert index.get(image_fingerprint(Image.new("RGB", (128, 64), "red")), "key", "vqa") is None
+        assert index.get(image_fingerprint(Image.new("RGB", (32, 32), "red")), "key", "vqa") == "red"
+
+    def test_results_share_slot(self):
+        index = NearDuplicateIndex(16, max_distance=8)
+        index.put(image_fingerprint(gradient_image()), "a", 1)
+        index.put(image_fingerprint(recompress(gradient_image(), 300)), "b", 2)
+        assert len(index) == 1
+        assert index.get(image_fingerprint(gradient_image()), "b", "vqa") == 2
+
+    def test_ring_eviction(self):
+        index = NearDuplicateIndex(2, max_distance=0)
+        colors = ["red", "green", "blue"]
+        for color in colors:
+            index.put(image_fingerprint(Image.new("RGB", (64, 64), color)), "key", color)
+        assert len(index) == 2
+        assert index.get(image_fingerprint(Image.new("RGB", (64, 64), "red")), "key", "vqa") is None
+        assert index.get(image_fingerprint(Image.new("RGB", (64, 64), "blue")), "key", "vqa") == "blue"
+
+    def test_results_per_image_bounded(self, monkeypatch):
+        monkeypatch.setattr(phash, "MAX_RESULTS_PER_IMAGE", 2)
+        index = NearDuplicateIndex(4, max_distance=0)
+        fingerprint = image_fingerprint(gradient_image())
+        for key in ("a", "b", "c"):
+            index.put(fingerprint, key, key)
+        assert index.get(fingerprint, "a", "vqa") is None
+        assert index.get(fingerprint, "c", "vqa") == "c"
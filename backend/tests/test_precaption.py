@@ -0,0 +1,169 @@
+"""
+Тесты фонового описания изображения при создании сессии.
+"""
+import pytest
+import asyncio
+import sys
+import os
+from unittest.mock import MagicMock
+
+from PIL import Image
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import precaption
+from app.admission import AdmissionController
+from app.budget import resolve_token_budget
+from app.precaption import start_precaption, take_precaption
+from app.utils import sessions, save_session_image
+
+
+@pytest.fixture(autouse=True)
+def session(monkeypatch):
+    monkeypatch.setattr(precaption.settings, "PRECAPTION_ON_UPLOAD", True)
+    sessions.clear()
+    save_session_image("s1", b"", Image.new("RGB", (64, 64), "red"))
+    yield "s1"
+    sessions.clear()
+
+
+@pytest.fixture
+def manager():
+    manager = MagicMock()
+    manager.vqa_inference.return_value = "A red square."
+    return manager
+
+
+def controller():
+    return AdmissionController(1, {"interactive": 10, "bulk": 10, "background": 10})
+
+
+async def run_inference(func, *args):
+    return func(*args)
+
+
+def caption_budget():
+    return resolve_token_budget("caption")
+
+
+class TestPrecaption:
+    """Тесты фонового описания."""
+
+    def test_disabled(self, session, manager, monkeypatch):
+        monkeypatch.setattr(precaption.settings, "PRECAPTION_ON_UPLOAD", False)
+
+        async def run():
+            return start_precaption(session, "ip:1", manager, controller(), run_inference)
+
+        assert asyncio.run(run()) is None
+        assert "caption" not in sessions[session]
+
+    def test_hit(self, session, manager):
+        async def run():
+            await start_precaption(session, "ip:1", manager, controller(), run_inference)
+            return await take_precaption(session, caption_budget(), None)
+
+        assert asyncio.run(run()) == "A red square."
+        assert manager.vqa_inference.call_args.args[1] is None
+        assert sessions[session]["caption"]["status"] == "done"
+
+    def test_budget_or_model_mismatch(self, session, manager):
+        async def run():
+            await start_precaption(session, "ip:1", manager, controller(), run_inference)
+            return (
+                await take_precaption(session, caption_budget() + 1, None),
+                await take_precaption(session, caption_budget(), "other"),
+            )
+
+        assert asyncio.run(run()) == (None, None)
+
+    def test_attach_to_running(self, session, manager):
+        """Запрос описания дожидается уже выполняющегося фонового инференса."""
+
+        async def run():
+            started, done = asyncio.Event(), asyncio.Event()
+
+            async def slow_inference(func, *args):
+                started.set()
+                await done.wait()
+                return func(*args)
+
+            start_precaption(session, "ip:1", manager, controller(), slow_inference)
+            await started.wait()
+            waiter = asyncio.create_task(take_precaption(session, caption_budget(), None))
+            await asyncio.sleep(0.01)
+            assert not waiter.done()
+            done.set()
+            return await waiter
+
+        assert asyncio.run(run()) == "A red square."
+        assert manager.vqa_inference.call_count == 1
+
+    def test_queued_job_cancelled(self, session, manager):
+        """Описание, ожидающее в очереди, отменяется: запрос идет обычным путем."""
+        async def run():
+            admission = controller()
+            release = asyncio.Event()
+
+            async def hold():
+                async with admission.admit("interactive", 1.0, "ip:2"):
+                    await release.wait()
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            task = start_precaption(session, "ip:1", manager, admission, run_inference)
+            await asyncio.sleep(0)
+            assert admission.queued("background") == 1
+
+            assert await take_precaption(session, caption_budget(), None) is None
+            await asyncio.gather(task, return_exceptions=True)
+            assert admission.queued("background") == 0
+            release.set()
+            await holder
+
+        asyncio.run(run())
+        assert sessions[session]["caption"]["status"] == "cancelled"
+        manager.vqa_inference.assert_not_called()
+
+    def test_yields_to_interactive(self, session, manager):
+        """Фоновое описание выполняется после ожидающих интерактивных запросов."""
+        order = []
+
+        async def run():
+            admission = controller()
+            release = asyncio.Event()
+
+            async def hold():
+                async with admission.admit("interactive", 1.0, "ip:2"):
+                    await release.wait()
+
+            async def interactive():
+                async with admission.admit("interactive", 1.0, "ip:3"):
+                    order.append("interactive")
+
+            async def recording_inference(func, *args):
+                order.append("precaption")
+                return func(*args)
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            task = start_precaption(session, "ip:1", manager, admission, recording_inference)
+            await asyncio.sleep(0)
+            user = asyncio.create_task(interactive())
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(holder, user, task)
+
+        asyncio.run(run())
+        assert order == ["interactive", "precaption"]
+
+    def test_expired_session_skipped(self, session, manager):
+        async def run():
+            task = start_precaption(session, "ip:1", manager, controller(), run_inference)
+            sessions.clear()
+            await task
+            return task
+
+        asyncio.run(run())
+        manager.vqa_inference.assert_not_called()
@@ -0,0 +1,130 @@
+"""
+Тесты для профилирования по запросу.
+"""
+import pytest
+import sys
+import os
+import threading
+from contextlib import nullcontext
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import torch
+
+from app import profiling
+
+
+@pytest.fixture(autouse=True)
+def profiling_state(tmp_path, monkeypatch):
+    """Изолирует состояние захватов и директорию артефактов."""
+    monkeypatch.setattr(profiling.settings, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling.settings, "PROFILING_MAX_SECONDS", 300)
+    monkeypatch.setattr(profiling.settings, "PROFILING_MAX_REQUESTS", 20)
+    monkeypatch.setattr(profiling, "_torch_capture", None)
+    monkeypatch.setattr(profiling, "_last_torch_capture", None)
+    monkeypatch.setattr(profiling, "_stack_sampler", None)
+    monkeypatch.setattr(profiling, "_profiler_busy", threading.Lock())
+    yield tmp_path
+
+
+class TestTorchCapture:
+    """Тесты захвата torch.profiler."""
+
+    def test_inactive_is_noop(self):
+        """Без захвата хук возвращает пустой контекст."""
+        assert isinstance(profiling.torch_profile("default", "vqa"), nullcontext)
+
+    def test_captures_next_requests(self, profiling_state):
+        """Профилируются ровно N следующих инференсов."""
+        profiling.start_torch_capture(1)
+        with profiling.torch_profile("default", "vqa"):
+            torch.ones(8, 8) @ torch.ones(8, 8)
+        assert isinstance(profiling.torch_profile("default", "vqa"), nullcontext)
+        assert profiling._torch_capture is None
+
+        status = profiling.profiling_status()
+        assert status["torch"]["captured"] == 1
+        assert status["torch"]["active"] is False
+        names = {artifact["name"] for artifact in status["artifacts"]}
+        assert set(status["torch"]["artifacts"]) == names
+        assert any(name.endswith("-default-vqa.json") for name in names)
+
+    def test_overlapping_inferences(self, profiling_state):
+        """Параллельный инференс во время профилируемого идет без профиля и не падает."""
+        profiling.start_torch_capture(2)
+        entered, release = threading.Event(), threading.Event()
+        errors = []
+
+        def profiled():
+            try:
+                with profiling.torch_profile("default", "vqa"):
+                    entered.set()
+                    release.wait(5)
+                    torch.ones(8, 8) @ torch.ones(8, 8)
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=profiled)
+        thread.start()
+        assert entered.wait(5)
+        overlapping = profiling.torch_profile("default", "ocr")
+        assert isinstance(overlapping, nullcontext)
+        with overlapping:
+            torch.ones(8, 8) @ torch.ones(8, 8)
+        release.set()
+        thread.join(5)
+
+        assert errors == []
+        status = profiling.profiling_status()["torch"]
+        assert status["captured"] == 1
+        assert status["active"] is True
+        with profiling.torch_profile("default", "ocr"):
+            torch.ones(8, 8) @ torch.ones(8, 8)
+        assert profiling.profiling_status()["torch"]["captured"] == 2
+
+    def test_limits(self):
+        """Число запросов и окно ограничены настройками."""
+        status = profiling.start_torch_capture(1000, 10000)
+        assert status["requests"] == 20
+        assert status["remaining_s"] <= 300
+
+    def test_concurrent_capture_rejected(self):
+        profiling.start_torch_capture(2)
+        with pytest.raises(RuntimeError):
+            profiling.start_torch_capture(1)
+
+
+class TestStackSampler:
+    """Тесты семплирования стеков."""
+
+    def test_folded_output(self, profiling_state):
+        """Семплер пишет стеки в формате folded: "кадр;кадр;... count"."""
+        profiling.start_stack_sampling(0.2, 5)
+        profiling._stack_sampler.join(timeout=5)
+
+        status = profiling.profiling_status()["stack"]
+        assert status["active"] is False
+        assert status["samples"] > 0
+        lines = (profiling_state / status["artifacts"][0]).read_text(encoding="utf-8").splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0
+        assert ";" in stack
+
+    def test_stop(self):
+        profiling.start_stack_sampling(60, 5)
+        profiling._stack_sampler.stop()
+        profiling._stack_sampler.join(timeout=5)
+        assert not profiling._stack_sampler.is_alive()
+
+
+class TestArtifacts:
+    """Тесты выдачи артефактов."""
+
+    def test_artifact_path(self, profiling_state):
+        (profiling_state / "stack-1.folded").write_text("a 1\n")
+        assert profiling.artifact_path("stack-1.folded") == str(profiling_state / "stack-1.folded")
+        assert profiling.artifact_path("missing.folded") is None
+        assert profiling.artifact_path("../stack-1.folded") is None
+        assert profiling.artifact_path("..") is None
@@ -0,0 +1,159 @@
+"""
+Тесты для пула реплик модели.
+"""
+import pytest
+import sys
+import os
+import queue
+import threading
+from types import SimpleNamespace
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.replicas import ReplicaPool, partition_cpus
+
+
+class TestPartitionCpus:
+    """Тесты для разбиения CPU между репликами."""
+
+    def test_even_split(self):
+        """Тест равномерного разбиения."""
+        sets = partition_cpus(list(range(8)), 4)
+        assert sets == [[0, 1], [2, 3], [4, 5], [6, 7]]
+
+    def test_uneven_split(self):
+        """Тест разбиения с остатком."""
+        sets = partition_cpus(list(range(7)), 3)
+        assert [len(s) for s in sets] == [3, 2, 2]
+
+    def test_sets_are_disjoint(self):
+        """Наборы CPU не пересекаются и покрывают все CPU."""
+        cpus = [0, 2, 4, 6, 8, 10, 12]
+        sets = partition_cpus(cpus, 3)
+        flat = [cpu for s in sets for cpu in s]
+        assert sorted(flat) == cpus
+        assert len(flat) == len(set(flat))
+
+    def test_not_enough_cpus(self):
+        """Тест ошибки при нехватке CPU."""
+        with pytest.raises(ValueError):
+            partition_cpus([0, 1], 3)
+
+    def test_invalid_replicas(self):
+        """Тест ошибки при неположительном числе реплик."""
+        with pytest.raises(ValueError):
+            partition_cpus([0, 1], 0)
+
+
+class TestReplicaPool:
+    """Тесты для диспетчера реплик (без запуска процессов)."""
+
+    def test_threads_default_to_cpu_set_size(self):
+        """Число потоков по умолчанию равно размеру набора CPU."""
+        pool = ReplicaPool(2, cpus=[0, 1, 2, 3, 4])
+        assert pool.threads == [3, 2]
+
+    def test_explicit_threads(self):
+        """Явно заданное число потоков."""
+        pool = ReplicaPool(2, threads_per_replica=1, cpus=[0, 1, 2, 3])
+        assert pool.threads == [1, 1]
+
+    def test_pick_least_loaded(self):
+        """Выбирается наименее загруженная готовая реплика."""
+        pool = ReplicaPool(3, cpus=[0, 1, 2])
+        pool._ready = [True, True, True]
+        pool.in_flight = [2, 0, 1]
+        assert pool._pick_replica() == 1
+
+    def test_pick_skips_not_ready(self):
+        """Неготовые реплики не выбираются."""
+        pool = ReplicaPool(3, cpus=[0, 1, 2])
+        pool._ready = [True, False, True]
+        pool.in_flight = [2, 0, 1]
+        assert pool._pick_replica() == 2
+
+    def test_pick_without_ready_replicas(self):
+        """Ошибка, если нет готовых реплик."""
+        pool = ReplicaPool(2, cpus=[0, 1])
+        assert pool.is_loaded() is False
+        with pytest.raises(RuntimeError):
+            pool._pick_replica()
+
+
+class FakeProcess:
+    """Процесс реплики с управляемым состоянием."""
+
+    def __init__(self):
+        self.exitcode = None
+
+    def is_alive(self) -> bool:
+        return self.exitcode is None
+
+
+@pytest.fixture
+def running_pool():
+    """Пул из двух готовых реплик без процессов: очереди в памяти."""
+    pool = ReplicaPool(2, cpus=[0, 1])
+    pool._ready = [True, True]
+    pool._processes = [FakeProcess(), FakeProcess()]
+    pool._task_queues = [queue.Queue(), queue.Queue()]
+    pool._results = queue.Queue()
+    return pool
+
+
+class TestReplicaFailure:
+    """Тесты обработки завершившихся реплик."""
+
+    def test_dead_replica_fails_pending_futures(self, running_pool):
+        """Незавершенные запросы упавшей реплики получают ошибку, реплика исключается."""
+        lost = running_pool._submit_to(0, "ocr_batch_inference")
+        kept = running_pool._submit_to(1, "ocr_batch_inference")
+        running_pool._processes[0].exitcode = -9
+        running_pool._check_processes()
+
+        with pytest.raises(RuntimeError, match="Реплика 0"):
+            lost.result(timeout=1)
+        assert not kept.done()
+        assert running_pool.in_flight == [0, 1]
+        assert running_pool._pick_replica() == 1
+        assert running_pool.is_loaded() is True
+        with pytest.raises(RuntimeError):
+            running_pool._submit_to(0, "ocr_batch_inference")
+
+    def test_results_sent_before_exit_are_delivered(self, running_pool):
+        """Ответ, отправленный репликой до завершения, не теряется."""
+        future = running_pool._submit_to(0, "ocr_batch_inference")
+        task_id = running_pool._task_queues[0].get()[0]
+        running_pool._results.put(("ok", 0, task_id, ["text"]))
+        running_pool._processes[0].exitcode = 1
+        running_pool._check_processes()
+        assert future.result(timeout=1) == ["text"]
+
+    def test_all_replicas_dead(self, running_pool):
+        for process in running_pool._processes:
+            process.exitcode = -11
+        running_pool._check_processes()
+        assert running_pool.is_loaded() is False
+        with pytest.raises(RuntimeError):
+            running_pool.submit("ocr_batch_inference")
+
+    def test_load_failure_of_one_replica(self, running_pool):
+        """Реплика, не загрузившая модель, не блокирует готовность остальных."""
+        running_pool._ready = [True, False]
+        running_pool._handle_result("error", 1, None, "MemoryError: ")
+        assert running_pool.is_loaded() is True
+        assert running_pool._pick_replica() == 0
+
+    def test_broadcast_timeout(self, running_pool, monkeypatch):
+        """Неответившая реплика не блокирует broadcast дольше таймаута."""
+        monkeypatch.setattr("app.replicas.settings", SimpleNamespace(REPLICA_BROADCAST_TIMEOUT=0.05))
+
+        def answer_first():
+            task_id = running_pool._task_queues[0].get(timeout=1)[0]
+            running_pool._handle_result("ok", 0, task_id, 3)
+
+        responder = threading.Thread(target=answer_first)
+        responder.start()
+        assert running_pool.broadcast("expire_session_caches", 60) == [3]
+        responder.join(1)
@@ -0,0 +1,37 @@
+"""
+Тесты для сериализации ответов orjson.
+"""
+import json
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.responses import ORJSONResponse, stream_json
+
+
+class TestORJSONResponse:
+    """Тесты для ORJSONResponse."""
+    
+    def test_render(self):
+        response = ORJSONResponse({"text": "Привет", "tiles": 2})
+        assert json.loads(response.body) == {"text": "Привет", "tiles": 2}
+        assert response.media_type == "application/json"
+
+
+class TestStreamJson:
+    """Тесты для stream_json."""
+    
+    def test_chunks_form_same_json(self):
+        """Части потока вместе дают JSON, равный сериализации целиком."""
+        payload = {"text": 'Строка "1"\n\tконец\\' * 50, "task_id": "abc", "tiles": 3, "max_new_tokens": None}
+        chunks = list(stream_json(payload, "text", chunk_chars=7))
+        assert len(chunks) > 3
+        assert json.loads(b"".join(chunks)) == payload
+    
+    def test_only_field(self):
+        assert json.loads(b"".join(stream_json({"text": "abc"}, "text"))) == {"text": "abc"}
+    
+    def test_empty_text(self):
+        assert json.loads(b"".join(stream_json({"text": "", "tiles": 1}, "text"))) == {"text": "", "tiles": 1}
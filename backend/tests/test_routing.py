@@ -0,0 +1,71 @@
+"""
+Тесты для реестра моделей и маршрутизации задач.
+"""
+import pytest
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app.routing
+from app.routing import model_registry, resolve_model, vqa_task, DEFAULT_MODEL
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Реестр с маленькой и большой моделью и правилами маршрутизации."""
+    monkeypatch.setattr(app.routing.settings, "MODEL_REGISTRY", {
+        "small": "HuggingFaceTB/SmolVLM2-256M-Video-Instruct",
+        "medium": "HuggingFaceTB/SmolVLM2-500M-Video-Instruct",
+    })
+    monkeypatch.setattr(app.routing.settings, "MODEL_ROUTES", {
+        "caption": "small",
+        "ocr": "medium",
+        "vqa": "missing",
+    })
+
+
+class TestModelRegistry:
+    """Тесты для реестра моделей."""
+
+    def test_default_always_present(self, registry):
+        """Псевдоним default указывает на MODEL_NAME."""
+        assert model_registry()[DEFAULT_MODEL] == app.routing.settings.MODEL_NAME
+        assert "small" in model_registry()
+
+
+class TestResolveModel:
+    """Тесты для маршрутизации задач."""
+
+    def test_route_by_task(self, registry):
+        """Задача направляется по правилу."""
+        assert resolve_model("caption") == "small"
+        assert resolve_model("ocr") == "medium"
+
+    def test_unknown_route_alias_falls_back(self, registry):
+        """Правило на незарегистрированную модель ведет на default."""
+        assert resolve_model("vqa") == DEFAULT_MODEL
+
+    def test_no_rules(self):
+        """Без правил все задачи идут в default."""
+        assert resolve_model("ocr") == DEFAULT_MODEL
+
+    def test_override(self, registry):
+        """Переопределение из запроса имеет приоритет."""
+        assert resolve_model("caption", "medium") == "medium"
+
+    def test_unknown_override(self, registry):
+        """Неизвестное переопределение."""
+        with pytest.raises(KeyError):
+            resolve_model("caption", "huge")
+
+
+class TestVqaTask:
+    """Тесты определения задачи VQA."""
+
+    def test_caption(self):
+        assert vqa_task([None, "  "]) == "caption"
+
+    def test_vqa(self):
+        assert vqa_task([None, "What color?"]) == "vqa"
@@ -0,0 +1,109 @@
+"""
+Тесты для спекулятивного декодирования на маленьких случайных моделях.
+"""
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from app.speculative import assisted_generate, configure_draft, is_draft_compatible
+
+
+VOCAB_SIZE = 64
+EOS_TOKEN_ID = 1
+
+
+def tiny_model(seed: int, layers: int = 2):
+    """Создает маленькую случайную causal LM без загрузки весов."""
+    torch.manual_seed(seed)
+    config = transformers.LlamaConfig(
+        vocab_size=VOCAB_SIZE, hidden_size=32, intermediate_size=64,
+        num_hidden_layers=layers, num_attention_heads=2, num_key_value_heads=2,
+        pad_token_id=0, eos_token_id=EOS_TOKEN_ID
+    )
+    return transformers.LlamaForCausalLM(config).eval()
+
+
+@pytest.fixture
+def inputs():
+    """Случайный промпт."""
+    torch.manual_seed(42)
+    input_ids = torch.randint(2, VOCAB_SIZE, (1, 12))
+    return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+
+GENERATE_KWARGS = dict(
+    max_new_tokens=24,
+    do_sample=False,
+    repetition_penalty=1.2,
+    pad_token_id=0,
+    eos_token_id=EOS_TOKEN_ID
+)
+
+
+class TestAssistedGenerate:
+    """Тесты эквивалентности жадному декодированию."""
+
+    @pytest.mark.parametrize("draft_seed,draft_layers", [(0, 2), (1, 1), (7, 1)])
+    def test_output_matches_greedy(self, inputs, draft_seed, draft_layers):
+        """Результат совпадает с обычной жадной генерацией для любой draft-модели."""
+        model = tiny_model(0)
+        draft = tiny_model(draft_seed, draft_layers)
+        configure_draft(draft, num_tokens=4, confidence_threshold=0.0)
+
+        with torch.no_grad():
+            greedy = model.generate(**inputs, **GENERATE_KWARGS)
+            speculative, stats = assisted_generate(model, draft, inputs, **GENERATE_KWARGS)
+
+        assert torch.equal(greedy, speculative)
+        assert stats["new_tokens"] == greedy.shape[1] - inputs["input_ids"].shape[1]
+
+    def test_identical_draft_accepts_everything(self, inputs):
+        """Draft с теми же весами: все предложенные токены принимаются."""
+        model = tiny_model(0)
+        draft = tiny_model(0)
+        configure_draft(draft, num_tokens=4, confidence_threshold=0.0)
+
+        with torch.no_grad():
+            _, stats = assisted_generate(model, draft, inputs, **GENERATE_KWARGS)
+
+        assert stats["proposed_tokens"] > 0
+        assert stats["acceptance_rate"] == pytest.approx(1.0)
+
+    def test_stats_bounds(self, inputs):
+        """Доля принятых токенов в пределах [0, 1]."""
+        model = tiny_model(0)
+        draft = tiny_model(3, 1)
+        configure_draft(draft, num_tokens=4, confidence_threshold=0.0)
+
+        with torch.no_grad():
+            _, stats = assisted_generate(model, draft, inputs, **GENERATE_KWARGS)
+
+        assert 0.0 <= stats["acceptance_rate"] <= 1.0
+        assert stats["accepted_tokens"] <= stats["proposed_tokens"]
+
+
+class TestDraftCompatibility:
+    """Тесты проверки совместимости draft-модели."""
+
+    @staticmethod
+    def processor(vocab, image_seq_len):
+        return SimpleNamespace(
+            tokenizer=SimpleNamespace(get_vocab=lambda: vocab),
+            image_seq_len=image_seq_len
+        )
+
+    def test_compatible(self):
+        assert is_draft_compatible(self.processor({"a": 0}, 64), self.processor({"a": 0}, 64))
+
+    def test_different_vocab(self):
+        assert not is_draft_compatible(self.processor({"a": 0}, 64), self.processor({"b": 0}, 64))
+
+    def test_different_image_seq_len(self):
+        assert not is_draft_compatible(self.processor({"a": 0}, 81), self.processor({"a": 0}, 64))
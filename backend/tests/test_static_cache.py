@@ -0,0 +1,105 @@
+"""
+Тесты для кэша статического frontend.
+"""
+import gzip
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.static_cache import StaticCache, accepted_encodings, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+
+
+def make_frontend(directory, script="console.log('app');\n" * 50):
+    (directory / "index.html").write_text(
+        '<link rel="stylesheet" href="/static/style.css"><script src="/static/app.js"></script>'
+        '<img src="/static/missing.png">', encoding="utf-8"
+    )
+    (directory / "app.js").write_text(script, encoding="utf-8")
+    (directory / "style.css").write_text("a{}", encoding="utf-8")
+    return StaticCache(str(directory))
+
+
+class TestAcceptedEncodings:
+    """Тесты для accepted_encodings."""
+    
+    def test_quality_zero_excluded(self):
+        assert accepted_encodings("gzip;q=0, br, deflate;q=0.5") == ["br", "deflate"]
+    
+    def test_empty(self):
+        assert accepted_encodings("") == [""]
+
+
+class TestStaticCache:
+    """Тесты для StaticCache."""
+    
+    def test_missing_directory(self, tmp_path):
+        cache = StaticCache(str(tmp_path / "missing"))
+        assert cache.response("index.html", {}) is None
+    
+    def test_versioned_links(self, tmp_path):
+        """Ссылки index.html на существующие файлы получают версию по содержимому."""
+        cache = make_frontend(tmp_path)
+        html = cache.assets["index.html"].variants["identity"].decode("utf-8")
+        assert f'src="/static/app.js?v={cache.assets["app.js"].version}"' in html
+        assert f'href="/static/style.css?v={cache.assets["style.css"].version}"' in html
+        assert 'src="/static/missing.png"' in html
+    
+    def test_version_changes_with_content(self, tmp_path):
+        first = make_frontend(tmp_path).assets["app.js"].version
+        second = make_frontend(tmp_path, script="console.log('v2');\n" * 50).assets["app.js"].version
+        assert first != second
+    
+    def test_gzip_variant(self, tmp_path):
+        """Сжатый вариант отдается клиенту, который его принимает."""
+        cache = make_frontend(tmp_path)
+        response = cache.response("app.js", {"accept-encoding": "gzip, deflate"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(response.body) == cache.assets["app.js"].variants["identity"]
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert "charset=utf-8" in response.headers["content-type"]
+        
+        plain = cache.response("app.js", {})
+        assert "content-encoding" not in plain.headers
+        assert plain.body == cache.assets["app.js"].variants["identity"]
+    
+    def test_small_file_not_compressed(self, tmp_path):
+        """Вариант, не меньший исходного, не хранится."""
+        cache = make_frontend(tmp_path)
+        assert list(cache.assets["style.css"].variants) == ["identity"]
+        assert "content-encoding" not in cache.response("style.css", {"accept-encoding": "gzip"}).headers
+    
+    def test_cache_control(self, tmp_path):
+        cache = make_frontend(tmp_path)
+        version = cache.assets["app.js"].version
+        assert cache.response("app.js", {}, version).headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert cache.response("app.js", {}, "old").headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+        assert cache.response("app.js", {}).headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    
+    def test_not_modified(self, tmp_path):
+        """If-None-Match с текущим ETag (в том числе слабым) дает 304 без тела."""
+        cache = make_frontend(tmp_path)
+        etag = cache.assets["index.html"].etags["identity"]
+        for header in (etag, f'"other", W/{etag}', "*"):
+            response = cache.response("index.html", {"if-none-match": header})
+            assert response.status_code == 304
+            assert response.body == b""
+            assert response.headers["etag"] == etag
+        assert cache.response("index.html", {"if-none-match": '"other"'}).status_code == 200
+    
+    def test_etag_per_encoding(self, tmp_path):
+        """У каждого варианта свой ETag; 304 возвращает ETag варианта для клиента."""
+        cache = make_frontend(tmp_path)
+        asset = cache.assets["app.js"]
+        assert asset.etags["identity"] == f'"{asset.version}"'
+        assert asset.etags["gzip"] == f'"{asset.version}-gzip"'
+        assert len(set(asset.etags.values())) == len(asset.variants)
+        
+        gzipped = cache.response("app.js", {"accept-encoding": "gzip"})
+        assert gzipped.headers["etag"] == asset.etags["gzip"]
+        assert cache.response("app.js", {}).headers["etag"] == asset.etags["identity"]
+        
+        revalidated = cache.response("app.js", {"if-none-match": asset.etags["gzip"]})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == asset.etags["identity"]
@@ -0,0 +1,73 @@
+"""
+Тесты для тайлового OCR.
+"""
+import pytest
+from PIL import Image
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.tiling import split_strips, merge_overlap, merge_tile_texts
+
+
+class TestSplitStrips:
+    """Тесты разбиения на полосы."""
+    
+    def test_small_image_single_strip(self):
+        image = Image.new("RGB", (800, 800))
+        assert split_strips(image, 768, 96) == [image]
+    
+    @pytest.mark.parametrize("height", [900, 2000, 4096])
+    def test_strips_cover_page_with_overlap(self, height):
+        image = Image.new("L", (600, height))
+        for y in range(height):
+            image.putpixel((0, y), y % 256)
+        strips = split_strips(image, 768, 96)
+        
+        assert len(strips) >= 2
+        assert all(strip.size[0] == 600 for strip in strips)
+        assert all(strip.size[1] <= 768 for strip in strips)
+        assert len({strip.size[1] for strip in strips}) == 1
+        # Общая высота полос с учетом перекрытий покрывает страницу
+        strip_height = strips[0].size[1]
+        assert strip_height * len(strips) - (len(strips) - 1) * 96 >= height
+        # Последняя полоса заканчивается на нижнем краю
+        assert strips[-1].getpixel((0, strip_height - 1)) == (height - 1) % 256
+    
+    def test_overlap_limited_by_tile_height(self):
+        strips = split_strips(Image.new("RGB", (100, 1000)), 200, 500)
+        assert all(strip.size[1] <= 200 for strip in strips)
+
+
+class TestMergeOverlap:
+    """Тесты склейки текста соседних полос."""
+    
+    def test_exact_overlap(self):
+        previous = ["line 1", "line 2", "line 3"]
+        current = ["line 2", "line 3", "line 4"]
+        assert merge_overlap(previous, current) == ["line 1", "line 2", "line 3", "line 4"]
+    
+    def test_fuzzy_overlap(self):
+        """Строка перекрытия распознана в двух полосах немного по-разному."""
+        previous = ["Invoice number 12345", "Total amount: 100.00 USD"]
+        current = ["Total amount: 100,00 USD", "Thank you"]
+        assert merge_overlap(previous, current) == [
+            "Invoice number 12345", "Total amount: 100.00 USD", "Thank you"
+        ]
+    
+    def test_cut_lines_on_strip_edges(self):
+        """Обрезки строк на нижнем краю верхней полосы и верхнем краю нижней удаляются."""
+        previous = ["first line of text", "second line of text", "third li"]
+        current = ["line of text", "third line of text", "fourth line"]
+        assert merge_overlap(previous, current) == [
+            "first line of text", "second line of text", "third line of text", "fourth line"
+        ]
+    
+    def test_no_overlap(self):
+        assert merge_overlap(["alpha"], ["beta"]) == ["alpha", "beta"]
+    
+    def test_merge_tile_texts(self):
+        texts = ["Header\nParagraph one", "Paragraph one\nParagraph two", "", "Paragraph two\nFooter"]
+        assert merge_tile_texts(texts) == "Header\nParagraph one\nParagraph two\nFooter"
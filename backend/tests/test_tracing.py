@@ -0,0 +1,107 @@
+"""
+Тесты для трассировки запросов.
+"""
+import json
+import threading
+import time
+import pytest
+import sys
+import os
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import tracing
+from app.tracing import Trace, JsonlExporter, start_trace, end_trace, record_span, should_sample
+
+
+class TestTrace:
+    """Тесты для Trace."""
+
+    def test_server_timing(self):
+        """Стадии с одинаковым именем суммируются, total добавляется в конец."""
+        trace = Trace()
+        start = trace.started
+        trace.add_span("preprocess", start, start + 0.010)
+        trace.add_span("decode", start + 0.010, start + 0.030)
+        trace.add_span("preprocess", start + 0.030, start + 0.035)
+
+        header = trace.server_timing(start + 0.050)
+        assert header == "preprocess;dur=15.0, decode;dur=20.0, total;dur=50.0"
+
+    def test_records_nesting(self):
+        """Стадии внутри inference получают его как родителя."""
+        trace = Trace()
+        start = trace.started
+        trace.add_span("base64_decode", start, start + 0.001)
+        trace.add_span("prefill", start + 0.002, start + 0.005)
+        trace.add_span("inference", start + 0.002, start + 0.010)
+
+        records = trace.to_records("POST /api/vqa", start + 0.011, {"http.status_code": 200})
+        by_name = {record["name"]: record for record in records}
+        root = by_name["POST /api/vqa"]
+        assert root["parent_id"] is None
+        assert root["attributes"] == {"http.status_code": 200}
+        assert by_name["base64_decode"]["parent_id"] == root["span_id"]
+        assert by_name["inference"]["parent_id"] == root["span_id"]
+        assert by_name["prefill"]["parent_id"] == by_name["inference"]["span_id"]
+        assert len({record["trace_id"] for record in records}) == 1
+
+    def test_record_span_context(self):
+        """record_span пишет только в текущую трассу."""
+        record_span("ignored", 0.0, 1.0)
+        trace, token = start_trace()
+        record_span("stage", trace.started, trace.started + 0.001)
+        end_trace(token)
+        record_span("ignored", 0.0, 1.0)
+        assert [span[0] for span in trace.spans] == ["stage"]
+
+
+class TestSampling:
+    """Тесты выборки и экспорта."""
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(tracing.settings, "TRACING_ENABLED", False)
+        monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 1.0)
+        assert should_sample() is False
+
+    def test_sample_rate(self, monkeypatch):
+        monkeypatch.setattr(tracing.settings, "TRACING_ENABLED", True)
+        monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 1.0)
+        assert should_sample() is True
+        monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 0.0)
+        assert should_sample() is False
+
+    def test_jsonl_exporter(self, tmp_path):
+        path = tmp_path / "traces" / "traces.jsonl"
+        exporter = JsonlExporter(str(path))
+        exporter.export([{"name": "a"}, {"name": "b"}])
+        exporter.export([{"name": "c"}])
+        exporter.flush()
+        lines = path.read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["name"] for line in lines] == ["a", "b", "c"]
+
+    def test_jsonl_exporter_does_not_block(self, tmp_path, monkeypatch):
+        """export() не ждет диска: запись в фоновом потоке, лишние трассы отбрасываются."""
+        exporter = JsonlExporter(str(tmp_path / "traces.jsonl"), max_pending=2)
+        writing, release = threading.Event(), threading.Event()
+        original_open = open
+
+        def slow_open(*args, **kwargs):
+            writing.set()
+            release.wait(5)
+            return original_open(*args, **kwargs)
+
+        monkeypatch.setattr("builtins.open", slow_open)
+        exporter.export([{"name": "first"}])
+        assert writing.wait(5)
+        started = time.perf_counter()
+        for name in ("a", "b", "c"):
+            exporter.export([{"name": name}])
+        assert time.perf_counter() - started < 0.5
+        assert exporter.dropped == 1
+        release.set()
+        exporter.flush()
+        monkeypatch.undo()
+        lines = (tmp_path / "traces.jsonl").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["name"] for line in lines] == ["first", "a", "b"]
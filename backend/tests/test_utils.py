@@ -3,10 +3,10 @@
 """
 import pytest
 import base64
+import gzip
 import io
 import sys
 import os
-from datetime import datetime, timedelta
 from PIL import Image
 
 # Добавляем путь к app
@@ -16,14 +16,41 @@ from app.utils import (
     generate_session_id,
     save_session_image,
     get_session_image,
-    cleanup_expired_sessions,
     image_to_base64,
     save_ocr_result,
     get_ocr_result,
-    cleanup_expired_ocr_results,
+    get_ocr_result_gzip,
+    ocr_results_bytes,
+    gunzip_range,
+    parse_byte_range,
+    expire_due,
     sessions,
     ocr_results
 )
+from app.expiry import ExpiryQueue
+import app.utils
+
+
+class FakeClock:
+    """Управляемые монотонные часы."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+    
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Очередь дедлайнов utils на управляемых часах и SESSION_TIMEOUT = 3600."""
+    fake = FakeClock()
+    monkeypatch.setattr(app.utils, "expiry", ExpiryQueue(clock=fake))
+    monkeypatch.setattr(app.utils.settings, "SESSION_TIMEOUT", 3600)
+    return fake
 
 
 class TestSessionManagement:
@@ -60,40 +87,35 @@ class TestSessionManagement:
         result = get_session_image("nonexistent-session-id")
         assert result is None
     
-    def test_session_last_accessed_updated(self, sample_image_png):
-        """Тест обновления last_accessed при получении сессии."""
+    def test_access_extends_session(self, sample_image_png, clock):
+        """Обращение к сессии продлевает ее на SESSION_TIMEOUT."""
         session_id = generate_session_id()
         image = Image.open(io.BytesIO(sample_image_png))
         
         save_session_image(session_id, sample_image_png, image)
-        initial_time = sessions[session_id]["last_accessed"]
-        
-        # Ждем немного
-        import time
-        time.sleep(0.1)
-        
+        clock.advance(3000)
         get_session_image(session_id)
-        updated_time = sessions[session_id]["last_accessed"]
+        clock.advance(3000)
+        assert expire_due() == 0
+        assert session_id in sessions
         
-        assert updated_time > initial_time
+        clock.advance(601)
+        assert expire_due() == 1
+        assert session_id not in sessions
     
-    def test_cleanup_expired_sessions(self, sample_image_png):
-        """Тест очистки истекших сессий."""
+    def test_expire_sessions(self, sample_image_png, clock):
+        """Удаляются только сессии с наступившим дедлайном."""
         session_id1 = generate_session_id()
         session_id2 = generate_session_id()
         image = Image.open(io.BytesIO(sample_image_png))
         
-        # Сохраняем две сессии
         save_session_image(session_id1, sample_image_png, image)
+        clock.advance(100)
         save_session_image(session_id2, sample_image_png, image)
         
-        # Делаем одну сессию истекшей
-        sessions[session_id1]["last_accessed"] = datetime.now() - timedelta(seconds=3700)
+        clock.advance(3500)
+        expire_due()
         
-        # Очищаем с таймаутом 3600 секунд
-        cleanup_expired_sessions(3600)
-        
-        # Первая сессия должна быть удалена, вторая - нет
         assert session_id1 not in sessions
         assert session_id2 in sessions
 
@@ -136,9 +158,26 @@ class TestOCRResults:
         assert isinstance(task_id, str)
         assert len(task_id) > 0
         assert task_id in ocr_results
-        assert ocr_results[task_id]["text"] == text
+        assert gzip.decompress(ocr_results[task_id]["gzip"]) == text.encode("utf-8")
+        assert ocr_results[task_id]["size"] == len(text)
         assert "created_at" in ocr_results[task_id]
     
+    def test_ocr_result_compressed(self):
+        """Текстовый результат хранится в несколько раз меньше исходного."""
+        text = "\n".join(f"Строка {i}: итого {i * 3}.00 руб." for i in range(2000))
+        task_id = save_ocr_result(text)
+        body, size = get_ocr_result_gzip(task_id)
+        assert size == len(text.encode("utf-8"))
+        assert len(body) * 4 < size
+        assert ocr_results_bytes() == (len(body), size)
+        assert get_ocr_result(task_id) == text
+    
+    def test_gunzip_range(self):
+        data = "Привет, мир! ".encode("utf-8") * 1000
+        body = gzip.compress(data)
+        assert gunzip_range(body, 0, 9) == data[:10]
+        assert gunzip_range(body, 5000, len(data) - 1) == data[5000:]
+    
     def test_get_ocr_result(self):
         """Тест получения результата OCR."""
         text = "Sample OCR text"
@@ -152,18 +191,37 @@ class TestOCRResults:
         result = get_ocr_result("nonexistent-task-id")
         assert result is None
     
-    def test_cleanup_expired_ocr_results(self):
-        """Тест очистки истекших результатов OCR."""
+    def test_expire_ocr_results(self, clock):
+        """Результат OCR истекает через SESSION_TIMEOUT после создания."""
         task_id1 = save_ocr_result("Text 1")
+        clock.advance(100)
         task_id2 = save_ocr_result("Text 2")
+        get_ocr_result(task_id1)
         
-        # Делаем один результат истекшим
-        ocr_results[task_id1]["created_at"] = datetime.now() - timedelta(seconds=3700)
-        
-        # Очищаем с таймаутом 3600 секунд
-        cleanup_expired_ocr_results(3600)
+        clock.advance(3500)
+        expire_due()
         
-        # Первый результат должен быть удален, второй - нет
         assert task_id1 not in ocr_results
         assert task_id2 in ocr_results
 
+
+class TestParseByteRange:
+    """Тесты для parse_byte_range."""
+    
+    def test_ranges(self):
+        assert parse_byte_range("bytes=0-99", 1000) == (0, 99)
+        assert parse_byte_range("bytes=900-", 1000) == (900, 999)
+        assert parse_byte_range("bytes=-100", 1000) == (900, 999)
+        assert parse_byte_range("bytes=990-2000", 1000) == (990, 999)
+        assert parse_byte_range("bytes=-5000", 1000) == (0, 999)
+    
+    def test_ignored(self):
+        """Некорректные и множественные диапазоны игнорируются - отдается весь ресурс."""
+        for header in ("bytes=0-9,20-29", "items=0-9", "bytes=a-9", "bytes=9-0", "bytes=-"):
+            assert parse_byte_range(header, 1000) is None
+    
+    def test_unsatisfiable(self):
+        with pytest.raises(ValueError):
+            parse_byte_range("bytes=1000-", 1000)
+        with pytest.raises(ValueError):
+            parse_byte_range("bytes=-0", 1000)
@@ -12,11 +12,16 @@ from PIL import Image
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from app.validators import (
+    decode_base64_image,
     validate_base64_image,
     validate_language,
     validate_session_id,
+    validate_model,
+    validate_image_count,
+    validate_total_pixels,
     ValidationError
 )
+import app.routing
 
 
 class TestValidateBase64Image:
@@ -69,6 +74,19 @@ class TestValidateBase64Image:
         assert exc_info.value.code == "DECODE_ERROR"
         assert exc_info.value.error == "INVALID_BASE64"
     
+    def test_characters_outside_alphabet(self):
+        """Символы вне алфавита base64 не пропускаются молча."""
+        for value in ("iVBORw0K GgoA", "iVBORw0K\nGgo=", "iVBO-w0K", "QQ===", "data:image/png;base64,Ж0K="):
+            with pytest.raises(ValidationError) as exc_info:
+                decode_base64_image(value)
+            assert exc_info.value.error == "INVALID_BASE64"
+    
+    def test_decode_with_and_without_prefix(self):
+        raw = bytes(range(256)) * 3 + b"x"
+        encoded = base64.b64encode(raw).decode()
+        assert decode_base64_image(encoded) == raw
+        assert decode_base64_image("data:image/png;base64," + encoded) == raw
+    
     def test_too_large_image(self, mock_settings):
         """Тест слишком большого изображения."""
         # Создаем строку больше MAX_IMAGE_SIZE
@@ -158,3 +176,50 @@ class TestValidateSessionId:
         result = validate_session_id(session_id)
         assert result == "test-session-123"
 
+
+
+class TestValidateModel:
+    """Тесты для validate_model."""
+    
+    def test_none_model(self):
+        """Тест None - маршрутизация по задаче."""
+        assert validate_model(None) is None
+        assert validate_model("  ") is None
+    
+    def test_default_model(self):
+        """Модель по умолчанию всегда зарегистрирована."""
+        assert validate_model("default") == "default"
+    
+    def test_registered_model(self, monkeypatch):
+        """Тест зарегистрированного псевдонима."""
+        monkeypatch.setattr(app.routing.settings, "MODEL_REGISTRY", {"small": "test/small"})
+        assert validate_model("small") == "small"
+    
+    def test_unknown_model(self):
+        """Тест незарегистрированного псевдонима."""
+        with pytest.raises(ValidationError) as exc_info:
+            validate_model("unknown")
+        assert exc_info.value.code == "MODEL_NOT_FOUND"
+
+
+class TestValidateImageLimits:
+    """Тесты лимитов на изображения одного промпта."""
+    
+    def test_count_within_limit(self, monkeypatch):
+        monkeypatch.setattr(app.validators.settings, "MAX_IMAGES_PER_REQUEST", 3)
+        assert validate_image_count(3) == 3
+    
+    def test_too_many_images(self, monkeypatch):
+        monkeypatch.setattr(app.validators.settings, "MAX_IMAGES_PER_REQUEST", 3)
+        with pytest.raises(ValidationError) as exc_info:
+            validate_image_count(4)
+        assert exc_info.value.error == "TOO_MANY_IMAGES"
+    
+    def test_total_pixels(self, monkeypatch):
+        """Пиксели суммируются по всем изображениям."""
+        monkeypatch.setattr(app.validators.settings, "MAX_TOTAL_PIXELS", 20000)
+        images = [Image.new("RGB", (100, 100)), Image.new("RGB", (50, 200))]
+        assert validate_total_pixels(images) == 20000
+        with pytest.raises(ValidationError) as exc_info:
+            validate_total_pixels(images + [Image.new("RGB", (1, 1))])
+        assert exc_info.value.error == "IMAGES_TOO_LARGE"
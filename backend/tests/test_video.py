@@ -0,0 +1,151 @@
+"""
+Тесты выборки ключевых кадров видео.
+"""
+import pytest
+import asyncio
+import threading
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+# Добавляем путь к app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import video
+from app.validators import ValidationError
+from app.video import drop_near_duplicates, sample_frames, scene_changes, spool_upload, uniform_indices
+
+
+def solid(value: int, size=(48, 64)) -> np.ndarray:
+    return np.full((*size, 3), value, dtype=np.uint8)
+
+
+def gradient(flip: bool = False, size: int = 96) -> np.ndarray:
+    x = np.linspace(0, 1, size)
+    base = np.outer(np.sin(x * 7), np.cos(x * 5)) * 120 + 128
+    pixels = np.stack([base, base[::-1], base.T], axis=-1).astype(np.uint8)
+    return np.ascontiguousarray(pixels[:, ::-1]) if flip else pixels
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+class TestUniformIndices:
+    """Тесты равномерной выборки."""
+
+    def test_midpoints(self):
+        assert uniform_indices(100, 4) == [12, 37, 62, 87]
+
+    def test_short_clip(self):
+        assert uniform_indices(3, 8) == [0, 1, 2]
+        assert uniform_indices(0, 8) == []
+
+
+class TestSceneChanges:
+    """Тесты выборки по смене сцены."""
+
+    def test_cuts_selected(self):
+        frames = [solid(0)] * 3 + [solid(200)] * 3 + [solid(100)] * 2
+        selected = scene_changes(enumerate(frames), max_frames=8, threshold=0.1)
+        assert [index for index, _ in selected] == [0, 3, 6]
+
+    def test_budget_keeps_strongest(self):
+        """При переполнении вытесняются кадры с наименьшим изменением, первый остается."""
+        frames = [solid(0), solid(60), solid(255), solid(230)]
+        selected = scene_changes(enumerate(frames), max_frames=2, threshold=0.05)
+        assert [index for index, _ in selected] == [0, 2]
+
+
+class TestDropNearDuplicates:
+    """Тесты удаления почти совпадающих кадров."""
+
+    def test_drops_repeats(self):
+        frames = [
+            {"index": i, "image": Image.fromarray(pixels)}
+            for i, pixels in enumerate([gradient(), gradient(flip=True), gradient()])
+        ]
+        assert [frame["index"] for frame in drop_near_duplicates(frames, 16)] == [0, 1]
+
+
+class TestSpoolUpload:
+    """Тесты записи загружаемого видео на диск."""
+
+    def test_written_in_parts(self):
+        path = asyncio.run(spool_upload(chunks(b"abc", b"def"), 100))
+        try:
+            with open(path, "rb") as f:
+                assert f.read() == b"abcdef"
+        finally:
+            os.unlink(path)
+
+    def test_written_off_event_loop(self, monkeypatch):
+        """Диск пишется в пуле потоков блоками не меньше SPOOL_WRITE_BYTES."""
+        monkeypatch.setattr(video, "SPOOL_WRITE_BYTES", 4)
+        writes = []
+        write_all = video._write_all
+        monkeypatch.setattr(video, "_write_all", lambda f, data: (
+            writes.append((threading.get_ident(), data)), write_all(f, data)
+        ))
+
+        async def run():
+            return await spool_upload(chunks(b"ab", b"cd", b"ef", b"g"), 100), threading.get_ident()
+
+        path, loop_thread = asyncio.run(run())
+        try:
+            with open(path, "rb") as f:
+                assert f.read() == b"abcdefg"
+        finally:
+            os.unlink(path)
+        assert [data for _, data in writes] == [b"abcd", b"efg"]
+        assert loop_thread not in {thread for thread, _ in writes}
+
+    def test_too_large(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(video.settings, "VIDEO_TMP_DIR", str(tmp_path))
+        with pytest.raises(ValidationError) as exc_info:
+            asyncio.run(spool_upload(chunks(b"x" * 60, b"x" * 60), 100))
+        assert exc_info.value.error == "VIDEO_TOO_LARGE"
+        assert list(tmp_path.iterdir()) == []
+
+    def test_empty(self):
+        with pytest.raises(ValidationError) as exc_info:
+            asyncio.run(spool_upload(chunks(), 100))
+        assert exc_info.value.code == "EMPTY_VIDEO"
+
+
+class TestSampleFrames:
+    """Тесты чтения кадров видеофайла через OpenCV."""
+
+    @pytest.fixture
+    def clip(self, tmp_path):
+        """Клип 60 кадров 25 fps: три сцены по 20 кадров."""
+        cv2 = pytest.importorskip("cv2")
+        path = str(tmp_path / "clip.avi")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (128, 96))
+        for scene in (gradient(size=128), gradient(flip=True, size=128), solid(30, (128, 128))):
+            for _ in range(20):
+                writer.write(np.ascontiguousarray(scene[:96, :, ::-1]))
+        writer.release()
+        return path
+
+    def test_uniform(self, clip):
+        result = sample_frames(clip, "uniform", 6)
+        assert result["candidates"] == 6
+        assert result["duration"] == 2.4
+        # Повторы кадров одной сцены отброшены
+        assert len(result["frames"]) == 3
+        assert [frame["index"] for frame in result["frames"]] == [5, 25, 45]
+
+    def test_scene(self, clip):
+        result = sample_frames(clip, "scene", 8)
+        assert [frame["index"] for frame in result["frames"]] == [0, 24, 48]
+
+    def test_invalid_file(self, tmp_path):
+        pytest.importorskip("cv2")
+        path = tmp_path / "broken.mp4"
+        path.write_bytes(b"not a video")
+        with pytest.raises(ValidationError):
+            sample_frames(str(path), "uniform", 4)
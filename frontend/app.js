@@ -4,6 +4,12 @@ let currentSessionId = localStorage.getItem('session_id') || null;
 let currentImageBase64 = null;
 let currentOcrTaskId = null;
 
+const devParam = new URLSearchParams(window.location.search).get('dev');
+if (devParam !== null) {
+    localStorage.setItem('dev_mode', devParam === '0' ? '0' : '1');
+}
+const DEV_MODE = localStorage.getItem('dev_mode') === '1';
+
 document.getElementById('tab-vqa').addEventListener('click', () => switchTab('vqa'));
 document.getElementById('tab-ocr').addEventListener('click', () => switchTab('ocr'));
 
@@ -71,10 +77,42 @@ function handleImageFile(file) {
         imagePreview.classList.remove('hidden');
         questionSection.classList.remove('hidden');
         dropZone.classList.add('hidden');
+        pendingSession = createSession(currentImageBase64);
     };
     reader.readAsDataURL(file);
 }
 
+// Фоновое описание при загрузке включается на сервере (PRECAPTION_ON_UPLOAD)
+const precaptionOnUpload = fetch(`${API_BASE}/api/health`)
+    .then(response => response.ok ? response.json() : null)
+    .then(data => Boolean(data && data.precaption_on_upload))
+    .catch(() => false);
+let pendingSession = null;
+
+// Сессия создается сразу при загрузке, только если сервер заранее готовит описание изображения
+async function createSession(image) {
+    if (!(await precaptionOnUpload)) {
+        return;
+    }
+    try {
+        const response = await fetch(`${API_BASE}/api/sessions`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ image })
+        });
+        if (!response.ok || image !== currentImageBase64) {
+            return;
+        }
+        const data = await response.json();
+        currentSessionId = data.session_id;
+        localStorage.setItem('session_id', currentSessionId);
+    } catch (error) {
+        // Сессия будет создана первым вопросом
+    }
+}
+
 clearImage.addEventListener('click', () => {
     currentImageBase64 = null;
     currentSessionId = null;
@@ -106,6 +144,11 @@ askButton.addEventListener('click', async () => {
     askButton.innerHTML = '<span class="spinner"></span> Обработка...';
     
     try {
+        // Вопрос задается в сессии, созданной при загрузке изображения
+        if (pendingSession) {
+            await pendingSession;
+            pendingSession = null;
+        }
         const response = await fetch(`${API_BASE}/api/vqa`, {
             method: 'POST',
             headers: {
@@ -127,7 +170,7 @@ askButton.addEventListener('click', async () => {
         currentSessionId = data.session_id;
         localStorage.setItem('session_id', currentSessionId);
         
-        addMessageToChat('assistant', data.answer);
+        addMessageToChat('assistant', data.answer, parseServerTiming(response));
         
         questionInput.value = '';
         
@@ -141,7 +184,7 @@ askButton.addEventListener('click', async () => {
     }
 });
 
-function addMessageToChat(role, content) {
+function addMessageToChat(role, content, timings = null) {
     const messageDiv = document.createElement('div');
     messageDiv.className = 'chat-message mb-4';
     
@@ -164,6 +207,7 @@ function addMessageToChat(role, content) {
                 </div>
                 <div class="flex-1 bg-white rounded-lg p-3 border border-gray-200">
                     <p class="text-gray-800 whitespace-pre-wrap">${escapeHtml(content)}</p>
+                    ${renderTimings(timings)}
                 </div>
             </div>
         `;
@@ -288,6 +332,7 @@ ocrButton.addEventListener('click', async () => {
         ocrResult.innerHTML = `
             <div class="bg-white rounded-lg p-4 border border-gray-200">
                 <pre class="whitespace-pre-wrap text-sm text-gray-800 font-mono">${escapeHtml(data.text)}</pre>
+                ${renderTimings(parseServerTiming(response))}
             </div>
         `;
         
@@ -373,6 +418,32 @@ function showToast(message, type) {
     }, 5000);
 }
 
+function parseServerTiming(response) {
+    if (!DEV_MODE) {
+        return null;
+    }
+    const header = response.headers.get('Server-Timing');
+    if (!header) {
+        return null;
+    }
+    return header.split(',').map(entry => {
+        const [name, ...params] = entry.trim().split(';');
+        const dur = params.find(param => param.trim().startsWith('dur='));
+        return { name, duration: dur ? parseFloat(dur.trim().slice(4)) : null };
+    });
+}
+
+function renderTimings(timings) {
+    if (!timings || timings.length === 0) {
+        return '';
+    }
+    const items = timings
+        .filter(timing => timing.duration !== null)
+        .map(timing => `${escapeHtml(timing.name)} ${timing.duration.toFixed(1)} мс`)
+        .join(' · ');
+    return `<p class="server-timing mt-2 text-xs text-gray-400 font-mono">${items}</p>`;
+}
+
 function escapeHtml(text) {
     const div = document.createElement('div');
     div.textContent = text;